@@ -4,8 +4,16 @@
 """
 Package core pour les fonctionnalités principales d'AniData VPN
 Ce package fournit les implémentations des différents protocoles et services
+
+Les gestionnaires sont importés à la demande : la ligne de commande et le
+démon n'ont pas à charger tout le module VPN pour démarrer.
 """
 
-from .vpn import WireGuardManager, RealVPNManager
+__all__ = ['WireGuardManager', 'RealVPNManager']
+
 
-__all__ = ['WireGuardManager', 'RealVPNManager']
\ No newline at end of file
+def __getattr__(name):
+    if name in __all__:
+        from . import vpn
+        return getattr(vpn, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Server Catalog
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Cached access to the server catalog.
+
+The parsed catalog is kept as a pickle next to the user's other caches and
+reused as long as the source file keeps the same size and modification
+time, so short-lived processes (CLI, probes) skip JSON parsing entirely.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('anidata_catalog')
+
+CACHE_DIR = os.path.join(os.path.expanduser("~/.anidata"), "cache")
+CACHE_VERSION = 1
+
+
+def default_servers_file() -> str:
+    """User catalog if present, otherwise the catalog shipped with the project"""
+    user_file = os.path.join(os.path.expanduser("~/.anidata"), "servers/config.json")
+    if os.path.exists(user_file):
+        return user_file
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, "infrastructure/servers/config.json")
+
+
+def _cache_path(servers_file: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(servers_file).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"catalog-{digest}.pickle")
+
+
+def _read_source(servers_file: str) -> Dict:
+    with open(servers_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_catalog_data(servers_file: str = None, use_cache: bool = True) -> Dict:
+    """
+    Load the whole catalog document (servers, routes, settings)
+
+    Args:
+        servers_file: Path to server configuration file
+        use_cache: Reuse (and refresh) the pickled copy
+
+    Returns:
+        Catalog document, or an empty catalog if the file is missing/invalid
+    """
+    servers_file = servers_file or default_servers_file()
+    try:
+        stat = os.stat(servers_file)
+    except OSError:
+        logger.warning(f"Server configuration file not found: {servers_file}")
+        return {"servers": []}
+
+    key = (CACHE_VERSION, os.path.abspath(servers_file), stat.st_mtime_ns, stat.st_size)
+    cache_file = _cache_path(servers_file)
+
+    if use_cache:
+        try:
+            with open(cache_file, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("key") == key:
+                return cached["data"]
+        except (OSError, pickle.PickleError, EOFError, AttributeError, KeyError, TypeError):
+            pass
+
+    try:
+        data = _read_source(servers_file)
+    except (json.JSONDecodeError, IOError) as e:
+        logger.error(f"Failed to load server configuration: {str(e)}")
+        return {"servers": []}
+
+    if use_cache:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                pickle.dump({"key": key, "data": data}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logger.debug(f"Could not write catalog cache: {str(e)}")
+
+    return data
+
+
+def load_catalog(servers_file: str = None, protocol: Optional[str] = "wireguard",
+                 use_cache: bool = True) -> List[Dict]:
+    """
+    Load servers, keeping only those supporting ``protocol`` (None keeps all)
+    """
+    servers = load_catalog_data(servers_file, use_cache).get("servers", [])
+    if protocol:
+        servers = [server for server in servers if protocol in server.get("protocols", [])]
+    return servers
+
+
+def filter_servers(servers: List[Dict],
+                   country: str = None,
+                   region: str = None,
+                   protocol_name: str = None,
+                   query: str = None) -> List[Dict]:
+    """Filter catalog entries; all string comparisons are case-insensitive"""
+    country = country.lower() if country else None
+    region = region.lower() if region else None
+    protocol_name = protocol_name.lower() if protocol_name else None
+    query = query.lower() if query else None
+
+    result = []
+    for server in servers:
+        if country and server.get("country", "").lower() != country:
+            continue
+        if region and server.get("region", "").lower() != region:
+            continue
+        if protocol_name and protocol_name not in [p.lower() for p in server.get("protocols", [])]:
+            continue
+        if query and query not in server.get("country", "").lower() \
+                and query not in server.get("city", "").lower() \
+                and query not in server.get("id", "").lower():
+            continue
+        result.append(server)
+    return result
+
+
+def find_server(servers: List[Dict], server_id: str) -> Optional[Dict]:
+    for server in servers:
+        if server.get("id") == server_id:
+            return server
+    return None
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Command Line Interface
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Headless command line client.
+
+Usage: ``python -m core.cli <command> [options]``. Every command accepts
+``--json`` for machine-readable output; ``stats --watch`` streams one JSON
+object per line (NDJSON).
+
+Start-up cost is kept low on purpose: only the standard library is loaded
+up front, the catalog comes from the pickled cache (``core.catalog``), the
+daemon client is imported only when a daemon socket exists, and the
+WireGuard manager only when a tunnel has to be driven in-process.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Dict, List, Optional
+
+DEFAULT_INTERFACE = "anidata0"
+
+
+def _project_root() -> str:
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _emit(args, data, text: str = None) -> None:
+    if args.json:
+        print(json.dumps(data, separators=(",", ":"), default=str), flush=True)
+    elif text is not None:
+        print(text, flush=True)
+
+
+def _daemon_manager():
+    """Manager backed by the daemon, or None (no import cost when no socket exists)"""
+    from core.daemon.protocol import default_socket_path
+    if not os.path.exists(default_socket_path()):
+        return None
+    from core.daemon.client import connect_daemon, DaemonVPNManager
+    client = connect_daemon()
+    return DaemonVPNManager(client) if client else None
+
+
+def _local_manager(args):
+    from core.protocols.wireguard.async_wireguard import AsyncWireGuardManager
+    home_dir = os.path.expanduser("~/.anidata")
+    return AsyncWireGuardManager(config_dir=os.path.join(home_dir, "config/wireguard"),
+                                 servers_file=args.servers_file)
+
+
+def _run(result):
+    """Daemon managers answer directly, the local manager returns coroutines"""
+    import asyncio
+    if asyncio.iscoroutine(result):
+        return asyncio.run(result)
+    return result
+
+
+def _servers(args) -> List[Dict]:
+    from core.catalog import load_catalog, filter_servers
+    servers = load_catalog(args.servers_file, protocol=None)
+    return filter_servers(servers,
+                          country=getattr(args, "country", None),
+                          region=getattr(args, "region", None),
+                          protocol_name=getattr(args, "protocol", None) or "wireguard",
+                          query=getattr(args, "query", None))
+
+
+def _probe(args, servers: List[Dict]) -> Dict[str, Optional[float]]:
+    from core.vpn.probe import probe_servers
+    return probe_servers(servers, port=args.port, timeout=args.timeout,
+                         concurrency=args.concurrency, refresh=args.refresh)
+
+
+def _describe(server: Dict) -> str:
+    return f"{server.get('id')}: {server.get('country')}, {server.get('city')}"
+
+
+# ----------------------------------------------------------------------
+# Commands
+# ----------------------------------------------------------------------
+
+def cmd_list(args) -> int:
+    servers = _servers(args)
+    if args.limit:
+        servers = servers[:args.limit]
+    _emit(args, servers, "\n".join(_describe(s) for s in servers) or "No servers match")
+    return 0
+
+
+def cmd_probe(args) -> int:
+    servers = _servers(args)
+    if args.server_ids:
+        servers = [s for s in servers if s["id"] in args.server_ids]
+    elif not args.all and not (args.country or args.region or args.query):
+        print("Specify server IDs, a filter, or --all", file=sys.stderr)
+        return 2
+
+    rtts = _probe(args, servers)
+    results = sorted(
+        ({"id": s["id"], "country": s.get("country"), "city": s.get("city"), "rtt_ms": rtts.get(s["id"])}
+         for s in servers),
+        key=lambda r: (r["rtt_ms"] is None, r["rtt_ms"] or 0)
+    )
+    lines = [
+        f"{r['id']:<12} {r['country']}, {r['city']}: "
+        + (f"{r['rtt_ms']:.1f} ms" if r["rtt_ms"] is not None else "unreachable")
+        for r in results
+    ]
+    _emit(args, results, "\n".join(lines))
+    return 0
+
+
+def _best_server(args) -> Optional[Dict]:
+    from core.vpn.probe import nearest_servers, select_best_server
+    servers = _servers(args)
+    if args.nearest and len(servers) > args.nearest:
+        # Offline location: probe the closest servers first, no lookup service involved
+        from core.net.geoip import locate_client
+        here = locate_client()
+        if here is not None and here.latitude is not None:
+            nearby = nearest_servers(servers, here.latitude, here.longitude, args.nearest)
+            server = select_best_server(nearby, _probe(args, nearby))
+            if server:
+                return server
+    return select_best_server(servers, _probe(args, servers))
+
+
+def cmd_best(args) -> int:
+    server = _best_server(args)
+    if not server:
+        _emit(args, None, "No reachable server")
+        return 1
+    _emit(args, server, _describe(server))
+    return 0
+
+
+def _target_server(args) -> Optional[str]:
+    """``--server``, or the lowest-latency server with ``--auto`` ("" if none is reachable)"""
+    if args.auto:
+        server = _best_server(args)
+        return server["id"] if server else ""
+    return args.server
+
+
+def cmd_connect(args) -> int:
+    server_id = _target_server(args)
+    if server_id == "":
+        _emit(args, {"success": False, "error": "No reachable server"}, "Connection failed: no reachable server")
+        return 1
+
+    manager = _daemon_manager() or _local_manager(args)
+    result = _run(manager.connect(server_id=server_id,
+                                  use_default_route=not args.no_default_route,
+                                  dns_servers=args.dns))
+    if result.get("success"):
+        server = result.get("server", {})
+        _emit(args, result, f"Connected to {server.get('country')}, {server.get('city')}")
+        return 0
+    _emit(args, result, f"Connection failed: {result.get('error')}")
+    return 1
+
+
+def cmd_switch(args) -> int:
+    server_id = _target_server(args)
+    if not server_id:
+        _emit(args, {"success": False, "error": "No reachable server"}, "Switch failed: no reachable server")
+        return 1
+
+    manager = _daemon_manager()
+    if manager is not None:
+        result = manager.switch(server_id)
+    else:
+        # The tunnel state a switch keeps lives in the daemon: reconnect in-process
+        result = _run(_local_manager(args).connect(server_id=server_id))
+    if result.get("success"):
+        server = result.get("server", {})
+        _emit(args, result, f"Switched to {server.get('country')}, {server.get('city')}")
+        return 0
+    _emit(args, result, f"Switch failed: {result.get('error')}")
+    return 1
+
+
+def cmd_disconnect(args) -> int:
+    manager = _daemon_manager() or _local_manager(args)
+    result = _run(manager.disconnect())
+    if result.get("success"):
+        _emit(args, result, "Disconnected successfully")
+        return 0
+    _emit(args, result, f"Disconnection failed: {result.get('error')}")
+    return 1
+
+
+def cmd_status(args) -> int:
+    manager = _daemon_manager()
+    if manager:
+        status = manager.get_status()
+    else:
+        # No daemon: the interface existing is enough, no need to fork ``wg show``
+        from core.daemon.telemetry import read_interface_counters
+        counters = read_interface_counters(args.interface)
+        status = {"connected": counters is not None, "interface": args.interface}
+        if counters:
+            status["statistics"] = {"total_downloaded": counters[0] / 1024 / 1024,
+                                    "total_uploaded": counters[1] / 1024 / 1024}
+
+    if status.get("connected"):
+        server = status.get("server") or {}
+        text = f"Connected to {server.get('country')}, {server.get('city')}" if server else "Connected"
+        conn_info = status.get("connection_info") or {}
+        if conn_info:
+            text += (f"\n  Interface: {conn_info.get('interface')}"
+                     f"\n  Local IP: {conn_info.get('local_ip')}"
+                     f"\n  Remote: {conn_info.get('remote_endpoint')}"
+                     f"\n  Data transfer: RX: {conn_info.get('transfer_rx')}, TX: {conn_info.get('transfer_tx')}")
+    else:
+        text = "Not connected"
+    _emit(args, status, text)
+    return 0 if status.get("connected") else 3
+
+
+class _CounterSampler:
+    """Rates from sysfs counters, used when no daemon telemetry is available"""
+
+    def __init__(self, interface: str):
+        from core.daemon.telemetry import read_interface_counters
+        self._read = read_interface_counters
+        self.interface = interface
+        self.last = self._read(interface)
+        self.last_time = time.time()
+
+    def sample(self) -> Dict:
+        now = time.time()
+        counters = self._read(self.interface)
+        rx_rate = tx_rate = 0.0
+        if counters and self.last and now > self.last_time:
+            rx_rate = max(0, counters[0] - self.last[0]) / (now - self.last_time)
+            tx_rate = max(0, counters[1] - self.last[1]) / (now - self.last_time)
+        self.last, self.last_time = counters, now
+        return {
+            "timestamp": now,
+            "connected": counters is not None,
+            "rx_bytes": counters[0] if counters else 0,
+            "tx_bytes": counters[1] if counters else 0,
+            "rx_rate": rx_rate,
+            "tx_rate": tx_rate,
+        }
+
+
+class _TelemetrySampler:
+    """Samples read from the daemon's shared-memory ring"""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def sample(self) -> Dict:
+        latest = self.reader.latest()
+        if latest is None:
+            return {"timestamp": time.time(), "connected": False,
+                    "rx_bytes": 0, "tx_bytes": 0, "rx_rate": 0.0, "tx_rate": 0.0}
+        return {
+            "timestamp": latest.timestamp,
+            "connected": latest.connected,
+            "rx_bytes": latest.rx_bytes,
+            "tx_bytes": latest.tx_bytes,
+            "rx_rate": latest.rx_rate,
+            "tx_rate": latest.tx_rate,
+        }
+
+
+def cmd_geoip(args) -> int:
+    from core.net import geoip
+    if args.geoip_command == "compile":
+        counts = geoip.compile_database(args.source, args.database)
+        _emit(args, counts, f"{counts['ipv4_ranges']} IPv4 ranges, {counts['ipv6_ranges']} IPv6 ranges, "
+                            f"{counts['locations']} locations -> {args.database}")
+        return 0
+
+    try:
+        index = geoip.GeoIPIndex(args.database)
+    except geoip.GeoIPError as e:
+        _emit(args, {"error": str(e)}, f"Error: {e}")
+        return 1
+    addresses = args.addresses or [None]
+    results = []
+    for address in addresses:
+        location = geoip.locate_client(address, index) if address is None else index.lookup(address)
+        results.append({"address": address, "location": location._asdict() if location else None})
+    _emit(args, results, "\n".join(
+        f"{r['address'] or 'this host'}: "
+        + (f"{r['location']['country']}"
+           + (f" ({r['location']['latitude']:.2f}, {r['location']['longitude']:.2f})"
+              if r["location"]["latitude"] is not None else "")
+           if r["location"] else "unknown")
+        for r in results
+    ))
+    return 0 if all(r["location"] for r in results) else 1
+
+
+def cmd_stats(args) -> int:
+    sampler = None
+    if not args.no_daemon:
+        from core.daemon.telemetry import open_telemetry
+        reader = open_telemetry()
+        if reader:
+            sampler = _TelemetrySampler(reader)
+    if sampler is None:
+        sampler = _CounterSampler(args.interface)
+        # Rates need two readings
+        time.sleep(min(args.interval, 1.0))
+
+    count = 0
+    try:
+        while True:
+            sample = sampler.sample()
+            _emit(args, sample,
+                  f"{time.strftime('%H:%M:%S', time.localtime(sample['timestamp']))} "
+                  f"down {sample['rx_rate'] / 1024 / 1024:.2f} MB/s  "
+                  f"up {sample['tx_rate'] / 1024 / 1024:.2f} MB/s  "
+                  f"total {sample['rx_bytes'] / 1024 / 1024:.1f}/{sample['tx_bytes'] / 1024 / 1024:.1f} MB")
+            count += 1
+            if not args.watch or (args.count and count >= args.count):
+                break
+            time.sleep(args.interval)
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    return 0
+
+
+# ----------------------------------------------------------------------
+# Argument parsing
+# ----------------------------------------------------------------------
+
+def _add_filters(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--country", help="Filter by country")
+    parser.add_argument("--region", help="Filter by region")
+    parser.add_argument("--query", help="Match country, city or ID")
+
+
+def _add_probe_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--port", type=int, default=443, help="TCP port used for probes (default: 443)")
+    parser.add_argument("--timeout", type=float, default=1.5, help="Probe timeout in seconds (default: 1.5)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Probes in flight (default: 64)")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached probe results")
+    parser.add_argument("--nearest", type=int, default=16,
+                        help="Probe only the N servers closest to this host's GeoIP location (default: 16, 0: all)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="anidata-vpn", description="AniData VPN command line client")
+    parser.add_argument("--json", action="store_true", help="Machine-readable output")
+    parser.add_argument("--servers-file", help="Path to server configuration file")
+
+    # Also accepted after the command; SUPPRESS keeps a value given before it
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", default=argparse.SUPPRESS, help="Machine-readable output")
+    common.add_argument("--servers-file", default=argparse.SUPPRESS, help="Path to server configuration file")
+    subparsers = parser.add_subparsers(dest="command", help="Command to execute")
+
+    list_parser = subparsers.add_parser("list", parents=[common], help="List available servers")
+    _add_filters(list_parser)
+    list_parser.add_argument("--protocol", help="Required protocol (default: wireguard)")
+    list_parser.add_argument("--limit", type=int, help="Maximum number of servers")
+    list_parser.set_defaults(func=cmd_list)
+
+    probe_parser = subparsers.add_parser("probe", parents=[common], help="Measure server latency")
+    probe_parser.add_argument("server_ids", nargs="*", help="Servers to probe")
+    probe_parser.add_argument("--all", action="store_true", help="Probe every server")
+    _add_filters(probe_parser)
+    _add_probe_options(probe_parser)
+    probe_parser.set_defaults(func=cmd_probe)
+
+    best_parser = subparsers.add_parser("best", parents=[common], help="Show the lowest-latency server")
+    _add_filters(best_parser)
+    _add_probe_options(best_parser)
+    best_parser.set_defaults(func=cmd_best)
+
+    connect_parser = subparsers.add_parser("connect", parents=[common], help="Connect to VPN")
+    target = connect_parser.add_mutually_exclusive_group()
+    target.add_argument("--server", help="Server ID to connect to")
+    target.add_argument("--auto", action="store_true", help="Connect to the lowest-latency server")
+    _add_filters(connect_parser)
+    _add_probe_options(connect_parser)
+    connect_parser.add_argument("--no-default-route", action="store_true", help="Do not route all traffic")
+    connect_parser.add_argument("--dns", nargs="+", help="DNS servers to use")
+    connect_parser.set_defaults(func=cmd_connect)
+
+    switch_parser = subparsers.add_parser("switch", parents=[common],
+                                          help="Change servers without tearing the tunnel down")
+    target = switch_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--server", help="Server ID to switch to")
+    target.add_argument("--auto", action="store_true", help="Switch to the lowest-latency server")
+    _add_filters(switch_parser)
+    _add_probe_options(switch_parser)
+    switch_parser.set_defaults(func=cmd_switch)
+
+    disconnect_parser = subparsers.add_parser("disconnect", parents=[common], help="Disconnect from VPN")
+    disconnect_parser.set_defaults(func=cmd_disconnect)
+
+    status_parser = subparsers.add_parser("status", parents=[common], help="Check VPN connection status")
+    status_parser.add_argument("--interface", default=DEFAULT_INTERFACE, help="Tunnel interface")
+    status_parser.set_defaults(func=cmd_status)
+
+    geoip_parser = subparsers.add_parser("geoip", parents=[common], help="Offline IP geolocation database")
+    geoip_subparsers = geoip_parser.add_subparsers(dest="geoip_command", required=True)
+    geoip_compile = geoip_subparsers.add_parser("compile", parents=[common], help="Compile a range CSV")
+    geoip_compile.add_argument("source", help="CSV file (DB-IP lite, or network,country[,lat,lon])")
+    geoip_lookup = geoip_subparsers.add_parser("lookup", parents=[common], help="Locate addresses")
+    geoip_lookup.add_argument("addresses", nargs="*", help="Addresses (default: this host)")
+    for sub in (geoip_compile, geoip_lookup):
+        sub.add_argument("--database", default=os.path.join(os.path.expanduser("~/.anidata"), "geoip", "geoip.adb"),
+                         help="Compiled database path")
+    geoip_parser.set_defaults(func=cmd_geoip)
+
+    stats_parser = subparsers.add_parser("stats", parents=[common], help="Show traffic statistics")
+    stats_parser.add_argument("--watch", action="store_true", help="Stream samples until interrupted")
+    stats_parser.add_argument("--interval", type=float, default=1.0, help="Seconds between samples (default: 1)")
+    stats_parser.add_argument("--count", type=int, help="Stop after this many samples")
+    stats_parser.add_argument("--interface", default=DEFAULT_INTERFACE, help="Tunnel interface")
+    stats_parser.add_argument("--no-daemon", action="store_true", help="Read counters directly")
+    stats_parser.set_defaults(func=cmd_stats)
+
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    root = _project_root()
+    if root not in sys.path:
+        sys.path.insert(0, root)
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return 2
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
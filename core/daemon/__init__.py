@@ -0,0 +1,25 @@
+# AniData VPN - Core Daemon Package
+# © 2023-2024 AniData
+
+"""
+Package du démon de contrôle d'AniData VPN
+Un seul processus possède le tunnel, le catalogue de serveurs et les statistiques,
+et les expose via une API JSON-RPC sur un socket Unix. Les interfaces graphiques
+et la ligne de commande deviennent de simples clients.
+"""
+
+from .protocol import RPCError, default_socket_path
+from .client import DaemonClient, DaemonVPNManager, DaemonRealVPNManager, connect_daemon
+from .telemetry import TelemetrySample, TelemetryReader, open_telemetry
+
+__all__ = [
+    'RPCError',
+    'default_socket_path',
+    'DaemonClient',
+    'DaemonVPNManager',
+    'DaemonRealVPNManager',
+    'connect_daemon',
+    'TelemetrySample',
+    'TelemetryReader',
+    'open_telemetry',
+]
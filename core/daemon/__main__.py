@@ -0,0 +1,6 @@
+# AniData VPN - Control Daemon entry point
+# © 2023-2024 AniData
+
+from .server import main
+
+main()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Daemon Client
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Thin client for the control daemon.
+
+``DaemonClient`` speaks the raw protocol; ``DaemonVPNManager`` and
+``DaemonRealVPNManager`` wrap it behind the manager APIs the frontends
+already use, so a UI only has to pick which object to build.
+"""
+
+import os
+import socket
+import logging
+import threading
+import itertools
+from typing import Any, Callable, Dict, List, Optional
+
+from . import protocol
+from .protocol import RPCError
+from .telemetry import TelemetryReader, open_telemetry
+
+logger = logging.getLogger('anidata_daemon')
+
+# Tunnel setup forks several privileged commands; allow it plenty of time
+CONNECT_TIMEOUT = 120.0
+
+
+class DaemonClient:
+    """
+    Connection to the control daemon
+
+    Responses are routed to the waiting caller by request id; notifications
+    are delivered to subscribed callbacks from a background reader thread.
+    """
+
+    def __init__(self, socket_path: str = None, timeout: float = 10.0):
+        """
+        Initialize the client (does not connect)
+
+        Args:
+            socket_path: Path of the control socket
+            timeout: Default timeout for RPC calls in seconds
+        """
+        self.socket_path = socket_path or protocol.default_socket_path()
+        self.timeout = timeout
+
+        self._sock = None
+        self._reader = None
+        self._send_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending: Dict[int, list] = {}
+        self._ids = itertools.count(1)
+        self._callbacks: Dict[str, List[Callable]] = {}
+        self._disconnect_callbacks: List[Callable] = []
+        self.connected = False
+
+    def connect(self) -> None:
+        """Open the socket and start the reader thread"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.settimeout(None)
+        except OSError:
+            sock.close()
+            raise
+
+        self._sock = sock
+        self.connected = True
+        self._reader = threading.Thread(target=self._read_loop, name="anidata-daemon-client", daemon=True)
+        self._reader.start()
+
+    def close(self) -> None:
+        self.connected = False
+        if self._sock:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+
+    def _read_loop(self) -> None:
+        stream = self._sock.makefile("rb")
+        try:
+            for line in stream:
+                try:
+                    message = protocol.decode_message(line)
+                except RPCError as e:
+                    logger.warning(f"Ignoring malformed message from daemon: {e.message}")
+                    continue
+
+                if "id" in message and ("result" in message or "error" in message):
+                    with self._pending_lock:
+                        waiter = self._pending.pop(message["id"], None)
+                    if waiter:
+                        waiter[1] = message
+                        waiter[0].set()
+                elif "method" in message:
+                    for callback in list(self._callbacks.get(message["method"], [])):
+                        try:
+                            callback(message.get("params") or {})
+                        except Exception as e:
+                            logger.error(f"Subscription callback failed: {str(e)}")
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.connected = False
+            # Wake up every caller still waiting for a response
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            for waiter in pending.values():
+                waiter[0].set()
+            for callback in list(self._disconnect_callbacks):
+                try:
+                    callback()
+                except Exception:
+                    pass
+
+    def call(self, method: str, params: Dict[str, Any] = None, timeout: float = None) -> Any:
+        """
+        Call a daemon method and wait for its result
+
+        Args:
+            method: Method name
+            params: Named parameters
+            timeout: Timeout in seconds (defaults to the client timeout)
+
+        Returns:
+            Method result
+
+        Raises:
+            RPCError: On error response, timeout or lost connection
+        """
+        if not self.connected:
+            raise RPCError(protocol.INTERNAL_ERROR, "Not connected to daemon")
+
+        request_id = next(self._ids)
+        waiter = [threading.Event(), None]
+        with self._pending_lock:
+            self._pending[request_id] = waiter
+
+        try:
+            with self._send_lock:
+                self._sock.sendall(protocol.encode_message(protocol.make_request(request_id, method, params)))
+        except OSError as e:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise RPCError(protocol.INTERNAL_ERROR, f"Connection to daemon lost: {str(e)}")
+
+        if not waiter[0].wait(timeout if timeout is not None else self.timeout):
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise RPCError(protocol.INTERNAL_ERROR, f"Timed out waiting for {method}")
+
+        response = waiter[1]
+        if response is None:
+            raise RPCError(protocol.INTERNAL_ERROR, "Connection to daemon lost")
+        if "error" in response:
+            error = response["error"]
+            raise RPCError(error.get("code", protocol.INTERNAL_ERROR), error.get("message", ""), error.get("data"))
+        return response.get("result")
+
+    def subscribe(self, topic: str, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        Subscribe to a topic
+
+        The callback runs on the reader thread; GUI code must hand the data
+        over to its own thread.
+        """
+        first = not self._callbacks.get(topic)
+        self._callbacks.setdefault(topic, []).append(callback)
+        if first:
+            self.call("subscribe", {"topics": [topic]})
+
+    def unsubscribe(self, topic: str, callback: Callable = None) -> None:
+        callbacks = self._callbacks.get(topic, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        elif callback is None:
+            callbacks.clear()
+        if not callbacks and self.connected:
+            try:
+                self.call("unsubscribe", {"topics": [topic]})
+            except RPCError:
+                pass
+
+    def on_disconnect(self, callback: Callable[[], None]) -> None:
+        self._disconnect_callbacks.append(callback)
+
+
+def connect_daemon(socket_path: str = None, timeout: float = 10.0) -> Optional[DaemonClient]:
+    """
+    Connect to a running daemon
+
+    Returns:
+        Connected client, or None if no daemon is listening
+    """
+    socket_path = socket_path or protocol.default_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+
+    client = DaemonClient(socket_path, timeout=timeout)
+    try:
+        client.connect()
+        client.call("ping", timeout=2.0)
+    except (OSError, RPCError) as e:
+        logger.debug(f"Daemon not available on {socket_path}: {str(e)}")
+        client.close()
+        return None
+    return client
+
+
+class DaemonVPNManager:
+    """
+    Manager backed by the daemon, with the same API as
+    ``core.protocols.wireguard.wireguard.WireGuardManager``
+    """
+
+    def __init__(self, client: DaemonClient):
+        self.client = client
+        self._servers = None
+        self._status = None
+        self._status_lock = threading.Lock()
+        self._listeners: List[Callable] = []
+        self.client.subscribe(protocol.TOPIC_STATUS, self._on_status)
+
+    def _on_status(self, status: Dict[str, Any]) -> None:
+        with self._status_lock:
+            self._status = status
+        for listener in list(self._listeners):
+            listener(status)
+
+    def add_status_listener(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """Register a callback for pushed status updates (called on the client thread)"""
+        self._listeners.append(callback)
+
+    def remove_status_listener(self, callback: Callable) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    @property
+    def servers(self) -> List[Dict]:
+        if self._servers is None:
+            self._servers = self.client.call("servers.list")
+        return self._servers
+
+    @servers.setter
+    def servers(self, value: List[Dict]) -> None:
+        self._servers = value
+
+    @property
+    def current_server(self) -> Optional[Dict]:
+        return self.get_status().get("server")
+
+    def catalog_id(self, server: Dict) -> Optional[str]:
+        """
+        ID of ``server`` in the daemon's catalog, None if it has no match
+
+        Frontends that list another file (data/countries.json) are matched
+        on the country and city; another city of the same country is no
+        match, the user did not pick it.
+        """
+        servers = self.servers or []
+        if any(s.get("id") == server.get("id") for s in servers):
+            return server.get("id")
+        for candidate in servers:
+            if all(candidate.get(key) and candidate.get(key) == server.get(key) for key in ("country", "city")):
+                return candidate["id"]
+        return None
+
+    def get_server(self, server_id: str = None) -> Dict:
+        if server_id is None:
+            return self.servers[0] if self.servers else None
+        try:
+            return self.client.call("servers.get", {"server_id": server_id})
+        except RPCError as e:
+            raise ValueError(e.message)
+
+    def connect(self, server_id: str = None, use_default_route: bool = True, dns_servers: List[str] = None) -> Dict:
+        try:
+            return self.client.call("connect", {
+                "server_id": server_id,
+                "use_default_route": use_default_route,
+                "dns_servers": dns_servers,
+            }, timeout=CONNECT_TIMEOUT)
+        except RPCError as e:
+            return {"success": False, "error": e.message}
+
+    def switch(self, server_id: str) -> Dict:
+        try:
+            return self.client.call("switch", {"server_id": server_id}, timeout=CONNECT_TIMEOUT)
+        except RPCError as e:
+            return {"success": False, "error": e.message}
+
+    def disconnect(self) -> Dict:
+        try:
+            return self.client.call("disconnect", timeout=CONNECT_TIMEOUT)
+        except RPCError as e:
+            return {"success": False, "error": e.message}
+
+    def get_status(self) -> Dict:
+        """Latest status pushed by the daemon (no round trip once subscribed)"""
+        with self._status_lock:
+            status = self._status
+        if status is None:
+            try:
+                status = self.client.call("status")
+            except RPCError:
+                return {"connected": False, "server": None}
+            with self._status_lock:
+                self._status = status
+        return status
+
+    def open_telemetry(self) -> Optional[TelemetryReader]:
+        """Attach to the daemon's shared-memory traffic samples, if published"""
+        try:
+            name = self.client.call("ping").get("telemetry")
+        except RPCError:
+            return None
+        return open_telemetry(name) if name else None
+
+    def close(self) -> None:
+        self.client.close()
+
+
+class DaemonRealVPNManager(DaemonVPNManager):
+    """
+    Manager backed by the daemon, with the boolean API of
+    ``core.vpn.wireguard_manager.RealVPNManager``
+    """
+
+    def connect(self, connection_config: Dict) -> bool:
+        server = connection_config.get("server") or {}
+        server_id = self.catalog_id(server)
+        if server_id is None:
+            logger.error(f"Connection failed: {server.get('country')}, {server.get('city')} "
+                         f"is not in the daemon's catalog")
+            return False
+        result = super().connect(server_id=server_id)
+        if not result.get("success"):
+            logger.error(f"Connection failed: {result.get('error', 'unknown error')}")
+        return bool(result.get("success"))
+
+    def disconnect(self) -> bool:
+        return bool(super().disconnect().get("success"))
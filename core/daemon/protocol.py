@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Daemon JSON-RPC Protocol
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+JSON-RPC 2.0 framing shared by the control daemon and its clients.
+
+Messages are UTF-8 JSON objects, one per line, over a Unix stream socket.
+Server-initiated notifications (subscriptions) use the standard JSON-RPC
+notification shape: a request object without an ``id``.
+"""
+
+import os
+import json
+from typing import Any, Dict, Optional
+
+JSONRPC_VERSION = "2.0"
+
+# Standard JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# Application error codes
+OPERATION_FAILED = -32000
+
+# Notifications pushed to subscribers
+TOPIC_STATUS = "status"
+TOPICS = (TOPIC_STATUS,)
+
+# Largest accepted message, to bound memory used by a misbehaving client
+MAX_MESSAGE_SIZE = 4 * 1024 * 1024
+
+
+class RPCError(Exception):
+    """Error returned by (or raised inside) a JSON-RPC method"""
+
+    def __init__(self, code: int, message: str, data: Any = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+    def to_dict(self) -> Dict[str, Any]:
+        error = {"code": self.code, "message": self.message}
+        if self.data is not None:
+            error["data"] = self.data
+        return error
+
+
+def default_socket_path() -> str:
+    """
+    Resolve the control socket path
+
+    Order: ``ANIDATA_VPN_SOCKET``, ``$XDG_RUNTIME_DIR/anidata-vpn.sock``,
+    then ``~/.anidata/run/anidata-vpn.sock``.
+    """
+    path = os.environ.get("ANIDATA_VPN_SOCKET")
+    if path:
+        return path
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "anidata-vpn.sock")
+
+    return os.path.join(os.path.expanduser("~/.anidata"), "run", "anidata-vpn.sock")
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    """Serialize a message as a single line"""
+    return json.dumps(message, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+
+
+def decode_message(line: bytes) -> Dict[str, Any]:
+    """Parse a single line into a message object"""
+    try:
+        message = json.loads(line)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise RPCError(PARSE_ERROR, f"Parse error: {str(e)}")
+
+    if not isinstance(message, dict):
+        raise RPCError(INVALID_REQUEST, "Invalid request: expected an object")
+    return message
+
+
+def make_request(request_id: Optional[int], method: str, params: Optional[Dict] = None) -> Dict[str, Any]:
+    message = {"jsonrpc": JSONRPC_VERSION, "method": method, "params": params or {}}
+    if request_id is not None:
+        message["id"] = request_id
+    return message
+
+
+def make_notification(method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    return make_request(None, method, params)
+
+
+def make_response(request_id: Any, result: Any) -> Dict[str, Any]:
+    return {"jsonrpc": JSONRPC_VERSION, "id": request_id, "result": result}
+
+
+def make_error(request_id: Any, error: RPCError) -> Dict[str, Any]:
+    return {"jsonrpc": JSONRPC_VERSION, "id": request_id, "error": error.to_dict()}
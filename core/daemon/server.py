@@ -0,0 +1,805 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Control Daemon
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Single background process owning the tunnel, the server catalog and the
+connection statistics.
+
+Every frontend used to build its own manager, load the catalog and run its
+own polling thread; two open windows doubled the work and could fight over
+the ``anidata0`` interface. The daemon does all of that once and exposes it
+as JSON-RPC 2.0 over a Unix socket (see ``protocol.py``). Clients may
+subscribe to topics and receive notifications instead of polling.
+
+The tunnel is driven by ``AsyncWireGuardManager`` on the daemon's own event
+loop. A synchronous manager passed in for embedding still works: its calls
+are handed to the default executor. With the async manager, a watchdog
+reconnects (or fails over) when the tunnel stops working, see
+``core.vpn.watchdog``, and ``switch`` changes servers without tearing the
+tunnel down.
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import logging
+import signal
+import inspect
+import functools
+from typing import Any, Callable, Dict, List, Optional
+
+from core.catalog import default_servers_file, filter_servers, find_server, load_catalog_data
+from core.dns import DNSStub, DEFAULT_HOST, DEFAULT_PORT, create_upstream
+from . import protocol
+from .protocol import RPCError
+from .telemetry import TelemetryWriter, default_telemetry_name, read_interface_counters
+
+logger = logging.getLogger('anidata_daemon')
+
+DAEMON_VERSION = "1.0.0"
+
+
+def format_uptime(seconds: float) -> str:
+    seconds = max(0, int(seconds))
+    return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+
+
+class _ClientConnection:
+    """State of one connected client: write lock and coalesced notifications"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.write_lock = asyncio.Lock()
+        self.topics = set()
+        # Latest notification per topic; older undelivered ones are dropped
+        self.pending = {}
+        self.pending_event = asyncio.Event()
+        self.closed = False
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        if self.closed:
+            return
+        async with self.write_lock:
+            self.writer.write(protocol.encode_message(message))
+            await self.writer.drain()
+
+    def notify(self, topic: str, params: Dict[str, Any]) -> None:
+        if topic in self.topics and not self.closed:
+            self.pending[topic] = params
+            self.pending_event.set()
+
+    async def notification_pump(self) -> None:
+        """Deliver coalesced notifications so a slow client never blocks the daemon"""
+        while not self.closed:
+            await self.pending_event.wait()
+            self.pending_event.clear()
+            pending, self.pending = self.pending, {}
+            for topic, params in pending.items():
+                try:
+                    await self.send(protocol.make_notification(topic, params))
+                except (ConnectionError, OSError):
+                    self.closed = True
+                    return
+
+
+class VPNDaemon:
+    """
+    Control daemon exposing a WireGuard manager over a Unix socket
+    """
+
+    def __init__(self,
+                 socket_path: str = None,
+                 config_dir: str = None,
+                 servers_file: str = None,
+                 poll_interval: float = 1.0,
+                 wg_poll_interval: float = 5.0,
+                 telemetry_name: str = None,
+                 telemetry_rate: float = 10.0,
+                 dns_stub: str = None,
+                 blocklists: List[str] = None,
+                 manager=None):
+        """
+        Initialize the daemon
+
+        Args:
+            socket_path: Path of the control socket (see protocol.default_socket_path)
+            config_dir: Directory for WireGuard configurations
+            servers_file: Path to server catalog
+            poll_interval: Seconds between statistics samples (sysfs, no fork)
+            wg_poll_interval: Seconds between ``wg show`` refreshes
+            telemetry_name: Shared memory block for traffic samples
+            telemetry_rate: Samples per second while connected (0 disables)
+            dns_stub: "host:port" of the local caching DNS stub, "" to disable
+                (default: enabled on 127.0.0.1:53 when settings.dns.use_doh is set)
+            blocklists: Domain lists filtered by the stub (default: settings.dns.blocklists)
+            manager: Pre-built manager, async or not (mainly for embedding)
+        """
+        self.socket_path = socket_path or protocol.default_socket_path()
+        self.config_dir = config_dir or os.path.join(os.path.expanduser("~/.anidata"), "config/wireguard")
+        self.servers_file = servers_file or default_servers_file()
+        self.poll_interval = poll_interval
+        self.wg_poll_interval = wg_poll_interval
+        self.telemetry_name = telemetry_name or default_telemetry_name()
+        self.telemetry_rate = telemetry_rate
+        self.manager = manager
+        self.telemetry = None
+        self.dns_stub_address = dns_stub
+        self.dns_stub = None
+        self.blocklists = blocklists
+        self.split_tunnel = None
+        self.route_policy = None
+        self.watchdog = None
+
+        self._clients = set()
+        self._server = None
+        self._stop_event = None
+        self._op_lock = None
+
+        # Cached state shared by every client
+        self._status = {"connected": False, "server": None}
+        self._connected_at = 0.0
+        self._last_counters = None
+        self._last_counters_time = 0.0
+        self._last_wg_poll = 0.0
+        self._connection_info = {}
+        self._connect_params: Optional[Dict[str, Any]] = None
+
+        self._methods: Dict[str, Callable] = {
+            "ping": self._rpc_ping,
+            "servers.list": self._rpc_servers_list,
+            "servers.get": self._rpc_servers_get,
+            "status": self._rpc_status,
+            "connect": self._rpc_connect,
+            "disconnect": self._rpc_disconnect,
+            "switch": self._rpc_switch,
+            "subscribe": self._rpc_subscribe,
+            "unsubscribe": self._rpc_unsubscribe,
+            "shutdown": self._rpc_shutdown,
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def _create_manager(self):
+        from core.protocols.wireguard.async_wireguard import AsyncWireGuardManager
+        return AsyncWireGuardManager(config_dir=self.config_dir, servers_file=self.servers_file)
+
+    async def _call(self, func, *args, **kwargs):
+        """Await a manager coroutine, or run a blocking method in the executor"""
+        if asyncio.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    def _load_route_policy(self):
+        """Networks of settings.split_tunnel (include_networks/exclude_networks), None for all"""
+        from core.net.cidr import route_policy
+
+        split_settings = load_catalog_data(self.servers_file).get("settings", {}).get("split_tunnel") or {}
+        include = split_settings.get("include_networks")
+        exclude = split_settings.get("exclude_networks")
+        if not include and not exclude:
+            return None
+        try:
+            policy = route_policy(include, exclude)
+        except ValueError as e:
+            logger.warning(f"Network split tunneling disabled: {str(e)}")
+            return None
+        if not policy:
+            logger.warning("Network split tunneling disabled: include_networks minus exclude_networks is empty")
+            return None
+        logger.info(f"Tunnel limited to {len(policy)} prefixes")
+        return policy
+
+    async def _start_dns_stub(self) -> None:
+        """Local caching resolver used as the tunnel's DNS server"""
+        settings = load_catalog_data(self.servers_file).get("settings", {})
+        dns_settings = settings.get("dns", {})
+        address = self.dns_stub_address
+        if address is None:
+            if not dns_settings.get("use_doh"):
+                return
+            address = f"{DEFAULT_HOST}:{DEFAULT_PORT}"
+        if not address:
+            return
+
+        host, _, port = address.rpartition(":")
+        stub = DNSStub(create_upstream(dns_settings), host=host or DEFAULT_HOST, port=int(port))
+        try:
+            await stub.start()
+        except OSError as e:
+            logger.warning(f"DNS stub disabled ({address}: {str(e)}), using static resolvers")
+            await stub.upstream.close()
+            return
+        if stub.port != 53:
+            logger.warning("resolv.conf can only use port 53: the stub will not be used by the tunnel")
+        self.dns_stub = stub
+        if self.blocklists is None:
+            self.blocklists = dns_settings.get("blocklists", [])
+
+        # Domain rules only work when lookups go through the stub
+        from core.net import SplitTunnel
+        try:
+            self.split_tunnel = SplitTunnel.from_settings(settings.get("split_tunnel"))
+        except ValueError as e:
+            logger.warning(f"Split tunneling disabled: {str(e)}")
+        if self.split_tunnel is not None:
+            if stub.port == 53:
+                stub.observers.append(self.split_tunnel.observe)
+            else:
+                logger.warning("Split tunneling needs the DNS stub on port 53, disabled")
+                self.split_tunnel = None
+
+    def _load_firewall(self):
+        """Leak protection of settings.leak_protection, None if disabled"""
+        from core.net.firewall import Firewall
+
+        settings = load_catalog_data(self.servers_file).get("settings", {})
+        try:
+            firewall = Firewall.from_settings(settings.get("leak_protection"))
+        except ValueError as e:
+            logger.warning(f"Leak protection disabled: {str(e)}")
+            return None
+        if firewall is None:
+            return None
+        if not hasattr(self.manager, "firewall"):
+            logger.warning("Leak protection needs the async WireGuard manager, disabled")
+            return None
+
+        if self.split_tunnel is not None and not self.split_tunnel.use_default_route and firewall.kill_switch:
+            # Include mode sends everything else outside the tunnel on purpose
+            logger.warning("Kill switch disabled: split tunneling is in include mode")
+            firewall.kill_switch = False
+        if self.route_policy is not None:
+            firewall.bypass = ~self.route_policy
+        if self.dns_stub is not None:
+            upstream = self.dns_stub.upstream
+            if getattr(upstream, "port", None) == 53:
+                # Plain DNS upstream of the stub (DoH goes over 443 and needs no exception)
+                firewall.extra_dns_servers.append(upstream.host)
+            # Resolvers the DoH server's name is looked up with
+            firewall.extra_dns_servers.extend(getattr(upstream, "bootstrap", ()))
+        return firewall
+
+    def _load_watchdog(self):
+        """Watchdog with the thresholds of settings.watchdog, None if disabled"""
+        from core.vpn.watchdog import Thresholds, Watchdog
+
+        settings = load_catalog_data(self.servers_file).get("settings", {}).get("watchdog") or {}
+        if not settings.get("enabled", True):
+            return None
+        if not asyncio.iscoroutinefunction(getattr(self.manager, "connect", None)):
+            # RealVPNManager and friends run their own monitoring thread
+            return None
+        try:
+            return Watchdog(Thresholds.from_settings(settings))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Invalid watchdog settings ({str(e)}), using defaults")
+            return Watchdog()
+
+    def _prepare_socket(self) -> None:
+        """Create the socket directory and remove a stale socket file"""
+        socket_dir = os.path.dirname(self.socket_path)
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                # Nobody listening: left over by a crashed daemon
+                os.unlink(self.socket_path)
+            else:
+                raise RuntimeError(f"Another daemon is already listening on {self.socket_path}")
+            finally:
+                probe.close()
+
+    async def serve_forever(self) -> None:
+        """Run the daemon until shutdown is requested"""
+        loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._op_lock = asyncio.Lock()
+
+        if self.manager is None:
+            self.manager = await loop.run_in_executor(None, self._create_manager)
+        self.route_policy = self._load_route_policy()
+        await self._start_dns_stub()
+        firewall = self._load_firewall()
+        if firewall is not None:
+            self.manager.firewall = firewall
+        self.watchdog = self._load_watchdog()
+
+        self._prepare_socket()
+        self._server = await asyncio.start_unix_server(
+            self._handle_client, path=self.socket_path, limit=protocol.MAX_MESSAGE_SIZE
+        )
+        os.chmod(self.socket_path, 0o600)
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        logger.info(f"AniData VPN daemon listening on {self.socket_path} "
+                    f"({len(self.manager.servers)} servers)")
+
+        tasks = [asyncio.create_task(self._poll_loop())]
+        if self.watchdog is not None:
+            tasks.append(asyncio.create_task(self._watchdog_loop()))
+        if self.dns_stub and self.blocklists:
+            # Large lists take a while to compile the first time: resolve unfiltered meanwhile
+            tasks.append(asyncio.create_task(self.dns_stub.load_blocklist(self.blocklists)))
+        if self.telemetry_rate > 0:
+            try:
+                self.telemetry = TelemetryWriter(self.telemetry_name)
+                tasks.append(asyncio.create_task(self._telemetry_loop()))
+            except OSError as e:
+                logger.warning(f"Telemetry disabled: {str(e)}")
+
+        try:
+            await self._stop_event.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self.telemetry:
+                self.telemetry.close()
+                self.telemetry = None
+            if self.split_tunnel and self.split_tunnel.active:
+                await self.split_tunnel.stop()
+            if self.dns_stub:
+                await self.dns_stub.stop()
+                self.dns_stub = None
+            self._server.close()
+            await self._server.wait_closed()
+            for client in list(self._clients):
+                client.closed = True
+                client.pending_event.set()
+                client.writer.close()
+
+            if getattr(self.manager, "interface", None):
+                logger.info("Tearing down tunnel before exit")
+                await self._call(self.manager.disconnect)
+
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+            logger.info("AniData VPN daemon stopped")
+
+    def run(self) -> None:
+        asyncio.run(self.serve_forever())
+
+    # ------------------------------------------------------------------
+    # Client handling
+    # ------------------------------------------------------------------
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = _ClientConnection(writer)
+        self._clients.add(client)
+        pump = asyncio.create_task(client.notification_pump())
+
+        try:
+            while not client.closed:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    await client.send(protocol.make_error(
+                        None, RPCError(protocol.INVALID_REQUEST, "Message too large")))
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+
+                response = await self._dispatch(client, line)
+                if response is not None:
+                    await client.send(response)
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            # Client went away, or the daemon is shutting down
+            pass
+        finally:
+            client.closed = True
+            client.pending_event.set()
+            pump.cancel()
+            self._clients.discard(client)
+            writer.close()
+
+    async def _dispatch(self, client: _ClientConnection, line: bytes) -> Optional[Dict[str, Any]]:
+        request_id = None
+        try:
+            message = protocol.decode_message(line)
+            request_id = message.get("id")
+            method_name = message.get("method")
+            params = message.get("params") or {}
+
+            if not isinstance(method_name, str):
+                raise RPCError(protocol.INVALID_REQUEST, "Invalid request: missing method")
+            if not isinstance(params, dict):
+                raise RPCError(protocol.INVALID_PARAMS, "Only named parameters are supported")
+
+            method = self._methods.get(method_name)
+            if method is None:
+                raise RPCError(protocol.METHOD_NOT_FOUND, f"Method not found: {method_name}")
+
+            try:
+                # Checked before the call: a TypeError raised inside a method is a bug, not bad params
+                inspect.signature(method).bind(client, **params)
+            except TypeError as e:
+                raise RPCError(protocol.INVALID_PARAMS, f"Invalid params: {str(e)}")
+            result = await method(client, **params)
+
+            if request_id is None:
+                return None
+            return protocol.make_response(request_id, result)
+        except RPCError as e:
+            return protocol.make_error(request_id, e)
+        except Exception as e:
+            logger.exception("Unhandled error in RPC method")
+            return protocol.make_error(request_id, RPCError(protocol.INTERNAL_ERROR, str(e)))
+
+    def _publish(self, topic: str, params: Dict[str, Any]) -> None:
+        for client in self._clients:
+            client.notify(topic, params)
+
+    # ------------------------------------------------------------------
+    # Status polling (one poller for every client)
+    # ------------------------------------------------------------------
+
+    async def _refresh_status(self, force_wg: bool = False) -> Dict[str, Any]:
+        """Rebuild the cached status"""
+        interface = getattr(self.manager, "interface", None)
+        now = time.time()
+
+        if not interface:
+            self._last_counters = None
+            self._connection_info = {}
+            self._status = {
+                "connected": False,
+                "server": None,
+                "uptime": "00:00:00",
+                "statistics": {
+                    "download_speed": 0,
+                    "upload_speed": 0,
+                    "total_downloaded": 0,
+                    "total_uploaded": 0,
+                },
+            }
+            if self.watchdog is not None and self._connect_params is not None:
+                # Between two recovery attempts
+                self._status["watchdog"] = self.watchdog.status()
+            return self._status
+
+        # ``wg show`` forks sudo: refresh it at a slower cadence than counters
+        if force_wg or now - self._last_wg_poll >= self.wg_poll_interval:
+            self._last_wg_poll = now
+            try:
+                self._connection_info = await self._call(interface.get_connection_status)
+            except Exception as e:
+                self._connection_info = {"connected": False, "error": str(e)}
+
+        download_speed = upload_speed = 0.0
+        rx_bytes = tx_bytes = 0
+        counters = read_interface_counters(interface.interface_name)
+        if counters:
+            rx_bytes, tx_bytes = counters
+            if self._last_counters and now > self._last_counters_time:
+                elapsed = now - self._last_counters_time
+                download_speed = max(0, rx_bytes - self._last_counters[0]) / elapsed / 1024 / 1024
+                upload_speed = max(0, tx_bytes - self._last_counters[1]) / elapsed / 1024 / 1024
+            self._last_counters = counters
+            self._last_counters_time = now
+
+        self._status = {
+            "connected": bool(self._connection_info.get("connected", counters is not None)),
+            "server": self.manager.current_server,
+            "connection_info": self._connection_info,
+            "uptime": format_uptime(now - self._connected_at) if self._connected_at else "00:00:00",
+            "statistics": {
+                "download_speed": download_speed,
+                "upload_speed": upload_speed,
+                "total_downloaded": rx_bytes / 1024 / 1024,
+                "total_uploaded": tx_bytes / 1024 / 1024,
+            },
+        }
+        if self.watchdog is not None:
+            self._status["watchdog"] = self.watchdog.status()
+        return self._status
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                status = await self._refresh_status()
+                self._publish(protocol.TOPIC_STATUS, status)
+            except Exception as e:
+                logger.error(f"Status polling failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    # ------------------------------------------------------------------
+    # Watchdog
+    # ------------------------------------------------------------------
+
+    async def _health_sample(self):
+        from core.vpn.watchdog import Sample
+        from core.protocols.wireguard.wireguard import WireGuardError
+
+        interface = self.manager.interface
+        now = time.time()
+        counters = read_interface_counters(interface.interface_name)
+        if counters is None:
+            return Sample(now, False, None, 0, 0)
+        try:
+            handshake = await interface.latest_handshake()
+        except WireGuardError as e:
+            # Cannot tell: judge on the counters only
+            logger.debug(f"Handshake time unavailable: {str(e)}")
+            handshake = None
+        return Sample(now, True, handshake, counters[0], counters[1])
+
+    async def _watchdog_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.watchdog.thresholds.check_interval)
+            if self._connect_params is None or getattr(self.manager, "interface", None) is None:
+                continue
+            try:
+                reason = self.watchdog.check(await self._health_sample())
+                if reason is not None:
+                    logger.warning(f"Tunnel unhealthy ({reason}), reconnecting")
+                    await self._recover()
+            except Exception as e:
+                logger.error(f"Watchdog failed: {str(e)}")
+
+    async def _recover(self) -> None:
+        """Reconnect with backoff until it works, or a user connect/disconnect takes over"""
+        from core.vpn.watchdog import failover_candidates
+
+        params = self._connect_params
+        watchdog = self.watchdog
+        # params stays untouched: it is how a user connect/disconnect is detected
+        server_id = params["server_id"]
+        tried = [server_id]
+        loop = asyncio.get_running_loop()
+        while self._connect_params is params:
+            await asyncio.sleep(watchdog.next_delay())
+            if self._connect_params is not params:
+                return
+            if watchdog.should_fail_over():
+                candidates = await loop.run_in_executor(None, failover_candidates, self.manager.servers, tried)
+                if candidates:
+                    server_id = candidates[0]["id"]
+                    tried.append(server_id)
+                    watchdog.failed_over(server_id)
+
+            async with self._op_lock:
+                if self._connect_params is not params:
+                    return
+                watchdog.attempt_started()
+                result = await self._connect(server_id, params["use_default_route"], params["dns_servers"])
+                if result.get("success"):
+                    self._connect_params = dict(params, server_id=server_id)
+                status = await self._refresh_status(force_wg=True)
+            self._publish(protocol.TOPIC_STATUS, status)
+            if result.get("success"):
+                return
+            watchdog.attempt_failed()
+            logger.warning(f"Reconnection to {server_id} failed: {result.get('error')}")
+
+    async def _telemetry_loop(self) -> None:
+        """
+        Publish traffic samples to shared memory
+
+        Runs on the event loop: a sysfs read costs a few microseconds, far
+        less than handing it to a worker thread at this rate.
+        """
+        fast_interval = 1.0 / self.telemetry_rate
+        last = None
+        last_time = 0.0
+        while True:
+            interface = getattr(self.manager, "interface", None)
+            counters = read_interface_counters(interface.interface_name) if interface else None
+            now = time.time()
+
+            if counters:
+                rx_rate = tx_rate = 0.0
+                if last and now > last_time:
+                    rx_rate = max(0, counters[0] - last[0]) / (now - last_time)
+                    tx_rate = max(0, counters[1] - last[1]) / (now - last_time)
+                self.telemetry.write(counters[0], counters[1], rx_rate, tx_rate, True, now)
+                last, last_time = counters, now
+                await asyncio.sleep(fast_interval)
+            else:
+                # Keep a heartbeat so readers can tell the daemon is alive
+                self.telemetry.write(0, 0, 0.0, 0.0, False, now)
+                last = None
+                await asyncio.sleep(1.0)
+
+    # ------------------------------------------------------------------
+    # RPC methods
+    # ------------------------------------------------------------------
+
+    async def _rpc_ping(self, client) -> Dict[str, Any]:
+        return {
+            "version": DAEMON_VERSION,
+            "pid": os.getpid(),
+            "clients": len(self._clients),
+            "telemetry": self.telemetry.name if self.telemetry else None,
+        }
+
+    async def _rpc_servers_list(self, client,
+                                country: str = None,
+                                region: str = None,
+                                protocol: str = None,
+                                query: str = None,
+                                offset: int = 0,
+                                limit: int = None) -> List[Dict]:
+        servers = filter_servers(self.manager.servers, country, region, protocol, query)
+        end = offset + limit if limit is not None else None
+        return servers[offset:end]
+
+    async def _rpc_servers_get(self, client, server_id: str) -> Dict:
+        server = find_server(self.manager.servers, server_id)
+        if server:
+            return server
+        raise RPCError(protocol.INVALID_PARAMS, f"Server with ID {server_id} not found")
+
+    async def _rpc_status(self, client) -> Dict[str, Any]:
+        return self._status
+
+    async def _connect(self, server_id: Optional[str], use_default_route: bool,
+                       dns_servers: Optional[List[str]]) -> Dict[str, Any]:
+        """Bring the tunnel up (``_op_lock`` held), split tunnel included"""
+        # Lookups go through the local cache instead of a resolver behind the tunnel
+        if dns_servers is None and self.dns_stub is not None and self.dns_stub.port == 53:
+            dns_servers = [self.dns_stub.host]
+
+        split = self.split_tunnel
+        if split is not None and not split.use_default_route:
+            # Include mode: only the listed domains go through the tunnel
+            use_default_route = False
+
+        if split is not None and split.active:
+            await split.stop()
+        options = {"allowed_ips": self.route_policy} if self.route_policy is not None else {}
+        result = await self._call(self.manager.connect,
+                                  server_id=server_id,
+                                  use_default_route=use_default_route,
+                                  dns_servers=dns_servers,
+                                  **options)
+        if result.get("timings"):
+            logger.debug(f"Connect steps (ms): {result['timings']}")
+        if split is not None and result.get("success"):
+            from core.protocols.wireguard.wireguard import WireGuardError
+            try:
+                await split.start(result["interface"])
+                # Cached answers were never seen by the split tunnel: look them up again
+                self.dns_stub.cache.clear()
+            except WireGuardError as e:
+                logger.warning(f"Split tunneling not applied: {str(e)}")
+                result["split_tunnel_error"] = str(e)
+        self._connected_at = time.time() if result.get("success") else 0.0
+        self._last_counters = None
+        if result.get("success") and self.watchdog is not None:
+            self.watchdog.connected()
+        return result
+
+    async def _rpc_connect(self, client,
+                           server_id: str = None,
+                           use_default_route: bool = True,
+                           dns_servers: List[str] = None) -> Dict[str, Any]:
+        # Connect/disconnect are serialized: only one tunnel operation at a time
+        async with self._op_lock:
+            result = await self._connect(server_id, use_default_route, dns_servers)
+            # Kept for the watchdog; a new dict also ends a recovery in progress
+            self._connect_params = {
+                "server_id": (result.get("server") or {}).get("id") or server_id,
+                "use_default_route": use_default_route,
+                "dns_servers": dns_servers,
+            } if result.get("success") else None
+            status = await self._refresh_status(force_wg=True)
+        self._publish(protocol.TOPIC_STATUS, status)
+        return result
+
+    async def _rpc_disconnect(self, client) -> Dict[str, Any]:
+        async with self._op_lock:
+            self._connect_params = None
+            if self.split_tunnel is not None and self.split_tunnel.active:
+                await self.split_tunnel.stop()
+            result = await self._call(self.manager.disconnect)
+            self._connected_at = 0.0
+            status = await self._refresh_status()
+        self._publish(protocol.TOPIC_STATUS, status)
+        return result
+
+    async def _rpc_switch(self, client, server_id: str) -> Dict[str, Any]:
+        """Move the tunnel to ``server_id`` in place (see AsyncWireGuardManager.switch)"""
+        async with self._op_lock:
+            params = self._connect_params
+            if params is not None and asyncio.iscoroutinefunction(getattr(self.manager, "switch", None)):
+                result = await self.manager.switch(server_id)
+                if result.get("success") and self.watchdog is not None:
+                    self.watchdog.connected()
+                # On failure the previous server is still in use: nothing changes
+            else:
+                # No tunnel to keep, or a manager that can only reconnect
+                params = params or {"use_default_route": True, "dns_servers": None}
+                result = await self._connect(server_id, params["use_default_route"], params["dns_servers"])
+                if not result.get("success"):
+                    self._connect_params = None
+            if result.get("success"):
+                # A new dict also ends a recovery aimed at the previous server
+                self._connect_params = dict(params, server_id=result["server"]["id"])
+            status = await self._refresh_status(force_wg=True)
+        self._publish(protocol.TOPIC_STATUS, status)
+        return result
+
+    async def _rpc_subscribe(self, client, topics: List[str] = None) -> Dict[str, Any]:
+        topics = topics or list(protocol.TOPICS)
+        unknown = [t for t in topics if t not in protocol.TOPICS]
+        if unknown:
+            raise RPCError(protocol.INVALID_PARAMS, f"Unknown topics: {', '.join(unknown)}")
+
+        client.topics.update(topics)
+        # Deliver the current state right away so the client never starts blank
+        if protocol.TOPIC_STATUS in topics:
+            client.notify(protocol.TOPIC_STATUS, self._status)
+        return {"subscribed": sorted(client.topics)}
+
+    async def _rpc_unsubscribe(self, client, topics: List[str] = None) -> Dict[str, Any]:
+        if topics:
+            client.topics.difference_update(topics)
+        else:
+            client.topics.clear()
+        return {"subscribed": sorted(client.topics)}
+
+    async def _rpc_shutdown(self, client) -> Dict[str, Any]:
+        self._stop_event.set()
+        return {"stopping": True}
+
+
+def main():
+    """Run the control daemon"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AniData VPN control daemon")
+    parser.add_argument("--socket", help="Path of the control socket")
+    parser.add_argument("--config-dir", help="Directory for WireGuard configurations")
+    parser.add_argument("--servers-file", help="Path to server configuration file")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="Seconds between statistics samples (default: 1.0)")
+    parser.add_argument("--telemetry-rate", type=float, default=10.0,
+                        help="Shared-memory telemetry samples per second, 0 to disable (default: 10)")
+    parser.add_argument("--dns-stub", default=None,
+                        help="Local DNS stub address (default: 127.0.0.1:53 when DoH is enabled; '' disables)")
+    parser.add_argument("--blocklist", action="append", default=None, metavar="FILE",
+                        help="Domain blocklist for the DNS stub, repeatable (default: settings.dns.blocklists)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Enable debug logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    daemon = VPNDaemon(
+        socket_path=args.socket,
+        config_dir=args.config_dir,
+        servers_file=args.servers_file,
+        poll_interval=args.poll_interval,
+        telemetry_rate=args.telemetry_rate,
+        dns_stub=args.dns_stub,
+        blocklists=args.blocklist,
+    )
+    try:
+        daemon.run()
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
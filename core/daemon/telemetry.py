@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Shared-Memory Telemetry
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+High-frequency traffic samples published through shared memory.
+
+The daemon writes counter and rate samples into a fixed ring of 64-byte
+slots. Readers map the same block and copy slots out directly: no socket,
+no JSON and no work for the daemon per reader. Each slot carries a
+sequence number that is odd while the slot is being written (seqlock); a
+reader retries when the sequence is odd or changed during its copy.
+
+Layout::
+
+    header  (64 bytes)  magic, version, capacity, slot size, head
+    slot[i] (64 bytes)  seq, index, timestamp, rx_bytes, tx_bytes,
+                        rx_rate, tx_rate, connected
+
+``head`` is the number of samples written so far; sample ``n`` lives in
+slot ``n % capacity``.
+"""
+
+import os
+import time
+import struct
+import logging
+from collections import namedtuple
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger('anidata_daemon')
+
+MAGIC = b"ADTM"
+VERSION = 1
+
+HEADER_FORMAT = "<4sIIIQ"
+HEADER_SIZE = 64
+HEAD_OFFSET = struct.calcsize("<4sIII")
+
+SLOT_FORMAT = "<QQdQQddB7x"
+SLOT_SIZE = struct.calcsize(SLOT_FORMAT)
+PAYLOAD_FORMAT = "<QdQQddB"
+PAYLOAD_OFFSET = 8
+
+DEFAULT_CAPACITY = 600  # 60 seconds at 10 Hz
+
+# Attempts before giving up on a slot the writer keeps overwriting
+READ_RETRIES = 8
+
+TelemetrySample = namedtuple(
+    "TelemetrySample",
+    ["index", "timestamp", "rx_bytes", "tx_bytes", "rx_rate", "tx_rate", "connected"]
+)
+TelemetrySample.__doc__ = "One traffic sample; rates are in bytes per second"
+
+
+def default_telemetry_name() -> str:
+    """Shared memory block name, per user unless ``ANIDATA_VPN_TELEMETRY`` is set"""
+    return os.environ.get("ANIDATA_VPN_TELEMETRY") or f"anidata_vpn_telemetry_{os.getuid()}"
+
+
+def read_interface_counters(interface: str) -> Optional[Tuple[int, int]]:
+    """
+    Read RX/TX byte counters of an interface from sysfs (no process spawn)
+
+    Returns:
+        Tuple of (rx_bytes, tx_bytes) or None if the interface does not exist
+    """
+    base = f"/sys/class/net/{interface}/statistics"
+    try:
+        with open(os.path.join(base, "rx_bytes"), "r") as f:
+            rx_bytes = int(f.read().strip())
+        with open(os.path.join(base, "tx_bytes"), "r") as f:
+            tx_bytes = int(f.read().strip())
+        return rx_bytes, tx_bytes
+    except (OSError, ValueError):
+        return None
+
+
+class TelemetryWriter:
+    """
+    Single writer of the telemetry ring (the daemon)
+    """
+
+    def __init__(self, name: str = None, capacity: int = DEFAULT_CAPACITY):
+        """
+        Create the shared memory block
+
+        Args:
+            name: Block name (see default_telemetry_name)
+            capacity: Number of slots in the ring
+        """
+        self.name = name or default_telemetry_name()
+        self.capacity = capacity
+        size = HEADER_SIZE + capacity * SLOT_SIZE
+
+        try:
+            self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            # Left over by a daemon that did not exit cleanly
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+
+        self._buf = self._shm.buf
+        self._head = 0
+        struct.pack_into(HEADER_FORMAT, self._buf, 0, MAGIC, VERSION, capacity, SLOT_SIZE, 0)
+
+    def write(self, rx_bytes: int, tx_bytes: int, rx_rate: float, tx_rate: float,
+              connected: bool, timestamp: float = None) -> None:
+        """Append one sample, overwriting the oldest slot when the ring is full"""
+        index = self._head
+        offset = HEADER_SIZE + (index % self.capacity) * SLOT_SIZE
+        seq = struct.unpack_from("<Q", self._buf, offset)[0]
+
+        # Odd sequence: slot is being written
+        struct.pack_into("<Q", self._buf, offset, seq + 1)
+        struct.pack_into(PAYLOAD_FORMAT, self._buf, offset + PAYLOAD_OFFSET,
+                         index, timestamp or time.time(), rx_bytes, tx_bytes,
+                         rx_rate, tx_rate, 1 if connected else 0)
+        struct.pack_into("<Q", self._buf, offset, seq + 2)
+
+        self._head = index + 1
+        struct.pack_into("<Q", self._buf, HEAD_OFFSET, self._head)
+
+    def close(self) -> None:
+        self._buf = None
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class TelemetryReader:
+    """
+    Reader of the telemetry ring; any number may attach
+    """
+
+    def __init__(self, name: str = None):
+        """
+        Attach to an existing block
+
+        Raises:
+            FileNotFoundError: If no daemon publishes telemetry under this name
+            ValueError: If the block does not hold a telemetry ring
+        """
+        self.name = name or default_telemetry_name()
+        self._shm = shared_memory.SharedMemory(name=self.name)
+        # Readers must not unlink the block when they exit
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        except Exception:
+            pass
+
+        self._buf = self._shm.buf
+        magic, version, capacity, slot_size, _ = struct.unpack_from(HEADER_FORMAT, self._buf, 0)
+        if magic != MAGIC or version != VERSION or slot_size != SLOT_SIZE:
+            self.close()
+            raise ValueError(f"Shared memory block {self.name} is not a telemetry ring")
+        self.capacity = capacity
+
+    @property
+    def head(self) -> int:
+        """Number of samples written so far"""
+        return struct.unpack_from("<Q", self._buf, HEAD_OFFSET)[0]
+
+    def _read_slot(self, index: int) -> Optional[TelemetrySample]:
+        offset = HEADER_SIZE + (index % self.capacity) * SLOT_SIZE
+        for _ in range(READ_RETRIES):
+            seq_before = struct.unpack_from("<Q", self._buf, offset)[0]
+            if seq_before & 1:
+                continue
+            payload = struct.unpack_from(PAYLOAD_FORMAT, self._buf, offset + PAYLOAD_OFFSET)
+            seq_after = struct.unpack_from("<Q", self._buf, offset)[0]
+            if seq_before != seq_after:
+                continue
+            if payload[0] != index:
+                # Slot already reused for a newer sample
+                return None
+            return TelemetrySample(payload[0], payload[1], payload[2], payload[3],
+                                   payload[4], payload[5], bool(payload[6]))
+        return None
+
+    def latest(self) -> Optional[TelemetrySample]:
+        """Most recent sample, or None if nothing was written yet"""
+        head = self.head
+        if head == 0:
+            return None
+        return self._read_slot(head - 1)
+
+    def since(self, index: int) -> List[TelemetrySample]:
+        """
+        Samples written after ``index`` (exclusive), oldest first
+
+        Pass ``-1`` to get everything still in the ring. Samples that were
+        overwritten before being read are skipped.
+        """
+        head = self.head
+        start = max(index + 1, head - self.capacity, 0)
+        samples = []
+        for i in range(start, head):
+            sample = self._read_slot(i)
+            if sample is not None:
+                samples.append(sample)
+        return samples
+
+    def close(self) -> None:
+        self._buf = None
+        self._shm.close()
+
+
+def open_telemetry(name: str = None) -> Optional[TelemetryReader]:
+    """Attach to the daemon telemetry ring, or return None if it is not published"""
+    try:
+        return TelemetryReader(name)
+    except (FileNotFoundError, ValueError, OSError) as e:
+        logger.debug(f"Telemetry not available: {str(e)}")
+        return None
@@ -0,0 +1,28 @@
+# AniData VPN - DNS Package
+# © 2023-2024 AniData
+
+"""
+Package DNS d'AniData VPN
+Résolveur local avec cache (stub) et transferts DNS-over-HTTPS, utilisé à la
+place d'un resolv.conf statique pointant vers un résolveur distant, et
+filtrage des domaines publicitaires/malveillants par listes compilées.
+"""
+
+from .blocklist import Blocklist, load_blocklist
+from .cache import DNSCache
+from .stub import DNSStub, DEFAULT_HOST, DEFAULT_PORT
+from .upstream import DoHUpstream, UDPUpstream, UpstreamError, bootstrap_resolvers, create_upstream
+
+__all__ = [
+    'Blocklist',
+    'load_blocklist',
+    'DNSCache',
+    'DNSStub',
+    'DEFAULT_HOST',
+    'DEFAULT_PORT',
+    'DoHUpstream',
+    'UDPUpstream',
+    'UpstreamError',
+    'bootstrap_resolvers',
+    'create_upstream',
+]
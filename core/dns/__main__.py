@@ -0,0 +1,62 @@
+# AniData VPN - DNS stub entry point
+# © 2023-2024 AniData
+
+import sys
+import asyncio
+import logging
+import argparse
+
+from core.catalog import load_catalog_data
+from . import DNSStub, DEFAULT_HOST, DEFAULT_PORT, DoHUpstream, UDPUpstream, bootstrap_resolvers, create_upstream
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AniData VPN local DNS stub")
+    parser.add_argument("--listen", default=f"{DEFAULT_HOST}:{DEFAULT_PORT}",
+                        help=f"Address to listen on (default: {DEFAULT_HOST}:{DEFAULT_PORT})")
+    parser.add_argument("--doh", help="DoH endpoint (default: settings.dns of the catalog)")
+    parser.add_argument("--udp", help="Plain DNS upstream host[:port] instead of DoH")
+    parser.add_argument("--blocklist", action="append", default=None, metavar="FILE",
+                        help="Domain blocklist (hosts/adblock/plain), repeatable "
+                             "(default: settings.dns.blocklists of the catalog)")
+    parser.add_argument("--servers-file", help="Catalog holding the DNS settings")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Enable debug logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    dns_settings = load_catalog_data(args.servers_file).get("settings", {}).get("dns") or {}
+    if args.doh:
+        upstream = DoHUpstream(args.doh, bootstrap=bootstrap_resolvers(dns_settings))
+    elif args.udp:
+        host, _, port = args.udp.partition(":")
+        upstream = UDPUpstream(host, int(port or 53))
+    else:
+        upstream = create_upstream(dns_settings)
+    blocklists = args.blocklist if args.blocklist is not None else dns_settings.get("blocklists", [])
+
+    host, _, port = args.listen.rpartition(":")
+    stub = DNSStub(upstream, host=host or DEFAULT_HOST, port=int(port))
+
+    async def run():
+        await stub.start()
+        if blocklists:
+            await stub.load_blocklist(blocklists)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await stub.stop()
+
+    try:
+        asyncio.run(run())
+    except PermissionError:
+        print(f"Error: binding {args.listen} needs root or CAP_NET_BIND_SERVICE", file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+main()
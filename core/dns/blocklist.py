@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - DNS Blocklists
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Ad, tracker and malware domain filtering for the DNS stub.
+
+Each source list (hosts file, adblock ``||domain^`` rules or one domain per
+line) is compiled once into a segment file under ``~/.anidata/cache/dns``:
+
+    header | Bloom filter | sorted 64-bit hashes of the domains
+
+Segments are opened with mmap, so a list of a few million domains costs
+roughly 10 bytes of page cache per entry, shared between processes, and
+nothing is parsed at startup. A lookup hashes each suffix of the name
+(``a.b.example.com``, ``b.example.com``, ``example.com``, ``com``), tests
+the Bloom filter and confirms the rare positives with a binary search in
+the hash array.
+
+Compilation is per source: updating or adding a list only recompiles that
+list, in a worker process. ``load_blocklist`` is meant to run in an
+executor, and the result is swapped into the stub in one assignment, so
+resolution never waits on it.
+"""
+
+import os
+import mmap
+import array
+import bisect
+import hashlib
+import logging
+import struct
+import sys
+from concurrent.futures import Executor
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger('anidata_dns')
+
+CACHE_DIR = os.path.join(os.path.expanduser("~/.anidata"), "cache", "dns")
+FORMAT_VERSION = 1
+
+# magic, version, byteorder, k, bloom bits (log2), count, source size, source mtime_ns
+SEGMENT_HEADER = struct.Struct("<4sBBBBQQQ")
+SEGMENT_MAGIC = b"ABLK"
+BLOOM_BITS_PER_ENTRY = 10
+BLOOM_HASHES = 6
+
+_BYTEORDER = 0 if sys.byteorder == "little" else 1
+_IGNORED_HOSTS = {"localhost", "localhost.localdomain", "local", "broadcasthost",
+                  "ip6-localhost", "ip6-loopback", "0.0.0.0"}
+
+
+def domain_hash(name: str) -> int:
+    return int.from_bytes(hashlib.blake2b(name.encode("ascii", "replace"), digest_size=8).digest(),
+                          "little")
+
+
+def parse_list(lines: Iterable[str]) -> Iterator[str]:
+    """Domains of a hosts file, adblock list or plain domain list"""
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if not line or line[0] in "![":
+            continue
+        if line.startswith("||"):
+            # Only whole-domain adblock rules: ||example.com^
+            line = line[2:]
+            if line.endswith("^"):
+                line = line[:-1]
+            if any(c in line for c in "/*^$|"):
+                continue
+        else:
+            fields = line.split()
+            # hosts format: "0.0.0.0 example.com [aliases...]"
+            line = fields[1] if len(fields) > 1 else fields[0]
+        name = line.strip(".").lower()
+        if "." not in name or name in _IGNORED_HOSTS or any(c in name for c in "/*:@ "):
+            continue
+        yield name
+
+
+def _segment_path(source: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"blocklist-{digest}.ablk")
+
+
+def compile_segment(source: str, output: str = None) -> str:
+    """
+    Compile ``source`` into a segment file
+
+    Returns:
+        Path of the segment
+    """
+    output = output or _segment_path(source)
+    stat = os.stat(source)
+    with open(source, "r", encoding="utf-8", errors="replace") as f:
+        hashes = array.array("Q", sorted({domain_hash(name) for name in parse_list(f)}))
+
+    count = len(hashes)
+    log2_bits = max(13, (count * BLOOM_BITS_PER_ENTRY - 1).bit_length())
+    mask = (1 << log2_bits) - 1
+    bloom = bytearray(1 << (log2_bits - 3))
+    for h in hashes:
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for i in range(BLOOM_HASHES):
+            bit = (h1 + i * h2) & mask
+            bloom[bit >> 3] |= 1 << (bit & 7)
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    tmp_file = f"{output}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, FORMAT_VERSION, _BYTEORDER, BLOOM_HASHES,
+                                    log2_bits, count, stat.st_size, stat.st_mtime_ns))
+        f.write(bloom)
+        hashes.tofile(f)
+    os.replace(tmp_file, output)
+    logger.info(f"Compiled blocklist {source}: {count} domains")
+    return output
+
+
+class Segment:
+    """
+    One compiled list, mapped read-only
+    """
+
+    def __init__(self, path: str, source: str = None):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, byteorder, self.k, log2_bits, self.count,
+         self.source_size, self.source_mtime_ns) = SEGMENT_HEADER.unpack_from(self._map)
+        if magic != SEGMENT_MAGIC or version != FORMAT_VERSION or byteorder != _BYTEORDER:
+            self._map.close()
+            raise ValueError(f"Incompatible blocklist segment: {path}")
+
+        self.path = path
+        self.source = source
+        self.mask = (1 << log2_bits) - 1
+        start = SEGMENT_HEADER.size
+        end = start + (1 << (log2_bits - 3))
+        self._bloom = memoryview(self._map)[start:end]
+        self._hashes = memoryview(self._map)[end:end + 8 * self.count].cast("Q")
+
+    def is_current(self, stat: os.stat_result) -> bool:
+        return (self.source_size, self.source_mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+
+    def __contains__(self, h: int) -> bool:
+        bloom = self._bloom
+        mask = self.mask
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for i in range(self.k):
+            bit = (h1 + i * h2) & mask
+            if not bloom[bit >> 3] & (1 << (bit & 7)):
+                return False
+        hashes = self._hashes
+        i = bisect.bisect_left(hashes, h)
+        return i < self.count and hashes[i] == h
+
+    def close(self) -> None:
+        self._bloom.release()
+        self._hashes.release()
+        self._map.close()
+
+
+class Blocklist:
+    """
+    Union of compiled segments, queried by domain name
+    """
+
+    def __init__(self, segments: Sequence[Segment] = ()):
+        self.segments = list(segments)
+
+    def __len__(self) -> int:
+        return sum(segment.count for segment in self.segments)
+
+    @property
+    def sources(self) -> List[str]:
+        return [segment.source for segment in self.segments]
+
+    def blocks(self, name: str) -> bool:
+        """True if ``name`` or one of its parent domains is listed"""
+        segments = self.segments
+        if not segments:
+            return False
+        start = 0
+        # Lists never hold bare TLDs: stop at the last dot
+        last_dot = name.rfind(".")
+        while 0 <= start <= last_dot:
+            h = domain_hash(name[start:])
+            for segment in segments:
+                if h in segment:
+                    return True
+            start = name.find(".", start) + 1
+        return False
+
+    __contains__ = blocks
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+
+def _open_current(source: str, stat: os.stat_result) -> Optional[Segment]:
+    """Previously compiled segment of ``source``, if still up to date"""
+    try:
+        segment = Segment(_segment_path(source), source)
+    except (OSError, ValueError, struct.error):
+        return None
+    if segment.is_current(stat):
+        return segment
+    segment.close()
+    return None
+
+
+def load_blocklist(sources: Sequence[str], previous: Optional[Blocklist] = None,
+                   executor: Executor = None) -> Blocklist:
+    """
+    Blocklist for ``sources``, compiling only what changed
+
+    Segments of ``previous`` that are still current are reused as-is.
+    Missing sources are skipped with a warning.
+
+    Args:
+        sources: List files
+        previous: Blocklist being replaced
+        executor: Where to compile stale lists (a ProcessPoolExecutor keeps
+            the compilation from competing with the caller for the GIL)
+    """
+    reusable = {segment.source: segment for segment in (previous.segments if previous else [])}
+    segments = {}
+    stale = []
+    for source in sources:
+        try:
+            stat = os.stat(source)
+        except OSError:
+            logger.warning(f"Blocklist not found: {source}")
+            continue
+        segment = reusable.get(source)
+        if segment is None or not segment.is_current(stat):
+            segment = _open_current(source, stat)
+        if segment is None:
+            stale.append(source)
+        else:
+            segments[source] = segment
+
+    if stale:
+        if executor is not None:
+            futures = {source: executor.submit(compile_segment, source) for source in stale}
+            results = {}
+            for source, future in futures.items():
+                try:
+                    results[source] = future.result()
+                except OSError as e:
+                    logger.error(f"Failed to compile blocklist {source}: {str(e)}")
+        else:
+            results = {}
+            for source in stale:
+                try:
+                    results[source] = compile_segment(source)
+                except OSError as e:
+                    logger.error(f"Failed to compile blocklist {source}: {str(e)}")
+        for source, path in results.items():
+            segments[source] = Segment(path, source)
+
+    return Blocklist([segments[source] for source in sources if source in segments])
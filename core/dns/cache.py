@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - DNS Answer Cache
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+LRU cache of upstream answers, kept as wire-format bytes.
+
+An entry remembers where the TTL fields are, so serving a hit is a copy of
+the message with the remaining TTL, the client's ID and the client's
+question (case preserved for 0x20 randomization) written in place. No
+parsing happens on the hit path.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from . import message
+
+Key = Tuple[bytes, int, int]  # message.Question.key
+
+
+class CacheEntry:
+    __slots__ = ("response", "ttl_offsets", "question_end", "stored_at", "expires_at",
+                 "ttl", "hits", "refreshing")
+
+    def __init__(self, response: bytes, ttl_offsets, question_end: int, ttl: int, now: float):
+        self.response = response
+        self.ttl_offsets = ttl_offsets
+        self.question_end = question_end
+        self.stored_at = now
+        self.expires_at = now + ttl
+        self.ttl = ttl
+        self.hits = 0
+        self.refreshing = False
+
+
+class DNSCache:
+    """
+    TTL-respecting LRU of DNS responses keyed by (name, type, class)
+    """
+
+    def __init__(self,
+                 max_entries: int = 10000,
+                 min_ttl: int = 0,
+                 max_ttl: int = 86400,
+                 negative_ttl: int = 60,
+                 prefetch_ratio: float = 0.1):
+        """
+        Args:
+            max_entries: Least recently used entries are evicted past this
+            min_ttl: Floor applied to upstream TTLs
+            max_ttl: Ceiling applied to upstream TTLs
+            negative_ttl: TTL for NXDOMAIN/NODATA answers without SOA
+            prefetch_ratio: Share of the TTL left when a popular entry is refreshed
+        """
+        self.max_entries = max_entries
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.prefetch_ratio = prefetch_ratio
+        self._entries: "OrderedDict[Key, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Key, now: float = None) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        now = now or time.monotonic()
+        if entry.expires_at <= now:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        self.hits += 1
+        return entry
+
+    def put(self, key: Key, response: bytes, now: float = None) -> Optional[CacheEntry]:
+        """Store an upstream response; errors and zero TTLs are not cached"""
+        if message.rcode(response) not in (message.RCODE_NOERROR, message.RCODE_NXDOMAIN):
+            return None
+        try:
+            question = message.parse_question(response)
+            offsets, ttl = message.ttl_fields(response, question.end)
+        except (message.DNSFormatError, IndexError, ValueError):
+            return None
+
+        ttl = self.negative_ttl if ttl is None else ttl
+        ttl = max(self.min_ttl, min(self.max_ttl, ttl))
+        if ttl <= 0:
+            return None
+
+        previous = self._entries.pop(key, None)
+        entry = CacheEntry(response, offsets, question.end, ttl, now or time.monotonic())
+        if previous is not None:
+            entry.hits = previous.hits
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def needs_refresh(self, entry: CacheEntry, now: float = None) -> bool:
+        """Popular entry close to expiry, not already being refreshed"""
+        if entry.refreshing or entry.hits < 2:
+            return False
+        remaining = entry.expires_at - (now or time.monotonic())
+        return remaining < max(1.0, entry.ttl * self.prefetch_ratio)
+
+    @staticmethod
+    def render(entry: CacheEntry, query: bytes, question_end: int, now: float = None) -> bytes:
+        """The cached response as an answer to ``query``"""
+        remaining = max(0, int(entry.expires_at - (now or time.monotonic())))
+        response = message.with_ttls(entry.response, entry.ttl_offsets, remaining)
+        response[0:2] = query[0:2]
+        if question_end == entry.question_end:
+            response[message.HEADER.size:question_end] = query[message.HEADER.size:question_end]
+        return bytes(response)
+
+    def clear(self) -> None:
+        self._entries.clear()
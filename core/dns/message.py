@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - DNS Wire Format
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+The few parts of the DNS wire format (RFC 1035) the stub needs.
+
+Messages stay as bytes: the stub only reads the question, the response
+code and the TTLs, and rewrites the ID and TTL fields in place. Nothing is
+decoded into record objects.
+"""
+
+import socket
+import struct
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+HEADER = struct.Struct(">HHHHHH")
+TYPE_A = 1
+TYPE_SOA = 6
+TYPE_AAAA = 28
+TYPE_OPT = 41
+
+RCODE_NOERROR = 0
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+RCODE_REFUSED = 5
+
+FLAG_QR = 0x8000
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+FLAG_RA = 0x0080
+
+
+class DNSFormatError(ValueError):
+    """Malformed DNS message"""
+
+
+class Question(NamedTuple):
+    name: str        # lower case, no trailing dot (lossy: for matching only)
+    qtype: int
+    qclass: int
+    end: int         # offset just after the question section
+    wire_name: bytes  # wire-format name, ASCII lower case
+
+    @property
+    def key(self) -> Tuple[bytes, int, int]:
+        """Cache and coalescing key: exact, unlike ``name`` (dots inside labels, non-ASCII bytes)"""
+        return self.wire_name, self.qtype, self.qclass
+
+
+def _skip_name(data: bytes, offset: int) -> int:
+    """Offset just after a (possibly compressed) name"""
+    while True:
+        if offset >= len(data):
+            raise DNSFormatError("Name past end of message")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += length + 1
+
+
+def parse_question(data: bytes) -> Question:
+    """First question of a query or response"""
+    if len(data) < HEADER.size:
+        raise DNSFormatError("Message shorter than a header")
+    if HEADER.unpack_from(data)[2] < 1:
+        raise DNSFormatError("No question")
+
+    labels = []
+    offset = HEADER.size
+    while True:
+        if offset >= len(data):
+            raise DNSFormatError("Question past end of message")
+        length = data[offset]
+        if length == 0:
+            offset += 1
+            break
+        if length & 0xC0:
+            raise DNSFormatError("Compressed name in question")
+        labels.append(data[offset + 1:offset + 1 + length])
+        offset += length + 1
+
+    if offset + 4 > len(data):
+        raise DNSFormatError("Truncated question")
+    qtype, qclass = struct.unpack_from(">HH", data, offset)
+    name = b".".join(labels).decode("ascii", errors="replace").lower()
+    # Length bytes are at most 63: lower() only touches the ASCII letters of labels
+    return Question(name, qtype, qclass, offset + 4, data[HEADER.size:offset].lower())
+
+
+def message_id(data: bytes) -> int:
+    return struct.unpack_from(">H", data)[0]
+
+
+def rcode(data: bytes) -> int:
+    return struct.unpack_from(">H", data, 2)[0] & 0x000F
+
+
+def ttl_fields(data: bytes, question_end: int) -> Tuple[List[int], Optional[int]]:
+    """
+    Offsets of the TTL fields of every resource record, and the TTL to cache for
+
+    OPT pseudo-records are skipped (their "TTL" holds EDNS flags). For
+    negative answers, the SOA minimum bounds the TTL (RFC 2308).
+
+    Returns:
+        (offsets, ttl) where ttl is None when the message has no records
+    """
+    _, _, qdcount, ancount, nscount, arcount = HEADER.unpack_from(data)
+    offset = question_end
+    for _ in range(qdcount - 1):
+        offset = _skip_name(data, offset) + 4
+
+    offsets = []
+    ttl = None
+    for _ in range(ancount + nscount + arcount):
+        offset = _skip_name(data, offset)
+        if offset + 10 > len(data):
+            raise DNSFormatError("Truncated resource record")
+        rtype, _, record_ttl, rdlength = struct.unpack_from(">HHIH", data, offset)
+        rdata = offset + 10
+        if rtype != TYPE_OPT:
+            offsets.append(offset + 4)
+            if rtype == TYPE_SOA and ancount == 0:
+                # MINIMUM is the last field of the SOA rdata
+                record_ttl = min(record_ttl, struct.unpack_from(">I", data, rdata + rdlength - 4)[0])
+            ttl = record_ttl if ttl is None else min(ttl, record_ttl)
+        offset = rdata + rdlength
+    return offsets, ttl
+
+
+def answer_addresses(data: bytes, question_end: int) -> List[Tuple[str, int]]:
+    """(address, ttl) of every A/AAAA record in the answer section, CNAME targets included"""
+    _, _, qdcount, ancount, _, _ = HEADER.unpack_from(data)
+    offset = question_end
+    for _ in range(qdcount - 1):
+        offset = _skip_name(data, offset) + 4
+
+    addresses = []
+    for _ in range(ancount):
+        offset = _skip_name(data, offset)
+        if offset + 10 > len(data):
+            raise DNSFormatError("Truncated resource record")
+        rtype, _, ttl, rdlength = struct.unpack_from(">HHIH", data, offset)
+        rdata = offset + 10
+        if rtype == TYPE_A and rdlength == 4:
+            addresses.append((socket.inet_ntop(socket.AF_INET, data[rdata:rdata + 4]), ttl))
+        elif rtype == TYPE_AAAA and rdlength == 16:
+            addresses.append((socket.inet_ntop(socket.AF_INET6, data[rdata:rdata + 16]), ttl))
+        offset = rdata + rdlength
+    return addresses
+
+
+def with_ttls(data: bytes, offsets: List[int], ttl: int) -> bytearray:
+    """Copy of ``data`` with every TTL set to ``ttl``"""
+    message = bytearray(data)
+    for offset in offsets:
+        struct.pack_into(">I", message, offset, ttl)
+    return message
+
+
+def error_response(query: bytes, code: int) -> bytes:
+    """Answer ``query`` with an empty response carrying ``code``"""
+    question = parse_question(query)
+    query_id, flags = struct.unpack_from(">HH", query)
+    flags = FLAG_QR | (flags & FLAG_RD) | FLAG_RA | code
+    return HEADER.pack(query_id, flags, 1, 0, 0, 0) + query[HEADER.size:question.end]
+
+
+def truncated_response(response: bytes, question_end: int) -> bytes:
+    """Header and question only, with TC set: the client retries over TCP"""
+    query_id, flags = struct.unpack_from(">HH", response)
+    return HEADER.pack(query_id, flags | FLAG_TC, 1, 0, 0, 0) + response[HEADER.size:question_end]
+
+
+def edns_payload_size(query: bytes, question_end: int) -> int:
+    """UDP payload size the client accepts (512 without EDNS)"""
+    try:
+        _, _, qdcount, ancount, nscount, arcount = HEADER.unpack_from(query)
+        offset = question_end
+        for _ in range(ancount + nscount):
+            offset = _skip_name(query, offset)
+            offset += 10 + struct.unpack_from(">H", query, offset + 8)[0]
+        for _ in range(arcount):
+            offset = _skip_name(query, offset)
+            rtype, rclass = struct.unpack_from(">HH", query, offset)
+            if rtype == TYPE_OPT:
+                return max(512, rclass)
+            offset += 10 + struct.unpack_from(">H", query, offset + 8)[0]
+    except (struct.error, DNSFormatError):
+        pass
+    return 512
+
+
+def build_query(name: Union[str, bytes], qtype: int = 1, query_id: int = 0, qclass: int = 1) -> bytes:
+    """
+    Recursive query for ``name`` (used for refreshes and tests)
+
+    Args:
+        name: Dotted name, or wire-format bytes (Question.wire_name) used as is
+    """
+    if isinstance(name, bytes):
+        encoded = name
+    else:
+        encoded = b"".join(bytes([len(label)]) + label.encode("ascii")
+                           for label in name.rstrip(".").split(".") if label) + b"\x00"
+    return HEADER.pack(query_id, FLAG_RD, 1, 0, 0, 0) + encoded + struct.pack(">HH", qtype, qclass)
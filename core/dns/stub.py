@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Local DNS Stub
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Caching DNS stub listening on a local address.
+
+``resolv.conf`` points at the stub instead of a remote resolver reached
+through the tunnel. Cache hits are answered directly from the UDP
+callback, without creating a task. Misses for the same name share a
+single upstream request. Popular names are refreshed in the background
+shortly before they expire, so they never fall out of the cache.
+Names on a blocklist are answered NXDOMAIN without going upstream.
+Observers see every fresh upstream answer (split tunneling uses them to
+learn the addresses of routed domains); an observer may return a future,
+and the answer is held until it is done (at most ``OBSERVER_WAIT``).
+"""
+
+import os
+import struct
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from . import message
+from .blocklist import Blocklist, load_blocklist
+from .cache import DNSCache, Key
+from .upstream import UpstreamError
+
+logger = logging.getLogger('anidata_dns')
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 53
+OBSERVER_WAIT = 1.0  # seconds an answer may be held for its observers
+
+
+class _UDPServer(asyncio.DatagramProtocol):
+    def __init__(self, stub: "DNSStub"):
+        self.stub = stub
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            question = message.parse_question(data)
+        except message.DNSFormatError:
+            return
+
+        # Fast path: answered before returning to the event loop
+        response = self.stub.answer_local(data, question)
+        if response is not None:
+            self._send(response, data, question, addr)
+        else:
+            asyncio.ensure_future(self._resolve(data, question, addr))
+
+    async def _resolve(self, data, question, addr):
+        response = await self.stub.resolve_miss(data, question)
+        self._send(response, data, question, addr)
+
+    def _send(self, response, query, question, addr):
+        if len(response) > message.edns_payload_size(query, question.end):
+            response = message.truncated_response(response, question.end)
+        if self.transport is not None:
+            self.transport.sendto(response, addr)
+
+
+class DNSStub:
+    """
+    Local caching stub forwarding misses to an upstream
+    """
+
+    def __init__(self, upstream, cache: DNSCache = None,
+                 host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 blocklist: Blocklist = None):
+        """
+        Args:
+            upstream: DoHUpstream, UDPUpstream or anything with ``async query(bytes)``
+            cache: Answer cache (a default one if None)
+            blocklist: Domains answered NXDOMAIN (see ``set_blocklist``)
+            host: Listening address
+            port: Listening port (UDP and TCP); resolv.conf can only use 53
+        """
+        self.upstream = upstream
+        self.cache = cache or DNSCache()
+        self.host = host
+        self.port = port
+        self.blocklist = blocklist
+        self.observers: List[Callable[[message.Question, bytes], Optional[asyncio.Future]]] = []
+        self.stats = {"queries": 0, "coalesced": 0, "prefetches": 0, "errors": 0, "blocked": 0}
+
+        self._inflight: Dict[Key, asyncio.Future] = {}
+        self._transport = None
+        self._tcp_server = None
+        self._tcp_clients = set()
+
+    # ------------------------------------------------------------------
+    # Resolution
+    # ------------------------------------------------------------------
+
+    def answer_local(self, query: bytes, question: message.Question) -> Optional[bytes]:
+        """Blocked or cached answer to ``query``, or None if the upstream must be asked"""
+        self.stats["queries"] += 1
+        if self.blocklist is not None and self.blocklist.blocks(question.name):
+            self.stats["blocked"] += 1
+            return message.error_response(query, message.RCODE_NXDOMAIN)
+        entry = self.cache.get(question.key)
+        if entry is None:
+            return None
+        if self.cache.needs_refresh(entry):
+            entry.refreshing = True
+            self.stats["prefetches"] += 1
+            asyncio.ensure_future(self._refresh(question))
+        return self.cache.render(entry, query, question.end)
+
+    async def resolve_miss(self, query: bytes, question: message.Question) -> bytes:
+        """Ask the upstream, sharing the request with identical queries in flight"""
+        future = self._inflight.get(question.key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+        else:
+            future = asyncio.ensure_future(self._fetch(query, question))
+            self._inflight[question.key] = future
+            future.add_done_callback(lambda done: self._fetch_done(question.key, done))
+
+        try:
+            response = await asyncio.shield(future)
+        except UpstreamError as e:
+            self.stats["errors"] += 1
+            logger.debug(f"Upstream failed for {question.name}: {str(e)}")
+            return message.error_response(query, message.RCODE_SERVFAIL)
+        except Exception as e:
+            # Unparsable answer and the like: the client still gets a reply
+            self.stats["errors"] += 1
+            logger.warning(f"Lookup of {question.name} failed: {str(e) or type(e).__name__}")
+            return message.error_response(query, message.RCODE_SERVFAIL)
+
+        entry = self.cache.get(question.key)
+        if entry is not None:
+            return self.cache.render(entry, query, question.end)
+        # Not cacheable (error, TTL 0): forward as-is with the client's ID
+        return query[0:2] + response[2:]
+
+    async def resolve(self, query: bytes) -> bytes:
+        """Answer a wire-format query (blocklist and cache first)"""
+        question = message.parse_question(query)
+        response = self.answer_local(query, question)
+        if response is None:
+            response = await self.resolve_miss(query, question)
+        return response
+
+    def _fetch_done(self, key: Key, future: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if not future.cancelled():
+            # Retrieved here even when every waiter is gone (client timed out)
+            future.exception()
+
+    async def _fetch(self, query: bytes, question: message.Question) -> bytes:
+        # ID 0 as recommended for DoH (RFC 8484): identical requests look identical
+        response = await self.upstream.query(b"\x00\x00" + query[2:])
+        waits = []
+        for observer in self.observers:
+            try:
+                wait = observer(question, response)
+            except Exception as e:
+                logger.warning(f"DNS observer failed for {question.name}: {str(e)}")
+                continue
+            if wait is not None:
+                waits.append(wait)
+        if waits:
+            # E.g. routes for the answer: the client connects as soon as it has it
+            await asyncio.wait(waits, timeout=OBSERVER_WAIT)
+        # Cached last: a cache hit must not get ahead of the observers either
+        self.cache.put(question.key, response)
+        return response
+
+    async def _refresh(self, question: message.Question) -> None:
+        query = message.build_query(question.wire_name, question.qtype, qclass=question.qclass)
+        try:
+            await self._fetch(query, question)
+        except Exception as e:
+            # Nobody awaits this task: log rather than leave the exception unretrieved
+            logger.debug(f"Refresh failed for {question.name}: {str(e) or type(e).__name__}")
+        finally:
+            # Still the old entry if the refresh failed: let a later hit try again
+            entry = self.cache.get(question.key)
+            if entry is not None:
+                entry.refreshing = False
+
+    def set_blocklist(self, blocklist: Optional[Blocklist]) -> None:
+        """Swap the blocklist, closing the segments no longer used"""
+        previous, self.blocklist = self.blocklist, blocklist
+        if previous is not None:
+            kept = set(map(id, blocklist.segments)) if blocklist is not None else set()
+            for segment in previous.segments:
+                if id(segment) not in kept:
+                    segment.close()
+
+    async def load_blocklist(self, sources) -> None:
+        """Compile/map ``sources`` off the event loop, then switch to them"""
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=min(len(sources), os.cpu_count() or 1) or 1) as pool:
+            blocklist = await loop.run_in_executor(
+                None, load_blocklist, list(sources), self.blocklist, pool
+            )
+        self.set_blocklist(blocklist)
+        logger.info(f"Blocklist: {len(blocklist)} domains from {len(blocklist.segments)} lists")
+
+    # ------------------------------------------------------------------
+    # Listeners
+    # ------------------------------------------------------------------
+
+    async def _handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._tcp_clients.add(writer)
+        try:
+            while True:
+                (length,) = struct.unpack(">H", await reader.readexactly(2))
+                query = await reader.readexactly(length)
+                try:
+                    response = await self.resolve(query)
+                except message.DNSFormatError:
+                    break
+                writer.write(struct.pack(">H", len(response)) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._tcp_clients.discard(writer)
+            writer.close()
+
+    async def start(self) -> None:
+        """Bind UDP and TCP listeners (raises OSError if the port is taken or privileged)"""
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _UDPServer(self), local_addr=(self.host, self.port)
+        )
+        try:
+            self._tcp_server = await asyncio.start_server(self._handle_tcp, self.host, self.port)
+        except OSError:
+            self._transport.close()
+            self._transport = None
+            raise
+        logger.info(f"DNS stub listening on {self.host}:{self.port}, upstream {self.upstream!r}")
+
+    async def stop(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        if self._tcp_server is not None:
+            self._tcp_server.close()
+            for writer in list(self._tcp_clients):
+                writer.close()
+            await self._tcp_server.wait_closed()
+            self._tcp_server = None
+        self.set_blocklist(None)
+        await self.upstream.close()
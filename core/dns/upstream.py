@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - DNS Upstreams
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Upstream resolvers for the DNS stub.
+
+``DoHUpstream`` sends RFC 8484 POST requests over a small pool of
+persistent keep-alive connections: the TCP and TLS handshakes are paid once
+per connection, not once per lookup. ``UDPUpstream`` is plain DNS, used
+when DoH is disabled in the settings.
+
+The DoH server's own name is never looked up through the system resolver:
+once resolv.conf points at the stub, that lookup would come back to the
+stub and wait on itself. Its addresses come from ``settings.dns.
+doh_bootstrap`` or from plain DNS queries to the configured resolvers,
+and connections are made by address with the name kept for TLS.
+"""
+
+import ssl
+import socket
+import asyncio
+import logging
+import ipaddress
+from typing import Iterable, List, Optional
+from urllib.parse import urlsplit
+
+from . import message
+
+logger = logging.getLogger('anidata_dns')
+
+DNS_MESSAGE = "application/dns-message"
+MAX_RESPONSE = 65535
+
+
+class UpstreamError(Exception):
+    """Upstream unreachable or gave an unusable answer"""
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class DoHUpstream:
+    """
+    DNS-over-HTTPS client with a keep-alive connection pool
+    """
+
+    def __init__(self, url: str, pool_size: int = 4, timeout: float = 3.0,
+                 ssl_context: ssl.SSLContext = None,
+                 addresses: Iterable[str] = (), bootstrap: Iterable[str] = ()):
+        """
+        Args:
+            url: DoH endpoint (``https://...``; ``http://`` for local tests)
+            pool_size: Connections, hence requests in flight, at most
+            timeout: Seconds per request, connection included
+            ssl_context: TLS settings (system defaults if None)
+            addresses: Known addresses of the DoH server (no lookup at all)
+            bootstrap: Plain DNS resolvers used to look the server up
+                (system resolver if empty, only safe outside the stub)
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("https", "http"):
+            raise ValueError(f"Unsupported DoH URL: {url}")
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.ssl = (ssl_context or ssl.create_default_context()) if parts.scheme == "https" else None
+        self.timeout = timeout
+        self.bootstrap = list(bootstrap)
+        self.addresses = list(addresses)
+        try:
+            self.addresses = self.addresses or [str(ipaddress.ip_address(self.host))]
+        except ValueError:
+            pass
+        self._idle: List[_Connection] = []
+        self._slots = asyncio.Semaphore(pool_size)
+        self._resolving: Optional[asyncio.Future] = None
+
+    def __repr__(self) -> str:
+        return f"DoHUpstream({self.url!r})"
+
+    async def _lookup(self) -> List[str]:
+        if not self.bootstrap:
+            loop = asyncio.get_running_loop()
+            infos = await loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)
+            return list(dict.fromkeys(info[4][0] for info in infos))
+        for server in self.bootstrap:
+            resolver = UDPUpstream(server, timeout=self.timeout)
+            addresses = []
+            for qtype in (message.TYPE_A, message.TYPE_AAAA):
+                query = message.build_query(self.host, qtype)
+                try:
+                    response = await resolver.query(query)
+                    question = message.parse_question(response)
+                    addresses += [address for address, _ in message.answer_addresses(response, question.end)]
+                except (UpstreamError, message.DNSFormatError) as e:
+                    logger.debug(f"Bootstrap lookup of {self.host} via {server} failed: {str(e)}")
+            if addresses:
+                return addresses
+        raise OSError(f"cannot resolve {self.host} via {', '.join(self.bootstrap)}")
+
+    async def resolve_host(self) -> List[str]:
+        """
+        Addresses of the DoH server, looked up once and shared by every connection
+
+        Raises:
+            OSError: No bootstrap resolver answered
+        """
+        if not self.addresses:
+            if self._resolving is None:
+                self._resolving = asyncio.ensure_future(self._lookup())
+            resolving = self._resolving
+            try:
+                self.addresses = await asyncio.shield(resolving)
+                logger.info(f"DoH server {self.host}: {', '.join(self.addresses)}")
+            finally:
+                if self._resolving is resolving and resolving.done():
+                    self._resolving = None
+        return self.addresses
+
+    async def _open(self) -> _Connection:
+        addresses = await self.resolve_host()
+        address = addresses[0]
+        try:
+            reader, writer = await asyncio.open_connection(
+                address, self.port, ssl=self.ssl, server_hostname=self.host if self.ssl else None
+            )
+        except OSError:
+            # Try the next address on the next attempt
+            addresses.append(addresses.pop(0))
+            raise
+        return _Connection(reader, writer)
+
+    async def _exchange(self, connection: _Connection, query: bytes) -> bytes:
+        request = (
+            f"POST {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}\r\n"
+            f"Content-Type: {DNS_MESSAGE}\r\n"
+            f"Accept: {DNS_MESSAGE}\r\n"
+            f"Content-Length: {len(query)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode("ascii")
+        connection.writer.write(request + query)
+        await connection.writer.drain()
+
+        reader = connection.reader
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by upstream")
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or parts[1] != b"200":
+            raise UpstreamError(f"DoH upstream answered {status_line.decode(errors='replace').strip()}")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()
+                if len(body) > MAX_RESPONSE:
+                    raise UpstreamError("DoH response too large")
+        elif "content-length" in headers:
+            length = int(headers["content-length"])
+            if length > MAX_RESPONSE:
+                raise UpstreamError("DoH response too large")
+            body = await reader.readexactly(length)
+        else:
+            raise UpstreamError("DoH response without length")
+
+        if headers.get("connection", "").lower() == "close":
+            connection.close()
+            connection.writer = None
+        return body
+
+    async def query(self, query: bytes) -> bytes:
+        """
+        Resolve a wire-format query
+
+        Raises:
+            UpstreamError: Timeout, HTTP error, or connection failure
+        """
+        async with self._slots:
+            # A pooled connection may have been closed by the server while
+            # idle: retry once on a fresh one
+            for attempt in range(2):
+                reused = bool(self._idle)
+                connection = self._idle.pop() if reused else None
+                try:
+                    if connection is None:
+                        connection = await asyncio.wait_for(self._open(), self.timeout)
+                    response = await asyncio.wait_for(self._exchange(connection, query), self.timeout)
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as e:
+                    if connection is not None and connection.writer is not None:
+                        connection.close()
+                    if reused and attempt == 0 and not isinstance(e, asyncio.TimeoutError):
+                        continue
+                    raise UpstreamError(f"{self.host}: {str(e) or type(e).__name__}")
+                except UpstreamError:
+                    connection.close()
+                    raise
+                if connection.writer is not None:
+                    self._idle.append(connection)
+                return response
+        raise UpstreamError(f"{self.host}: no connection")
+
+    async def close(self) -> None:
+        while self._idle:
+            self._idle.pop().close()
+
+
+class _UDPExchange(asyncio.DatagramProtocol):
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class UDPUpstream:
+    """
+    Plain DNS over UDP
+    """
+
+    def __init__(self, host: str, port: int = 53, timeout: float = 2.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def __repr__(self) -> str:
+        return f"UDPUpstream({self.host!r}, {self.port})"
+
+    async def query(self, query: bytes) -> bytes:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _UDPExchange(future), remote_addr=(self.host, self.port)
+            )
+        except OSError as e:
+            raise UpstreamError(f"{self.host}: {e}")
+        try:
+            transport.sendto(query)
+            return await asyncio.wait_for(future, self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise UpstreamError(f"{self.host}: {str(e) or type(e).__name__}")
+        finally:
+            transport.close()
+
+    async def close(self) -> None:
+        pass
+
+
+def create_upstream(dns_settings: Optional[dict]):
+    """Upstream described by the catalog's ``settings.dns`` block"""
+    dns_settings = dns_settings or {}
+    if dns_settings.get("use_doh") and dns_settings.get("doh_server"):
+        return DoHUpstream(dns_settings["doh_server"],
+                           addresses=dns_settings.get("doh_bootstrap", ()),
+                           bootstrap=bootstrap_resolvers(dns_settings))
+    return UDPUpstream(dns_settings.get("primary", "1.1.1.1"))
+
+
+def bootstrap_resolvers(dns_settings: Optional[dict]) -> List[str]:
+    """Plain resolvers of ``settings.dns`` used to look up the DoH server"""
+    dns_settings = dns_settings or {}
+    resolvers = [dns_settings.get(key) for key in ("primary", "secondary")]
+    return [resolver for resolver in resolvers if resolver] or ["1.1.1.1"]
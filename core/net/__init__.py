@@ -0,0 +1,40 @@
+# AniData VPN - Network Package
+# © 2023-2024 AniData
+
+"""
+Package réseau d'AniData VPN
+Règles nftables chargées par lots, ensembles de réseaux (CIDR),
+géolocalisation IP hors ligne, découverte du MTU du chemin, kill
+switch et protection contre les fuites (IPv6, DNS), et split
+tunneling : choix, par domaine, par réseau ou par pays, du trafic
+qui passe par le tunnel.
+"""
+
+_EXPORTS = {
+    'CIDRSet': 'cidr',
+    'Firewall': 'firewall',
+    'route_policy': 'cidr',
+    'GeoIPIndex': 'geoip',
+    'Location': 'geoip',
+    'locate_client': 'geoip',
+    'tunnel_mtu': 'pmtu',
+    'SetBatcher': 'nft',
+    'apply_script': 'nft',
+    'delete_table': 'nft',
+    'replace_table_script': 'nft',
+    'DomainRules': 'split_tunnel',
+    'SplitTunnel': 'split_tunnel',
+    'SPLIT_MARK': 'split_tunnel',
+    'SPLIT_TABLE': 'split_tunnel',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    # Import paresseux : le module wireguard configure la journalisation au chargement
+    if name in _EXPORTS:
+        import importlib
+        module = importlib.import_module(f".{_EXPORTS[name]}", __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
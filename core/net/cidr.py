@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - CIDR Sets
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Sets of IP networks with union, difference, intersection and complement.
+
+A set is kept per address family as sorted, disjoint, non-adjacent
+``[start, end)`` integer ranges: the leaves of a fully compressed radix
+tree, without the tree. Every operation is a linear merge of two such
+lists, and turning the result back into prefixes gives the smallest
+possible list (each range splits greedily into its largest aligned
+blocks, and no block can span two ranges).
+
+``route_policy`` turns include/exclude lists from the settings into the
+AllowedIPs and routes of the tunnel:
+
+    route_policy(exclude=["lan", "country:FR", "203.0.113.0/24"])
+
+Thousands of prefixes are combined in a few milliseconds.
+"""
+
+import socket
+import bisect
+import ipaddress
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+Range = Tuple[int, int]
+
+_BITS = {4: 32, 6: 128}
+_FAMILIES = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+LAN_NETWORKS = [
+    "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16",  # RFC 1918
+    "169.254.0.0/16", "fe80::/10",                      # link-local
+    "fc00::/7",                                         # unique local
+]
+MULTICAST_NETWORKS = ["224.0.0.0/4", "ff00::/8"]
+
+# Names usable in include/exclude lists
+ALIASES: Dict[str, List[str]] = {
+    "lan": LAN_NETWORKS,
+    "multicast": MULTICAST_NETWORKS,
+}
+
+
+def _parse(network) -> Tuple[int, int, int]:
+    """(version, start, end) of a network given as text or ipaddress object"""
+    if isinstance(network, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+        start = int(network.network_address)
+        return network.version, start, start + network.num_addresses
+
+    text = str(network).strip()
+    address, _, length = text.partition("/")
+    version = 6 if ":" in address else 4
+    bits = _BITS[version]
+    try:
+        start = int.from_bytes(socket.inet_pton(_FAMILIES[version], address), "big")
+        prefix = int(length) if length else bits
+    except (OSError, ValueError):
+        raise ValueError(f"Invalid network: {text}")
+    if not 0 <= prefix <= bits:
+        raise ValueError(f"Invalid prefix length: {text}")
+    size = 1 << (bits - prefix)
+    start &= ~(size - 1)  # host bits set, as ip_network(strict=False)
+    return version, start, start + size
+
+
+def _normalize(ranges: List[Range]) -> List[Range]:
+    """Sort and merge overlapping or adjacent ranges"""
+    ranges.sort()
+    merged: List[Range] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(a: List[Range], b: List[Range]) -> List[Range]:
+    result = []
+    j = 0
+    for start, end in a:
+        while j < len(b) and b[j][1] <= start:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] < end:
+            if b[k][0] > start:
+                result.append((start, b[k][0]))
+            start = max(start, b[k][1])
+            k += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+
+def _intersect(a: List[Range], b: List[Range]) -> List[Range]:
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start < end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def _prefixes(start: int, end: int, bits: int) -> Iterator[Tuple[int, int]]:
+    """Largest aligned blocks covering [start, end) as (address, prefix length)"""
+    while start < end:
+        size = (start & -start) if start else 1 << bits
+        while start + size > end:
+            size >>= 1
+        yield start, bits - size.bit_length() + 1
+        start += size
+
+
+def _format(version: int, value: int) -> str:
+    return socket.inet_ntop(_FAMILIES[version], value.to_bytes(_BITS[version] // 8, "big"))
+
+
+class CIDRSet:
+    """
+    Immutable set of IPv4 and IPv6 addresses
+    """
+
+    __slots__ = ("_ranges",)
+
+    def __init__(self, networks: Iterable[Union[str, ipaddress.IPv4Network, ipaddress.IPv6Network]] = ()):
+        """
+        Args:
+            networks: CIDR strings ("10.0.0.0/8", "2001:db8::/32", bare
+                addresses) or ipaddress networks; host bits are ignored
+        """
+        ranges: Dict[int, List[Range]] = {4: [], 6: []}
+        for network in networks:
+            version, start, end = _parse(network)
+            ranges[version].append((start, end))
+        self._ranges = {version: _normalize(r) for version, r in ranges.items()}
+
+    @classmethod
+    def _from_ranges(cls, v4: List[Range], v6: List[Range]) -> "CIDRSet":
+        instance = cls.__new__(cls)
+        instance._ranges = {4: v4, 6: v6}
+        return instance
+
+    @classmethod
+    def from_ranges(cls, v4: List[Range], v6: List[Range] = ()) -> "CIDRSet":
+        """Set of ``[start, end)`` integer ranges per family"""
+        return cls._from_ranges(_normalize(list(v4)), _normalize(list(v6)))
+
+    @classmethod
+    def everything(cls) -> "CIDRSet":
+        return cls._from_ranges([(0, 1 << 32)], [(0, 1 << 128)])
+
+    # ------------------------------------------------------------------
+    # Set algebra
+    # ------------------------------------------------------------------
+
+    def __or__(self, other: "CIDRSet") -> "CIDRSet":
+        return CIDRSet._from_ranges(*(_normalize(self._ranges[v] + other._ranges[v]) for v in (4, 6)))
+
+    def __sub__(self, other: "CIDRSet") -> "CIDRSet":
+        return CIDRSet._from_ranges(*(_subtract(self._ranges[v], other._ranges[v]) for v in (4, 6)))
+
+    def __and__(self, other: "CIDRSet") -> "CIDRSet":
+        return CIDRSet._from_ranges(*(_intersect(self._ranges[v], other._ranges[v]) for v in (4, 6)))
+
+    def __invert__(self) -> "CIDRSet":
+        return CIDRSet.everything() - self
+
+    union = __or__
+    difference = __sub__
+    intersection = __and__
+    complement = __invert__
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CIDRSet) and self._ranges == other._ranges
+
+    def __hash__(self) -> int:
+        return hash((tuple(self._ranges[4]), tuple(self._ranges[6])))
+
+    def __bool__(self) -> bool:
+        return bool(self._ranges[4] or self._ranges[6])
+
+    def __contains__(self, address: str) -> bool:
+        version, value, _ = _parse(address)
+        ranges = self._ranges[version]
+        i = bisect.bisect_right(ranges, (value, 1 << 129)) - 1
+        return i >= 0 and ranges[i][0] <= value < ranges[i][1]
+
+    def covers(self, version: int) -> bool:
+        """True if every address of the family is in the set"""
+        return self._ranges[version] == [(0, 1 << _BITS[version])]
+
+    def is_everything(self) -> bool:
+        return self.covers(4) and self.covers(6)
+
+    def num_addresses(self, version: int = 4) -> int:
+        return sum(end - start for start, end in self._ranges[version])
+
+    # ------------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------------
+
+    def prefixes(self, version: Optional[int] = None) -> List[str]:
+        """Smallest list of CIDR prefixes describing the set"""
+        result = []
+        for v in ((version,) if version else (4, 6)):
+            bits = _BITS[v]
+            for start, end in self._ranges[v]:
+                result.extend(f"{_format(v, address)}/{length}" for address, length in _prefixes(start, end, bits))
+        return result
+
+    def nft_elements(self, version: int) -> List[str]:
+        """Elements of an nftables interval set: one per range (prefix or ``a-b``)"""
+        elements = []
+        bits = _BITS[version]
+        for start, end in self._ranges[version]:
+            size = end - start
+            if size & (size - 1) == 0 and start % size == 0:
+                elements.append(f"{_format(version, start)}/{bits - size.bit_length() + 1}")
+            else:
+                elements.append(f"{_format(version, start)}-{_format(version, end - 1)}")
+        return elements
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.prefixes())
+
+    def __len__(self) -> int:
+        """Number of prefixes in the minimal representation"""
+        return len(self.prefixes())
+
+    def __str__(self) -> str:
+        """WireGuard AllowedIPs format"""
+        return ", ".join(self.prefixes())
+
+    def __repr__(self) -> str:
+        prefixes = self.prefixes()
+        shown = ", ".join(prefixes[:4]) + (f", ... ({len(prefixes)} prefixes)" if len(prefixes) > 4 else "")
+        return f"CIDRSet([{shown}])"
+
+
+def networks_from(items: Iterable[str]) -> CIDRSet:
+    """
+    CIDRSet of networks, aliases ("lan", "multicast") and countries
+    ("country:FR", from the offline GeoIP database)
+
+    Raises:
+        ValueError: Invalid network, or a country without GeoIP database
+    """
+    networks = []
+    countries = []
+    for item in items or ():
+        name = str(item).strip().lower()
+        alias = ALIASES.get(name)
+        if alias is not None:
+            networks.extend(alias)
+        elif name.startswith("country:"):
+            countries.append(name[len("country:"):])
+        else:
+            networks.append(item)
+
+    result = CIDRSet(networks)
+    if countries:
+        from .geoip import default_index
+        index = default_index()
+        if index is None:
+            raise ValueError(f"No GeoIP database for country rules: {', '.join(countries)}")
+        for country in countries:
+            result = result | index.country_networks(country)
+    return result
+
+
+def route_policy(include: Iterable[str] = None, exclude: Iterable[str] = None) -> CIDRSet:
+    """
+    Addresses sent through the tunnel
+
+    Args:
+        include: Networks routed through the tunnel (everything if empty)
+        exclude: Networks that bypass it, taken out of ``include``
+    """
+    allowed = networks_from(include) if include else CIDRSet.everything()
+    return allowed - networks_from(exclude) if exclude else allowed
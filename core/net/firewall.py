@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Kill Switch and Leak Protection
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Kill switch and leak protection with nftables.
+
+The whole ruleset for a tunnel state (interface, allowed endpoints, DNS
+servers) is generated as one table and loaded with a single ``nft -f``:
+the kernel swaps the old table for the new one in one transaction, so a
+server switch never has a moment without rules, and no process is
+spawned per rule.
+
+Rules follow ``settings.leak_protection``:
+
+- ``kill_switch``: outgoing and forwarded traffic is dropped unless it
+  leaves through the tunnel, goes to a tunnel endpoint (WireGuard
+  handshakes), to the LAN (``allow_lan``, on by default), or is routed
+  outside the tunnel on purpose by split tunneling.
+- ``ipv6_leak_protection``: IPv6 may only use the tunnel, even without
+  the kill switch.
+- ``dns_leak_protection``: DNS (port 53, DNS-over-TLS 853) only to the
+  configured resolvers, whichever interface it would use.
+
+``webrtc_leak_protection`` is a browser setting, nothing to do here.
+"""
+
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .cidr import CIDRSet, networks_from
+from .nft import apply_script, delete_table, replace_table_script
+from .split_tunnel import SPLIT_MARK
+
+logger = logging.getLogger('anidata_net')
+
+GUARD_FAMILY = "inet"
+GUARD_TABLE_NAME = "anidata_guard"
+
+# Needed on the physical link even when everything else is blocked
+_LINK_RULES = (
+    "        udp sport 68 udp dport 67 accept\n"                       # DHCPv4
+    "        udp sport 546 udp dport 547 accept\n"                     # DHCPv6
+    "        icmpv6 type { nd-router-solicit, nd-neighbor-solicit, nd-neighbor-advert } accept\n"
+)
+
+
+class TunnelState(NamedTuple):
+    interface: str
+    endpoints: Tuple[Tuple[str, int], ...]  # (address, UDP port)
+    dns_servers: Tuple[str, ...]
+
+
+def _set(name: str, kind: str, elements: Iterable[str], interval: bool = False) -> str:
+    """Set declaration, empty sets included (rules referencing them stay valid)"""
+    elements = list(elements)
+    flags = "flags interval; " if interval else ""
+    content = f"elements = {{ {', '.join(elements)} }}; " if elements else ""
+    return f"    set {name} {{ type {kind}; {flags}{content}}}\n"
+
+
+class Firewall:
+    """
+    Generates and loads the guard table for the current tunnel state
+    """
+
+    def __init__(self,
+                 kill_switch: bool = True,
+                 ipv6_leak_protection: bool = True,
+                 dns_leak_protection: bool = True,
+                 allow_lan: bool = True,
+                 lan_networks: Iterable[str] = ("lan",)):
+        """
+        Args:
+            kill_switch: Block everything outside the tunnel
+            ipv6_leak_protection: Block IPv6 outside the tunnel
+            dns_leak_protection: Allow DNS only to the configured resolvers
+            allow_lan: Keep the local network reachable
+            lan_networks: Networks, aliases or countries counted as LAN
+        """
+        self.kill_switch = kill_switch
+        self.ipv6_leak_protection = ipv6_leak_protection
+        self.dns_leak_protection = dns_leak_protection
+        self.lan = networks_from(lan_networks) if allow_lan else CIDRSet()
+        # Resolvers used behind the scenes (e.g. the DNS stub's upstream)
+        self.extra_dns_servers: List[str] = []
+        # Networks deliberately routed outside the tunnel (network split tunneling)
+        self.bypass = CIDRSet()
+        self.state: Optional[TunnelState] = None
+        self._script: Optional[str] = None
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict]) -> Optional["Firewall"]:
+        """Firewall for ``settings.leak_protection``, None if nothing is enabled"""
+        settings = settings or {}
+        options = {
+            "kill_switch": bool(settings.get("kill_switch")),
+            "ipv6_leak_protection": bool(settings.get("ipv6_leak_protection")),
+            "dns_leak_protection": bool(settings.get("dns_leak_protection")),
+        }
+        if not any(options.values()):
+            return None
+        return cls(allow_lan=settings.get("allow_lan", True),
+                   lan_networks=settings.get("lan_networks", ("lan",)),
+                   **options)
+
+    @property
+    def active(self) -> bool:
+        return self.state is not None
+
+    # ------------------------------------------------------------------
+    # Ruleset
+    # ------------------------------------------------------------------
+
+    def ruleset(self, state: TunnelState) -> str:
+        """Complete guard table for ``state``"""
+        iface = f'"{state.interface}"'
+        sets = []
+        rules = ["        oifname \"lo\" accept\n"]
+
+        if self.dns_leak_protection:
+            dns = list(state.dns_servers) + self.extra_dns_servers
+            sets.append(_set("dns_v4", "ipv4_addr", (a for a in dns if ":" not in a)))
+            sets.append(_set("dns_v6", "ipv6_addr", (a for a in dns if ":" in a)))
+            # Before the tunnel accept: a resolver reached through the tunnel is still a leak
+            rules.append("        meta l4proto { tcp, udp } th dport { 53, 853 } ip daddr != @dns_v4 drop\n")
+            rules.append("        meta l4proto { tcp, udp } th dport { 53, 853 } ip6 daddr != @dns_v6 drop\n")
+
+        rules.append(f"        oifname {iface} accept\n")
+        # Rerouted by the domain split tunnel (mark set at mangle priority, before this chain)
+        rules.append(f"        meta mark 0x{SPLIT_MARK:08x} accept\n")
+
+        endpoints = [(address, f"{address} . {port}") for address, port in state.endpoints]
+        sets.append(_set("endpoints_v4", "ipv4_addr . inet_service", (e for a, e in endpoints if ":" not in a)))
+        sets.append(_set("endpoints_v6", "ipv6_addr . inet_service", (e for a, e in endpoints if ":" in a)))
+        rules.append("        ip daddr . udp dport @endpoints_v4 accept\n")
+        rules.append("        ip6 daddr . udp dport @endpoints_v6 accept\n")
+
+        direct = self.lan | self.bypass
+        sets.append(_set("direct_v4", "ipv4_addr", direct.nft_elements(4), interval=True))
+        sets.append(_set("direct_v6", "ipv6_addr", direct.nft_elements(6), interval=True))
+        rules.append("        ip daddr @direct_v4 accept\n")
+        rules.append("        ip6 daddr @direct_v6 accept\n")
+        rules.append(_LINK_RULES)
+
+        if self.kill_switch:
+            rules.append("        counter drop\n")
+        elif self.ipv6_leak_protection:
+            rules.append("        meta nfproto ipv6 counter drop\n")
+
+        chain_rules = "".join(rules)
+        return replace_table_script(GUARD_FAMILY, GUARD_TABLE_NAME, (
+            "".join(sets)
+            + "    chain output {\n"
+            "        type filter hook output priority filter; policy accept;\n"
+            f"{chain_rules}"
+            "    }\n"
+            # Shared connections: forwarded packets follow the same rules
+            "    chain forward {\n"
+            "        type filter hook forward priority filter; policy accept;\n"
+            f"{chain_rules}"
+            "    }\n"
+        ))
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    async def apply(self, interface: str, endpoints: Iterable[Tuple[str, int]],
+                    dns_servers: Iterable[str] = ()) -> None:
+        """
+        Replace the guard table in one transaction
+
+        Raises:
+            WireGuardError: nft rejected the ruleset (the previous one stays)
+        """
+        state = TunnelState(interface, tuple(endpoints), tuple(dns_servers))
+        script = self.ruleset(state)
+        if script == self._script:
+            return
+        await apply_script(script)
+        self.state = state
+        self._script = script
+        logger.info(f"Leak protection applied for {interface} "
+                    f"({', '.join(f'{a}:{p}' for a, p in state.endpoints) or 'no endpoint'})")
+
+    async def clear(self) -> None:
+        """Remove the guard table (deliberate disconnect)"""
+        await delete_table(GUARD_FAMILY, GUARD_TABLE_NAME)
+        self.state = None
+        self._script = None
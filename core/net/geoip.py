@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Offline IP Geolocation
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Offline IP-to-location index.
+
+A range CSV (DB-IP "lite" country or city files, or ``network,country
+[,latitude,longitude]`` lines) is compiled once into a flat file:
+
+    header | IPv6 range starts (u64) | IPv4 range starts (u32)
+           | IPv4 location ids | IPv6 location ids | locations
+
+Ranges are contiguous (gaps get a "no location" id), so a lookup is one
+binary search over the start array of the family followed by a fixed-size
+read. The file is mapped with mmap: nothing is parsed at startup and only
+the pages a lookup touches become resident. IPv6 ranges are indexed by
+their first 64 bits, finer allocations do not exist in location data.
+
+No network access is involved: ``locate_client`` uses the source address
+the kernel would pick for an outgoing packet, which is the public address
+on directly connected hosts. Behind NAT it is private and callers fall
+back to their usual behaviour.
+"""
+
+import os
+import csv
+import math
+import mmap
+import array
+import bisect
+import socket
+import struct
+import logging
+import ipaddress
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .cidr import CIDRSet
+
+logger = logging.getLogger('anidata_net')
+
+DEFAULT_DATABASE = os.path.join(os.path.expanduser("~/.anidata"), "geoip", "geoip.adb")
+FORMAT_VERSION = 2  # 2: NaN coordinates for country-only locations
+
+HEADER = struct.Struct("<4sB3xIII")  # magic, version, IPv4 ranges, IPv6 ranges, locations
+LOCATION = struct.Struct("<2sff")    # country, latitude, longitude
+MAGIC = b"AGEO"
+NO_LOCATION = 0xFFFFFFFF
+NAN = float("nan")  # stored coordinates of country-only locations
+
+
+class Location(NamedTuple):
+    country: str
+    latitude: Optional[float]   # None for country-only data
+    longitude: Optional[float]
+
+
+class GeoIPError(Exception):
+    """Missing or unreadable database"""
+
+
+# ----------------------------------------------------------------------
+# Compilation
+# ----------------------------------------------------------------------
+
+def _to_int(address: str) -> Tuple[int, int]:
+    family = socket.AF_INET6 if ":" in address else socket.AF_INET
+    return (6 if family == socket.AF_INET6 else 4), int.from_bytes(socket.inet_pton(family, address), "big")
+
+
+def _read_rows(source: str) -> Iterator[Tuple[int, int, int, str, float, float]]:
+    """(version, start, end exclusive, country, latitude, longitude) per CSV row"""
+    with open(source, "r", encoding="utf-8", errors="replace", newline="") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                if "/" in row[0]:
+                    # network,country[,latitude,longitude]
+                    network = ipaddress.ip_network(row[0].strip(), strict=False)
+                    version = network.version
+                    start = int(network.network_address)
+                    end = start + network.num_addresses
+                    country = row[1]
+                    coordinates = row[2:4]
+                else:
+                    version, start = _to_int(row[0].strip())
+                    end = _to_int(row[1].strip())[1] + 1
+                    if len(row) >= 8:
+                        # DB-IP city lite: start,end,continent,country,region,city,latitude,longitude
+                        country, coordinates = row[3], row[6:8]
+                    else:
+                        country, coordinates = row[2], row[3:5]
+                # Country-only files: no coordinates rather than a point at (0, 0)
+                latitude, longitude = (float(c) for c in coordinates) if len(coordinates) == 2 else (NAN, NAN)
+            except (ValueError, OSError, IndexError):
+                continue  # header line or malformed row
+            yield version, start, end, country.strip().upper()[:2], latitude, longitude
+
+
+def _flatten(ranges: List[Tuple[int, int, int]], shift: int, top: int) -> Tuple[List[int], List[int]]:
+    """Contiguous start/location arrays, gaps filled with NO_LOCATION"""
+    ranges.sort()
+    starts: List[int] = []
+    locations: List[int] = []
+    covered = 0
+    for start, end, location in ranges:
+        # Overlapping or finer than the index: the first range wins
+        start = max(start >> shift, covered)
+        end = ((end - 1) >> shift) + 1
+        if start >= end:
+            continue
+        if start > covered:
+            starts.append(covered)
+            locations.append(NO_LOCATION)
+        if not (locations and locations[-1] == location and start == covered):
+            starts.append(start)
+            locations.append(location)
+        covered = end
+    if covered < top:
+        starts.append(covered)
+        locations.append(NO_LOCATION)
+    return starts, locations
+
+
+def compile_database(source: str, output: str = DEFAULT_DATABASE) -> Dict[str, int]:
+    """
+    Compile a range CSV into the mmap format
+
+    Returns:
+        Counts of IPv4 ranges, IPv6 ranges and locations
+    """
+    location_ids: Dict[Tuple[str, float, float], int] = {}
+    ranges: Dict[int, List[Tuple[int, int, int]]] = {4: [], 6: []}
+    for version, start, end, country, latitude, longitude in _read_rows(source):
+        # Rounded to ~1 km: city files repeat the same points many times (NaN != NaN: use None)
+        key = (country, None, None) if math.isnan(latitude) else (country, round(latitude, 2), round(longitude, 2))
+        location = location_ids.setdefault(key, len(location_ids))
+        ranges[version].append((start, end, location))
+
+    v4_starts, v4_locations = _flatten(ranges[4], 0, 1 << 32)
+    v6_starts, v6_locations = _flatten(ranges[6], 64, 1 << 64)
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    tmp_file = f"{output}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(v4_starts), len(v6_starts), len(location_ids)))
+        array.array("Q", v6_starts).tofile(f)
+        array.array("I", v4_starts).tofile(f)
+        array.array("I", v4_locations).tofile(f)
+        array.array("I", v6_locations).tofile(f)
+        f.write(b"".join(LOCATION.pack(country.encode("ascii", "replace").ljust(2),
+                                       NAN if latitude is None else latitude,
+                                       NAN if longitude is None else longitude)
+                         for country, latitude, longitude in location_ids))
+    os.replace(tmp_file, output)
+
+    counts = {"ipv4_ranges": len(v4_starts), "ipv6_ranges": len(v6_starts), "locations": len(location_ids)}
+    logger.info(f"Compiled GeoIP database {output}: {counts}")
+    return counts
+
+
+# ----------------------------------------------------------------------
+# Lookups
+# ----------------------------------------------------------------------
+
+class GeoIPIndex:
+    """
+    Read-only view of a compiled database
+    """
+
+    def __init__(self, path: str = DEFAULT_DATABASE):
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, n4, n6, self.location_count = HEADER.unpack_from(self._map)
+        except (OSError, ValueError, struct.error) as e:
+            raise GeoIPError(f"Cannot open GeoIP database {path}: {e}")
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._map.close()
+            raise GeoIPError(f"Incompatible GeoIP database: {path}")
+
+        self.path = path
+        view = memoryview(self._map)
+        offset = HEADER.size
+        self._v6_starts = view[offset:offset + 8 * n6].cast("Q")
+        offset += 8 * n6
+        self._v4_starts = view[offset:offset + 4 * n4].cast("I")
+        offset += 4 * n4
+        self._v4_locations = view[offset:offset + 4 * n4].cast("I")
+        offset += 4 * n4
+        self._v6_locations = view[offset:offset + 4 * n6].cast("I")
+        self._locations_offset = offset + 4 * n6
+
+    @classmethod
+    def open_default(cls) -> Optional["GeoIPIndex"]:
+        """The user's database, or None if it was never compiled"""
+        try:
+            return cls()
+        except GeoIPError:
+            return None
+
+    def _location(self, location_id: int) -> Optional[Location]:
+        if location_id == NO_LOCATION:
+            return None
+        country, latitude, longitude = LOCATION.unpack_from(
+            self._map, self._locations_offset + location_id * LOCATION.size
+        )
+        if math.isnan(latitude):
+            return Location(country.decode("ascii", "replace").strip(), None, None)
+        return Location(country.decode("ascii", "replace").strip(), latitude, longitude)
+
+    def lookup(self, address: str) -> Optional[Location]:
+        """Location of ``address``, or None if unknown or malformed"""
+        try:
+            version, value = _to_int(address)
+        except OSError:
+            return None
+        if version == 4:
+            starts, locations = self._v4_starts, self._v4_locations
+        else:
+            starts, locations, value = self._v6_starts, self._v6_locations, value >> 64
+        i = bisect.bisect_right(starts, value) - 1
+        return self._location(locations[i]) if i >= 0 else None
+
+    def country_networks(self, country: str) -> "CIDRSet":
+        """Every address range located in ``country`` (two-letter code)"""
+        from .cidr import CIDRSet
+
+        country = country.upper().encode("ascii")
+        matching = {
+            i for i in range(self.location_count)
+            if self._map[self._locations_offset + i * LOCATION.size:self._locations_offset + i * LOCATION.size + 2]
+            == country
+        }
+        ranges = {}
+        for version, starts, locations, shift, top in ((4, self._v4_starts, self._v4_locations, 0, 1 << 32),
+                                                        (6, self._v6_starts, self._v6_locations, 64, 1 << 128)):
+            found = []
+            last = len(starts) - 1
+            for i, location in enumerate(locations):
+                if location in matching:
+                    end = starts[i + 1] << shift if i < last else top
+                    found.append((starts[i] << shift, end))
+            ranges[version] = found
+        return CIDRSet.from_ranges(ranges[4], ranges[6])
+
+    def close(self) -> None:
+        for view in (self._v6_starts, self._v4_starts, self._v4_locations, self._v6_locations):
+            view.release()
+        self._map.close()
+
+
+@lru_cache(maxsize=1)
+def default_index() -> Optional[GeoIPIndex]:
+    """Shared index on DEFAULT_DATABASE (None if missing)"""
+    return GeoIPIndex.open_default()
+
+
+def egress_address(version: int = 4) -> Optional[str]:
+    """Source address of outgoing traffic (a UDP connect sends no packet)"""
+    family, target = (socket.AF_INET, "192.0.2.1") if version == 4 else (socket.AF_INET6, "2001:db8::1")
+    try:
+        with socket.socket(family, socket.SOCK_DGRAM) as s:
+            s.connect((target, 9))
+            return s.getsockname()[0]
+    except OSError:
+        return None
+
+
+def locate_client(address: str = None, index: GeoIPIndex = None) -> Optional[Location]:
+    """
+    Location of ``address``, or of this host's egress address
+
+    Returns None without a database, or when the address is private (NAT).
+    """
+    index = index or default_index()
+    if index is None:
+        return None
+    candidates = [address] if address else [egress_address(4), egress_address(6)]
+    for candidate in candidates:
+        if candidate and ipaddress.ip_address(candidate).is_global:
+            location = index.lookup(candidate)
+            if location is not None:
+                return location
+    return None
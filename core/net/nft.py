@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - nftables Helpers
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+nftables access through ``nft -f -``.
+
+Every change is written as one script and loaded by a single ``nft``
+process, which the kernel applies as one transaction: either the whole
+script takes effect or none of it does. ``SetBatcher`` applies the same
+idea to set elements that arrive one by one (addresses learned from DNS
+answers): they are queued for a few milliseconds and flushed together.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from core.protocols.wireguard.async_wireguard import run_command
+from core.protocols.wireguard.wireguard import WireGuardError
+
+logger = logging.getLogger('anidata_net')
+
+NFT_TIMEOUT = 10.0
+
+
+async def apply_script(script: str, timeout: float = NFT_TIMEOUT) -> None:
+    """
+    Load ``script`` in one transaction
+
+    Raises:
+        WireGuardError: nft missing or the script was rejected (nothing applied)
+    """
+    await run_command("sudo", "nft", "-f", "-", input=script, timeout=timeout)
+
+
+async def delete_table(family: str, name: str) -> None:
+    """Remove a table if present"""
+    await run_command("sudo", "nft", "delete", "table", family, name, check=False, timeout=NFT_TIMEOUT)
+
+
+def replace_table_script(family: str, name: str, body: str) -> str:
+    """
+    Script replacing table ``family name`` with ``body``
+
+    The table is created first so the delete never fails, then recreated:
+    there is no moment where the old rules are gone and the new ones
+    are missing.
+    """
+    return (
+        f"add table {family} {name}\n"
+        f"delete table {family} {name}\n"
+        f"table {family} {name} {{\n{body}}}\n"
+    )
+
+
+class SetBatcher:
+    """
+    Adds addresses to timeout sets in batches
+
+    An address already in the set for long enough is skipped, so a burst
+    of lookups for the same names costs nothing. Elements are refreshed
+    (delete + add in the same transaction) when an answer outlives them.
+    """
+
+    def __init__(self,
+                 family: str,
+                 table: str,
+                 set_v4: str,
+                 set_v6: str,
+                 delay: float = 0.05,
+                 max_batch: int = 512,
+                 min_timeout: int = 60,
+                 grace: int = 60):
+        """
+        Args:
+            family, table: Table holding the sets
+            set_v4, set_v6: Sets for IPv4 and IPv6 addresses
+            delay: Seconds an address may wait for others before a flush
+            max_batch: Pending addresses that trigger an immediate flush
+            min_timeout: Floor for element timeouts (short DNS TTLs)
+            grace: Seconds kept after the TTL for connections still open
+        """
+        self.family = family
+        self.table = table
+        self.set_v4 = set_v4
+        self.set_v6 = set_v6
+        self.delay = delay
+        self.max_batch = max_batch
+        self.min_timeout = min_timeout
+        self.grace = grace
+        self.stats = {"added": 0, "refreshed": 0, "skipped": 0, "batches": 0, "failures": 0}
+
+        # Kernel-side expiry of every element we added (monotonic clock)
+        self._expiry: Dict[str, float] = {}
+        self._pending: Dict[str, Tuple[int, bool]] = {}
+        # Batch future of each address not in the kernel yet (pending or being flushed)
+        self._batch: Optional[asyncio.Future] = None
+        self._waiting: Dict[str, asyncio.Future] = {}
+        self._flush_handle = None
+        self._flush_task = None
+
+    def add(self, address: str, ttl: int) -> Optional[asyncio.Future]:
+        """
+        Queue ``address`` for at least ``ttl`` seconds
+
+        Returns:
+            Future resolved (True if applied) once ``address`` is in the
+            set, None if it already is
+        """
+        now = time.monotonic()
+        timeout = max(ttl, self.min_timeout) + self.grace
+        known = self._expiry.get(address)
+        if known is not None and known >= now + ttl:
+            self.stats["skipped"] += 1
+            return self._waiting.get(address)
+        # Deleting an element that has just expired would fail the whole batch
+        refresh = known is not None and known - now > 2.0
+        self._expiry[address] = now + timeout
+        self._pending[address] = (timeout, refresh)
+        if self._batch is None:
+            self._batch = asyncio.get_running_loop().create_future()
+        self._waiting[address] = self._batch
+
+        if len(self._pending) >= self.max_batch:
+            self._schedule(0)
+        elif self._flush_handle is None:
+            self._schedule(self.delay)
+        return self._batch
+
+    def _schedule(self, delay: float) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = asyncio.get_running_loop().call_later(delay, self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._flush_handle = None
+        # One nft process at a time: a flush in progress picks up the rest when done
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self.flush())
+
+    def script(self, pending: Dict[str, Tuple[int, bool]]) -> str:
+        deletes: List[str] = []
+        adds: List[str] = []
+        for address, (timeout, refresh) in pending.items():
+            set_name = self.set_v6 if ":" in address else self.set_v4
+            if refresh:
+                deletes.append(f"delete element {self.family} {self.table} {set_name} {{ {address} }}")
+            adds.append(f"add element {self.family} {self.table} {set_name} {{ {address} timeout {timeout}s }}")
+        return "\n".join(deletes + adds) + "\n"
+
+    async def flush(self) -> None:
+        """Apply every pending address now"""
+        while self._pending:
+            pending, self._pending = self._pending, {}
+            batch, self._batch = self._batch, None
+            applied = False
+            try:
+                await apply_script(self.script(pending))
+                applied = True
+            except WireGuardError as e:
+                self.stats["failures"] += 1
+                logger.warning(f"Could not update {self.table} sets: {str(e)}")
+                # Forget them: the next answer for these names retries
+                for address in pending:
+                    self._expiry.pop(address, None)
+                continue
+            finally:
+                self._release(pending, batch, applied)
+            self.stats["batches"] += 1
+            for _, refresh in pending.values():
+                self.stats["refreshed" if refresh else "added"] += 1
+
+        if len(self._expiry) > 4 * self.max_batch:
+            now = time.monotonic()
+            self._expiry = {address: expiry for address, expiry in self._expiry.items() if expiry > now}
+
+    def _release(self, addresses, batch: Optional[asyncio.Future], applied: bool) -> None:
+        for address in addresses:
+            if self._waiting.get(address) is batch:
+                del self._waiting[address]
+        if batch is not None and not batch.done():
+            batch.set_result(applied)
+
+    def reset(self) -> None:
+        """Forget everything (the sets were recreated)"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._release(list(self._pending), self._batch, False)
+        self._batch = None
+        self._pending.clear()
+        self._expiry.clear()
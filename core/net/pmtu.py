@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Path MTU Discovery
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Path MTU probing towards WireGuard endpoints.
+
+Probes are UDP datagrams with the DF bit set, sent to the endpoint's own
+port so they follow the exact path of the tunnel (WireGuard drops them
+silently). A probe fails when the kernel refuses it (larger than the local
+link) or when a router answers "fragmentation needed", which the kernel
+reports on the connected socket. The MTU learned from an ICMP error is
+tried next, then a binary search finishes the job.
+
+A probe that draws no error proves nothing: the path may filter ICMP, and
+WireGuard never answers. Probing therefore only lowers the MTU: the search
+starts at the path MTU that DEFAULT_TUNNEL_MTU needs (or the route MTU if
+smaller), so the result never exceeds what the fixed default would have
+used, and on a clean path a single probe is enough.
+
+Results are cached per (local network, server), the local network being
+identified by the default gateway and the source address: moving to
+another network probes again.
+"""
+
+import os
+import json
+import time
+import errno
+import select
+import socket
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger('anidata_net')
+
+PMTU_CACHE_FILE = os.path.join(os.path.expanduser("~/.anidata"), "cache", "pmtu.json")
+PMTU_TTL = 24 * 3600  # seconds
+PROBE_WAIT = 0.25     # seconds to wait for an ICMP error after each probe
+
+DEFAULT_TUNNEL_MTU = 1420  # wg-quick default: a 1500 path with an IPv6 outer header
+WIREGUARD_OVERHEAD = 32    # message type, receiver index, counter, Poly1305 tag
+UDP_HEADER = 8
+IP_HEADER = {4: 20, 6: 40}
+MIN_PATH_MTU = {4: 576, 6: 1280}
+
+# Linux values, not exported by every Python build
+_SOCKOPTS = {
+    # version: (level, MTU_DISCOVER, PMTUDISC_PROBE, MTU)
+    4: (socket.IPPROTO_IP, getattr(socket, "IP_MTU_DISCOVER", 10),
+        getattr(socket, "IP_PMTUDISC_PROBE", 3), getattr(socket, "IP_MTU", 14)),
+    6: (socket.IPPROTO_IPV6, getattr(socket, "IPV6_MTU_DISCOVER", 23),
+        getattr(socket, "IPV6_PMTUDISC_PROBE", 3), getattr(socket, "IPV6_MTU", 24)),
+}
+
+
+def tunnel_mtu_for(path_mtu: int, version: int) -> int:
+    """WireGuard interface MTU fitting in ``path_mtu`` with an IPv``version`` outer header"""
+    return path_mtu - IP_HEADER[version] - UDP_HEADER - WIREGUARD_OVERHEAD
+
+
+def path_mtu_for(tunnel_mtu: int, version: int) -> int:
+    """Path MTU needed by a ``tunnel_mtu`` WireGuard interface with an IPv``version`` outer header"""
+    return tunnel_mtu + IP_HEADER[version] + UDP_HEADER + WIREGUARD_OVERHEAD
+
+
+def _set_mark(sock: socket.socket, mark: Optional[int]) -> None:
+    if mark is not None:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, getattr(socket, "SO_MARK", 36), mark)
+        except OSError:
+            pass
+
+
+def _send_probe(sock: socket.socket, payload: int, wait: float) -> bool:
+    """True unless a ``payload``-byte DF datagram is rejected along the path"""
+    try:
+        sock.send(bytes(payload))
+    except OSError as e:
+        if e.errno == errno.EMSGSIZE:
+            return False
+        raise
+    if select.select([sock], [], [], wait)[0]:
+        try:
+            sock.recv(65535)
+        except OSError as e:
+            if e.errno == errno.EMSGSIZE:
+                return False
+            # Port unreachable and the like: the datagram reached the host
+    return True
+
+
+def probe_path_mtu(address: str, port: int, wait: float = PROBE_WAIT, mark: int = None) -> Tuple[int, int]:
+    """
+    Largest packet (IP header included) reaching ``address`` unfragmented,
+    at most what DEFAULT_TUNNEL_MTU needs (see module docstring)
+
+    Args:
+        mark: fwmark of the tunnel's own packets, so probes skip a tunnel
+            that is already up (needs CAP_NET_ADMIN, ignored otherwise)
+
+    Returns:
+        (path MTU, IP version of the path)
+
+    Raises:
+        OSError: No route to the endpoint
+    """
+    version = 6 if ":" in address else 4
+    level, mtu_discover, pmtudisc_probe, ip_mtu = _SOCKOPTS[version]
+    overhead = IP_HEADER[version] + UDP_HEADER
+
+    with socket.socket(socket.AF_INET6 if version == 6 else socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        # DF set, and the size is ours to choose even above the cached path MTU
+        sock.setsockopt(level, mtu_discover, pmtudisc_probe)
+        _set_mark(sock, mark)
+        sock.connect((address, port))
+
+        lo = MIN_PATH_MTU[version]
+        # Unconfirmed sizes never go above the default, only below
+        hi = max(min(sock.getsockopt(level, ip_mtu), path_mtu_for(DEFAULT_TUNNEL_MTU, version)), lo)
+        candidate = hi
+        probes = 0
+        while lo < hi:
+            probes += 1
+            if _send_probe(sock, candidate - overhead, wait):
+                lo = candidate
+            else:
+                # "Fragmentation needed" carries the next-hop MTU: try it directly
+                learned = sock.getsockopt(level, ip_mtu)
+                hi = candidate - 1
+                if lo <= learned < candidate:
+                    hi = candidate = learned
+                    continue
+            candidate = (lo + hi + 1) // 2
+
+    logger.debug(f"Path MTU to {address}: {lo} ({probes} probes)")
+    return lo, version
+
+
+# ----------------------------------------------------------------------
+# Network identity and cache
+# ----------------------------------------------------------------------
+
+def _default_gateway() -> str:
+    """Interface and gateway of the IPv4 default route, "" if unknown"""
+    try:
+        with open("/proc/net/route", "r") as f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                if len(fields) > 7 and fields[1] == "00000000" and fields[7] == "00000000":
+                    gateway = socket.inet_ntoa(int(fields[2], 16).to_bytes(4, "little"))
+                    return f"{fields[0]}/{gateway}"
+    except (OSError, ValueError):
+        pass
+    return ""
+
+
+def local_network_id(address: str, mark: int = None) -> str:
+    """Identifier of the network used to reach ``address`` (gateway and source address)"""
+    family = socket.AF_INET6 if ":" in address else socket.AF_INET
+    try:
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            _set_mark(sock, mark)
+            sock.connect((address, 9))  # no packet sent
+            source = sock.getsockname()[0]
+    except OSError:
+        source = ""
+    return f"{_default_gateway()}/{source}"
+
+
+class PMTUCache:
+    """
+    Path MTUs keyed by local network and server, persisted to disk
+    """
+
+    def __init__(self, cache_file: str = PMTU_CACHE_FILE, ttl: float = PMTU_TTL):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.entries: Dict[str, Dict] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logger.debug(f"Could not write PMTU cache: {str(e)}")
+
+    def get(self, network: str, server: str) -> Optional[Dict]:
+        entry = self.entries.get(f"{network}|{server}")
+        if entry and time.time() - entry.get("time", 0) < self.ttl:
+            return entry
+        return None
+
+    def put(self, network: str, server: str, path_mtu: int, version: int) -> Dict:
+        entry = {"path_mtu": path_mtu, "version": version, "time": time.time()}
+        self.entries[f"{network}|{server}"] = entry
+        return entry
+
+
+def tunnel_mtu(address: str, port: int, server_id: str = None,
+               cache: PMTUCache = None, refresh: bool = False, mark: int = None) -> int:
+    """
+    WireGuard MTU for the endpoint on the current network
+
+    Probes once per (network, server) and caches the result; never more
+    than DEFAULT_TUNNEL_MTU, which is also the fallback when the path
+    cannot be probed.
+    """
+    cache = cache or PMTUCache()
+    network = local_network_id(address, mark)
+    server = server_id or f"{address}:{port}"
+    entry = None if refresh else cache.get(network, server)
+    if entry is None:
+        try:
+            path_mtu, version = probe_path_mtu(address, port, mark=mark)
+        except OSError as e:
+            logger.warning(f"Path MTU probe to {address} failed ({str(e)}), using {DEFAULT_TUNNEL_MTU}")
+            return DEFAULT_TUNNEL_MTU
+        entry = cache.put(network, server, path_mtu, version)
+        cache.save()
+    # min(): entries probed before the search was capped
+    mtu = min(tunnel_mtu_for(entry["path_mtu"], entry["version"]), DEFAULT_TUNNEL_MTU)
+    logger.info(f"Tunnel MTU for {server}: {mtu} (path MTU {entry['path_mtu']})")
+    return mtu
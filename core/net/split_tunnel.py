@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Domain Split Tunneling
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Domain-based split tunneling.
+
+The rules name domains, but packets only carry addresses. The DNS stub
+reports every answer; when the name matches a rule, the addresses go into
+nftables timeout sets (through ``SetBatcher``), a mangle chain marks
+packets to those addresses, and an ``ip rule`` sends marked packets to a
+dedicated routing table:
+
+- ``include``: only the listed domains use the tunnel; the table holds
+  a default route through the tunnel and the main table is left alone.
+- ``exclude``: everything uses the tunnel except the listed domains; the
+  table holds the physical default route.
+
+The stub holds a matching answer until its addresses are in the set, so
+the client's first connection is already routed the right way. The
+decision is then kept per connection in the conntrack mark: a connection
+never changes routes halfway (addresses added or expiring later only
+affect new connections). Marked packets are masqueraded, since their
+source address was picked before the mark rerouted them. Settings live
+in the catalog under ``settings.split_tunnel``:
+
+    {"mode": "exclude", "domains": ["netflix.com", "*.nflxvideo.net"]}
+"""
+
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from core.dns import message
+from core.protocols.wireguard.async_wireguard import run_command
+from .nft import SetBatcher, apply_script, delete_table, replace_table_script
+
+logger = logging.getLogger('anidata_net')
+
+MODES = ("include", "exclude")
+
+SPLIT_FAMILY = "inet"
+SPLIT_TABLE_NAME = "anidata_split"
+SPLIT_MARK = 0x41440001
+SPLIT_TABLE = 4144
+SPLIT_RULE_PRIORITY = 4144
+
+
+class DomainRules:
+    """
+    Domain patterns: ``example.com`` matches the name and its subdomains,
+    ``*.example.com`` only the subdomains
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._names = set()
+        self._subdomains_only = set()
+        for pattern in patterns:
+            pattern = pattern.strip().strip(".").lower()
+            if pattern.startswith("*."):
+                self._subdomains_only.add(pattern[2:])
+            elif pattern:
+                self._names.add(pattern)
+
+    def __len__(self) -> int:
+        return len(self._names) + len(self._subdomains_only)
+
+    def matches(self, name: str) -> bool:
+        if name in self._names:
+            return True
+        start = name.find(".") + 1
+        while start:
+            suffix = name[start:]
+            if suffix in self._names or suffix in self._subdomains_only:
+                return True
+            start = name.find(".", start) + 1
+        return False
+
+
+class SplitTunnel:
+    """
+    Routes the addresses of matching domains according to ``mode``
+    """
+
+    def __init__(self, mode: str, domains: Iterable[str]):
+        """
+        Args:
+            mode: "include" (only these domains through the VPN) or "exclude"
+            domains: Domain patterns (see DomainRules)
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown split tunnel mode: {mode}")
+        self.mode = mode
+        self.rules = DomainRules(domains)
+        self.interface_name: Optional[str] = None
+        # Answers wait for their batch: keep the batching window short
+        self.batcher = SetBatcher(SPLIT_FAMILY, SPLIT_TABLE_NAME, "routed_v4", "routed_v6", delay=0.01)
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict]) -> Optional["SplitTunnel"]:
+        """Split tunnel described by ``settings.split_tunnel``, None if off"""
+        settings = settings or {}
+        mode = settings.get("mode", "off")
+        domains = settings.get("domains", [])
+        if mode == "off" or not domains:
+            return None
+        return cls(mode, domains)
+
+    @property
+    def active(self) -> bool:
+        return self.interface_name is not None
+
+    @property
+    def use_default_route(self) -> bool:
+        """Whether the tunnel still takes the default route in the main table"""
+        return self.mode == "exclude"
+
+    # ------------------------------------------------------------------
+    # DNS observer
+    # ------------------------------------------------------------------
+
+    def observe(self, question: message.Question, response: bytes) -> Optional[asyncio.Future]:
+        """
+        DNSStub observer: route the addresses of matching names
+
+        Returns:
+            Future done once they are routed (the stub holds the answer
+            until then), None if there is nothing to wait for
+        """
+        if not self.active or not self.rules.matches(question.name):
+            return None
+        try:
+            addresses = message.answer_addresses(response, question.end)
+        except message.DNSFormatError:
+            return None
+        batches = {self.batcher.add(address, ttl) for address, ttl in addresses} - {None}
+        return asyncio.gather(*batches) if batches else None
+
+    # ------------------------------------------------------------------
+    # Rules and routes
+    # ------------------------------------------------------------------
+
+    def ruleset(self, interface_name: str) -> str:
+        mark = f"0x{SPLIT_MARK:08x}"
+        # Decided on the first packet, then the same for the whole connection
+        marking = (
+            f"        ct state new ip daddr @routed_v4 ct mark set {mark}\n"
+            f"        ct state new ip6 daddr @routed_v6 ct mark set {mark}\n"
+            f"        ct mark {mark} meta mark set {mark}\n"
+        )
+        return replace_table_script(SPLIT_FAMILY, SPLIT_TABLE_NAME, (
+            "    set routed_v4 { type ipv4_addr; flags timeout; }\n"
+            "    set routed_v6 { type ipv6_addr; flags timeout; }\n"
+            # Local traffic: the route hook re-runs the lookup after marking
+            "    chain output {\n"
+            "        type route hook output priority mangle; policy accept;\n"
+            f"{marking}"
+            "    }\n"
+            # Forwarded traffic (shared connection)
+            "    chain prerouting {\n"
+            "        type filter hook prerouting priority mangle; policy accept;\n"
+            f"{marking}"
+            "    }\n"
+            "    chain postrouting {\n"
+            "        type nat hook postrouting priority srcnat; policy accept;\n"
+            f"        meta mark {mark} masquerade\n"
+            "    }\n"
+        ))
+
+    async def _physical_default_routes(self, interface_name: str) -> List[List[str]]:
+        routes = []
+        for family in ("-4", "-6"):
+            output = await run_command("ip", family, "route", "show", "default", check=False, timeout=5.0)
+            for line in output.splitlines():
+                fields = line.split()
+                if fields and f"dev {interface_name}" not in line:
+                    routes.append([family] + fields)
+                    break
+        return routes
+
+    async def start(self, interface_name: str) -> None:
+        """
+        Install the sets, marking rules and policy route for ``interface_name``
+
+        Raises:
+            WireGuardError: nft or ip failed (partial changes are undone)
+        """
+        self.batcher.reset()
+        try:
+            await apply_script(self.ruleset(interface_name))
+            await run_command("sudo", "sysctl", "-q", "net.ipv4.conf.all.src_valid_mark=1")
+
+            if self.mode == "include":
+                routes = [[family, "default", "dev", interface_name] for family in ("-4", "-6")]
+            else:
+                routes = await self._physical_default_routes(interface_name)
+            for route in routes:
+                family, fields = route[0], route[1:]
+                await run_command("sudo", "ip", family, "route", "replace", *fields, "table", str(SPLIT_TABLE),
+                                  check=family == "-4")
+                await run_command("sudo", "ip", family, "rule", "add", "fwmark", f"0x{SPLIT_MARK:x}",
+                                  "lookup", str(SPLIT_TABLE), "priority", str(SPLIT_RULE_PRIORITY),
+                                  check=family == "-4")
+        except Exception:
+            await self._teardown()
+            raise
+
+        self.interface_name = interface_name
+        logger.info(f"Split tunnel ({self.mode}, {len(self.rules)} domain rules) on {interface_name}")
+
+    async def _teardown(self) -> None:
+        for family in ("-4", "-6"):
+            await run_command("sudo", "ip", family, "rule", "del", "fwmark", f"0x{SPLIT_MARK:x}",
+                              "lookup", str(SPLIT_TABLE), check=False)
+            await run_command("sudo", "ip", family, "route", "flush", "table", str(SPLIT_TABLE), check=False)
+        await delete_table(SPLIT_FAMILY, SPLIT_TABLE_NAME)
+
+    async def stop(self) -> None:
+        """Remove everything ``start`` installed"""
+        self.interface_name = None
+        self.batcher.reset()
+        await self._teardown()
@@ -0,0 +1,804 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Asyncio WireGuard Manager
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Asyncio-native WireGuard manager.
+
+Connect and disconnect are described as a graph of steps with explicit
+dependencies instead of a fixed sequence: key loading, peer key lookup,
+endpoint resolution and interface creation start together, DNS and routing
+are configured side by side once the interface is up, and so on. Each step
+has its own timeout; when one fails, the steps still running are cancelled
+and every started step is undone in reverse order, so a failed connect
+does not leave a half-configured interface behind. ``switch`` changes
+servers with a smaller graph that only replaces the peer.
+
+Commands run through ``asyncio.create_subprocess_exec`` and endpoints are
+resolved with ``loop.getaddrinfo``: no thread per operation. The result
+dictionaries match ``WireGuardManager`` so callers can switch freely.
+"""
+
+import os
+import time
+import random
+import socket
+import asyncio
+import logging
+import functools
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.catalog import default_servers_file, load_catalog, find_server
+from core.net.cidr import CIDRSet
+from core.protocols.wireguard.wireguard import (
+    TUNNEL_MARK, WireGuardError, routing_scripts, routing_teardown_scripts
+)
+
+logger = logging.getLogger('anidata_wireguard')
+
+DEFAULT_INTERFACE = "anidata0"
+DEFAULT_PORT = 51820
+DEFAULT_DNS = ["1.1.1.1", "1.0.0.1"]
+DEFAULT_STEP_TIMEOUT = 15.0  # seconds; sudo may prompt
+SWITCH_HANDSHAKE_TIMEOUT = 10.0  # seconds for the new server to answer during a switch
+HANDSHAKE_POLL_INTERVAL = 0.05
+
+
+async def run_command(*args: str, input: str = None, timeout: float = None, check: bool = True) -> str:
+    """
+    Run a command without blocking the event loop
+
+    Returns:
+        Standard output, stripped
+
+    Raises:
+        WireGuardError: Command missing, failed (with ``check``) or timed out
+    """
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        raise WireGuardError(f"Command not found: {args[0]}")
+
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(input.encode() if input is not None else None), timeout
+        )
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise WireGuardError(f"Command timed out: {' '.join(args)}")
+
+    if check and process.returncode != 0:
+        message = stderr.decode(errors="replace").strip() or f"exit status {process.returncode}"
+        raise WireGuardError(f"{' '.join(args)}: {message}")
+    return stdout.decode(errors="replace").strip()
+
+
+def _split_endpoint(endpoint: str) -> Tuple[str, int]:
+    """(address, port) of "address:port", IPv6 addresses unbracketed"""
+    host, _, port = endpoint.rpartition(":")
+    return host.strip("[]"), int(port)
+
+
+class Step:
+    """A node of a StepGraph"""
+
+    def __init__(self,
+                 name: str,
+                 action: Callable[[Dict], Awaitable],
+                 requires: Iterable[str] = (),
+                 timeout: float = DEFAULT_STEP_TIMEOUT,
+                 undo: Callable[[Dict], Awaitable] = None):
+        """
+        Args:
+            name: Step name, also the key of its result in the context
+            action: Coroutine function taking the shared context
+            requires: Names of the steps that must complete first
+            timeout: Seconds before the step is cancelled
+            undo: Coroutine function reverting the step after a later failure
+        """
+        self.name = name
+        self.action = action
+        self.requires = tuple(requires)
+        self.timeout = timeout
+        self.undo = undo
+
+
+class StepFailed(WireGuardError):
+    """A step of a graph failed or timed out"""
+
+    def __init__(self, step: str, message: str):
+        super().__init__(f"{step}: {message}")
+        self.step = step
+
+
+class StepGraph:
+    """
+    Runs steps as soon as their dependencies are done
+
+    Each step's return value is stored in the context under its name, so
+    later steps read what earlier ones produced. ``timings`` holds the
+    duration of every completed step in milliseconds.
+    """
+
+    def __init__(self, steps: Iterable[Step]):
+        self.steps: Dict[str, Step] = {}
+        for step in steps:
+            if step.name in self.steps:
+                raise ValueError(f"Duplicate step: {step.name}")
+            self.steps[step.name] = step
+        for step in self.steps.values():
+            missing = [name for name in step.requires if name not in self.steps]
+            if missing:
+                raise ValueError(f"Step {step.name} requires unknown steps: {', '.join(missing)}")
+        self.timings: Dict[str, float] = {}
+
+    async def _run_step(self, step: Step, context: Dict):
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(step.action(context), step.timeout)
+        except asyncio.TimeoutError:
+            raise StepFailed(step.name, f"timed out after {step.timeout:g}s")
+        except StepFailed:
+            raise
+        except Exception as e:
+            # Bugs included: anything escaping here would skip the rollback
+            raise StepFailed(step.name, str(e) or type(e).__name__)
+        finally:
+            self.timings[step.name] = round((time.perf_counter() - start) * 1000, 2)
+
+    async def run(self, context: Dict = None) -> Dict:
+        """
+        Execute the graph
+
+        Returns:
+            The context, filled with every step result
+
+        Raises:
+            StepFailed: First failure, after cancelling and undoing
+        """
+        context = {} if context is None else context
+        done: List[str] = []
+        failed: List[str] = []
+        running: Dict[asyncio.Task, Step] = {}
+        waiting = dict(self.steps)
+
+        def launch_ready():
+            for name, step in list(waiting.items()):
+                if all(dep in done for dep in step.requires):
+                    del waiting[name]
+                    running[asyncio.ensure_future(self._run_step(step, context))] = step
+
+        launch_ready()
+        try:
+            while running:
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    step = running.pop(task)
+                    if task.exception() is not None:
+                        failed.append(step.name)
+                    context[step.name] = task.result()
+                    done.append(step.name)
+                launch_ready()
+            if waiting:
+                raise StepFailed(next(iter(waiting)), "dependency cycle")
+        except BaseException:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            # Failed and interrupted steps may have half-applied their change: undo them too
+            await self._rollback(done + failed + [step.name for step in running.values()], context)
+            raise
+        return context
+
+    async def _rollback(self, done: List[str], context: Dict) -> None:
+        for name in reversed(done):
+            step = self.steps[name]
+            if step.undo is None:
+                continue
+            try:
+                await asyncio.wait_for(step.undo(context), step.timeout)
+            except Exception as e:
+                logger.warning(f"Could not undo {name}: {str(e)}")
+
+
+class AsyncWireGuardInterface:
+    """
+    State of the tunnel interface, exposed as ``manager.interface`` like
+    the synchronous manager does
+    """
+
+    def __init__(self, interface_name: str, config_dir: str):
+        self.interface_name = interface_name
+        self.config_dir = config_dir
+        self.private_key_path = os.path.join(config_dir, "private.key")
+        self.public_key = None
+        self.local_ip = None
+        self.remote_endpoint = None
+        self.remote_public_key = None
+        self.allowed_ips = "0.0.0.0/0, ::/0"
+        self.mtu = None
+
+    async def peer_handshakes(self) -> Dict[str, float]:
+        """
+        Unix time of the latest handshake per peer public key, 0 if none yet
+
+        Raises:
+            WireGuardError: ``wg`` failed (interface gone, no privileges)
+        """
+        output = await run_command("sudo", "wg", "show", self.interface_name, "latest-handshakes", timeout=5.0)
+        return {fields[0]: float(fields[1]) for fields in (line.split() for line in output.splitlines())
+                if len(fields) == 2 and fields[1].isdigit()}
+
+    async def latest_handshake(self) -> float:
+        """
+        Unix time of the most recent handshake with any peer, 0 if none yet
+
+        Raises:
+            WireGuardError: ``wg`` failed (interface gone, no privileges)
+        """
+        return max((await self.peer_handshakes()).values(), default=0.0)
+
+    async def get_connection_status(self) -> Dict[str, any]:
+        """Same fields as WireGuardInterface.get_connection_status"""
+        status = {
+            "interface": self.interface_name,
+            "connected": False,
+            "public_key": self.public_key,
+            "local_ip": self.local_ip,
+            "remote_endpoint": self.remote_endpoint,
+            "latest_handshake": None,
+            "transfer_rx": 0,
+            "transfer_tx": 0,
+            "persistent_keepalive": None
+        }
+        try:
+            output = await run_command("sudo", "wg", "show", self.interface_name, timeout=5.0)
+        except WireGuardError as e:
+            return {"connected": False, "error": str(e)}
+
+        if "peer" in output:
+            status["connected"] = True
+            for line in output.splitlines():
+                line = line.strip()
+                lower = line.lower()
+                if "latest handshake:" in lower:
+                    status["latest_handshake"] = line.split(":", 1)[1].strip()
+                elif "transfer:" in lower:
+                    parts = line.split(":", 1)[1].strip().split()
+                    if len(parts) >= 4:
+                        status["transfer_rx"] = parts[0] + " " + parts[1]
+                        status["transfer_tx"] = parts[2] + " " + parts[3]
+                elif "persistent keepalive:" in lower:
+                    status["persistent_keepalive"] = line.split(":", 1)[1].strip()
+        return status
+
+
+class AsyncWireGuardManager:
+    """
+    Coroutine counterpart of WireGuardManager
+    """
+
+    def __init__(self,
+                 config_dir: str = None,
+                 servers_file: str = None,
+                 interface_name: str = DEFAULT_INTERFACE,
+                 local_ip: str = "10.10.10.2/24",
+                 mtu: Optional[int] = None,
+                 firewall=None):
+        """
+        Initialize the manager
+
+        Args:
+            config_dir: Directory for WireGuard configurations
+            servers_file: Path to server catalog
+            interface_name: Name of the WireGuard interface
+            local_ip: Tunnel address with CIDR
+            mtu: Interface MTU (None: probed per network and server, see core.net.pmtu)
+            firewall: core.net.firewall.Firewall enforcing leak protection
+        """
+        self.config_dir = config_dir or os.path.join(os.path.expanduser("~/.anidata"), "config/wireguard")
+        self.servers_file = servers_file or default_servers_file()
+        self.interface_name = interface_name
+        self.local_ip = local_ip
+        self.mtu = mtu
+        self.firewall = firewall
+
+        self.servers = load_catalog(self.servers_file)
+        self.current_server = None
+        self.interface: Optional[AsyncWireGuardInterface] = None
+        self.last_timings: Dict[str, float] = {}
+        self._allowed_ips: Optional[CIDRSet] = None  # policy of the current tunnel
+
+        os.makedirs(self.config_dir, exist_ok=True)
+
+    def get_server(self, server_id: str = None) -> Optional[Dict]:
+        if not self.servers:
+            logger.error("No servers available")
+            return None
+        if server_id:
+            server = find_server(self.servers, server_id)
+            if not server:
+                logger.warning(f"Server with ID {server_id} not found")
+            return server
+        # Same policy as the synchronous manager; use core.vpn.probe for latency-based selection
+        return random.choice(self.servers)
+
+    # ------------------------------------------------------------------
+    # Peer helpers (shared by the connect and switch graphs)
+    # ------------------------------------------------------------------
+
+    async def _peer_key(self, server: Dict) -> str:
+        # The catalog does not carry server keys yet: same placeholder as WireGuardManager
+        if server.get("public_key"):
+            return server["public_key"]
+        return await run_command("wg", "pubkey", input=await run_command("wg", "genkey"))
+
+    async def _resolve_endpoint(self, server: Dict) -> str:
+        host = server.get("ip", "").replace("xx", "1")  # Replace xx with 1 for demo
+        port = server.get("port", DEFAULT_PORT)
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_DGRAM)
+        address = infos[0][4][0]
+        return f"[{address}]:{port}" if ":" in address else f"{address}:{port}"
+
+    async def _path_mtu(self, server: Dict, endpoint: str) -> int:
+        if self.mtu:
+            return self.mtu
+        from core.net.pmtu import tunnel_mtu
+        address, port = _split_endpoint(endpoint)
+        loop = asyncio.get_running_loop()
+        # Cached per network: usually no probe at all, otherwise a fraction of a second
+        return await loop.run_in_executor(None, functools.partial(
+            tunnel_mtu, address, port, server.get("id"), mark=TUNNEL_MARK
+        ))
+
+    @staticmethod
+    def _tunnel_networks(allowed_ips: Optional[CIDRSet], endpoint: str) -> Optional[CIDRSet]:
+        """Networks given to the peer, None for everything"""
+        if allowed_ips is None or allowed_ips.is_everything():
+            return None
+        # Never route the endpoint itself into the tunnel
+        return allowed_ips - CIDRSet([_split_endpoint(endpoint)[0]])
+
+    def _write_config(self, private_key: str, mtu: int, peer_key: str, endpoint: str,
+                      networks: Optional[CIDRSet]) -> str:
+        config = "[Interface]\n"
+        config += f"PrivateKey = {private_key}\n"
+        config += f"Address = {self.local_ip}\n"
+        config += f"MTU = {mtu}\n\n"
+        config += "[Peer]\n"
+        config += f"PublicKey = {peer_key}\n"
+        config += f"Endpoint = {endpoint}\n"
+        # An empty set stays empty, like the live peer (see swap_peer)
+        config += f"AllowedIPs = {networks if networks is not None else '0.0.0.0/0, ::/0'}\n"
+        config += "PersistentKeepalive = 25\n"
+
+        path = os.path.join(self.config_dir, f"{self.interface_name}.conf")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(config)
+        return path
+
+    # ------------------------------------------------------------------
+    # Connect graph
+    # ------------------------------------------------------------------
+
+    def _connect_graph(self, interface: AsyncWireGuardInterface, server: Dict,
+                       use_default_route: bool, dns_servers: List[str],
+                       allowed_ips: Optional[CIDRSet] = None) -> StepGraph:
+        name = interface.interface_name
+
+        def tunnel_networks(ctx) -> Optional[CIDRSet]:
+            return self._tunnel_networks(allowed_ips, ctx["resolve_endpoint"])
+
+        async def check_tools(ctx):
+            await run_command("wg", "--version", timeout=5.0)
+
+        async def load_keys(ctx):
+            if os.path.exists(interface.private_key_path):
+                with open(interface.private_key_path, "r") as f:
+                    private_key = f.read().strip()
+            else:
+                logger.info("Generating WireGuard keypair")
+                private_key = await run_command("wg", "genkey")
+                with open(interface.private_key_path, "w") as f:
+                    f.write(private_key)
+                os.chmod(interface.private_key_path, 0o600)
+            interface.public_key = await run_command("wg", "pubkey", input=private_key)
+            return private_key
+
+        async def peer_key(ctx):
+            return await self._peer_key(server)
+
+        async def resolve_endpoint(ctx):
+            return await self._resolve_endpoint(server)
+
+        # Kill switch already engaged (reconnection): a failed attempt keeps blocking
+        firewall_engaged = self.firewall is not None and self.firewall.active
+
+        async def apply_firewall(ctx):
+            await self.firewall.apply(name, [_split_endpoint(ctx["resolve_endpoint"])], dns_servers)
+
+        async def clear_firewall(ctx):
+            if not firewall_engaged:
+                await self.firewall.clear()
+
+        async def create_interface(ctx):
+            if await self._interface_exists():
+                logger.info(f"Interface {name} already exists, recreating")
+                await run_command("sudo", "ip", "link", "del", name)
+            await run_command("sudo", "ip", "link", "add", name, "type", "wireguard")
+
+        async def delete_interface(ctx):
+            await run_command("sudo", "ip", "link", "del", name, check=False)
+
+        async def set_private_key(ctx):
+            await run_command("sudo", "wg", "set", name, "private-key", interface.private_key_path)
+
+        async def path_mtu(ctx):
+            return await self._path_mtu(server, ctx["resolve_endpoint"])
+
+        async def configure_address(ctx):
+            await run_command("sudo", "ip", "addr", "add", self.local_ip, "dev", name)
+            await run_command("sudo", "ip", "link", "set", "mtu", str(ctx["path_mtu"]), "dev", name)
+            await run_command("sudo", "ip", "link", "set", "up", "dev", name)
+            interface.local_ip = self.local_ip
+            interface.mtu = ctx["path_mtu"]
+
+        async def add_peer(ctx):
+            interface.remote_endpoint = ctx["resolve_endpoint"]
+            interface.remote_public_key = ctx["peer_key"]
+            networks = tunnel_networks(ctx)
+            if networks is not None:
+                interface.allowed_ips = str(networks)
+            await run_command("sudo", "wg", "set", name,
+                              "peer", ctx["peer_key"],
+                              "allowed-ips", interface.allowed_ips.replace(" ", ""),
+                              "endpoint", ctx["resolve_endpoint"],
+                              "persistent-keepalive", "25")
+
+        async def render_config(ctx):
+            return self._write_config(ctx["load_keys"], ctx["path_mtu"], ctx["peer_key"],
+                                      ctx["resolve_endpoint"], tunnel_networks(ctx))
+
+        async def configure_routing(ctx):
+            if not use_default_route:
+                return
+            await run_command("sudo", "sh", "-c", "echo 1 > /proc/sys/net/ipv4/ip_forward")
+            await run_command("sudo", "sysctl", "-q", "net.ipv4.conf.all.src_valid_mark=1")
+            # Encrypted packets are marked so they keep using the physical route
+            await run_command("sudo", "wg", "set", name, "fwmark", f"0x{TUNNEL_MARK:x}")
+            # Rules left by a crashed session would be duplicated
+            await self._restore_routing()
+            # One ip process per family, whatever the number of routes
+            for family, script in routing_scripts(name, tunnel_networks(ctx)):
+                await run_command("sudo", "ip", family, "-batch", "-", input=script, check=family == "-4")
+
+        async def configure_dns(ctx):
+            temp_resolv_conf = os.path.join(self.config_dir, "resolv.conf.temp")
+            with open(temp_resolv_conf, "w") as f:
+                for dns in dns_servers:
+                    f.write(f"nameserver {dns}\n")
+                f.write("options timeout:2 attempts:3\n")
+            if os.path.exists("/etc/resolv.conf") and not os.path.exists("/etc/resolv.conf.anidata.bak"):
+                await run_command("sudo", "cp", "/etc/resolv.conf", "/etc/resolv.conf.anidata.bak")
+            await run_command("sudo", "cp", temp_resolv_conf, "/etc/resolv.conf")
+
+        steps = [
+            Step("check_tools", check_tools, timeout=5.0),
+            Step("load_keys", load_keys),
+            Step("peer_key", peer_key),
+            Step("resolve_endpoint", resolve_endpoint, timeout=5.0),
+            Step("create_interface", create_interface, requires=["check_tools"], undo=delete_interface),
+            Step("set_private_key", set_private_key, requires=["create_interface", "load_keys"]),
+            # After the guard table, which lets the probes through to the new endpoint
+            Step("path_mtu", path_mtu, requires=["resolve_endpoint"] + (["firewall"] if self.firewall else []),
+                 timeout=10.0),
+            Step("configure_address", configure_address, requires=["create_interface", "path_mtu"]),
+            Step("add_peer", add_peer, requires=["set_private_key", "peer_key", "resolve_endpoint"]),
+            Step("render_config", render_config, requires=["load_keys", "peer_key", "path_mtu"]),
+            Step("configure_routing", configure_routing, requires=["add_peer", "configure_address"],
+                 undo=lambda ctx: self._restore_routing()),
+            Step("configure_dns", configure_dns, requires=["configure_address"],
+                 undo=lambda ctx: self._restore_dns()),
+        ]
+        if self.firewall is not None:
+            # Runs alongside the interface setup; connect only succeeds once the guard table is loaded
+            steps.append(Step("firewall", apply_firewall, requires=["resolve_endpoint"], undo=clear_firewall))
+        return StepGraph(steps)
+
+    # ------------------------------------------------------------------
+    # Teardown helpers (also used by the disconnect graph)
+    # ------------------------------------------------------------------
+
+    async def _interface_exists(self) -> bool:
+        try:
+            return bool(await run_command("ip", "link", "show", self.interface_name, check=False, timeout=5.0))
+        except WireGuardError:
+            return False
+
+    async def _restore_dns(self) -> None:
+        if os.path.exists("/etc/resolv.conf.anidata.bak"):
+            await run_command("sudo", "mv", "/etc/resolv.conf.anidata.bak", "/etc/resolv.conf")
+
+    async def _restore_routing(self) -> None:
+        # Only our table and rules: the main table was never modified
+        for family, script in routing_teardown_scripts():
+            # -force: rules and routes already gone are not an error
+            await run_command("sudo", "ip", family, "-force", "-batch", "-", input=script, check=False)
+
+    def _disconnect_graph(self, name: str, keep_firewall: bool = False) -> StepGraph:
+        async def restore_dns(ctx):
+            await self._restore_dns()
+
+        async def restore_routing(ctx):
+            await self._restore_routing()
+
+        async def delete_interface(ctx):
+            await run_command("sudo", "ip", "link", "del", name)
+
+        async def clear_firewall(ctx):
+            await self.firewall.clear()
+
+        # DNS and routing are independent; the interface goes once both are back
+        steps = [
+            Step("restore_dns", restore_dns),
+            Step("restore_routing", restore_routing),
+            Step("delete_interface", delete_interface, requires=["restore_dns", "restore_routing"]),
+        ]
+        if self.firewall is not None and not keep_firewall:
+            # Last: traffic stays blocked until the tunnel is completely gone
+            steps.append(Step("clear_firewall", clear_firewall, requires=["delete_interface"]))
+        return StepGraph(steps)
+
+    # ------------------------------------------------------------------
+    # Switch graph
+    # ------------------------------------------------------------------
+
+    def _switch_graph(self, interface: AsyncWireGuardInterface, server: Dict) -> StepGraph:
+        """
+        Steps adding the new peer next to the current one and moving the
+        traffic over once it answered; a failure leaves the current peer
+        and the guard table as they were
+        """
+        name = interface.interface_name
+        old_key = interface.remote_public_key
+        old_endpoint = _split_endpoint(interface.remote_endpoint)
+
+        async def peer_key(ctx):
+            key = await self._peer_key(server)
+            if key == old_key:
+                # A second peer with the same key would be the current one
+                raise WireGuardError("The server shares the current peer key, reconnect instead")
+            return key
+
+        async def resolve_endpoint(ctx):
+            return await self._resolve_endpoint(server)
+
+        async def widen_firewall(ctx):
+            # Both peers coexist until the swap: both endpoints must get through
+            state = self.firewall.state
+            await self.firewall.apply(name, [old_endpoint, _split_endpoint(ctx["resolve_endpoint"])],
+                                      state.dns_servers)
+
+        async def restore_firewall(ctx):
+            await self.firewall.apply(name, [old_endpoint], self.firewall.state.dns_servers)
+
+        async def path_mtu(ctx):
+            return await self._path_mtu(server, ctx["resolve_endpoint"])
+
+        async def add_peer(ctx):
+            # No AllowedIPs yet, so no traffic is routed to it. A keepalive set on an
+            # interface that is up is sent at once, which starts the handshake
+            await run_command("sudo", "wg", "set", name,
+                              "peer", ctx["peer_key"],
+                              "endpoint", ctx["resolve_endpoint"],
+                              "persistent-keepalive", "25")
+
+        async def remove_peer(ctx):
+            await run_command("sudo", "wg", "set", name, "peer", ctx["peer_key"], "remove", check=False)
+
+        async def handshake(ctx):
+            while not (await interface.peer_handshakes()).get(ctx["peer_key"]):
+                await asyncio.sleep(HANDSHAKE_POLL_INTERVAL)
+
+        async def swap_peer(ctx):
+            networks = self._tunnel_networks(self._allowed_ips, ctx["resolve_endpoint"])
+            allowed_ips = str(networks) if networks is not None else interface.allowed_ips
+            # A single netlink message: the AllowedIPs move to the new peer as the old one goes
+            await run_command("sudo", "wg", "set", name,
+                              "peer", ctx["peer_key"], "allowed-ips", allowed_ips.replace(" ", ""),
+                              "peer", old_key, "remove")
+            interface.allowed_ips = allowed_ips
+            interface.remote_endpoint = ctx["resolve_endpoint"]
+            interface.remote_public_key = ctx["peer_key"]
+            return networks
+
+        guarded = self.firewall is not None and self.firewall.active
+        # The new endpoint is only reachable once the guard table lets it through
+        endpoint_ready = ["resolve_endpoint"] + (["firewall"] if guarded else [])
+        steps = [
+            Step("peer_key", peer_key),
+            Step("resolve_endpoint", resolve_endpoint, timeout=5.0),
+            Step("path_mtu", path_mtu, requires=endpoint_ready, timeout=10.0),
+            Step("add_peer", add_peer, requires=["peer_key"] + endpoint_ready, undo=remove_peer),
+            Step("handshake", handshake, requires=["add_peer"], timeout=SWITCH_HANDSHAKE_TIMEOUT),
+            Step("swap_peer", swap_peer, requires=["handshake", "path_mtu"]),
+        ]
+        if guarded:
+            steps.append(Step("firewall", widen_firewall, requires=["resolve_endpoint"], undo=restore_firewall))
+        return StepGraph(steps)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def connect(self,
+                      server_id: str = None,
+                      use_default_route: bool = True,
+                      dns_servers: List[str] = None,
+                      allowed_ips: Optional[CIDRSet] = None) -> Dict[str, any]:
+        """
+        Connect to a WireGuard server
+
+        ``allowed_ips`` limits the tunnel to some networks (see
+        core.net.cidr.route_policy); everything goes through it if None.
+
+        Returns:
+            Same dictionary as WireGuardManager.connect, plus ``timings``
+            (milliseconds per step)
+        """
+        if self.interface:
+            # The next connect replaces the guard table in one transaction
+            result = await self.disconnect(keep_firewall=True)
+            if not result.get("success"):
+                logger.warning(f"Previous tunnel not fully removed: {result.get('error')}")
+
+        server = self.get_server(server_id)
+        if not server:
+            return {"success": False, "error": "No suitable server found"}
+
+        interface = AsyncWireGuardInterface(self.interface_name, self.config_dir)
+        graph = self._connect_graph(interface, server, use_default_route, dns_servers or DEFAULT_DNS,
+                                    allowed_ips)
+        try:
+            context = await graph.run()
+        except WireGuardError as e:
+            self.last_timings = graph.timings
+            logger.error(f"Connection failed: {str(e)}")
+            return {"success": False, "error": str(e), "timings": graph.timings}
+
+        self.last_timings = graph.timings
+        self.interface = interface
+        self.current_server = server
+        self._allowed_ips = allowed_ips
+        return {
+            "success": True,
+            "server": {
+                "id": server.get("id"),
+                "country": server.get("country"),
+                "city": server.get("city")
+            },
+            "interface": interface.interface_name,
+            "config_file": context["render_config"],
+            "mtu": context["path_mtu"],
+            "public_key": interface.public_key,
+            "timings": graph.timings,
+        }
+
+    async def disconnect(self, keep_firewall: bool = False) -> Dict[str, any]:
+        """
+        Disconnect from the WireGuard server
+
+        A fresh process (e.g. the CLI) adopts an interface left up by a
+        previous one instead of reporting "Not connected".
+
+        Args:
+            keep_firewall: Leave the kill switch engaged (about to reconnect)
+        """
+        if not self.interface and not await self._interface_exists():
+            if self.firewall is not None and self.firewall.active and not keep_firewall:
+                await self.firewall.clear()
+            return {"success": True, "message": "Not connected"}
+
+        graph = self._disconnect_graph(self.interface_name, keep_firewall)
+        try:
+            await graph.run()
+        except WireGuardError as e:
+            self.last_timings = graph.timings
+            logger.error(f"Disconnection failed: {str(e)}")
+            return {"success": False, "error": str(e), "timings": graph.timings}
+
+        self.last_timings = graph.timings
+        self.interface = None
+        self.current_server = None
+        self._allowed_ips = None
+        return {"success": True, "message": "Disconnected successfully", "timings": graph.timings}
+
+    async def switch(self, server_id: str) -> Dict[str, any]:
+        """
+        Move the tunnel to another server without tearing it down
+
+        Interface, address, routes, DNS and guard table stay in place;
+        only the peer is replaced. The new peer handshakes next to the
+        current one and takes its AllowedIPs once it answered, so the
+        traffic is interrupted for one handshake round trip at most. If
+        the new server does not answer, the current peer is kept.
+
+        Returns:
+            Same dictionary as connect
+        """
+        if not self.interface:
+            return {"success": False, "error": "Not connected"}
+        server = self.get_server(server_id)
+        if not server:
+            return {"success": False, "error": "No suitable server found"}
+        if self.current_server and server.get("id") == self.current_server.get("id"):
+            return {"success": True, "message": "Already connected to this server",
+                    "server": {"id": server.get("id"), "country": server.get("country"),
+                               "city": server.get("city")},
+                    "interface": self.interface.interface_name, "timings": {}}
+
+        interface = self.interface
+        graph = self._switch_graph(interface, server)
+        try:
+            context = await graph.run()
+        except WireGuardError as e:
+            self.last_timings = graph.timings
+            logger.error(f"Switch to {server.get('id')} failed, staying on "
+                         f"{(self.current_server or {}).get('id')}: {str(e)}")
+            return {"success": False, "error": str(e), "timings": graph.timings}
+
+        self.last_timings = graph.timings
+        self.current_server = server
+        endpoint = context["resolve_endpoint"]
+
+        # The traffic already flows through the new peer: what follows only tidies up
+        mtu = context["path_mtu"]
+        if mtu != interface.mtu:
+            try:
+                await run_command("sudo", "ip", "link", "set", "mtu", str(mtu), "dev", interface.interface_name)
+                interface.mtu = mtu
+            except WireGuardError as e:
+                logger.warning(f"MTU left at {interface.mtu}: {str(e)}")
+        if self.firewall is not None and self.firewall.active:
+            try:
+                await self.firewall.apply(interface.interface_name, [_split_endpoint(endpoint)],
+                                          self.firewall.state.dns_servers)
+            except WireGuardError as e:
+                logger.warning(f"Previous endpoint still allowed by the guard table: {str(e)}")
+        with open(interface.private_key_path, "r") as f:
+            config_file = self._write_config(f.read().strip(), interface.mtu, interface.remote_public_key,
+                                             endpoint, context["swap_peer"])
+
+        logger.info(f"Switched to {server.get('id')} ({endpoint})")
+        return {
+            "success": True,
+            "server": {
+                "id": server.get("id"),
+                "country": server.get("country"),
+                "city": server.get("city")
+            },
+            "interface": interface.interface_name,
+            "config_file": config_file,
+            "mtu": interface.mtu,
+            "public_key": interface.public_key,
+            "timings": graph.timings,
+        }
+
+    async def get_status(self) -> Dict[str, any]:
+        if not self.interface:
+            return {"connected": False, "message": "Not connected"}
+        interface_status = await self.interface.get_connection_status()
+        return {
+            "connected": interface_status.get("connected", False),
+            "server": self.current_server,
+            "connection_info": interface_status
+        }
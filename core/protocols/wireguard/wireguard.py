@@ -14,7 +14,10 @@ import random
 import time
 import fcntl
 import struct
-from typing import Dict, List, Tuple, Optional, Union
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional, Union
+
+if TYPE_CHECKING:
+    from core.net.cidr import CIDRSet
 
 # Setup logging
 logging.basicConfig(
@@ -27,6 +30,44 @@ class WireGuardError(Exception):
     """Base exception for WireGuard-related errors"""
     pass
 
+# Policy routing, same scheme as wg-quick: tunnel routes live in their own
+# table, the tunnel's own UDP packets carry TUNNEL_MARK and skip it, and the
+# main table is never modified. Rules come after the split tunnel's (4144).
+TUNNEL_MARK = 0x41440002
+TUNNEL_TABLE = 4145
+TUNNEL_RULE_PRIORITY = 4150
+
+def routing_scripts(interface_name: str, routes: Optional["CIDRSet"] = None) -> List[Tuple[str, str]]:
+    """
+    ``ip -batch`` scripts installing the tunnel routing, as (family flag, script)
+
+    Args:
+        interface_name: WireGuard interface
+        routes: Networks routed through the tunnel (everything if None)
+    """
+    scripts = []
+    for version, flag, default in ((4, "-4", "0.0.0.0/0"), (6, "-6", "::/0")):
+        prefixes = routes.prefixes(version) if routes is not None else [default]
+        if not prefixes:
+            continue
+        script = "".join(f"route replace {prefix} dev {interface_name} table {TUNNEL_TABLE}\n"
+                         for prefix in prefixes)
+        # Everything unmarked uses the tunnel table...
+        script += f"rule add not fwmark 0x{TUNNEL_MARK:x} table {TUNNEL_TABLE} priority {TUNNEL_RULE_PRIORITY + 1}\n"
+        # ...except what the main table knows more precisely than its default route (LAN)
+        script += f"rule add table main suppress_prefixlength 0 priority {TUNNEL_RULE_PRIORITY}\n"
+        scripts.append((flag, script))
+    return scripts
+
+def routing_teardown_scripts() -> List[Tuple[str, str]]:
+    """Scripts removing whatever routing_scripts installed (run with ``-force``)"""
+    script = (
+        f"rule del priority {TUNNEL_RULE_PRIORITY}\n"
+        f"rule del priority {TUNNEL_RULE_PRIORITY + 1}\n"
+        f"route flush table {TUNNEL_TABLE}\n"
+    )
+    return [("-4", script), ("-6", script)]
+
 class WireGuardInterface:
     """
     Class for managing WireGuard interfaces and connections
@@ -52,6 +93,8 @@ class WireGuardInterface:
         self.remote_public_key = None
         self.local_ip = None
         self.dns_servers = ["1.1.1.1", "1.0.0.1"]  # Default DNS
+        self.allowed_ips = "0.0.0.0/0, ::/0"
+        self.mtu = 1420
         
         # Ensure config directory exists
         os.makedirs(config_dir, exist_ok=True)
@@ -175,6 +218,7 @@ class WireGuardInterface:
         """
         logger.info(f"Configuring WireGuard interface {self.interface_name}")
         self.local_ip = local_ip
+        self.mtu = mtu
         
         try:
             # Set IP address
@@ -193,7 +237,7 @@ class WireGuardInterface:
     def add_peer(self, 
                  public_key: str, 
                  endpoint: str,
-                 allowed_ips: str = "0.0.0.0/0",
+                 allowed_ips: Union[str, "CIDRSet"] = "0.0.0.0/0",
                  keep_alive: int = 25) -> None:
         """
         Add a WireGuard peer
@@ -201,19 +245,21 @@ class WireGuardInterface:
         Args:
             public_key: Public key of the peer
             endpoint: Endpoint in the format of "host:port"
-            allowed_ips: Allowed IPs in CIDR format (default: "0.0.0.0/0")
+            allowed_ips: Allowed IPs in CIDR format (default: "0.0.0.0/0"),
+                or a CIDRSet (see core.net.cidr.route_policy)
             keep_alive: Persistent keepalive interval in seconds
         """
         logger.info(f"Adding WireGuard peer with endpoint {endpoint}")
         self.remote_endpoint = endpoint
         self.remote_public_key = public_key
+        self.allowed_ips = str(allowed_ips)
         
         try:
             # Add peer configuration
             cmd = [
                 "sudo", "wg", "set", self.interface_name,
                 "peer", public_key,
-                "allowed-ips", allowed_ips,
+                "allowed-ips", self.allowed_ips.replace(" ", ""),
                 "endpoint", endpoint,
                 "persistent-keepalive", str(keep_alive)
             ]
@@ -223,36 +269,38 @@ class WireGuardInterface:
         except subprocess.SubprocessError as e:
             raise WireGuardError(f"Failed to add WireGuard peer: {str(e)}")
     
-    def configure_routing(self, default_route: bool = True) -> None:
+    def configure_routing(self, default_route: bool = True, routes: Optional["CIDRSet"] = None) -> None:
         """
         Configure routing for the WireGuard interface
         
+        Tunnel routes go to a dedicated table selected by ip rules (see
+        routing_scripts): the main table is left alone, so teardown is
+        the same few commands whatever was installed, even after a crash.
+        
         Args:
-            default_route: Whether to route all traffic through WireGuard
+            default_route: Whether to route traffic through WireGuard
+            routes: Networks to route through WireGuard (everything if None)
         """
+        if not default_route:
+            return
         logger.info("Configuring routing for WireGuard")
         
         try:
             # Enable IP forwarding
             subprocess.run(["sudo", "sh", "-c", "echo 1 > /proc/sys/net/ipv4/ip_forward"], check=True)
+            subprocess.run(["sudo", "sysctl", "-q", "net.ipv4.conf.all.src_valid_mark=1"], check=True)
             
-            if default_route:
-                # Save the current default gateway
-                default_gw = subprocess.run(
-                    ["sudo", "ip", "route", "show", "default"],
-                    capture_output=True,
-                    text=True,
-                    check=True
-                ).stdout.strip()
-                
-                # Add default route through WireGuard
-                subprocess.run(["sudo", "ip", "route", "add", "default", "dev", self.interface_name], check=True)
-                
-                # Save the original default route to a file for restoration
-                with open(os.path.join(self.config_dir, "original_route.txt"), 'w') as f:
-                    f.write(default_gw)
-                
-                logger.info("Set default route through WireGuard")
+            # Encrypted packets are marked so they keep using the physical route
+            subprocess.run(["sudo", "wg", "set", self.interface_name, "fwmark", f"0x{TUNNEL_MARK:x}"], check=True)
+            
+            # Rules left by a crashed session would be duplicated
+            self.restore_routing()
+            for family, script in routing_scripts(self.interface_name, routes):
+                subprocess.run(["sudo", "ip", family, "-batch", "-"], input=script, text=True,
+                               # IPv6 may be disabled on the host
+                               check=family == "-4")
+            
+            logger.info("Routing traffic through WireGuard (policy routing)")
         except subprocess.SubprocessError as e:
             raise WireGuardError(f"Failed to configure routing: {str(e)}")
     
@@ -302,25 +350,10 @@ class WireGuardInterface:
         """Restore original routing configuration"""
         logger.info("Restoring original routing configuration")
         
-        original_route_file = os.path.join(self.config_dir, "original_route.txt")
-        if os.path.exists(original_route_file):
-            try:
-                with open(original_route_file, 'r') as f:
-                    original_route = f.read().strip()
-                
-                # Delete current default route
-                subprocess.run(
-                    ["sudo", "ip", "route", "del", "default"],
-                    stderr=subprocess.DEVNULL,
-                    check=False
-                )
-                
-                # Restore original default route
-                sudo_cmd = ["sudo"] + original_route.split()
-                subprocess.run(sudo_cmd, check=True)
-                logger.info("Original routing configuration restored")
-            except (subprocess.SubprocessError, IOError) as e:
-                raise WireGuardError(f"Failed to restore routing configuration: {str(e)}")
+        for family, script in routing_teardown_scripts():
+            # -force: rules and routes already gone are not an error
+            subprocess.run(["sudo", "ip", family, "-force", "-batch", "-"], input=script, text=True,
+                           stderr=subprocess.DEVNULL, check=False)
     
     def get_connection_status(self) -> Dict[str, any]:
         """
@@ -410,13 +443,13 @@ class WireGuardInterface:
         config = "[Interface]\n"
         config += f"PrivateKey = {private_key}\n"
         config += f"Address = {self.local_ip}\n"
-        config += f"MTU = 1420\n\n"
+        config += f"MTU = {self.mtu}\n\n"
         
         if self.remote_public_key and self.remote_endpoint:
             config += "[Peer]\n"
             config += f"PublicKey = {self.remote_public_key}\n"
             config += f"Endpoint = {self.remote_endpoint}\n"
-            config += "AllowedIPs = 0.0.0.0/0, ::/0\n"
+            config += f"AllowedIPs = {self.allowed_ips}\n"
             config += "PersistentKeepalive = 25\n"
         
         with open(output_path, 'w') as f:
@@ -509,7 +542,8 @@ class WireGuardManager:
     def connect(self, 
                 server_id: str = None, 
                 use_default_route: bool = True,
-                dns_servers: List[str] = None) -> Dict[str, any]:
+                dns_servers: List[str] = None,
+                allowed_ips: Optional["CIDRSet"] = None) -> Dict[str, any]:
         """
         Connect to a WireGuard server
         
@@ -517,6 +551,7 @@ class WireGuardManager:
             server_id: ID of the server to connect to (auto-select if None)
             use_default_route: Whether to route all traffic through the VPN
             dns_servers: List of DNS servers to use
+            allowed_ips: Networks sent through the VPN (everything if None)
         
         Returns:
             Connection status information
@@ -542,14 +577,18 @@ class WireGuardManager:
                 config_dir=self.config_dir
             )
             
-            # Create and configure interface
-            self.interface.create_interface()
-            self.interface.configure_interface(local_ip="10.10.10.2/24")
-            
             # Extract endpoint from server config (usually port 51820 for WireGuard)
             server_ip = server.get("ip", "").replace("xx", "1")  # Replace xx with 1 for demo
             endpoint = f"{server_ip}:51820"
             
+            # Largest MTU the path to this server carries, probed once per network
+            from core.net.pmtu import tunnel_mtu
+            mtu = tunnel_mtu(server_ip, 51820, server.get("id"), mark=TUNNEL_MARK)
+            
+            # Create and configure interface
+            self.interface.create_interface()
+            self.interface.configure_interface(local_ip="10.10.10.2/24", mtu=mtu)
+            
             # Add peer (server)
             # In a real implementation, you would get the actual public key from the server
             # Here we're generating a placeholder public key
@@ -568,16 +607,24 @@ class WireGuardManager:
                 check=True
             ).stdout.strip()
             
+            # Never route the endpoint itself into the tunnel
+            if allowed_ips is not None and not allowed_ips.is_everything():
+                from core.net.cidr import CIDRSet
+                try:
+                    allowed_ips = allowed_ips - CIDRSet([server_ip])
+                except ValueError:
+                    pass  # host name endpoint
+            
             self.interface.add_peer(
                 public_key=placeholder_pubkey,
                 endpoint=endpoint,
-                allowed_ips="0.0.0.0/0, ::/0",
+                allowed_ips=allowed_ips if allowed_ips is not None else "0.0.0.0/0, ::/0",
                 keep_alive=25
             )
             
             # Configure routing
             if use_default_route:
-                self.interface.configure_routing(default_route=True)
+                self.interface.configure_routing(default_route=True, routes=allowed_ips)
             
             # Configure DNS
             if dns_servers:
@@ -647,64 +694,18 @@ class WireGuardManager:
 
 # CLI functions for testing
 def main():
-    """Main function for CLI testing"""
-    import argparse
-    
-    parser = argparse.ArgumentParser(description="AniData WireGuard VPN Client")
-    subparsers = parser.add_subparsers(dest="command", help="Command to execute")
-    
-    # Connect command
-    connect_parser = subparsers.add_parser("connect", help="Connect to VPN")
-    connect_parser.add_argument("--server", help="Server ID to connect to")
-    
-    # Disconnect command
-    disconnect_parser = subparsers.add_parser("disconnect", help="Disconnect from VPN")
-    
-    # Status command
-    status_parser = subparsers.add_parser("status", help="Check VPN connection status")
-    
-    # List servers command
-    list_parser = subparsers.add_parser("list", help="List available servers")
-    
-    args = parser.parse_args()
-    
-    manager = WireGuardManager()
-    
-    if args.command == "connect":
-        result = manager.connect(server_id=args.server)
-        if result.get("success"):
-            print(f"Connected to {result['server']['country']}, {result['server']['city']}")
-        else:
-            print(f"Connection failed: {result.get('error')}")
-    
-    elif args.command == "disconnect":
-        result = manager.disconnect()
-        if result.get("success"):
-            print("Disconnected successfully")
-        else:
-            print(f"Disconnection failed: {result.get('error')}")
-    
-    elif args.command == "status":
-        status = manager.get_status()
-        if status.get("connected"):
-            server = status.get("server", {})
-            print(f"Connected to {server.get('country')}, {server.get('city')}")
-            
-            conn_info = status.get("connection_info", {})
-            print(f"  Interface: {conn_info.get('interface')}")
-            print(f"  Local IP: {conn_info.get('local_ip')}")
-            print(f"  Remote: {conn_info.get('remote_endpoint')}")
-            print(f"  Data transfer: RX: {conn_info.get('transfer_rx')}, TX: {conn_info.get('transfer_tx')}")
-        else:
-            print("Not connected")
-    
-    elif args.command == "list":
-        print("Available servers:")
-        for server in manager.servers:
-            print(f"  {server['id']}: {server['country']}, {server['city']}")
-    
-    else:
-        parser.print_help()
+    """
+    Command line entry point
+
+    Kept for compatibility: the commands (and more) are implemented by
+    ``core.cli``, which talks to the daemon when it is running.
+    """
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+
+    from core.cli import main as cli_main
+    sys.exit(cli_main())
 
 
 if __name__ == "__main__":
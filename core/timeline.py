@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Startup Timeline
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Startup timeline for the frontends.
+
+Phases (imports, window construction, backend initialization...) are
+recorded with ``perf_counter`` at negligible cost. When
+``ANIDATA_STARTUP_TIMELINE`` is set, ``finish()`` appends one JSON line
+per start to ``~/.anidata/logs/startup.jsonl`` (or to the path given in
+the variable) and warns when the start exceeded its budget
+(``ANIDATA_STARTUP_BUDGET_MS``, default 1500).
+
+Each record is tagged ``cold`` when it is the first start since boot (page
+cache and bytecode likely not warm) and ``warm`` otherwise, so both can be
+tracked separately. For per-module detail, combine with
+``python -X importtime``.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('anidata_startup')
+
+DEFAULT_LOG_FILE = os.path.join(os.path.expanduser("~/.anidata"), "logs", "startup.jsonl")
+DEFAULT_BUDGET_MS = 1500
+
+
+def _process_age_ms() -> Optional[float]:
+    """Time since the process was exec'd, including interpreter start-up (Linux only)"""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # Field 22 (starttime), counted after the parenthesised command name
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return (uptime - start_ticks / os.sysconf("SC_CLK_TCK")) * 1000
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _boot_id() -> Optional[str]:
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _env_budget_ms() -> float:
+    """ANIDATA_STARTUP_BUDGET_MS, DEFAULT_BUDGET_MS if unset or invalid"""
+    value = os.environ.get("ANIDATA_STARTUP_BUDGET_MS", "")
+    if not value:
+        return DEFAULT_BUDGET_MS
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"Invalid ANIDATA_STARTUP_BUDGET_MS {value!r}, using {DEFAULT_BUDGET_MS} ms")
+        return DEFAULT_BUDGET_MS
+
+
+class StartupTimeline:
+    """
+    Ordered list of named phases measured from timeline creation
+    """
+
+    def __init__(self, name: str, log_file: str = None, budget_ms: float = None):
+        """
+        Initialize the timeline
+
+        Args:
+            name: Frontend name (``desktop``, ``modern``, ``tk``...)
+            log_file: JSONL output; defaults to ``ANIDATA_STARTUP_TIMELINE``
+            budget_ms: Start-up budget in milliseconds
+        """
+        self.name = name
+        self.origin = time.perf_counter()
+        # Time already spent before this object existed (interpreter, early imports)
+        self.offset_ms = _process_age_ms()
+
+        setting = os.environ.get("ANIDATA_STARTUP_TIMELINE", "")
+        self.enabled = setting not in ("", "0") or log_file is not None
+        if log_file is None and setting not in ("", "0", "1", "true", "yes"):
+            log_file = setting
+        self.log_file = log_file or DEFAULT_LOG_FILE
+        self.budget_ms = budget_ms if budget_ms is not None else _env_budget_ms()
+
+        self.phases: List[Dict] = []
+        self.finished = False
+
+    def _now_ms(self) -> float:
+        return (time.perf_counter() - self.origin) * 1000
+
+    def mark(self, name: str) -> None:
+        """Record an instant (e.g. ``window shown``)"""
+        at = self._now_ms()
+        self.phases.append({"name": name, "start_ms": round(at, 2), "duration_ms": 0.0})
+
+    @contextmanager
+    def phase(self, name: str):
+        """Measure the enclosed block"""
+        start = self._now_ms()
+        try:
+            yield
+        finally:
+            end = self._now_ms()
+            self.phases.append({
+                "name": name,
+                "start_ms": round(start, 2),
+                "duration_ms": round(end - start, 2),
+            })
+
+    def _is_cold(self, boot_id: Optional[str]) -> bool:
+        """First recorded start of this frontend since boot"""
+        if not boot_id:
+            return False
+        try:
+            with open(self.log_file, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("boot_id") == boot_id and record.get("frontend") == self.name:
+                        return False
+        except OSError:
+            pass
+        return True
+
+    def finish(self) -> Optional[Dict]:
+        """
+        Close the timeline (once) and write the record if enabled
+
+        Returns:
+            The record, or None if the timeline is disabled or already finished
+        """
+        if self.finished:
+            return None
+        self.finished = True
+
+        total_ms = self._now_ms()
+        if self.offset_ms is not None:
+            total_ms += self.offset_ms
+
+        if total_ms > self.budget_ms:
+            logger.warning(f"Startup of {self.name} took {total_ms:.0f} ms (budget {self.budget_ms:.0f} ms)")
+
+        if not self.enabled:
+            return None
+
+        boot_id = _boot_id()
+        record = {
+            "timestamp": time.time(),
+            "frontend": self.name,
+            "kind": "cold" if self._is_cold(boot_id) else "warm",
+            "boot_id": boot_id,
+            "python": sys.version.split()[0],
+            "pre_timeline_ms": round(self.offset_ms, 2) if self.offset_ms is not None else None,
+            "total_ms": round(total_ms, 2),
+            "budget_ms": self.budget_ms,
+            "over_budget": total_ms > self.budget_ms,
+            "phases": self.phases,
+        }
+
+        try:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            with open(self.log_file, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logger.debug(f"Could not write startup timeline: {str(e)}")
+        return record
+
+
+_timelines: Dict[str, StartupTimeline] = {}
+
+
+def get_timeline(name: str) -> StartupTimeline:
+    """Shared timeline for a frontend, created on first use"""
+    if name not in _timelines:
+        _timelines[name] = StartupTimeline(name)
+    return _timelines[name]
@@ -6,6 +6,12 @@ Package core pour les fonctionnalités VPN d'AniData
 Ce package fournit les implémentations des différents protocoles VPN supportés.
 """
 
-from .wireguard_manager import WireGuardManager, RealVPNManager
+__all__ = ['WireGuardManager', 'RealVPNManager']
 
-__all__ = ['WireGuardManager', 'RealVPNManager']
\ No newline at end of file
+
+def __getattr__(name):
+    # Import paresseux : wireguard_manager configure la journalisation au chargement
+    if name in __all__:
+        from . import wireguard_manager
+        return getattr(wireguard_manager, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Live Server Metrics
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Live latency and load per server.
+
+``ServerMetricsCache`` holds the latest ping and load of each server with
+the time they were taken. Values older than their TTL are still served but
+flagged ``stale`` so views can grey them out instead of showing nothing.
+Every change (new value, or a value turning stale) marks the server dirty;
+``drain_changes()`` returns only those, so a view can update the affected
+cells and leave the rest alone.
+
+``MeasurementService`` keeps the cache filled from a background thread: each
+round it probes the servers whose ping is missing or oldest (servers shown
+on screen first), a bounded number at a time. Results are shared with the
+on-disk probe cache used by ``core.cli``.
+"""
+
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from .probe import (ProbeCache, probe_rtt, DEFAULT_PROBE_PORT, DEFAULT_TIMEOUT)
+
+logger = logging.getLogger('anidata_metrics')
+
+PING_TTL = 300   # seconds
+LOAD_TTL = 120   # seconds
+
+
+class ServerMetricsCache:
+    """
+    Thread-safe ping/load table keyed by server ID
+    """
+
+    def __init__(self, ping_ttl: float = PING_TTL, load_ttl: float = LOAD_TTL):
+        self.ping_ttl = ping_ttl
+        self.load_ttl = load_ttl
+        self._entries: Dict[str, Dict] = {}
+        self._stale: Dict[str, bool] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def update_ping(self, server_id: str, ping_ms: Optional[float], measured_at: float = None) -> None:
+        """Record a measurement (None = unreachable)"""
+        with self._lock:
+            entry = self._entries.setdefault(server_id, {})
+            entry["ping_ms"] = ping_ms
+            entry["ping_at"] = time.time() if measured_at is None else measured_at
+            self._dirty.add(server_id)
+
+    def update_load(self, server_id: str, load: Optional[float], reported_at: float = None) -> None:
+        """Record a server-reported load in percent"""
+        with self._lock:
+            entry = self._entries.setdefault(server_id, {})
+            changed = entry.get("load") != load or "load_at" not in entry
+            entry["load"] = load
+            entry["load_at"] = time.time() if reported_at is None else reported_at
+            # Same value: only worth a redraw if it was shown as stale
+            if changed or self._stale.get(server_id, (False, False))[1]:
+                self._dirty.add(server_id)
+
+    def load_from_catalog(self, servers: Iterable[Dict]) -> None:
+        """Take the ``load`` field of catalog entries, when the catalog provides it"""
+        for server in servers:
+            if server.get("load") is not None:
+                self.update_load(server["id"], float(server["load"]))
+
+    def seed_from_probe_cache(self, probe_cache: ProbeCache, servers: Iterable[Dict],
+                              port: int = DEFAULT_PROBE_PORT) -> None:
+        """Start from the results of earlier runs (CLI, previous sessions) for these servers"""
+        for server in servers:
+            if not server.get("ip"):
+                continue
+            entry = probe_cache.entries.get(ProbeCache.key(server["id"], server["ip"], port))
+            if entry is not None:
+                # No timestamp: age unknown, shown as stale rather than fresh
+                self.update_ping(server["id"], entry.get("rtt_ms"), entry.get("timestamp", 0))
+
+    def ping_age(self, server_id: str) -> Optional[float]:
+        with self._lock:
+            entry = self._entries.get(server_id)
+            if not entry or "ping_at" not in entry:
+                return None
+            return time.time() - entry["ping_at"]
+
+    def _snapshot(self, server_id: str, now: float) -> Dict:
+        entry = self._entries.get(server_id, {})
+        ping_age = now - entry["ping_at"] if "ping_at" in entry else None
+        load_age = now - entry["load_at"] if "load_at" in entry else None
+        return {
+            "ping_ms": entry.get("ping_ms"),
+            "load": entry.get("load"),
+            "ping_age": ping_age,
+            "ping_stale": ping_age is not None and ping_age > self.ping_ttl,
+            "load_stale": load_age is not None and load_age > self.load_ttl,
+        }
+
+    @staticmethod
+    def _staleness(snapshot: Dict):
+        return snapshot["ping_stale"], snapshot["load_stale"]
+
+    def get(self, server_id: str) -> Dict:
+        with self._lock:
+            return self._snapshot(server_id, time.time())
+
+    def drain_changes(self) -> Dict[str, Dict]:
+        """
+        Servers whose values or staleness changed since the last call
+
+        Returns:
+            Mapping of server ID to {"ping_ms", "load", "ping_age", "ping_stale", "load_stale"}
+        """
+        now = time.time()
+        with self._lock:
+            # Values crossing their TTL count as changes too
+            for server_id in self._entries:
+                staleness = self._staleness(self._snapshot(server_id, now))
+                if staleness != self._stale.get(server_id, (False, False)):
+                    self._dirty.add(server_id)
+
+            changes = {}
+            for server_id in self._dirty:
+                snapshot = self._snapshot(server_id, now)
+                self._stale[server_id] = self._staleness(snapshot)
+                changes[server_id] = snapshot
+            self._dirty.clear()
+        return changes
+
+
+class MeasurementService:
+    """
+    Background prober keeping a ServerMetricsCache fresh
+    """
+
+    def __init__(self,
+                 servers: List[Dict],
+                 cache: ServerMetricsCache,
+                 interval: float = 5.0,
+                 batch_size: int = 32,
+                 concurrency: int = 16,
+                 port: int = DEFAULT_PROBE_PORT,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 probe_cache: ProbeCache = None):
+        """
+        Args:
+            servers: Catalog entries to measure (need ``id`` and ``ip``)
+            cache: Cache receiving the results
+            interval: Seconds between rounds
+            batch_size: Servers probed per round
+            concurrency: Probes in flight
+            port: TCP port to probe
+            timeout: Per-probe timeout in seconds
+            probe_cache: Disk cache shared with the CLI (a default one if None)
+        """
+        self.servers = servers
+        self.cache = cache
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.port = port
+        self.timeout = timeout
+        self.probe_cache = probe_cache or ProbeCache()
+
+        self._priority: List[str] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def set_servers(self, servers: List[Dict]) -> None:
+        self.servers = servers
+        self._wake.set()
+
+    def prioritize(self, server_ids: Iterable[str]) -> None:
+        """Measure these first on the next round (e.g. rows on screen)"""
+        self._priority = list(server_ids)
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self.cache.seed_from_probe_cache(self.probe_cache, self.servers, self.port)
+            self.cache.load_from_catalog(self.servers)
+            self._thread = threading.Thread(target=self._run, name="anidata-metrics", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+
+    def _next_batch(self) -> List[Dict]:
+        """Missing or stale pings first, priority servers ahead of the rest"""
+        priority = {server_id: rank for rank, server_id in enumerate(self._priority)}
+        candidates = []
+        for server in self.servers:
+            if not server.get("ip"):
+                continue
+            age = self.cache.ping_age(server["id"])
+            if age is not None and age < self.cache.ping_ttl:
+                continue
+            rank = priority.get(server["id"], len(priority))
+            candidates.append((rank, -(age if age is not None else float("inf")), server))
+        candidates.sort(key=lambda item: (item[0], item[1]))
+        return [server for _, _, server in candidates[:self.batch_size]]
+
+    def _run(self) -> None:
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self._stop.is_set():
+                batch = self._next_batch()
+                if batch:
+                    rtts = pool.map(lambda s: probe_rtt(s["ip"], self.port, self.timeout), batch)
+                    for server, rtt in zip(batch, rtts):
+                        if self._stop.is_set():
+                            break
+                        self.cache.update_ping(server["id"], rtt)
+                        self.probe_cache.put(server["id"], server["ip"], self.port, rtt)
+                    self.probe_cache.save()
+
+                self._wake.wait(self.interval)
+                self._wake.clear()
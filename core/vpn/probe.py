@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Server Latency Probes
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Concurrent latency probes for catalog servers.
+
+WireGuard runs over UDP and stays silent towards unauthenticated peers, so
+latency is measured with a TCP connect. A refused connection (RST) still
+travels the full round trip and counts as a valid measurement. Results are
+cached on disk with a TTL so repeated ``best``/``connect --auto`` calls do
+not re-probe the whole catalog. When the client's location is known (see
+core.net.geoip), only the geographically nearest servers are probed.
+"""
+
+import os
+import json
+import math
+import time
+import socket
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('anidata_probe')
+
+PROBE_CACHE_FILE = os.path.join(os.path.expanduser("~/.anidata"), "cache", "probes.json")
+PROBE_TTL = 300  # seconds
+DEFAULT_PROBE_PORT = 443
+DEFAULT_TIMEOUT = 1.5
+DEFAULT_CONCURRENCY = 64
+
+
+def probe_rtt(host: str, port: int = DEFAULT_PROBE_PORT, timeout: float = DEFAULT_TIMEOUT) -> Optional[float]:
+    """
+    Measure a TCP connect round trip
+
+    Returns:
+        Round trip in milliseconds, or None if the host did not answer
+    """
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            pass
+    except ConnectionRefusedError:
+        pass
+    except OSError:
+        return None
+    return (time.perf_counter() - start) * 1000
+
+
+class ProbeCache:
+    """
+    Probe results keyed by server ID and probed address, persisted to disk
+
+    A server whose address or probe port changed is measured again rather
+    than inheriting the old RTT.
+    """
+
+    def __init__(self, cache_file: str = PROBE_CACHE_FILE, ttl: float = PROBE_TTL):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.entries: Dict[str, Dict] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.cache_file, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logger.debug(f"Could not write probe cache: {str(e)}")
+
+    @staticmethod
+    def key(server_id: str, host: str, port: int) -> str:
+        return f"{server_id}|{host}:{port}"
+
+    def get(self, server_id: str, host: str, port: int) -> Optional[Dict]:
+        """Fresh entry for a server at ``host``:``port``, or None if missing/expired"""
+        entry = self.entries.get(self.key(server_id, host, port))
+        if entry and time.time() - entry.get("timestamp", 0) < self.ttl:
+            return entry
+        return None
+
+    def put(self, server_id: str, host: str, port: int, rtt_ms: Optional[float]) -> Dict:
+        entry = {"rtt_ms": rtt_ms, "timestamp": time.time()}
+        self.entries[self.key(server_id, host, port)] = entry
+        return entry
+
+
+def probe_servers(servers: List[Dict],
+                  port: int = DEFAULT_PROBE_PORT,
+                  timeout: float = DEFAULT_TIMEOUT,
+                  concurrency: int = DEFAULT_CONCURRENCY,
+                  cache: ProbeCache = None,
+                  refresh: bool = False) -> Dict[str, Optional[float]]:
+    """
+    Probe servers in parallel, reusing fresh cached results
+
+    Args:
+        servers: Catalog entries (need ``id`` and ``ip``)
+        port: TCP port to probe
+        timeout: Per-probe timeout in seconds
+        concurrency: Maximum probes in flight
+        cache: Probe cache (a default one is created if None)
+        refresh: Ignore cached results
+
+    Returns:
+        Mapping of server ID to RTT in milliseconds (None if unreachable)
+    """
+    cache = cache or ProbeCache()
+    results = {}
+    to_probe = []
+
+    for server in servers:
+        entry = None if refresh or not server.get("ip") else cache.get(server["id"], server["ip"], port)
+        if entry is not None:
+            results[server["id"]] = entry["rtt_ms"]
+        elif server.get("ip"):
+            to_probe.append(server)
+
+    if to_probe:
+        workers = max(1, min(concurrency, len(to_probe)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            rtts = pool.map(lambda s: probe_rtt(s["ip"], port, timeout), to_probe)
+            for server, rtt in zip(to_probe, rtts):
+                cache.put(server["id"], server["ip"], port, rtt)
+                results[server["id"]] = rtt
+        cache.save()
+
+    return results
+
+
+def rank_servers(servers: List[Dict], rtts: Dict[str, Optional[float]]) -> List[Dict]:
+    """Reachable active servers, lowest RTT first"""
+    candidates = [
+        server for server in servers
+        if rtts.get(server["id"]) is not None and server.get("status", "active") == "active"
+    ]
+    return sorted(candidates, key=lambda server: rtts[server["id"]])
+
+
+def select_best_server(servers: List[Dict], rtts: Dict[str, Optional[float]]) -> Optional[Dict]:
+    """Reachable active server with the lowest RTT"""
+    ranked = rank_servers(servers, rtts)
+    return ranked[0] if ranked else None
+
+
+def distance_km(latitude1: float, longitude1: float, latitude2: float, longitude2: float) -> float:
+    """Great-circle distance (haversine)"""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(longitude2 - longitude1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 6371.0 * 2 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def nearest_servers(servers: List[Dict], latitude: float, longitude: float,
+                    limit: Optional[int] = None) -> List[Dict]:
+    """Servers sorted by distance from a point (servers without coordinates last)"""
+    def key(server):
+        coordinates = server.get("coordinates") or {}
+        if coordinates.get("latitude") is None or coordinates.get("longitude") is None:
+            return math.inf
+        return distance_km(latitude, longitude, coordinates["latitude"], coordinates["longitude"])
+
+    ranked = sorted(servers, key=key)
+    return ranked[:limit] if limit else ranked
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Connection Watchdog
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Dead tunnel detection and recovery policy.
+
+A tunnel can be dead while its interface is still up: the server went
+away, a NAT mapping expired, the laptop woke up on another network.
+WireGuard shows it two ways. The latest handshake stops moving: a live
+session re-keys every two minutes while packets flow (persistent
+keepalive keeps them flowing) and its keys are refused after three
+minutes. And the receive counter stands still while the transmit
+counter keeps growing.
+
+``Watchdog`` turns periodic ``Sample``s into a verdict, then drives the
+recovery: reconnection attempts spaced by an exponential backoff with
+jitter (clients dropped by the same server do not come back in lockstep),
+and a failover to the next server of the latency ranking after
+``failover_after`` failures. It keeps time-to-recover metrics. The loop
+itself belongs to the caller: the daemon runs it on its event loop,
+``RealVPNManager`` in its monitoring thread.
+
+Thresholds can be set in the catalog under ``settings.watchdog``:
+
+    {"handshake_timeout": 180, "rx_stall_timeout": 60, "failover_after": 3}
+"""
+
+import time
+import random
+import logging
+from typing import Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger('anidata_watchdog')
+
+
+class Thresholds(NamedTuple):
+    check_interval: float = 5.0            # seconds between samples
+    handshake_timeout: float = 180.0       # WireGuard rejects session keys after 180 s
+    first_handshake_timeout: float = 20.0  # after (re)connecting
+    rx_stall_timeout: float = 60.0         # sending without receiving anything
+    failover_after: int = 3                # failed attempts before changing server
+    backoff_initial: float = 1.0
+    backoff_max: float = 60.0
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict]) -> "Thresholds":
+        settings = settings or {}
+        return cls(**{name: type(default)(settings[name])
+                      for name, default in cls._field_defaults.items() if name in settings})
+
+
+class Sample(NamedTuple):
+    time: float
+    interface_up: bool
+    latest_handshake: Optional[float]  # Unix time, 0 if never, None if unknown
+    rx_bytes: int
+    tx_bytes: int
+
+
+class Backoff:
+    """
+    Exponential delays with "equal jitter": half fixed, half random
+    """
+
+    def __init__(self, initial: float = 1.0, maximum: float = 60.0, factor: float = 2.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        ceiling = min(self.maximum, self.initial * self.factor ** self.attempts)
+        self.attempts += 1
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def reset(self) -> None:
+        self.attempts = 0
+
+
+class Watchdog:
+    """
+    Health verdicts and recovery decisions for one tunnel
+    """
+
+    def __init__(self, thresholds: Thresholds = None):
+        self.thresholds = thresholds or Thresholds()
+        self.backoff = Backoff(self.thresholds.backoff_initial, self.thresholds.backoff_max)
+        self.failures = 0                   # failed attempts on the current server
+        self.outage_started: Optional[float] = None
+        self.reason: Optional[str] = None
+        self.metrics = {
+            "outages": 0,
+            "recoveries": 0,
+            "failovers": 0,
+            "attempts": 0,
+            "failed_attempts": 0,
+            "last_time_to_recover": None,
+            "max_time_to_recover": None,
+            "total_time_to_recover": 0.0,
+        }
+        self._started = time.time()
+        self._last_rx: Optional[int] = None
+        self._rx_progress_at = self._started
+        self._tx_at_rx_progress = 0
+
+    # ------------------------------------------------------------------
+    # Health
+    # ------------------------------------------------------------------
+
+    def connected(self, now: float = None) -> None:
+        """A connection was (re)established: restart the checks, close the outage"""
+        now = now or time.time()
+        self._started = now
+        self._last_rx = None
+        self._rx_progress_at = now
+        if self.outage_started is not None:
+            elapsed = now - self.outage_started
+            self.metrics["recoveries"] += 1
+            self.metrics["last_time_to_recover"] = round(elapsed, 3)
+            self.metrics["max_time_to_recover"] = round(max(elapsed, self.metrics["max_time_to_recover"] or 0), 3)
+            self.metrics["total_time_to_recover"] += elapsed
+            logger.info(f"Tunnel recovered in {elapsed:.1f} s")
+        self.outage_started = None
+        self.reason = None
+        self.failures = 0
+        self.backoff.reset()
+
+    def _verdict(self, sample: Sample) -> Optional[str]:
+        t = self.thresholds
+        if not sample.interface_up:
+            return "interface missing"
+
+        if sample.latest_handshake:
+            age = sample.time - sample.latest_handshake
+            if age > t.handshake_timeout:
+                return f"no handshake for {age:.0f} s"
+        elif sample.latest_handshake == 0 and sample.time - self._started > t.first_handshake_timeout:
+            return "no handshake since connecting"
+
+        if sample.rx_bytes != self._last_rx:
+            self._last_rx = sample.rx_bytes
+            self._rx_progress_at = sample.time
+            self._tx_at_rx_progress = sample.tx_bytes
+        elif sample.tx_bytes > self._tx_at_rx_progress and sample.time - self._rx_progress_at > t.rx_stall_timeout:
+            return f"nothing received for {sample.time - self._rx_progress_at:.0f} s while sending"
+        return None
+
+    def check(self, sample: Sample) -> Optional[str]:
+        """Reason why the tunnel is unhealthy (an outage starts), None if healthy"""
+        reason = self._verdict(sample)
+        if reason is not None and self.outage_started is None:
+            self.outage_started = sample.time
+            self.reason = reason
+            self.metrics["outages"] += 1
+        return reason
+
+    # ------------------------------------------------------------------
+    # Recovery
+    # ------------------------------------------------------------------
+
+    def next_delay(self) -> float:
+        """Seconds to wait before the next attempt"""
+        return self.backoff.next_delay()
+
+    def attempt_started(self) -> None:
+        self.metrics["attempts"] += 1
+
+    def attempt_failed(self) -> None:
+        self.failures += 1
+        self.metrics["failed_attempts"] += 1
+
+    def should_fail_over(self) -> bool:
+        return self.failures >= self.thresholds.failover_after
+
+    def failed_over(self, server_id: str) -> None:
+        """Attempts now target ``server_id``: its failures count from zero"""
+        logger.warning(f"Failing over to {server_id} after {self.failures} failed attempts")
+        self.failures = 0
+        self.metrics["failovers"] += 1
+
+    def status(self) -> Dict:
+        recoveries = self.metrics["recoveries"]
+        return {
+            "healthy": self.outage_started is None,
+            "reason": self.reason,
+            "outage_duration": round(time.time() - self.outage_started, 1) if self.outage_started else 0.0,
+            "failures": self.failures,
+            "mean_time_to_recover": (round(self.metrics["total_time_to_recover"] / recoveries, 3)
+                                     if recoveries else None),
+            **{k: v for k, v in self.metrics.items() if k != "total_time_to_recover"},
+        }
+
+
+def failover_candidates(servers: List[Dict], exclude: List[str], limit: int = 16) -> List[Dict]:
+    """
+    Servers ranked by latency, without ``exclude``
+
+    Only the ``limit`` nearest are probed when the client's location is
+    known (offline GeoIP); cached probe results are reused. Blocking.
+    """
+    from .probe import nearest_servers, probe_servers, rank_servers
+
+    candidates = [server for server in servers if server.get("id") not in exclude]
+    if len(candidates) > limit:
+        from core.net.geoip import locate_client
+        here = locate_client()
+        if here is not None and here.latitude is not None:
+            candidates = nearest_servers(candidates, here.latitude, here.longitude, limit)
+    return rank_servers(candidates, probe_servers(candidates))
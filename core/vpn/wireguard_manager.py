@@ -16,22 +16,41 @@ import random
 import logging
 from datetime import datetime, timedelta
 
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(os.path.expanduser("~/.anidata/logs/vpn.log"), mode='a')
-    ]
-)
 logger = logging.getLogger("wireguard_manager")
+_logging_configured = False
+
+def _setup_logging():
+    """Configure la journalisation (console + ~/.anidata/logs/vpn.log) au premier usage
+    
+    Fait à la création du gestionnaire plutôt qu'à l'import : importer le module
+    ne doit ni ouvrir de fichier ni échouer si le dossier de logs n'existe pas.
+    """
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
+    
+    handlers = [logging.StreamHandler()]
+    log_dir = os.path.expanduser("~/.anidata/logs")
+    try:
+        os.makedirs(log_dir, exist_ok=True)
+        handlers.append(logging.FileHandler(os.path.join(log_dir, "vpn.log"), mode='a'))
+    except OSError:
+        pass
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
 
 class RealVPNManager:
     """Gestionnaire VPN qui établit de véritables connexions WireGuard sécurisées"""
     
     def __init__(self, config_dir=None, servers_file=None):
         """Initialise le gestionnaire VPN avec les chemins de configuration"""
+        _setup_logging()
+        
         # Configurer les chemins
         self.home_dir = os.path.expanduser("~/.anidata")
         self.config_dir = config_dir or os.path.join(self.home_dir, "config/wireguard")
@@ -47,6 +66,11 @@ class RealVPNManager:
         self.original_gateway = None
         self.connection_start_time = 0
         
+        # Surveillance : reconnexion automatique (voir core.vpn.watchdog)
+        self.watchdog = None
+        self.connection_config = None
+        self._monitor_stop = None
+        
         # Statistiques réseau
         self.last_rx_bytes = 0
         self.last_tx_bytes = 0
@@ -173,8 +197,13 @@ class RealVPNManager:
         """Génère une clé publique factice pour les serveurs de démonstration"""
         return "".join(random.choice("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz") for _ in range(44)) + "="
     
-    def create_wireguard_config(self, server):
-        """Crée un fichier de configuration WireGuard pour un serveur donné"""
+    def create_wireguard_config(self, server, allowed_ips=None):
+        """
+        Crée un fichier de configuration WireGuard pour un serveur donné
+
+        allowed_ips : réseaux passant par le tunnel (CIDRSet de core.net.cidr
+        ou texte au format AllowedIPs), tout le trafic si None
+        """
         try:
             # Lire la clé privée
             private_key_path = os.path.join(self.keys_dir, "private_key")
@@ -188,6 +217,17 @@ class RealVPNManager:
             server_public_key = server.get('public_key', 'SERVER_PUBLIC_KEY_PLACEHOLDER')
             server_endpoint = f"{server.get('ip', '127.0.0.1')}:{server.get('port', 51820)}"
             
+            # Réseaux du tunnel : wg-quick installe une route par préfixe
+            if allowed_ips is None:
+                allowed_ips = "0.0.0.0/0, ::/0"
+            elif not isinstance(allowed_ips, str) and not allowed_ips.is_everything():
+                from core.net.cidr import CIDRSet
+                try:
+                    # Jamais le serveur lui-même dans le tunnel
+                    allowed_ips = allowed_ips - CIDRSet([server.get('ip', '127.0.0.1')])
+                except ValueError:
+                    pass  # nom d'hôte
+            
             # Générer un IP client unique
             client_ip = f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(2, 254)}/32"
             
@@ -199,7 +239,7 @@ DNS = 1.1.1.1, 8.8.8.8
 
 [Peer]
 PublicKey = {server_public_key}
-AllowedIPs = 0.0.0.0/0, ::/0
+AllowedIPs = {allowed_ips}
 Endpoint = {server_endpoint}
 PersistentKeepalive = 25
 """
@@ -284,10 +324,18 @@ PersistentKeepalive = 25
         
         try:
             # 1. Créer le fichier de configuration WireGuard
-            config_path = self.create_wireguard_config(server)
+            allowed_ips = connection_config.get('allowed_ips')
+            if allowed_ips is None and (connection_config.get('include_networks')
+                                        or connection_config.get('exclude_networks')):
+                from core.net.cidr import route_policy
+                allowed_ips = route_policy(connection_config.get('include_networks'),
+                                           connection_config.get('exclude_networks'))
+            config_path = self.create_wireguard_config(server, allowed_ips)
             if not config_path:
                 return False
             self.config_file = config_path
+            # wg-quick nomme l'interface d'après le fichier de configuration
+            self.wireguard_interface = os.path.splitext(os.path.basename(config_path))[0]
             
             # 2. Sauvegarder la configuration réseau actuelle
             self.save_original_gateway()
@@ -314,14 +362,20 @@ PersistentKeepalive = 25
             self.connected = True
             self.current_server = server
             self.connection_start_time = time.time()
-            
-            # 6. Démarrer le thread de surveillance
-            if self.connection_thread and self.connection_thread.is_alive():
-                self.connection_thread.join(1)
-            
-            self.connection_thread = threading.Thread(target=self.monitor_connection)
-            self.connection_thread.daemon = True
-            self.connection_thread.start()
+            self.connection_config = dict(connection_config)
+            
+            # 6. Démarrer le thread de surveillance (sauf reconnexion depuis ce thread)
+            if threading.current_thread() is not self.connection_thread:
+                if self._monitor_stop is not None:
+                    self._monitor_stop.set()  # surveillance précédente, peut-être en pleine reconnexion
+                if self.connection_thread and self.connection_thread.is_alive():
+                    self.connection_thread.join(1)
+                
+                self._monitor_stop = threading.Event()
+                self.connection_thread = threading.Thread(target=self.monitor_connection,
+                                                          args=(self._monitor_stop,))
+                self.connection_thread.daemon = True
+                self.connection_thread.start()
             
             logger.info(f"Connecté avec succès à {server['country']} - {server['city']}")
             return True
@@ -329,11 +383,19 @@ PersistentKeepalive = 25
         except Exception as e:
             logger.error(f"Erreur lors de la connexion: {e}")
             # Tenter de nettoyer en cas d'erreur
-            self.disconnect()
+            self._teardown()
             return False
     
     def disconnect(self):
         """Déconnecte le VPN et restaure les paramètres réseau"""
+        # Déconnexion demandée : la surveillance ne doit pas reconnecter
+        if self._monitor_stop is not None:
+            self._monitor_stop.set()
+        self.connection_config = None
+        return self._teardown()
+    
+    def _teardown(self):
+        """Désactive l'interface sans toucher à la surveillance"""
         if not self.connected and not self.config_file:
             logger.info("Pas de connexion active à déconnecter")
             return True
@@ -370,29 +432,100 @@ PersistentKeepalive = 25
             logger.error(f"Erreur lors de la déconnexion: {e}")
             return False
     
-    def monitor_connection(self):
-        """Surveille la connexion VPN et collecte des statistiques"""
+    def _health_sample(self):
+        """Échantillon pour le watchdog : interface, dernier handshake, compteurs"""
+        from core.vpn.watchdog import Sample
+        
+        now = time.time()
+        try:
+            with open(f"/sys/class/net/{self.wireguard_interface}/statistics/rx_bytes", "r") as f:
+                rx_bytes = int(f.read())
+            with open(f"/sys/class/net/{self.wireguard_interface}/statistics/tx_bytes", "r") as f:
+                tx_bytes = int(f.read())
+        except (OSError, ValueError):
+            return Sample(now, False, None, 0, 0)
+        
+        try:
+            output = subprocess.check_output(
+                ["sudo", "-n", "wg", "show", self.wireguard_interface, "latest-handshakes"],
+                stderr=subprocess.DEVNULL, timeout=5
+            ).decode('utf-8')
+            times = [int(fields[1]) for fields in (line.split() for line in output.splitlines())
+                     if len(fields) == 2 and fields[1].isdigit()]
+            handshake = float(max(times, default=0))
+        except (subprocess.SubprocessError, OSError):
+            handshake = None  # inconnu : seuls les compteurs comptent
+        return Sample(now, True, handshake, rx_bytes, tx_bytes)
+    
+    def _next_server(self, tried):
+        """Serveur suivant du classement par latence, None s'il n'y en a plus"""
+        from core.vpn.watchdog import failover_candidates
+        try:
+            candidates = failover_candidates(self.servers, tried)
+        except Exception as e:
+            logger.error(f"Classement des serveurs impossible: {e}")
+            return None
+        return candidates[0] if candidates else None
+    
+    def _recover(self, stop):
+        """Reconnecte avec backoff exponentiel, bascule de serveur après N échecs"""
+        server = self.current_server or (self.connection_config or {}).get('server')
+        if not server or not self.connection_config:
+            return
+        tried = [server.get('id')]
+        
+        # L'interface est peut-être encore là : wg-quick up échouerait
+        self._teardown()
+        
+        while not stop.is_set():
+            if stop.wait(self.watchdog.next_delay()):
+                return
+            if self.watchdog.should_fail_over():
+                candidate = self._next_server(tried)
+                if candidate:
+                    server = candidate
+                    tried.append(server.get('id'))
+                    self.watchdog.failed_over(server.get('id'))
+            
+            logger.info(f"Reconnexion à {server.get('country')} - {server.get('city')}...")
+            self.watchdog.attempt_started()
+            if self.connect(dict(self.connection_config, server=server)):
+                return
+            self.watchdog.attempt_failed()
+    
+    def monitor_connection(self, stop=None):
+        """Surveille la connexion VPN, collecte des statistiques et reconnecte si elle meurt"""
+        from core.vpn.watchdog import Watchdog
+        
         logger.info("Démarrage de la surveillance de la connexion")
+        stop = stop or threading.Event()
+        if self.watchdog is None:
+            self.watchdog = Watchdog()
+        self.watchdog.connected()
+        last_check = time.time()
         
-        while self.connected:
+        while not stop.is_set():
             try:
-                # Vérifier si l'interface est toujours active
-                try:
-                    subprocess.check_output(["ip", "a", "show", "dev", self.wireguard_interface], stderr=subprocess.PIPE)
-                except subprocess.CalledProcessError:
-                    logger.warning("Interface VPN perdue, tentative de reconnexion...")
-                    self.connected = False
-                    break
-                
                 # Collecter les statistiques de bande passante
                 self.update_interface_stats()
                 
+                # Vérifier l'état du tunnel (handshake, trafic reçu)
+                if time.time() - last_check >= self.watchdog.thresholds.check_interval:
+                    last_check = time.time()
+                    reason = self.watchdog.check(self._health_sample())
+                    if reason:
+                        logger.warning(f"Connexion VPN défaillante ({reason}), tentative de reconnexion...")
+                        self._recover(stop)
+                        if self.connected:
+                            self.watchdog.connected()
+                        last_check = time.time()
+                
                 # Attendre avant la prochaine vérification
-                time.sleep(1)
+                stop.wait(min(1.0, self.watchdog.thresholds.check_interval))
                 
             except Exception as e:
                 logger.error(f"Erreur dans la surveillance de connexion: {e}")
-                time.sleep(5)  # Attendre plus longtemps en cas d'erreur
+                stop.wait(5)  # Attendre plus longtemps en cas d'erreur
         
         logger.info("Arrêt de la surveillance de la connexion")
     
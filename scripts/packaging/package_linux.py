@@ -10,9 +10,42 @@ import subprocess
 import platform
 import json
 import glob
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 import argparse
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+# Frozen executables, one directory per source fingerprint (survives dist/build cleanup)
+BUILD_CACHE_DIR = PROJECT_ROOT / ".build-cache"
+
+# Inputs of the PyInstaller bundle
+SOURCE_DIRS = ["core", "ui", "infrastructure", "scripts/simple_vpn.py"]
+SKIP_DIRS = {"__pycache__", ".git", "node_modules"}
+SKIP_SUFFIXES = {".pyc", ".pyo"}
+
+# Durée de chaque étape, affichée à la fin
+STAGE_TIMINGS = []
+
+@contextmanager
+def stage(name):
+    """Time a build stage for the final report"""
+    start = time.time()
+    try:
+        yield
+    finally:
+        STAGE_TIMINGS.append((name, time.time() - start))
+
+def print_timing_report(timings):
+    print("\nBuild timings:")
+    width = max((len(name) for name, _ in timings), default=0)
+    for name, seconds in timings:
+        print(f"  {name.ljust(width)}  {seconds:7.2f}s")
+    print(f"  {'total'.ljust(width)}  {sum(seconds for _, seconds in timings):7.2f}s")
+
 def check_requirements():
     """Check if all required packages are installed"""
     try:
@@ -238,22 +271,44 @@ esac
     
     return "dist/network"
 
-def build_linux_executable(app_info, icon_path):
-    """Build Linux executable using PyInstaller"""
+def source_fingerprint(app_info, icon_path, cmd):
+    """Hash of everything the frozen executable is built from"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(cmd).encode("utf-8"))
+    digest.update(json.dumps(app_info, sort_keys=True).encode("utf-8"))
+    
+    paths = [Path(icon_path)]
+    for entry in SOURCE_DIRS:
+        path = PROJECT_ROOT / entry
+        if path.is_file():
+            paths.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+            paths.extend(Path(root) / name for name in sorted(files)
+                         if Path(name).suffix not in SKIP_SUFFIXES)
+    
+    for path in paths:
+        if not path.is_file():
+            continue
+        digest.update(str(path.relative_to(PROJECT_ROOT) if PROJECT_ROOT in path.parents else path).encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()[:24]
+
+def build_linux_executable(app_info, icon_path, force=False):
+    """Build Linux executable using PyInstaller
+    
+    The bundle is cached under .build-cache/<fingerprint>: when sources,
+    assets and options are unchanged, the previous executable is reused
+    instead of running PyInstaller again.
+    """
     entry_point = app_info["entry_point"]
-    app_name = app_info["name"].replace(" ", "")
-    project_root = Path(__file__).resolve().parent.parent.parent
+    project_root = PROJECT_ROOT
     
     dist_dir = project_root / "dist"
-    build_dir = project_root / "build"
-    spec_file = project_root / f"{app_name}.spec"
-    
-    if dist_dir.exists():
-        shutil.rmtree(dist_dir)
-    if build_dir.exists():
-        shutil.rmtree(build_dir)
-    if spec_file.exists():
-        os.remove(spec_file)
+    dist_dir.mkdir(exist_ok=True)
     
     # Ensure entry point is a full path
     entry_point_path = project_root / entry_point
@@ -266,30 +321,49 @@ def build_linux_executable(app_info, icon_path):
         "pyinstaller",
         "--onefile",
         "--noconsole",
+        "--noconfirm",
         f"--icon={icon_path}",
         f"--name={app_info['package_name']}",
         f"--add-data={project_root}/ui/assets:ui/assets",
+        f"--add-data={project_root}/ui/maps:ui/maps",
         f"--add-data={project_root}/infrastructure:infrastructure",
         str(entry_point_path)
     ]
     
-    subprocess.run(cmd, check=True)
+    fingerprint = source_fingerprint(app_info, icon_path, cmd)
+    cached_executable = BUILD_CACHE_DIR / fingerprint / app_info['package_name']
+    executable = dist_dir / app_info['package_name']
+    
+    if cached_executable.exists() and not force:
+        print(f"Sources unchanged ({fingerprint}), reusing cached executable")
+        shutil.copy2(cached_executable, executable)
+    else:
+        # PyInstaller keeps its own analysis cache in build/: no wipe
+        subprocess.run(cmd, check=True, cwd=project_root)
+        cached_executable.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(executable, cached_executable)
+        
+        # Keep only the latest bundle
+        for old in BUILD_CACHE_DIR.iterdir():
+            if old.name != fingerprint:
+                shutil.rmtree(old, ignore_errors=True)
     
     # Create a symlink with space in name for better display
-    os.symlink(
-        f"{app_info['package_name']}", 
-        os.path.join("dist", app_info['name'].replace(" ", "\\ "))
-    )
+    link = os.path.join("dist", app_info['name'].replace(" ", "\\ "))
+    if not os.path.lexists(link):
+        os.symlink(f"{app_info['package_name']}", link)
     
     return "dist"
 
-def create_deb_package(app_info, executable_path, icon_path):
+def create_deb_package(app_info, executable_path, icon_path, desktop_file=None, network_files=None):
     """Create a Debian package (.deb)"""
     package_name = app_info["package_name"]
     version = "1.0.0"
     
     # Create directory structure
     deb_root = f"dist/{package_name}-{version}"
+    # Fresh staging tree: files from an earlier build must not end up in the package
+    shutil.rmtree(deb_root, ignore_errors=True)
     os.makedirs(f"{deb_root}/DEBIAN", exist_ok=True)
     os.makedirs(f"{deb_root}/usr/bin", exist_ok=True)
     os.makedirs(f"{deb_root}/usr/share/applications", exist_ok=True)
@@ -305,11 +379,11 @@ def create_deb_package(app_info, executable_path, icon_path):
     shutil.copy2(icon_path, f"{deb_root}/usr/share/icons/hicolor/256x256/apps/{package_name}.png")
     
     # Create desktop file
-    desktop_file = create_desktop_file(app_info, f"/usr/bin/{package_name}")
+    desktop_file = desktop_file or create_desktop_file(app_info, f"/usr/bin/{package_name}")
     shutil.copy2(desktop_file, f"{deb_root}/usr/share/applications/{package_name}.desktop")
     
     # Create network integration files
-    network_files = create_vpn_network_integration()
+    network_files = network_files or create_vpn_network_integration()
     for file in glob.glob(f"{network_files}/*"):
         if "nm-dispatcher" in file:
             shutil.copy2(file, f"{deb_root}/etc/NetworkManager/dispatcher.d/99-{package_name}")
@@ -401,7 +475,7 @@ exit 0
     print(f"Created Debian package: {deb_file}")
     return deb_file
 
-def create_rpm_package(app_info, executable_path, icon_path):
+def create_rpm_package(app_info, executable_path, icon_path, desktop_file=None, network_files=None):
     """Create an RPM package"""
     package_name = app_info["package_name"]
     version = "1.0.0"
@@ -488,7 +562,8 @@ fi
     with open(f"{package_name}.spec", "w") as f:
         f.write(spec_content)
     
-    # Prepare RPM build directories
+    # Prepare RPM build directories (fresh: no RPM or BUILDROOT left from an earlier build)
+    shutil.rmtree("rpmbuild", ignore_errors=True)
     for dir in ["BUILD", "RPMS", "SOURCES", "SPECS", "SRPMS"]:
         os.makedirs(f"rpmbuild/{dir}", exist_ok=True)
     
@@ -513,13 +588,14 @@ fi
         print("Failed to find built RPM package")
         return None
 
-def create_appimage(app_info, executable_path, icon_path):
+def create_appimage(app_info, executable_path, icon_path, desktop_file=None, network_files=None):
     """Create an AppImage package"""
     package_name = app_info["package_name"]
     version = "1.0.0"
     
     # Create AppDir structure
     appdir = f"dist/AppDir"
+    shutil.rmtree(appdir, ignore_errors=True)  # fresh staging tree
     os.makedirs(f"{appdir}/usr/bin", exist_ok=True)
     os.makedirs(f"{appdir}/usr/share/applications", exist_ok=True)
     os.makedirs(f"{appdir}/usr/share/icons/hicolor/256x256/apps", exist_ok=True)
@@ -552,12 +628,12 @@ exec "$APPDIR/usr/bin/{package_name}" "$@"
     shutil.copy2(icon_path, f"{appdir}/{package_name}.png")  # Root icon for AppImage
     
     # Create desktop file
-    desktop_file = create_desktop_file(app_info, f"/usr/bin/{package_name}")
+    desktop_file = desktop_file or create_desktop_file(app_info, f"/usr/bin/{package_name}")
     shutil.copy2(desktop_file, f"{appdir}/usr/share/applications/{package_name}.desktop")
     shutil.copy2(desktop_file, f"{appdir}/{package_name}.desktop")  # Root desktop file for AppImage
     
     # Create network integration files
-    network_files = create_vpn_network_integration()
+    network_files = network_files or create_vpn_network_integration()
     for file in glob.glob(f"{network_files}/*"):
         if not "nm-dispatcher" in file:  # Skip system files that need root installation
             shutil.copy2(file, f"{appdir}/usr/lib/{package_name}/{os.path.basename(file)}")
@@ -626,48 +702,77 @@ Save this file and restart NetworkManager.
     
     return nm_plugin_dir
 
+PACKAGE_BUILDERS = {
+    "deb": create_deb_package,
+    "rpm": create_rpm_package,
+    "appimage": create_appimage,
+}
+
+def _build_package(kind, app_info, executable_path, icon_path, desktop_file, network_files):
+    """Worker process: build one package type, report its duration"""
+    start = time.time()
+    try:
+        artifact = PACKAGE_BUILDERS[kind](app_info, executable_path, icon_path,
+                                          desktop_file=desktop_file, network_files=network_files)
+        return kind, artifact, time.time() - start, None
+    except Exception as e:
+        return kind, None, time.time() - start, str(e)
+
+def build_packages(kinds, app_info, executable_path, icon_path, jobs=None):
+    """Build the requested package types in parallel worker processes"""
+    # Shared inputs are written once, before the workers start
+    desktop_file = create_desktop_file(app_info, f"/usr/bin/{app_info['package_name']}")
+    network_files = create_vpn_network_integration()
+    
+    artifacts = {}
+    with ProcessPoolExecutor(max_workers=jobs or len(kinds)) as pool:
+        futures = [pool.submit(_build_package, kind, app_info, executable_path, icon_path,
+                               desktop_file, network_files) for kind in kinds]
+        for future in futures:
+            kind, artifact, seconds, error = future.result()
+            STAGE_TIMINGS.append((f"package {kind}", seconds))
+            if error:
+                print(f"Failed to create {kind.upper()} package: {error}")
+            else:
+                artifacts[kind] = artifact
+    return artifacts
+
 def main():
     parser = argparse.ArgumentParser(description="AniData VPN Linux Packaging Tool")
     parser.add_argument("--type", choices=["deb", "rpm", "appimage", "all"], default="all",
                         help="Type of package to build (default: all)")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Packages built in parallel (default: one process per type)")
+    parser.add_argument("--force-rebuild", action="store_true",
+                        help="Run PyInstaller even if sources are unchanged")
     args = parser.parse_args()
     
     if platform.system() != "Linux":
         print("This packaging script is intended for Linux only.")
         return
     
-    check_requirements()
+    with stage("requirements"):
+        check_requirements()
     app_info = get_app_info()
-    icon_path = get_icon_path()
+    with stage("icon"):
+        icon_path = get_icon_path()
     
     # Create network integration files
     create_network_manager_vpn_plugin(app_info)
     
     # Build executable
-    dist_dir = build_linux_executable(app_info, icon_path)
+    with stage("executable"):
+        dist_dir = build_linux_executable(app_info, icon_path, force=args.force_rebuild)
     executable_path = f"{dist_dir}/{app_info['package_name']}"
     print(f"Executable built at: {executable_path}")
     
     # Build packages based on type argument
-    if args.type in ["deb", "all"]:
-        try:
-            create_deb_package(app_info, executable_path, icon_path)
-        except Exception as e:
-            print(f"Failed to create DEB package: {e}")
-    
-    if args.type in ["rpm", "all"]:
-        try:
-            create_rpm_package(app_info, executable_path, icon_path)
-        except Exception as e:
-            print(f"Failed to create RPM package: {e}")
-    
-    if args.type in ["appimage", "all"]:
-        try:
-            create_appimage(app_info, executable_path, icon_path)
-        except Exception as e:
-            print(f"Failed to create AppImage: {e}")
+    kinds = list(PACKAGE_BUILDERS) if args.type == "all" else [args.type]
+    with stage("packages (wall)"):
+        build_packages(kinds, app_info, executable_path, icon_path, args.jobs)
     
     print("Packaging complete!")
+    print_timing_report(STAGE_TIMINGS)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -10,11 +10,24 @@ import platform
 import subprocess
 import argparse
 import datetime
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 VERSION = "1.0.0"
 RELEASE_DIR = "releases"
 
+# Empreintes publiées, calculées en une seule lecture
+DIGESTS = ("sha256", "blake2b")
+DIGEST_LABELS = {"sha256": "SHA256", "blake2b": "BLAKE2b"}
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+# Hors du dossier de sortie : tout ce qu'il contient est publié
+BUILD_CACHE_DIR = Path(__file__).resolve().parent.parent / ".build-cache"
+
+# Seuls les artefacts binaires ont des deltas
+DELTA_SUFFIXES = (".AppImage", ".deb", ".rpm", ".exe")
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Prépare une release d'AniData VPN")
     parser.add_argument('--version', '-v', default=VERSION,
@@ -26,6 +39,8 @@ def parse_arguments():
                         help='Ne pas nettoyer les anciens fichiers de build')
     parser.add_argument('--output', '-o', default=RELEASE_DIR,
                         help=f'Dossier de sortie pour les fichiers (par défaut: {RELEASE_DIR})')
+    parser.add_argument('--previous', default=None,
+                        help='Dossier de la release précédente (avec son manifest.json) pour générer les deltas')
     
     return parser.parse_args()
 
@@ -202,40 +217,157 @@ def build_linux_release(output_dir, version, pkg_type='all'):
         print(f"Erreur lors de la génération des packages Linux: {e}")
         return False
 
-def generate_checksums(output_dir):
-    """Génère des checksums pour tous les fichiers de release"""
+def build_deltas(output_dir, previous_dir, version):
+    """Génère les patchs binaires depuis la release précédente
+    
+    Pour chaque artefact de la release précédente, l'artefact correspondant
+    de cette version (même nom, version remplacée) reçoit un patch
+    <artefact>.from-<ancienne version>.adelta.
+    
+    Returns:
+        Entrées "deltas" du manifeste
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "update"))
+    from delta_update import make_delta
+    
+    try:
+        with open(os.path.join(previous_dir, "manifest.json"), 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Pas de manifeste dans {previous_dir}, deltas ignorés: {e}")
+        return []
+    
+    previous_version = previous.get("version")
+    deltas = []
+    for entry in previous.get("files", []):
+        old_name = entry["name"]
+        if not old_name.endswith(DELTA_SUFFIXES) or previous_version not in old_name:
+            continue
+        new_name = old_name.replace(previous_version, version)
+        old_path = os.path.join(previous_dir, old_name)
+        new_path = os.path.join(output_dir, new_name)
+        if not (os.path.exists(old_path) and os.path.exists(new_path)):
+            continue
+        
+        delta_name = f"{new_name}.from-{previous_version}.adelta"
+        header = make_delta(old_path, new_path, os.path.join(output_dir, delta_name),
+                            previous_version, version)
+        print(f"Delta {delta_name}: {header['patch_size']} octets au lieu de {header['new_size']}")
+        deltas.append({
+            "name": delta_name,
+            "artifact": new_name,
+            "from_version": previous_version,
+            "to_version": version,
+        })
+    return deltas
+
+def _hash_file(file_path, algorithms=DIGESTS, chunk_size=HASH_CHUNK_SIZE):
+    """Calcule plusieurs empreintes en une seule lecture du fichier"""
+    hashers = {name: hashlib.new(name) for name in algorithms}
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            for hasher in hashers.values():
+                hasher.update(view[:count])
+    return {name: hasher.hexdigest() for name, hasher in hashers.items()}
+
+def _load_hash_cache(cache_file):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def compute_digests(output_dir, files, workers=None):
+    """Empreintes des fichiers, en parallèle, sans recalculer ceux qui n'ont pas changé
+    
+    Le cache est indexé par (taille, mtime) : un artefact inchangé n'est jamais relu.
+    hashlib libère le GIL sur les gros blocs, les threads occupent donc tous les cœurs.
+    """
+    # Un cache par dossier de sortie, sous .build-cache/
+    output_key = hashlib.sha256(os.path.abspath(output_dir).encode('utf-8')).hexdigest()[:16]
+    cache_file = str(BUILD_CACHE_DIR / f"checksums-{output_key}.json")
+    cache = _load_hash_cache(cache_file)
+    
+    results = {}
+    to_hash = []
+    for file in files:
+        stat = os.stat(os.path.join(output_dir, file))
+        entry = cache.get(file)
+        if (entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns
+                and all(name in entry.get('digests', {}) for name in DIGESTS)):
+            results[file] = entry
+        else:
+            to_hash.append((file, stat))
+    
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            jobs = {file: pool.submit(_hash_file, os.path.join(output_dir, file)) for file, _ in to_hash}
+            for file, stat in to_hash:
+                results[file] = {
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'digests': jobs[file].result(),
+                }
+    print(f"{len(to_hash)} fichier(s) hachés, {len(files) - len(to_hash)} depuis le cache")
+    
+    # Le cache ne garde que les fichiers encore présents
+    os.makedirs(BUILD_CACHE_DIR, exist_ok=True)
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, cache_file)
+    return results
+
+def generate_checksums(output_dir, version=VERSION, deltas=None):
+    """Génère des checksums pour tous les fichiers de release
+    
+    Écrit checksums.txt (format BSD, une ligne par algorithme) et manifest.json.
+    """
     print("Génération des checksums...")
     
     checksums_file = os.path.join(output_dir, "checksums.txt")
+    manifest_file = os.path.join(output_dir, "manifest.json")
+    generated = datetime.datetime.now().isoformat()
     
     try:
+        # Cache des versions précédentes, écrit dans le dossier publié
+        legacy_cache = os.path.join(output_dir, ".checksums-cache.json")
+        if os.path.exists(legacy_cache):
+            os.remove(legacy_cache)
+        files = sorted(
+            file for file in os.listdir(output_dir)
+            if os.path.isfile(os.path.join(output_dir, file))
+            and file not in ("checksums.txt", "manifest.json")
+        )
+        digests = compute_digests(output_dir, files)
+        
         with open(checksums_file, 'w', encoding='utf-8') as f:
             f.write(f"# AniData VPN Checksums\n")
-            f.write(f"# Generated: {datetime.datetime.now().isoformat()}\n\n")
-            
-            for file in os.listdir(output_dir):
-                file_path = os.path.join(output_dir, file)
-                if os.path.isfile(file_path) and file != "checksums.txt":
-                    if platform.system() == "Windows":
-                        # Utiliser certutil sur Windows
-                        result = subprocess.run(
-                            ['certutil', '-hashfile', file_path, 'SHA256'],
-                            capture_output=True, text=True, check=True
-                        )
-                        # Extraire la ligne du hash (la deuxième ligne)
-                        hash_line = result.stdout.splitlines()[1].strip()
-                        f.write(f"SHA256 ({file}) = {hash_line}\n")
-                    else:
-                        # Utiliser sha256sum sur Linux/Mac
-                        result = subprocess.run(
-                            ['sha256sum', file_path],
-                            capture_output=True, text=True, check=True
-                        )
-                        # Format: <hash> <filename>
-                        hash_value = result.stdout.split()[0]
-                        f.write(f"SHA256 ({file}) = {hash_value}\n")
+            f.write(f"# Generated: {generated}\n\n")
+            for name in DIGESTS:
+                for file in files:
+                    f.write(f"{DIGEST_LABELS[name]} ({file}) = {digests[file]['digests'][name]}\n")
+        
+        manifest = {
+            'name': 'AniData VPN',
+            'version': version,
+            'generated': generated,
+            'files': [
+                dict(name=file, size=digests[file]['size'], **digests[file]['digests'])
+                for file in files
+            ],
+            'deltas': deltas or [],
+        }
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
         
         print(f"Checksums générés: {checksums_file}")
+        print(f"Manifeste généré: {manifest_file}")
         return True
     
     except Exception as e:
@@ -319,8 +451,11 @@ def main():
     # Générer des notes de version
     create_release_notes(output_dir, args.version)
     
+    # Patchs binaires depuis la release précédente
+    deltas = build_deltas(output_dir, args.previous, args.version) if args.previous else []
+    
     # Générer des checksums pour les fichiers
-    generate_checksums(output_dir)
+    generate_checksums(output_dir, args.version, deltas)
     
     print(f"\nPréparation de la release {args.version} terminée!")
     print(f"Fichiers disponibles dans: {output_dir}")
@@ -13,6 +13,9 @@ import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, font
 from PIL import Image, ImageTk, ImageDraw
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ui.tk import IndexedServerTree
+
 # Répertoire des configurations
 HOME_DIR = os.path.expanduser("~/.anidata")
 CONFIG_DIR = os.path.join(HOME_DIR, "config")
@@ -98,7 +101,17 @@ def check_wireguard():
     except:
         return False
 
-# Simuler une connexion VPN (pour démonstration)
+# Client du démon de contrôle : il possède le tunnel, les statistiques et le catalogue
+def connect_daemon_manager():
+    """Retourne un gestionnaire relié au démon AniData VPN, ou None s'il n'est pas lancé"""
+    try:
+        from core.daemon import connect_daemon, DaemonVPNManager
+    except ImportError:
+        return None
+    client = connect_daemon()
+    return DaemonVPNManager(client) if client else None
+
+# Simuler une connexion VPN (pour démonstration, sans démon)
 def simulate_vpn_connection(server):
     # En réalité, cette fonction appellerait le module WireGuard
     print(f"Connexion simulée au serveur {server['country']}, {server['city']}...")
@@ -111,6 +124,23 @@ def simulate_vpn_disconnection():
     time.sleep(1)
     return True
 
+def region_tag(server):
+    """Tag de style d'après la région du serveur"""
+    region = server.get("region", "").lower()
+    if "europe" in region:
+        return "europe"
+    elif "north america" in region:
+        return "namerica"
+    elif "asia" in region:
+        return "asia"
+    elif "south america" in region:
+        return "samerica"
+    elif "africa" in region:
+        return "africa"
+    elif "oceania" in region:
+        return "oceania"
+    return "default"
+
 # Classe principale de l'application
 class SimpleVPNApp:
     def __init__(self, root):
@@ -179,6 +209,7 @@ class SimpleVPNApp:
         self.connected = False
         self.selected_server = None
         self.connection_time = None
+        self.manager = connect_daemon_manager()
         
         # Création de l'interface
         self.create_ui()
@@ -186,8 +217,8 @@ class SimpleVPNApp:
         # Charger les serveurs
         self.load_server_list()
         
-        # Vérifier WireGuard
-        if not check_wireguard():
+        # Vérifier WireGuard (inutile avec le démon, qui pilote le tunnel)
+        if self.manager is None and not check_wireguard():
             messagebox.showwarning(
                 "WireGuard non installé", 
                 "WireGuard n'est pas installé sur votre système.\n\n"
@@ -298,8 +329,19 @@ class SimpleVPNApp:
         
         # Scrollbar pour la liste des serveurs
         scrollbar = ttk.Scrollbar(left_frame, orient="vertical", command=self.server_list.yview)
-        self.server_list.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Index iid -> serveur (plus de JSON dans les tags) et lignes créées à la demande
+        self.server_index = IndexedServerTree(
+            self.server_list,
+            lambda server: (
+                server.get("country", "Unknown"),
+                server.get("city", "Unknown"),
+                server.get("status", "active")
+            ),
+            row_tags=lambda server: (region_tag(server),),
+            scrollbar=scrollbar
+        )
         self.server_list.pack(fill=tk.BOTH, expand=True, pady=5)
         self.server_list.bind("<<TreeviewSelect>>", self.on_server_select)
         
@@ -491,38 +533,14 @@ class SimpleVPNApp:
         self.update_uptime()
     
     def load_server_list(self):
-        # Effacer la liste actuelle
-        for item in self.server_list.get_children():
-            self.server_list.delete(item)
-        
-        # Charger les serveurs
-        servers = load_servers()
-        
-        # Ajouter les serveurs à la liste
-        for server in servers:
-            # Déterminer la région pour le style
-            region = server.get("region", "").lower()
-            tag = "default"
-            
-            if "europe" in region:
-                tag = "europe"
-            elif "north america" in region:
-                tag = "namerica"
-            elif "asia" in region:
-                tag = "asia"
-            elif "south america" in region:
-                tag = "samerica"
-            elif "africa" in region:
-                tag = "africa"
-            elif "oceania" in region:
-                tag = "oceania"
-            
-            # Insérer le serveur avec son tag de région
-            self.server_list.insert("", tk.END, iid=server["id"], values=(
-                server.get("country", "Unknown"),
-                server.get("city", "Unknown"),
-                server.get("status", "active")
-            ), tags=[json.dumps(server), tag])
+        # Charger les serveurs (seule la première page de lignes est créée)
+        servers = None
+        if self.manager is not None:
+            try:
+                servers = self.manager.servers
+            except Exception as e:
+                print(f"Erreur lors du chargement des serveurs du démon: {e}")
+        self.server_index.set_servers(servers or load_servers())
             
         # Configurer les tags pour les couleurs par région (nuances de Bleu Azur)
         self.server_list.tag_configure("europe", background=self.colors["light_accent"])
@@ -533,13 +551,10 @@ class SimpleVPNApp:
         self.server_list.tag_configure("oceania", background="#3399FF")   # Bleu Azur soutenu
     
     def on_server_select(self, event):
-        selection = self.server_list.selection()
-        if selection:
-            item_id = selection[0]
-            tags = self.server_list.item(item_id, "tags")
-            if tags:
-                self.selected_server = json.loads(tags[0])
-                self.server_label.config(text=f"{self.selected_server['country']}, {self.selected_server['city']}")
+        server = self.server_index.selected_server()
+        if server:
+            self.selected_server = server
+            self.server_label.config(text=f"{self.selected_server['country']}, {self.selected_server['city']}")
     
     def connect(self):
         if not self.selected_server:
@@ -551,7 +566,7 @@ class SimpleVPNApp:
         self.root.update()
         
         # Vérifier WireGuard si protocole WireGuard sélectionné
-        if self.protocol_var.get() == "WireGuard" and not check_wireguard():
+        if self.manager is None and self.protocol_var.get() == "WireGuard" and not check_wireguard():
             response = messagebox.askquestion(
                 "WireGuard non installé", 
                 "WireGuard n'est pas installé. Voulez-vous l'installer maintenant?\n\n"
@@ -572,8 +587,16 @@ class SimpleVPNApp:
                 # Continuer en mode simulation
                 pass
         
-        # Simuler une connexion
-        success = simulate_vpn_connection(self.selected_server)
+        if self.manager is not None:
+            result = self.manager.connect(server_id=self.selected_server.get("id"))
+            success = result.get("success", False)
+            if not success:
+                self.status_label.config(text="Déconnecté", fg=self.colors["text_dark"])
+                messagebox.showerror("Échec de la connexion", result.get("error", "Erreur inconnue"))
+                return
+        else:
+            # Simuler une connexion
+            success = simulate_vpn_connection(self.selected_server)
         
         if success:
             self.connected = True
@@ -594,8 +617,14 @@ class SimpleVPNApp:
         if not self.connected:
             return
         
-        # Simuler une déconnexion
-        success = simulate_vpn_disconnection()
+        if self.manager is not None:
+            result = self.manager.disconnect()
+            success = result.get("success", False)
+            if not success:
+                messagebox.showerror("Échec de la déconnexion", result.get("error", "Erreur inconnue"))
+        else:
+            # Simuler une déconnexion
+            success = simulate_vpn_disconnection()
         
         if success:
             self.connected = False
@@ -628,14 +657,20 @@ class SimpleVPNApp:
     
     def update_statistics(self):
         if self.connected:
-            # Simuler des statistiques aléatoires
-            download = random.randint(50, 2000)
-            upload = random.randint(20, 500)
-            latency = random.randint(5, 200)
-            
-            self.download_label.config(text=f"{download} KB/s")
-            self.upload_label.config(text=f"{upload} KB/s")
-            self.latency_label.config(text=f"{latency} ms")
+            if self.manager is not None:
+                # Statut poussé par le démon : pas d'aller-retour
+                statistics = self.manager.get_status().get("statistics", {})
+                self.download_label.config(text=f"{statistics.get('download_speed', 0) * 1024:.0f} KB/s")
+                self.upload_label.config(text=f"{statistics.get('upload_speed', 0) * 1024:.0f} KB/s")
+            else:
+                # Simuler des statistiques aléatoires
+                download = random.randint(50, 2000)
+                upload = random.randint(20, 500)
+                latency = random.randint(5, 200)
+                
+                self.download_label.config(text=f"{download} KB/s")
+                self.upload_label.config(text=f"{upload} KB/s")
+                self.latency_label.config(text=f"{latency} ms")
             
             # Programmer la prochaine mise à jour
             self.root.after(2000, self.update_statistics)
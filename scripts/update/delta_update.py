@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Delta Updates
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Block-level binary deltas between consecutive release artifacts.
+
+Release side (``make``): the previous artifact is indexed in fixed blocks
+(rsync-style weak rolling checksum + BLAKE2b); the new artifact is scanned
+with the rolling checksum, so blocks that moved are still found. The patch
+is a stream of operations: COPY a range of the old file, or LITERAL bytes
+(LZMA-compressed, at most 1 MiB each).
+
+Client side (``apply`` / ``update``): the patch is read as it downloads.
+Every operation carries a digest of the bytes it produces, so a corrupt or
+truncated patch is detected at the first bad operation, and the result
+must match the SHA-256 announced in the header (and in the release
+manifest). Any failure falls back to downloading the full artifact.
+
+Patch layout::
+
+    MAGIC | u32 header length | JSON header
+    ("C" | u64 offset | u32 length | digest)*      copy from old file
+    ("L" | u32 size | u32 packed size | digest | data)*
+    "E"
+
+Usage::
+
+    delta_update.py make OLD NEW -o PATCH [--from-version A --to-version B]
+    delta_update.py apply OLD PATCH -o NEW
+    delta_update.py update --base-url URL --artifact-template NAME_{version}.AppImage \\
+                           --current-version 1.0.0 --cache-dir DIR
+"""
+
+import os
+import sys
+import json
+import lzma
+import mmap
+import struct
+import hashlib
+import argparse
+import tempfile
+import urllib.request
+from itertools import accumulate, compress, count
+from operator import sub
+
+MAGIC = b"ADLT\x01"
+BLOCK_SIZE = 4096
+MAX_LITERAL = 1024 * 1024
+COPY_CHUNK = 1024 * 1024
+OP_DIGEST_SIZE = 8
+DOWNLOAD_CHUNK = 256 * 1024
+SCAN_WINDOW = 256 * 1024
+
+_COPY = struct.Struct(">QI")
+_LITERAL = struct.Struct(">II")
+_U32 = struct.Struct(">I")
+
+
+class DeltaError(Exception):
+    """Patch unusable (corrupt, truncated, or for another base file)"""
+
+
+def _op_digest(data) -> bytes:
+    return hashlib.blake2b(data, digest_size=OP_DIGEST_SIZE).digest()
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(COPY_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ----------------------------------------------------------------------
+# Release side
+# ----------------------------------------------------------------------
+
+def _weak(block: bytes):
+    """rsync weak checksum, kept exact: a = sum of bytes, b = sum of prefix sums"""
+    return sum(block), sum(accumulate(block))
+
+
+def _index_blocks(old, block_size: int):
+    """
+    Index the aligned blocks of ``old``
+
+    Returns:
+        ({a: {b}} weak checksums, {strong hash: offset})
+    """
+    weak, strong = {}, {}
+    for offset in range(0, len(old) - block_size + 1, block_size):
+        block = old[offset:offset + block_size]
+        a, b = _weak(block)
+        weak.setdefault(a, set()).add(b)
+        strong.setdefault(hashlib.blake2b(block, digest_size=16).digest(), offset)
+    return weak, strong
+
+
+def _weak_hits(weak: dict, data: bytes, block_size: int):
+    """
+    Offsets in ``data`` whose window has a weak checksum present in ``weak``
+
+    Windows are first filtered on their byte sum with map/accumulate, so
+    the per-byte work stays in C; the second sum is only computed for the
+    few windows that pass.
+    """
+    # p[i] = sum(data[:i]), s[i] = sum(p[:i])
+    p = list(accumulate(data, initial=0))
+    s = list(accumulate(p, initial=0))
+    for i in compress(count(), map(weak.__contains__, map(sub, p[block_size:], p))):
+        b = s[i + block_size + 1] - s[i + 1] - block_size * p[i]
+        if b in weak[p[i + block_size] - p[i]]:
+            yield i
+
+
+def compute_ops(old, new, block_size: int = BLOCK_SIZE):
+    """
+    Delta operations turning ``old`` into ``new`` (bytes or mmap)
+
+    Blocks that keep matching are checked one strong hash at a time; after
+    a mismatch, ``new`` is scanned for the next candidate in windows that
+    grow up to SCAN_WINDOW bytes, which bounds the memory used.
+
+    Returns:
+        List of ("C", offset, length) and ("L", start, end) (range of ``new``)
+    """
+    weak, strong = _index_blocks(old, block_size)
+    ops = []
+
+    def emit_copy(offset, length):
+        last = ops[-1] if ops else None
+        if last and last[0] == "C" and last[1] + last[2] == offset:
+            ops[-1] = ("C", last[1], last[2] + length)
+        else:
+            ops.append(("C", offset, length))
+
+    def emit_literal(start, end):
+        for chunk_start in range(start, end, MAX_LITERAL):
+            ops.append(("L", chunk_start, min(end, chunk_start + MAX_LITERAL)))
+
+    def match(pos):
+        return strong.get(hashlib.blake2b(new[pos:pos + block_size], digest_size=16).digest())
+
+    n = len(new)
+    pos = literal_start = 0
+    window = block_size
+    while pos + block_size <= n:
+        offset = match(pos)
+        if offset is None:
+            # Look for the next window whose weak checksum is known
+            data = new[pos + 1:min(n, pos + window + block_size)]
+            found = False
+            for hit in _weak_hits(weak, data, block_size):
+                offset = match(pos + 1 + hit)
+                if offset is not None:
+                    pos += 1 + hit
+                    found = True
+                    break
+            if not found:
+                pos += max(1, len(data) - block_size + 1)
+                window = min(window * 2, SCAN_WINDOW)
+                continue
+        emit_literal(literal_start, pos)
+        emit_copy(offset, block_size)
+        pos += block_size
+        literal_start = pos
+        window = block_size
+
+    emit_literal(literal_start, n)
+    return ops
+
+
+def _map_file(f):
+    """Read-only mmap of ``f`` (empty bytes for an empty file)"""
+    if os.fstat(f.fileno()).st_size == 0:
+        return b""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def make_delta(old_path: str, new_path: str, patch_path: str,
+               from_version: str = None, to_version: str = None,
+               block_size: int = BLOCK_SIZE) -> dict:
+    """
+    Write the patch from ``old_path`` to ``new_path``
+
+    Both artifacts are memory-mapped rather than read in full.
+
+    Returns:
+        Header of the patch, plus its size under "patch_size"
+    """
+    with open(old_path, "rb") as old_file, open(new_path, "rb") as new_file:
+        old = _map_file(old_file)
+        new = _map_file(new_file)
+        try:
+            ops = compute_ops(old, new, block_size)
+            header = {
+                "from_version": from_version,
+                "to_version": to_version,
+                "old_size": len(old),
+                "old_sha256": _file_sha256(old_path),
+                "new_size": len(new),
+                "new_sha256": _file_sha256(new_path),
+                "block_size": block_size,
+                "copied": sum(op[2] for op in ops if op[0] == "C"),
+            }
+            header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+
+            tmp_path = f"{patch_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(MAGIC)
+                f.write(_U32.pack(len(header_bytes)))
+                f.write(header_bytes)
+                for op in ops:
+                    if op[0] == "C":
+                        _, offset, length = op
+                        op_digest = hashlib.blake2b(digest_size=OP_DIGEST_SIZE)
+                        for chunk_start in range(offset, offset + length, COPY_CHUNK):
+                            op_digest.update(old[chunk_start:min(offset + length, chunk_start + COPY_CHUNK)])
+                        f.write(b"C" + _COPY.pack(offset, length) + op_digest.digest())
+                    else:
+                        _, start, end = op
+                        raw = new[start:end]
+                        packed = lzma.compress(raw, preset=6)
+                        f.write(b"L" + _LITERAL.pack(end - start, len(packed)) + _op_digest(raw))
+                        f.write(packed)
+                f.write(b"E")
+            os.replace(tmp_path, patch_path)
+        finally:
+            for mapped in (old, new):
+                if isinstance(mapped, mmap.mmap):
+                    mapped.close()
+
+    header["patch_size"] = os.path.getsize(patch_path)
+    return header
+
+
+# ----------------------------------------------------------------------
+# Client side
+# ----------------------------------------------------------------------
+
+def _read_exact(stream, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise DeltaError("Patch truncated")
+        data += chunk
+    return data
+
+
+def read_header(stream) -> dict:
+    if _read_exact(stream, len(MAGIC)) != MAGIC:
+        raise DeltaError("Not an AniData delta patch")
+    (length,) = _U32.unpack(_read_exact(stream, _U32.size))
+    try:
+        return json.loads(_read_exact(stream, length).decode("utf-8"))
+    except ValueError as e:
+        raise DeltaError(f"Bad patch header: {e}")
+
+
+def apply_delta(old_path: str, patch_stream, out_path: str, expected_sha256: str = None) -> dict:
+    """
+    Apply a patch read from ``patch_stream`` (file or HTTP response)
+
+    The output is written to a temporary file and only renamed to
+    ``out_path`` once every operation and the final SHA-256 have matched.
+
+    Raises:
+        DeltaError: Wrong base file, corrupt or truncated patch
+    """
+    header = read_header(patch_stream)
+    if os.path.getsize(old_path) != header["old_size"] or _file_sha256(old_path) != header["old_sha256"]:
+        raise DeltaError("Installed artifact does not match the patch base")
+    if expected_sha256 and expected_sha256 != header["new_sha256"]:
+        raise DeltaError("Patch does not produce the announced artifact")
+
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, prefix=".delta-")
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out, open(old_path, "rb") as old:
+            while True:
+                tag = _read_exact(patch_stream, 1)
+                if tag == b"E":
+                    break
+                if tag == b"C":
+                    offset, length = _COPY.unpack(_read_exact(patch_stream, _COPY.size))
+                    expected = _read_exact(patch_stream, OP_DIGEST_SIZE)
+                    if offset + length > header["old_size"]:
+                        raise DeltaError("Copy outside of the base file")
+                    op_digest = hashlib.blake2b(digest_size=OP_DIGEST_SIZE)
+                    old.seek(offset)
+                    remaining = length
+                    while remaining:
+                        chunk = old.read(min(COPY_CHUNK, remaining))
+                        op_digest.update(chunk)
+                        digest.update(chunk)
+                        out.write(chunk)
+                        remaining -= len(chunk)
+                    written += length
+                elif tag == b"L":
+                    size, packed_size = _LITERAL.unpack(_read_exact(patch_stream, _LITERAL.size))
+                    expected = _read_exact(patch_stream, OP_DIGEST_SIZE)
+                    try:
+                        chunk = lzma.decompress(_read_exact(patch_stream, packed_size))
+                    except lzma.LZMAError as e:
+                        raise DeltaError(f"Corrupt literal: {e}")
+                    if len(chunk) != size:
+                        raise DeltaError("Literal size mismatch")
+                    op_digest = hashlib.blake2b(chunk, digest_size=OP_DIGEST_SIZE)
+                    digest.update(chunk)
+                    out.write(chunk)
+                    written += size
+                else:
+                    raise DeltaError(f"Unknown operation {tag!r}")
+
+                # Verify as we go: stop at the first bad block
+                if op_digest.digest() != expected:
+                    raise DeltaError(f"Checksum mismatch at output offset {written}")
+                if written > header["new_size"]:
+                    raise DeltaError("Patch produces more data than announced")
+
+        if written != header["new_size"] or digest.hexdigest() != header["new_sha256"]:
+            raise DeltaError("Patched artifact does not match the announced SHA-256")
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return header
+
+
+def _download(url: str, out_path: str, expected_sha256: str = None, timeout: float = 30) -> None:
+    """Stream a full artifact to disk, checking its SHA-256"""
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, prefix=".download-")
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out, urllib.request.urlopen(url, timeout=timeout) as response:
+            for chunk in iter(lambda: response.read(DOWNLOAD_CHUNK), b""):
+                digest.update(chunk)
+                out.write(chunk)
+        if expected_sha256 and digest.hexdigest() != expected_sha256:
+            raise DeltaError(f"Checksum mismatch for {url}")
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def update(base_url: str, artifact_template: str, current_version: str, cache_dir: str,
+           timeout: float = 30) -> dict:
+    """
+    Bring the cached artifact to the version published at ``base_url``
+
+    Uses the release manifest (manifest.json) to find the latest version,
+    a delta from ``current_version`` if one is published and the previous
+    artifact is in ``cache_dir``, and the full artifact otherwise.
+
+    Returns:
+        {"version", "path", "method": "delta" | "full" | "current", "downloaded"}
+    """
+    base_url = base_url.rstrip("/") + "/"
+    with urllib.request.urlopen(base_url + "manifest.json", timeout=timeout) as response:
+        manifest = json.load(response)
+
+    version = manifest["version"]
+    target_name = artifact_template.format(version=version)
+    current_path = os.path.join(cache_dir, artifact_template.format(version=current_version))
+    target_path = os.path.join(cache_dir, target_name)
+    files = {entry["name"]: entry for entry in manifest.get("files", [])}
+    if target_name not in files:
+        raise DeltaError(f"{target_name} is not part of release {version}")
+    target = files[target_name]
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if version == current_version and os.path.exists(current_path):
+        return {"version": version, "path": current_path, "method": "current", "downloaded": 0}
+
+    delta = next((d for d in manifest.get("deltas", [])
+                  if d.get("artifact") == target_name and d.get("from_version") == current_version), None)
+    if delta and os.path.exists(current_path):
+        try:
+            with urllib.request.urlopen(base_url + delta["name"], timeout=timeout) as response:
+                apply_delta(current_path, response, target_path, expected_sha256=target.get("sha256"))
+            return {"version": version, "path": target_path, "method": "delta",
+                    "downloaded": files.get(delta["name"], {}).get("size", 0)}
+        except (DeltaError, OSError) as e:
+            print(f"Delta update failed ({e}), downloading the full artifact")
+
+    _download(base_url + target_name, target_path, target.get("sha256"), timeout)
+    return {"version": version, "path": target_path, "method": "full", "downloaded": target.get("size", 0)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AniData VPN binary delta updates")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    make = commands.add_parser("make", help="Create a patch between two artifacts")
+    make.add_argument("old")
+    make.add_argument("new")
+    make.add_argument("-o", "--output", required=True)
+    make.add_argument("--from-version")
+    make.add_argument("--to-version")
+    make.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+
+    apply = commands.add_parser("apply", help="Apply a patch to a local artifact")
+    apply.add_argument("old")
+    apply.add_argument("patch")
+    apply.add_argument("-o", "--output", required=True)
+
+    upd = commands.add_parser("update", help="Update a cached artifact from a release server")
+    upd.add_argument("--base-url", required=True)
+    upd.add_argument("--artifact-template", required=True,
+                     help="Artifact file name with a {version} placeholder")
+    upd.add_argument("--current-version", required=True)
+    upd.add_argument("--cache-dir", default="/var/cache/anidata/updates")
+
+    args = parser.parse_args()
+    try:
+        if args.command == "make":
+            header = make_delta(args.old, args.new, args.output, args.from_version,
+                                args.to_version, args.block_size)
+            print(f"Patch {args.output}: {header['patch_size']} bytes for a "
+                  f"{header['new_size']}-byte artifact ({header['copied']} bytes reused)")
+        elif args.command == "apply":
+            with open(args.patch, "rb") as patch:
+                apply_delta(args.old, patch, args.output)
+            print(f"Patched artifact written to {args.output}")
+        else:
+            result = update(args.base_url, args.artifact_template, args.current_version, args.cache_dir)
+            print(f"{result['path']} (version {result['version']}, {result['method']}, "
+                  f"{result['downloaded']} bytes downloaded)")
+    except DeltaError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
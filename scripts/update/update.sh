@@ -63,9 +63,13 @@ check_current_version() {
 check_available_updates() {
     echo -e "${BLUE}Checking for available updates...${NC}"
     
-    # In a real implementation, this would contact a remote server
-    # For this demo, we'll simulate an available update
-    LATEST_VERSION="1.2.0"
+    if [ -n "$UPDATE_URL" ]; then
+        # Latest version published in the release manifest
+        LATEST_VERSION=$(python3 -c 'import json, sys, urllib.request; print(json.load(urllib.request.urlopen(sys.argv[1].rstrip("/") + "/manifest.json", timeout=30))["version"])' "$UPDATE_URL")
+    else
+        # No release server configured: simulate an available update
+        LATEST_VERSION="1.2.0"
+    fi
     
     if [ "$CURRENT_VERSION" = "$LATEST_VERSION" ]; then
         echo -e "${GREEN}You are already running the latest version (${LATEST_VERSION}).${NC}"
@@ -101,8 +105,22 @@ backup_installation() {
 download_update() {
     echo -e "${BLUE}Downloading update package...${NC}"
     
-    # In a real implementation, this would download from a server
-    # For this demo, we'll simulate a download
+    if [ -z "$UPDATE_URL" ]; then
+        # No release server configured: simulate the download
+        echo -e "${GREEN}Update package downloaded successfully.${NC}"
+        return
+    fi
+    
+    # Patch the previously downloaded artifact when a delta is published,
+    # otherwise download the full artifact (both are checksum-verified)
+    if ! python3 "$SCRIPT_DIR/delta_update.py" update \
+            --base-url "$UPDATE_URL" \
+            --artifact-template "$ARTIFACT_TEMPLATE" \
+            --current-version "$CURRENT_VERSION" \
+            --cache-dir "$UPDATE_CACHE_DIR"; then
+        echo -e "${RED}Failed to download the update package.${NC}"
+        exit 1
+    fi
     echo -e "${GREEN}Update package downloaded successfully.${NC}"
 }
 
@@ -110,18 +128,33 @@ download_update() {
 apply_update() {
     echo -e "${BLUE}Applying update...${NC}"
     
-    # Update core files
-    echo -e "  ${YELLOW}Updating core components...${NC}"
-    cp -r ../core/* /opt/anidata/ 2>/dev/null || true
-    
-    # Update UI files
-    echo -e "  ${YELLOW}Updating UI components...${NC}"
-    cp -r ../ui/* /opt/anidata/ 2>/dev/null || true
-    
-    # Update scripts
-    echo -e "  ${YELLOW}Updating scripts...${NC}"
-    mkdir -p /opt/anidata/scripts
-    cp -r ../scripts/* /opt/anidata/scripts/ 2>/dev/null || true
+    if [ -z "$UPDATE_URL" ]; then
+        # No release server configured: install from this checkout
+        echo -e "  ${YELLOW}Updating core components...${NC}"
+        cp -r ../core/* /opt/anidata/ 2>/dev/null || true
+        
+        echo -e "  ${YELLOW}Updating UI components...${NC}"
+        cp -r ../ui/* /opt/anidata/ 2>/dev/null || true
+        
+        echo -e "  ${YELLOW}Updating scripts...${NC}"
+        mkdir -p /opt/anidata/scripts
+        cp -r ../scripts/* /opt/anidata/scripts/ 2>/dev/null || true
+    else
+        # Install the artifact download_update fetched or patched (already
+        # checked against the manifest SHA-256); it stays in the cache as the
+        # base of the next delta
+        ARTIFACT="$UPDATE_CACHE_DIR/${ARTIFACT_TEMPLATE//\{version\}/$LATEST_VERSION}"
+        if [ ! -f "$ARTIFACT" ]; then
+            echo -e "${RED}Update artifact not found: ${ARTIFACT}${NC}"
+            exit 1
+        fi
+        
+        echo -e "  ${YELLOW}Installing $(basename "$ARTIFACT")...${NC}"
+        mkdir -p /opt/anidata/bin
+        install -m 0755 "$ARTIFACT" /opt/anidata/bin/.AniDataVPN.AppImage.new
+        mv -f /opt/anidata/bin/.AniDataVPN.AppImage.new /opt/anidata/bin/AniDataVPN.AppImage
+        ln -sf /opt/anidata/bin/AniDataVPN.AppImage /opt/anidata/bin/anidata
+    fi
     
     # Update version file
     echo "$LATEST_VERSION" > /opt/anidata/VERSION
@@ -190,11 +223,16 @@ parse_args() {
                 NO_RESTART=true
                 shift
                 ;;
+            --url)
+                UPDATE_URL="$2"
+                shift 2
+                ;;
             --help)
                 echo "Usage: $0 [options]"
                 echo "Options:"
                 echo "  --force      Force update even if already at the latest version"
                 echo "  --no-restart Don't restart services after update"
+                echo "  --url URL    Release server (manifest.json, artifacts and deltas)"
                 echo "  --help       Display this help message"
                 exit 0
                 ;;
@@ -235,6 +273,10 @@ main() {
 FORCE_UPDATE=false
 NO_RESTART=false
 SERVICE_WAS_RUNNING=false
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+UPDATE_URL="${ANIDATA_UPDATE_URL:-}"
+ARTIFACT_TEMPLATE="AniDataVPN_{version}.AppImage"
+UPDATE_CACHE_DIR="/var/cache/anidata/updates"
 
 # Run the update
 main "$@"
@@ -24,6 +24,8 @@ except ImportError:
 # Répertoire courant
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
+from ui.tk import IndexedServerTree, TkDispatcher
+
 # Importer le vrai gestionnaire VPN
 try:
     from core.vpn import WireGuardManager, RealVPNManager
@@ -58,9 +60,23 @@ except ImportError:
                 }
             }
 
+# Client du démon de contrôle
+def connect_daemon_manager():
+    """Retourne un gestionnaire relié au démon AniData VPN, ou None s'il n'est pas lancé"""
+    try:
+        from core.daemon import connect_daemon, DaemonRealVPNManager
+    except ImportError:
+        return None
+    client = connect_daemon()
+    return DaemonRealVPNManager(client) if client else None
+
 # Thread de surveillance du VPN
 class VPNStatusThread(threading.Thread):
-    """Thread for monitoring VPN connection status"""
+    """Thread for monitoring VPN connection status
+    
+    The callback runs on this thread: it must go through a TkDispatcher
+    rather than touch widgets directly.
+    """
     def __init__(self, manager, callback):
         super().__init__()
         self.manager = manager
@@ -138,7 +154,8 @@ class BandwidthGraph:
                 
             self.ax.set_xlim(max(0, current_time - self.time_window), max(self.time_window, current_time))
             
-            self.canvas.draw()
+            # Redessiné au prochain passage de la boucle Tk
+            self.canvas.draw_idle()
         except Exception as e:
             print(f"Erreur dans le graphique: {e}")
     
@@ -245,7 +262,9 @@ class ServerListFrame(ttk.Frame):
         # Barre de défilement
         scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.tree.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        
+        # Index iid -> serveur, filtrage par detach/reattach et lignes créées à la demande
+        self.index = IndexedServerTree(self.tree, self._row_values, scrollbar=scrollbar)
         
         # Sélection
         self.tree.bind("<<TreeviewSelect>>", self.on_server_selected)
@@ -253,19 +272,17 @@ class ServerListFrame(ttk.Frame):
         # Données
         self.servers = []
         
+    @staticmethod
+    def _row_values(server):
+        return (
+            server.get("country", "Unknown"), 
+            server.get("city", ""), 
+            ", ".join(server.get("protocols", []))
+        )
+        
     def populate_servers(self, servers):
         self.servers = servers
-        
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        for i, server in enumerate(servers):
-            protocols = ", ".join(server.get("protocols", []))
-            self.tree.insert("", tk.END, iid=str(i), values=(
-                server.get("country", "Unknown"), 
-                server.get("city", ""), 
-                protocols
-            ))
+        self.index.set_servers(servers)
             
         # Mise à jour du compteur
         if hasattr(self.master, "map_frame") and hasattr(self.master.map_frame, "server_count"):
@@ -275,26 +292,11 @@ class ServerListFrame(ttk.Frame):
             )
             
     def filter_servers(self, event=None):
-        query = self.search_entry.get().lower()
-        
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-            
-        for i, server in enumerate(self.servers):
-            if (query in server.get("country", "").lower() or 
-                query in server.get("city", "").lower()):
-                protocols = ", ".join(server.get("protocols", []))
-                self.tree.insert("", tk.END, iid=str(i), values=(
-                    server.get("country", "Unknown"), 
-                    server.get("city", ""), 
-                    protocols
-                ))
+        self.index.schedule_filter(self.search_entry.get())
                 
     def on_server_selected(self, event):
-        selection = self.tree.selection()
-        if selection:
-            index = int(selection[0])
-            server = self.servers[index]
+        server = self.index.selected_server()
+        if server:
             self.on_select_callback(server)
 
 # Contrôles de connexion
@@ -422,8 +424,14 @@ class AniDataVPNApp:
         self.root.geometry("1000x600")
         self.root.minsize(800, 500)
         
-        # Initialiser le gestionnaire VPN (réel ou simulé)
-        if real_vpn_available:
+        # Initialiser le gestionnaire VPN (démon, réel ou simulé)
+        daemon_manager = connect_daemon_manager() if real_vpn_available else None
+        self.uses_daemon = daemon_manager is not None
+        if daemon_manager is not None:
+            # Le démon possède le tunnel : l'interface n'est qu'un client
+            self.vpn_manager = daemon_manager
+            print("Connecté au démon AniData VPN")
+        elif real_vpn_available:
             try:
                 # Utiliser le vrai gestionnaire VPN qui chiffre le trafic Internet
                 home_dir = os.path.expanduser("~/.anidata")
@@ -480,14 +488,29 @@ class AniDataVPNApp:
         # Chargement des données
         self.load_servers()
         
-        # Démarrer la surveillance
-        self.status_thread = VPNStatusThread(self.vpn_manager, self.update_status)
+        # Démarrer la surveillance (les mises à jour passent par le thread Tk)
+        self.dispatcher = TkDispatcher(self.root)
+        self.dispatcher.start()
+        self.status_thread = VPNStatusThread(
+            self.vpn_manager,
+            lambda status: self.dispatcher.post("status", self.update_status, status)
+        )
         self.status_thread.start()
         
         # Gestion de la fermeture
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
     def load_servers(self):
+        if self.uses_daemon:
+            # Avec le démon : ne proposer que les serveurs de son catalogue
+            try:
+                self.servers = self.vpn_manager.servers
+                if self.servers:
+                    self.server_list.populate_servers(self.servers)
+                    return
+            except Exception as e:
+                print(f"Erreur lors du chargement des serveurs du démon: {e}")
+
         try:
             # Essayer de charger depuis le fichier JSON
             countries_path = os.path.join(current_dir, "data", "countries.json")
@@ -665,6 +688,8 @@ class AniDataVPNApp:
     def on_close(self):
         if hasattr(self, 'status_thread'):
             self.status_thread.stop()
+        if hasattr(self, 'dispatcher'):
+            self.dispatcher.stop()
         self.root.destroy()
 
 # Lancer l'application
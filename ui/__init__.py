@@ -1,2 +1,9 @@
 # This file marks the directory as a Python package
-from . import desktop
\ No newline at end of file
+# Subpackages are imported on demand so that importing one frontend does not
+# load the others (or PySide6 when only Tk is used).
+
+def __getattr__(name):
+    if name in ("desktop", "tk"):
+        import importlib
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,64 +1,63 @@
+import os
+import sys
+import random
+import functools
 import tkinter as tk
 from PIL import Image, ImageTk
 import io
 import base64
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from raster import linear_gradient, cached_render, code_hash
+
+# Couleurs pour le dégradé (bleu ciel uniquement)
+SKY_COLORS = [
+    (135, 206, 235),  # Bleu ciel
+    (176, 224, 230),  # Bleu ciel poudré
+    (173, 216, 230),  # Bleu ciel clair
+    (240, 248, 255)   # Bleu ciel très clair
+]
+
 # Fonction pour créer une image de fond dégradé bleu ciel
-def create_gradient_background(width=1200, height=800):
-    """Crée une image de fond avec un dégradé bleu ciel"""
-    from PIL import Image, ImageDraw
-    
-    # Créer une nouvelle image avec un fond transparent
-    image = Image.new('RGBA', (width, height), color=(255, 255, 255, 0))
-    draw = ImageDraw.Draw(image)
-    
-    # Couleurs pour le dégradé (bleu ciel uniquement)
-    colors = [
-        (135, 206, 235),  # Bleu ciel
-        (176, 224, 230),  # Bleu ciel poudré
-        (173, 216, 230),  # Bleu ciel clair
-        (240, 248, 255)   # Bleu ciel très clair
-    ]
-    
-    # Créer un dégradé
-    segments = len(colors) - 1
-    segment_height = height // segments
-    
-    for i in range(segments):
-        color1 = colors[i]
-        color2 = colors[i+1]
-        
-        # Dessiner un rectangle pour chaque segment du dégradé
-        for y in range(segment_height):
-            # Calculer la couleur du pixel en fonction de la position
-            r = int(color1[0] + (color2[0] - color1[0]) * y / segment_height)
-            g = int(color1[1] + (color2[1] - color1[1]) * y / segment_height)
-            b = int(color1[2] + (color2[2] - color1[2]) * y / segment_height)
-            
-            # Dessiner une ligne horizontale avec cette couleur
-            draw.line([(0, i*segment_height + y), (width, i*segment_height + y)], fill=(r, g, b, 180))
+def create_gradient_background(width=1200, height=800, colors=SKY_COLORS, seed=0):
+    """Crée une image de fond avec un dégradé bleu ciel
+    
+    Le dégradé est calculé en un seul bloc NumPy ; les cercles décoratifs
+    dépendent de ``seed`` pour que l'image soit reproductible (et cachable).
+    """
+    from PIL import ImageDraw
+    
+    # Dégradé vertical à travers toutes les couleurs
+    image = linear_gradient(width, height, colors, 'vertical', alpha=180)
+    overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
     
     # Ajouter quelques cercles décoratifs semi-transparents
+    rng = random.Random(seed)
     for i in range(20):
-        import random
-        x = random.randint(0, width)
-        y = random.randint(0, height)
-        size = random.randint(20, 100)
-        opacity = random.randint(30, 70)
-        r, g, b = colors[random.randint(0, len(colors)-1)]
+        x = rng.randint(0, width)
+        y = rng.randint(0, height)
+        size = rng.randint(20, 100)
+        opacity = rng.randint(30, 70)
+        r, g, b = colors[rng.randint(0, len(colors)-1)]
         draw.ellipse((x, y, x+size, y+size), fill=(r, g, b, opacity))
     
+    image.alpha_composite(overlay)
     return image
 
 # Fonction pour charger l'image de fond
-def get_background_image(width=1200, height=800):
+@functools.lru_cache(maxsize=4)
+def _background(width, height, theme):
+    # Une seule génération par taille et thème : mémoire, puis disque
+    return cached_render("background", lambda: create_gradient_background(width, height),
+                         width=width, height=height, theme=theme, colors=SKY_COLORS,
+                         code=code_hash(create_gradient_background))
+
+def get_background_image(width=1200, height=800, theme="sky"):
     """Renvoie une image de fond bleu ciel pour l'interface"""
     try:
-        # Générer une image de fond
-        image = create_gradient_background(width, height)
-        
-        # Convertir en PhotoImage pour Tkinter
-        return ImageTk.PhotoImage(image)
+        # Convertir en PhotoImage pour Tkinter (lié à la fenêtre courante, non caché)
+        return ImageTk.PhotoImage(_background(width, height, theme))
     except Exception as e:
         print(f"Erreur lors de la création de l'image de fond: {e}")
         return None
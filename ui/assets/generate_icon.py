@@ -5,15 +5,23 @@
 
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, ImageDraw, ImageFont
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from raster import linear_gradient, cached_render, code_hash
+
+ICO_SIZES = [16, 24, 32, 48, 64, 128, 256]
+LINUX_SIZES = [16, 24, 32, 48, 64, 128, 256, 512]
+
 def create_vpn_icon(size=512, output_path="icon.png"):
     """
     Create a VPN icon with blue azur color and shield design
     
     Args:
         size (int): Size of the icon in pixels
-        output_path (str): Path to save the icon
+        output_path (str): Path to save the icon (None: don't save)
     """
     # Create a new image with transparent background
     img = Image.new('RGBA', (size, size), color=(0, 0, 0, 0))
@@ -49,18 +57,9 @@ def create_vpn_icon(size=512, output_path="icon.png"):
         (left, top + radius),  # Left top after corner
     ]
     
-    # Draw main shield with blue azur gradient
-    for y in range(top, bottom):
-        # Calculate progress from top to bottom (0.0 to 1.0)
-        progress = (y - top) / (bottom - top)
-        
-        # Calculate color at this position (gradient from blue_azur to light_blue)
-        r = int(blue_azur[0] + progress * (light_blue[0] - blue_azur[0]))
-        g = int(blue_azur[1] + progress * (light_blue[1] - blue_azur[1]))
-        b = int(blue_azur[2] + progress * (light_blue[2] - blue_azur[2]))
-        
-        # Draw a horizontal line at this position
-        draw.line([(left, y), (right, y)], fill=(r, g, b))
+    # Draw main shield with blue azur gradient (one array, not one line per row)
+    gradient = linear_gradient(right - left + 1, bottom - top, [blue_azur, light_blue])
+    img.paste(gradient, (left, top))
     
     # Draw shield outline
     draw.polygon(points, outline=blue_azur)
@@ -134,44 +133,59 @@ def create_vpn_icon(size=512, output_path="icon.png"):
         print(f"Could not add text to icon: {e}")
     
     # Save the image
-    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
-    img.save(output_path)
-    print(f"Icon saved to {output_path}")
+    if output_path:
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        img.save(output_path)
+        print(f"Icon saved to {output_path}")
     
     # Return the image for further use
     return img
 
-def generate_icons_for_all_platforms():
+def render_vpn_icon(size=512):
+    """Base icon through the asset cache (drawn once per size)"""
+    return cached_render("vpn_icon", lambda: create_vpn_icon(size, None), size=size,
+                         code=code_hash(create_vpn_icon))
+
+def _export_png(base_path, size, png_path):
+    # Runs in a worker process
+    with Image.open(base_path) as base_icon:
+        base_icon.resize((size, size), Image.LANCZOS).save(png_path)
+    return png_path
+
+def _export_ico(base_path, ico_path):
+    with Image.open(base_path) as base_icon:
+        # Pillow downsizes the base image to each entry
+        base_icon.save(ico_path, sizes=[(size, size) for size in ICO_SIZES], format='ICO')
+    return ico_path
+
+def generate_icons_for_all_platforms(workers=None):
     """Generate icons for all supported platforms"""
+    start = time.time()
+    
     # Create directory for icons
     script_dir = os.path.dirname(os.path.abspath(__file__))
     icons_dir = os.path.join(script_dir, "icons")
     os.makedirs(icons_dir, exist_ok=True)
     
     # Base icon
-    base_icon = create_vpn_icon(512, os.path.join(script_dir, "icon.png"))
-    
-    # Windows ICO file (needs multiple sizes)
-    ico_sizes = [16, 24, 32, 48, 64, 128, 256]
-    ico_images = []
-    for size in ico_sizes:
-        resized_img = base_icon.resize((size, size), Image.LANCZOS)
-        ico_images.append(resized_img)
-    
-    # Save ICO file
-    ico_path = os.path.join(icons_dir, "anidata_vpn.ico")
-    ico_images[0].save(ico_path, sizes=[(img.width, img.height) for img in ico_images], format='ICO')
-    print(f"Windows icon saved to {ico_path}")
-    
-    # Linux PNG files
-    linux_sizes = [16, 24, 32, 48, 64, 128, 256, 512]
-    for size in linux_sizes:
-        png_path = os.path.join(icons_dir, f"anidata_vpn_{size}x{size}.png")
-        base_icon.resize((size, size), Image.LANCZOS).save(png_path)
-        print(f"Linux icon ({size}x{size}) saved to {png_path}")
+    base_path = os.path.join(script_dir, "icon.png")
+    render_vpn_icon(512).save(base_path)
+    print(f"Icon saved to {base_path}")
+    
+    # Windows ICO and Linux PNG files are independent: one process each
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        ico_job = pool.submit(_export_ico, base_path, os.path.join(icons_dir, "anidata_vpn.ico"))
+        png_jobs = {size: pool.submit(_export_png, base_path, size,
+                                      os.path.join(icons_dir, f"anidata_vpn_{size}x{size}.png"))
+                    for size in LINUX_SIZES}
+        
+        print(f"Windows icon saved to {ico_job.result()}")
+        for size, job in png_jobs.items():
+            print(f"Linux icon ({size}x{size}) saved to {job.result()}")
     
     # macOS ICNS file - skipping as it requires additional libraries
     print("For macOS, use the PNG files to create an .icns file")
+    print(f"Icons generated in {time.time() - start:.2f}s")
 
 if __name__ == "__main__":
     generate_icons_for_all_platforms()
\ No newline at end of file
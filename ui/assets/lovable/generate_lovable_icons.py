@@ -5,10 +5,16 @@ with enhanced elegance and modern aesthetics
 """
 
 import os
+import sys
+import inspect
+import functools
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import math
 from PIL.ImageDraw import floodfill
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from raster import linear_gradient, ellipse_mask, rounded_rect_mask, apply_mask, soft_shadow, cached_render, code_hash
+
 # Colors in the lovable.ai style - enhanced for elegance
 COLORS = {
     'primary': '#6c5ce7',
@@ -43,28 +49,23 @@ def hex_to_rgba(hex_color, alpha=255):
 
 def create_gradient(width, height, color1, color2, direction='horizontal'):
     """Create a gradient image between two colors"""
-    base = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(base)
-    
-    r1, g1, b1 = hex_to_rgb(color1)
-    r2, g2, b2 = hex_to_rgb(color2)
-    
-    if direction == 'horizontal':
-        for x in range(width):
-            # Calculate gradient color at this position
-            r = int(r1 + (r2 - r1) * x / width)
-            g = int(g1 + (g2 - g1) * x / width)
-            b = int(b1 + (b2 - b1) * x / width)
-            draw.line([(x, 0), (x, height)], fill=(r, g, b, 255))
-    else:  # vertical
-        for y in range(height):
-            # Calculate gradient color at this position
-            r = int(r1 + (r2 - r1) * y / height)
-            g = int(g1 + (g2 - g1) * y / height)
-            b = int(b1 + (b2 - b1) * y / height)
-            draw.line([(0, y), (width, y)], fill=(r, g, b, 255))
-            
-    return base
+    return linear_gradient(width, height, [color1, color2], direction)
+
+def cached_icon(filename):
+    """Render through the asset cache (keyed on the arguments and the drawing code) and save to SAVE_DIR"""
+    def decorator(func):
+        code = code_hash(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = inspect.signature(func).bind(*args, **kwargs)
+            bound.apply_defaults()
+            img = cached_render(f"lovable-{os.path.splitext(filename)[0]}",
+                                lambda: func(*args, **kwargs), code=code, **bound.arguments)
+            img.save(os.path.join(SAVE_DIR, filename))
+            return img
+        return wrapper
+    return decorator
 
 def create_rounded_rectangle(draw, xy, radius, fill=None, outline=None, width=0, gradient=None):
     """Draw a rounded rectangle with optional gradient fill"""
@@ -72,21 +73,9 @@ def create_rounded_rectangle(draw, xy, radius, fill=None, outline=None, width=0,
     
     # If we have a gradient, create a mask for it
     if gradient:
-        # Create a mask with the rounded rectangle shape
-        mask = Image.new('L', (x2-x1, y2-y1), 0)
-        mask_draw = ImageDraw.Draw(mask)
-        
-        # Draw the rounded rectangle on the mask
-        mask_draw.rectangle((radius, 0, x2-x1-radius, y2-y1), fill=255)
-        mask_draw.rectangle((0, radius, x2-x1, y2-y1-radius), fill=255)
-        mask_draw.pieslice((0, 0, 2*radius, 2*radius), 180, 270, fill=255)
-        mask_draw.pieslice((x2-x1-2*radius, 0, x2-x1, 2*radius), 270, 0, fill=255)
-        mask_draw.pieslice((0, y2-y1-2*radius, 2*radius, y2-y1), 90, 180, fill=255)
-        mask_draw.pieslice((x2-x1-2*radius, y2-y1-2*radius, x2-x1, y2-y1), 0, 90, fill=255)
-        
-        # Apply the mask to the gradient
-        gradient = gradient.resize((x2-x1, y2-y1))
-        gradient.putalpha(mask)
+        # Apply the rounded rectangle shape to the gradient
+        mask = rounded_rect_mask(x2-x1, y2-y1, radius)
+        gradient = apply_mask(gradient.resize((x2-x1, y2-y1)), mask)
         
         # Paste the masked gradient onto the image at the right position
         draw._image.paste(gradient, (x1, y1), gradient)
@@ -101,30 +90,9 @@ def create_rounded_rectangle(draw, xy, radius, fill=None, outline=None, width=0,
 
 def add_soft_shadow(img, blur_radius=10, opacity=100, offset=(0, 4)):
     """Add a soft shadow to an image"""
-    # Create a shadow image with transparent background
-    shadow = Image.new('RGBA', img.size, (0, 0, 0, 0))
-    
-    # Create a mask from the original image's alpha channel
-    mask = img.split()[3]
-    
-    # Draw the shadow using the mask
-    shadow_draw = ImageDraw.Draw(shadow)
-    shadow_draw.bitmap((0, 0), mask, fill=(0, 0, 0, opacity))
-    
-    # Blur the shadow
-    shadow = shadow.filter(ImageFilter.GaussianBlur(blur_radius))
-    
-    # Create a new image with transparent background
-    result = Image.new('RGBA', img.size, (0, 0, 0, 0))
-    
-    # Paste the shadow with offset
-    result.paste(shadow, offset, shadow)
-    
-    # Paste the original image on top
-    result.paste(img, (0, 0), img)
-    
-    return result
+    return soft_shadow(img, blur_radius, opacity, offset)
 
+@cached_icon('connect.png')
 def create_connect_icon(size=64, bg_color=COLORS['secondary'], bg_gradient=COLORS['secondary_gradient_end'], fg_color=COLORS['white']):
     """Create an elegant connect icon in lovable.ai style"""
     # Create image with transparent background
@@ -137,9 +105,7 @@ def create_connect_icon(size=64, bg_color=COLORS['secondary'], bg_gradient=COLOR
     gradient = create_gradient(circle_size, circle_size, bg_color, bg_gradient)
     
     # Create circle mask
-    mask = Image.new('L', (circle_size, circle_size), 0)
-    mask_draw = ImageDraw.Draw(mask)
-    mask_draw.ellipse((0, 0, circle_size, circle_size), fill=255)
+    mask = ellipse_mask(circle_size)
     
     # Apply mask to gradient
     circle_img = gradient.copy()
@@ -162,10 +128,9 @@ def create_connect_icon(size=64, bg_color=COLORS['secondary'], bg_gradient=COLOR
     # Add a subtle shadow
     img = add_soft_shadow(img, blur_radius=8, opacity=80)
     
-    # Save the image
-    img.save(os.path.join(SAVE_DIR, 'connect.png'))
     return img
 
+@cached_icon('disconnect.png')
 def create_disconnect_icon(size=64, bg_color=COLORS['danger'], bg_gradient=COLORS['danger_gradient_end'], fg_color=COLORS['white']):
     """Create an elegant disconnect icon in lovable.ai style"""
     # Create image with transparent background
@@ -178,9 +143,7 @@ def create_disconnect_icon(size=64, bg_color=COLORS['danger'], bg_gradient=COLOR
     gradient = create_gradient(circle_size, circle_size, bg_color, bg_gradient)
     
     # Create circle mask
-    mask = Image.new('L', (circle_size, circle_size), 0)
-    mask_draw = ImageDraw.Draw(mask)
-    mask_draw.ellipse((0, 0, circle_size, circle_size), fill=255)
+    mask = ellipse_mask(circle_size)
     
     # Apply mask to gradient
     circle_img = gradient.copy()
@@ -212,10 +175,9 @@ def create_disconnect_icon(size=64, bg_color=COLORS['danger'], bg_gradient=COLOR
     # Add a subtle shadow
     img = add_soft_shadow(img, blur_radius=8, opacity=80)
     
-    # Save the image
-    img.save(os.path.join(SAVE_DIR, 'disconnect.png'))
     return img
 
+@cached_icon('settings.png')
 def create_settings_icon(size=64, bg_color=COLORS['primary'], bg_gradient=COLORS['primary_gradient_end'], fg_color=COLORS['white']):
     """Create an elegant settings icon in lovable.ai style"""
     # Create image with transparent background
@@ -228,9 +190,7 @@ def create_settings_icon(size=64, bg_color=COLORS['primary'], bg_gradient=COLORS
     gradient = create_gradient(circle_size, circle_size, bg_color, bg_gradient)
     
     # Create circle mask
-    mask = Image.new('L', (circle_size, circle_size), 0)
-    mask_draw = ImageDraw.Draw(mask)
-    mask_draw.ellipse((0, 0, circle_size, circle_size), fill=255)
+    mask = ellipse_mask(circle_size)
     
     # Apply mask to gradient
     circle_img = gradient.copy()
@@ -282,9 +242,7 @@ def create_settings_icon(size=64, bg_color=COLORS['primary'], bg_gradient=COLORS
     mini_gradient = create_gradient(center_radius*2, center_radius*2, bg_color, bg_gradient)
     
     # Create a circular mask for the center
-    center_mask = Image.new('L', (center_radius*2, center_radius*2), 0)
-    center_mask_draw = ImageDraw.Draw(center_mask)
-    center_mask_draw.ellipse((0, 0, center_radius*2, center_radius*2), fill=255)
+    center_mask = ellipse_mask(center_radius*2)
     
     # Apply mask to mini gradient
     mini_gradient.putalpha(center_mask)
@@ -295,10 +253,9 @@ def create_settings_icon(size=64, bg_color=COLORS['primary'], bg_gradient=COLORS
     # Add a subtle shadow
     img = add_soft_shadow(img, blur_radius=8, opacity=80)
     
-    # Save the image
-    img.save(os.path.join(SAVE_DIR, 'settings.png'))
     return img
 
+@cached_icon('tray_icon.png')
 def create_tray_icon(size=64, bg_color=COLORS['primary'], bg_gradient=COLORS['primary_gradient_end'], fg_color=COLORS['white']):
     """Create an elegant tray icon in lovable.ai style"""
     # Create image with transparent background
@@ -379,10 +336,9 @@ def create_tray_icon(size=64, bg_color=COLORS['primary'], bg_gradient=COLORS['pr
     # Add a subtle shadow
     img = add_soft_shadow(img, blur_radius=6, opacity=70)
     
-    # Save the image
-    img.save(os.path.join(SAVE_DIR, 'tray_icon.png'))
     return img
 
+@cached_icon('logo.png')
 def create_logo(size=128, bg_color=COLORS['primary'], bg_gradient=COLORS['primary_gradient_end'], fg_color=COLORS['white']):
     """Create an elegant logo in lovable.ai style"""
     # Create image with transparent background - wider for the logo
@@ -463,10 +419,9 @@ def create_logo(size=128, bg_color=COLORS['primary'], bg_gradient=COLORS['primar
     # Add a subtle shadow to the entire logo
     img = add_soft_shadow(img, blur_radius=10, opacity=60)
     
-    # Save the image
-    img.save(os.path.join(SAVE_DIR, 'logo.png'))
     return img
 
+@cached_icon('dropdown_arrow.png')
 def create_dropdown_arrow(size=24, color=COLORS['primary'], gradient_color=COLORS['primary_gradient_end']):
     """Create an elegant dropdown arrow icon in lovable.ai style"""
     img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
@@ -504,8 +459,6 @@ def create_dropdown_arrow(size=24, color=COLORS['primary'], gradient_color=COLOR
     # Paste the actual arrow
     img.paste(arrow, (0, 0), arrow)
     
-    # Save the image
-    img.save(os.path.join(SAVE_DIR, 'dropdown_arrow.png'))
     return img
 
 def create_status_icons(size=16):
@@ -513,9 +466,7 @@ def create_status_icons(size=16):
     # Connected status with gradient
     connected_img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
     gradient = create_gradient(size, size, COLORS['success'], COLORS['success_gradient_end'])
-    mask = Image.new('L', (size, size), 0)
-    mask_draw = ImageDraw.Draw(mask)
-    mask_draw.ellipse((0, 0, size, size), fill=255)
+    mask = ellipse_mask(size)
     gradient.putalpha(mask)
     connected_img = add_soft_shadow(gradient, blur_radius=2, opacity=50)
     connected_img.save(os.path.join(SAVE_DIR, 'status_connected.png'))
@@ -523,9 +474,7 @@ def create_status_icons(size=16):
     # Disconnected status with gradient
     disconnected_img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
     gradient = create_gradient(size, size, COLORS['danger'], COLORS['danger_gradient_end'])
-    mask = Image.new('L', (size, size), 0)
-    mask_draw = ImageDraw.Draw(mask)
-    mask_draw.ellipse((0, 0, size, size), fill=255)
+    mask = ellipse_mask(size)
     gradient.putalpha(mask)
     disconnected_img = add_soft_shadow(gradient, blur_radius=2, opacity=50)
     disconnected_img.save(os.path.join(SAVE_DIR, 'status_disconnected.png'))
@@ -533,9 +482,7 @@ def create_status_icons(size=16):
     # Connecting status with gradient
     connecting_img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
     gradient = create_gradient(size, size, COLORS['warning'], COLORS['warning_gradient_end'])
-    mask = Image.new('L', (size, size), 0)
-    mask_draw = ImageDraw.Draw(mask)
-    mask_draw.ellipse((0, 0, size, size), fill=255)
+    mask = ellipse_mask(size)
     gradient.putalpha(mask)
     connecting_img = add_soft_shadow(gradient, blur_radius=2, opacity=50)
     connecting_img.save(os.path.join(SAVE_DIR, 'status_connecting.png'))
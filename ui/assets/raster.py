@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Raster Primitives
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Shared drawing primitives for the asset generators.
+
+Gradients, masks and shadows are computed as whole NumPy arrays instead of
+one ``draw.line`` per row or column. Masks are anti-aliased from a signed
+distance, so shapes no longer need to be drawn large and downscaled.
+
+``cached_render`` stores rendered images as PNG under
+``~/.anidata/cache/assets``, named after a hash of the render parameters:
+the same icon, theme and size is only ever drawn once. Generators pass
+``code_hash`` of their drawing function along, so editing it invalidates
+the cached PNGs.
+"""
+
+import os
+import json
+import inspect
+import hashlib
+from typing import Callable, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+CACHE_DIR = os.path.join(os.path.expanduser("~/.anidata"), "cache", "assets")
+# Bump when a primitive changes its output
+RENDER_VERSION = 1
+
+Color = Tuple[int, ...]
+
+
+def to_rgb(color) -> Tuple[int, int, int]:
+    """'#rrggbb' or (r, g, b[, a]) -> (r, g, b)"""
+    if isinstance(color, str):
+        color = color.lstrip('#')
+        return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+    return tuple(color[:3])
+
+
+def linear_gradient(width: int, height: int, stops: Sequence, direction: str = 'vertical',
+                    alpha: int = 255) -> Image.Image:
+    """
+    RGBA gradient through evenly spaced color stops
+
+    Args:
+        stops: Two or more colors ('#rrggbb' or RGB tuples)
+        direction: 'horizontal' (left to right) or 'vertical' (top to bottom)
+        alpha: Opacity of the whole image
+    """
+    length = width if direction == 'horizontal' else height
+    colors = np.array([to_rgb(c) for c in stops], dtype=np.float32)
+
+    # Position of each pixel along the gradient, in stop units
+    t = np.arange(length, dtype=np.float32) * (len(colors) - 1) / max(length, 1)
+    index = np.minimum(t.astype(np.int32), len(colors) - 2)
+    frac = (t - index)[:, None]
+    line = colors[index] + (colors[index + 1] - colors[index]) * frac
+
+    rgba = np.empty((length, 4), dtype=np.uint8)
+    rgba[:, :3] = line.astype(np.uint8)  # truncation, like int() in the old loops
+    rgba[:, 3] = alpha
+
+    if direction == 'horizontal':
+        pixels = np.broadcast_to(rgba[None, :, :], (height, width, 4))
+    else:
+        pixels = np.broadcast_to(rgba[:, None, :], (height, width, 4))
+    return Image.fromarray(np.ascontiguousarray(pixels), 'RGBA')
+
+
+def _coverage(distance: np.ndarray) -> Image.Image:
+    """Signed distance (negative inside) -> anti-aliased 'L' mask"""
+    return Image.fromarray((np.clip(0.5 - distance, 0.0, 1.0) * 255).astype(np.uint8), 'L')
+
+
+def _grid(width: int, height: int):
+    # Pixel centres
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    return x + 0.5, y + 0.5
+
+
+def ellipse_mask(width: int, height: int = None) -> Image.Image:
+    """Ellipse filling a width x height box"""
+    height = height or width
+    x, y = _grid(width, height)
+    rx, ry = width / 2.0, height / 2.0
+    # Normalised radius, scaled back to pixels along the smaller axis
+    distance = (np.sqrt(((x - rx) / rx) ** 2 + ((y - ry) / ry) ** 2) - 1.0) * min(rx, ry)
+    return _coverage(distance)
+
+
+def rounded_rect_mask(width: int, height: int, radius: float) -> Image.Image:
+    """Rectangle with rounded corners filling a width x height box"""
+    x, y = _grid(width, height)
+    radius = min(radius, width / 2.0, height / 2.0)
+    qx = np.abs(x - width / 2.0) - (width / 2.0 - radius)
+    qy = np.abs(y - height / 2.0) - (height / 2.0 - radius)
+    outside = np.hypot(np.maximum(qx, 0), np.maximum(qy, 0))
+    inside = np.minimum(np.maximum(qx, qy), 0)
+    return _coverage(outside + inside - radius)
+
+
+def apply_mask(img: Image.Image, mask: Image.Image) -> Image.Image:
+    """Multiply the alpha channel of ``img`` by ``mask``"""
+    pixels = np.array(img.convert('RGBA'))
+    pixels[:, :, 3] = (pixels[:, :, 3].astype(np.uint16) * np.asarray(mask) // 255).astype(np.uint8)
+    return Image.fromarray(pixels, 'RGBA')
+
+
+def soft_shadow(img: Image.Image, blur_radius: float = 10, opacity: int = 100,
+                offset: Tuple[int, int] = (0, 4)) -> Image.Image:
+    """Composite ``img`` over a blurred copy of its silhouette"""
+    alpha = np.asarray(img.split()[3], dtype=np.uint16)
+    shadow = np.zeros(alpha.shape + (4,), dtype=np.uint8)
+    shadow[:, :, 3] = (alpha * opacity // 255).astype(np.uint8)
+    shadow = Image.fromarray(shadow, 'RGBA').filter(ImageFilter.GaussianBlur(blur_radius))
+
+    result = Image.new('RGBA', img.size, (0, 0, 0, 0))
+    result.paste(shadow, offset, shadow)
+    result.alpha_composite(img)
+    return result
+
+
+def code_hash(*funcs: Callable) -> str:
+    """Hash of the source of ``funcs`` (bytecode if the source is unavailable)"""
+    digest = hashlib.sha256()
+    for func in funcs:
+        try:
+            digest.update(inspect.getsource(func).encode("utf-8"))
+        except (OSError, TypeError):
+            digest.update(func.__code__.co_code + repr(func.__code__.co_consts).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def render_key(name: str, **params) -> str:
+    """Stable hash of a render call"""
+    payload = json.dumps({"name": name, "version": RENDER_VERSION, "params": params},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def cached_render(name: str, render: Callable[[], Image.Image], **params) -> Image.Image:
+    """
+    Render once per distinct parameter set, then reuse the PNG on disk
+
+    Args:
+        name: Kind of asset (part of the key)
+        render: Called on a cache miss
+        params: Everything the output depends on (size, colors, theme...)
+    """
+    path = os.path.join(CACHE_DIR, f"{name}-{render_key(name, **params)}.png")
+    try:
+        with Image.open(path) as cached:
+            return cached.convert('RGBA')
+    except (OSError, ValueError):
+        pass
+
+    img = render()
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        img.save(tmp_path, format='PNG')
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not cache {name}: {e}")
+    return img
@@ -1,4 +1,13 @@
 # This file marks the directory as a Python package
-from . import main
-from . import modern_ui
-from . import modern_bridge
\ No newline at end of file
+# Modules are imported on demand: main, modern_ui and modern_bridge each pull
+# in PySide6, and modern_ui also pulls in pyqtgraph and numpy.
+
+_SUBMODULES = ("main", "modern_ui", "modern_bridge", "bandwidth_graph", "simple_ui",
+               "orchestrator", "native_map")
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        import importlib
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
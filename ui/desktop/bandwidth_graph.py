@@ -61,6 +61,24 @@ class BandwidthGraph(QWidget):
         self.download_data = self.download_data[mask]
         self.upload_data = self.upload_data[mask]
         
+    def update_bandwidth_batch(self, samples):
+        """Append several (timestamp, download, upload) samples at once"""
+        if not samples:
+            return
+        start = self.start_time.timestamp()
+        times, downloads, uploads = zip(*samples)
+        self.times = np.concatenate((self.times, np.asarray(times) - start))
+        self.download_data = np.concatenate((self.download_data, downloads))
+        self.upload_data = np.concatenate((self.upload_data, uploads))
+        
+        mask = self.times > self.times[-1] - self.time_window
+        self.times = self.times[mask]
+        self.download_data = self.download_data[mask]
+        self.upload_data = self.upload_data[mask]
+        
+    def set_refresh_interval(self, interval_ms):
+        self.timer.setInterval(interval_ms)
+        
     def update_plot(self):
         if len(self.times) > 0:
             self.download_curve.setData(self.times, self.download_data)
@@ -16,23 +16,31 @@ from typing import Dict, List, Optional
 # Add parent directory to path to import modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
+from core.timeline import get_timeline
+
+_timeline = get_timeline("desktop")
+
 try:
-    from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                                QHBoxLayout, QPushButton, QLabel, QComboBox,
-                                QTabWidget, QFrame, QSplitter, QProgressBar,
-                                QSystemTrayIcon, QMenu, QAction, QMessageBox,
-                                QCheckBox, QGroupBox, QFormLayout, QLineEdit,
-                                QToolButton, QStackedWidget, QTableWidget,
-                                QTableWidgetItem, QHeaderView)
-    from PySide6.QtGui import QIcon, QPixmap, QFont, QColor, QPainter, QPen
-    from PySide6.QtCore import Qt, QSize, QTimer, Signal, QThread, QSettings, QUrl
-    from PySide6.QtWebEngineWidgets import QWebEngineView
+    with _timeline.phase("import PySide6"):
+        from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
+                                    QHBoxLayout, QPushButton, QLabel, QComboBox,
+                                    QTabWidget, QFrame, QSplitter, QProgressBar,
+                                    QSystemTrayIcon, QMenu, QMessageBox, QStyle, QDialog,
+                                    QCheckBox, QGroupBox, QFormLayout, QLineEdit,
+                                    QToolButton, QStackedWidget, QTableView, QHeaderView)
+        from PySide6.QtGui import QIcon, QPixmap, QFont, QColor, QPainter, QPen, QAction
+        from PySide6.QtCore import Qt, QSize, QTimer, Signal, QThread, QSettings, QObject
 except ImportError:
     print("ERROR: PySide6 is required. Install with:")
     print("pip install PySide6")
     sys.exit(1)
 
+from ui.desktop.server_model import ServerTableModel, ServerFilterProxyModel, visible_server_ids
+from ui.desktop.orchestrator import ConnectionOrchestrator
+from ui.desktop.native_map import NativeMapWidget
+
 # Attempt to import core modules
+_timeline.mark("PySide6 ready")
 try:
     from core.protocols.wireguard.wireguard import WireGuardManager as OriginalWireGuardManager
     
@@ -219,47 +227,116 @@ class VPNStatusThread(QThread):
         self.wait()
 
 
-class MapWidget(QWebEngineView):
+class DaemonStatusRelay(QObject):
+    """Forwards status pushed by the control daemon to the GUI thread"""
+    status_updated = Signal(dict)
+    
+    def __init__(self, manager):
+        super().__init__()
+        self.manager = manager
+        
+    def _forward(self, status):
+        # Called on the daemon client thread; the queued signal crosses to the GUI thread
+        self.status_updated.emit(status)
+        
+    def start(self):
+        self.manager.add_status_listener(self._forward)
+        status = self.manager.get_status()
+        if status:
+            self.status_updated.emit(status)
+    
+    def stop(self):
+        self.manager.remove_status_listener(self._forward)
+        
+    def wait(self):
+        pass
+
+
+def create_status_monitor(manager):
+    """Push-based monitor when backed by the daemon, polling thread otherwise"""
+    if hasattr(manager, "add_status_listener"):
+        return DaemonStatusRelay(manager)
+    return VPNStatusThread(manager)
+
+
+class MetricsFeed(QObject):
+    """Feeds live ping/load from a MeasurementService into a server list widget
+    
+    The service measures on its own thread; a timer on the GUI thread drains
+    the changed entries at a bounded rate and hands them to the widget, which
+    only refreshes the affected cells.
+    """
+    
+    def __init__(self, servers, widget, refresh_ms=500, parent=None):
+        super().__init__(parent)
+        from core.vpn.metrics import ServerMetricsCache, MeasurementService
+        self.widget = widget
+        self.cache = ServerMetricsCache()
+        self.service = MeasurementService(servers, self.cache)
+        self._visible = []
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.refresh_ms = refresh_ms
+        
+    def start(self):
+        self.service.start()
+        self.timer.start(self.refresh_ms)
+        
+    def set_servers(self, servers):
+        self.service.set_servers(servers)
+        
+    def refresh(self):
+        # Rows on screen get measured first
+        if hasattr(self.widget, "visible_server_ids"):
+            visible = self.widget.visible_server_ids()
+            if visible != self._visible:
+                self._visible = visible
+                self.service.prioritize(visible)
+        
+        changes = self.cache.drain_changes()
+        if changes:
+            self.widget.update_metrics(changes)
+        
+    def stop(self):
+        self.timer.stop()
+        self.service.stop()
+
+
+def connect_daemon_manager():
+    """Return a manager backed by the control daemon, or None if it is not running"""
+    try:
+        from core.daemon import connect_daemon, DaemonVPNManager
+    except ImportError:
+        return None
+    client = connect_daemon()
+    return DaemonVPNManager(client) if client else None
+
+
+class MapWidget(QWidget):
     """Widget for displaying interactive world map with server locations"""
     
+    server_selected = Signal(dict)
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
         
-        # Load the HTML map file
-        map_path = os.path.join(os.path.dirname(__file__), '..', 'maps', 'world_map.html')
-        
-        # If the map file doesn't exist, create a simple one
-        if not os.path.exists(map_path):
-            self._create_simple_map(map_path)
-            
-        self.load(QUrl.fromLocalFile(map_path))
+        self.map_layout = QVBoxLayout(self)
+        self.map_layout.setContentsMargins(0, 0, 0, 0)
+        self.map_view = NativeMapWidget(self)
+        self.map_view.server_selected.connect(self.server_selected)
+        self.map_layout.addWidget(self.map_view)
     
-    def _create_simple_map(self, map_path):
-        """Create a simple HTML map if the actual map file doesn't exist"""
-        os.makedirs(os.path.dirname(map_path), exist_ok=True)
-        
-        html_content = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>AniData VPN Server Map</title>
-            <style>
-                body { margin: 0; padding: 0; background-color: #2c3e50; color: white; font-family: Arial, sans-serif; }
-                #map-container { width: 100%; height: 100vh; display: flex; justify-content: center; align-items: center; }
-                h2 { text-align: center; }
-            </style>
-        </head>
-        <body>
-            <div id="map-container">
-                <h2>AniData VPN Interactive Map<br>(Placeholder)</h2>
-            </div>
-        </body>
-        </html>
-        """
-        
-        with open(map_path, 'w') as f:
-            f.write(html_content)
+    def set_servers(self, servers):
+        """Place server markers from their coordinates"""
+        self.map_view.set_servers(servers)
+    
+    def set_metrics_provider(self, provider):
+        """Source of the latency shown in marker tooltips"""
+        self.map_view.set_metrics_provider(provider)
+    
+    def set_connected(self, server_id):
+        self.map_view.set_connected(server_id)
 
 
 # Import random module for simulation
@@ -279,7 +356,7 @@ class ServerListWidget(QWidget):
     def initUI(self):
         layout = QVBoxLayout(self)
         
-        # Search bar (placeholder)
+        # Search bar
         search_layout = QHBoxLayout()
         search_label = QLabel("Search:")
         self.search_edit = QLineEdit()
@@ -288,15 +365,24 @@ class ServerListWidget(QWidget):
         search_layout.addWidget(self.search_edit)
         layout.addLayout(search_layout)
         
-        # Server table
-        self.server_table = QTableWidget()
-        self.server_table.setColumnCount(4)
-        self.server_table.setHorizontalHeaderLabels(["Location", "Load", "Ping", "Features"])
+        # Server table: model/view, only visible rows are rendered
+        self.model = ServerTableModel(parent=self)
+        self.proxy = ServerFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        
+        self.server_table = QTableView()
+        self.server_table.setModel(self.proxy)
         self.server_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
         self.server_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
-        self.server_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.server_table.setSelectionMode(QTableWidget.SingleSelection)
-        self.server_table.itemClicked.connect(self.on_server_selected)
+        # Fixed row height: the view never measures rows it does not display
+        self.server_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.server_table.verticalHeader().hide()
+        self.server_table.setSelectionBehavior(QTableView.SelectRows)
+        self.server_table.setSelectionMode(QTableView.SingleSelection)
+        self.server_table.setSortingEnabled(True)
+        self.server_table.sortByColumn(0, Qt.AscendingOrder)
+        self.server_table.clicked.connect(self.on_server_selected)
+        self.search_edit.textChanged.connect(self.proxy.set_search)
         
         # Populate with servers
         self.populate_servers()
@@ -308,51 +394,19 @@ class ServerListWidget(QWidget):
         
     def populate_servers(self):
         """Populate the server table with server data"""
-        self.server_table.setRowCount(0)  # Clear table
+        self.model.set_servers(self.servers)
         
-        for server in self.servers:
-            row = self.server_table.rowCount()
-            self.server_table.insertRow(row)
-            
-            # Location (Country, City)
-            location = f"{server.get('country', 'Unknown')}, {server.get('city', 'Unknown')}"
-            location_item = QTableWidgetItem(location)
-            self.server_table.setItem(row, 0, location_item)
-            
-            # Load (simulated)
-            load = f"{random.randint(10, 90)}%"
-            load_item = QTableWidgetItem(load)
-            self.server_table.setItem(row, 1, load_item)
-            
-            # Ping (simulated)
-            ping = f"{random.randint(5, 300)} ms"
-            ping_item = QTableWidgetItem(ping)
-            self.server_table.setItem(row, 2, ping_item)
-            
-            # Features
-            features = []
-            capabilities = server.get('capabilities', {})
-            if capabilities.get('multi_hop', False):
-                features.append("Multi-hop")
-            if capabilities.get('obfuscation', False):
-                features.append("Obfuscation")
-            if capabilities.get('streaming', False):
-                features.append("Streaming")
-            if capabilities.get('p2p', False):
-                features.append("P2P")
-                
-            features_str = ", ".join(features) if features else "Standard"
-            features_item = QTableWidgetItem(features_str)
-            self.server_table.setItem(row, 3, features_item)
-            
-            # Store server data in the first column item
-            location_item.setData(Qt.UserRole, server)
+    def update_metrics(self, updates):
+        """Apply live ping/load values ({server_id: {"ping_ms": ..., "load": ...}})"""
+        self.model.update_metrics(updates)
+        
+    def visible_server_ids(self):
+        """Servers on screen, measured first by the metrics service"""
+        return visible_server_ids(self.server_table, self.proxy)
     
-    def on_server_selected(self, item):
+    def on_server_selected(self, index):
         """Handle server selection"""
-        # Get the server data from the first column of the selected row
-        row = item.row()
-        server = self.server_table.item(row, 0).data(Qt.UserRole)
+        server = self.proxy.server_for(index)
         if server:
             self.server_selected.emit(server)
 
@@ -530,6 +584,16 @@ class ConnectionWidget(QWidget):
             
             self.uptime_label.setText("0:00:00")
     
+    def set_connecting(self, connecting):
+        """Show a request in progress; disconnect doubles as cancel meanwhile"""
+        if connecting:
+            self.status_label.setText("Connecting...")
+            self.status_label.setStyleSheet("color: orange; font-weight: bold;")
+            self.connect_button.setEnabled(False)
+            self.disconnect_button.setEnabled(True)
+        elif self.status_label.text() == "Connecting...":
+            self.update_status({"connected": False})
+
     def update_uptime(self):
         """Update the uptime display"""
         elapsed = int(time.time() - self.uptime_start)
@@ -734,7 +798,11 @@ class MainWindow(QMainWindow):
         home_dir = os.path.expanduser("~/.anidata")
         os.makedirs(home_dir, exist_ok=True)
         
-        self.vpn_manager = WireGuardManager()
+        # Created by init_backend() once the window is on screen
+        self.vpn_manager = None
+        self.status_thread = None
+        self.orchestrator = None
+        self.metrics_feed = None
         self.settings = QSettings("AniData", "VPN")
         self.load_settings()
         
@@ -748,6 +816,42 @@ class MainWindow(QMainWindow):
         }
         self.update_theme_assets(self.app_settings.get("theme", "dark"))
         
+        with _timeline.phase("build window"):
+            self.initUI()
+        
+    def init_backend(self):
+        """Create the VPN manager, start monitoring and load servers
+        
+        Deferred until after the first paint: building the manager may load the
+        catalog, generate keys or prompt for privileges.
+        """
+        with _timeline.phase("init manager"):
+            # Prefer the control daemon, which owns the tunnel and the server catalog
+            self.vpn_manager = connect_daemon_manager() or WireGuardManager()
+        
+        # Start status monitoring
+        self.status_thread = create_status_monitor(self.vpn_manager)
+        self.status_thread.status_updated.connect(self.update_status)
+        self.status_thread.start()
+        
+        # Connect/disconnect run on the orchestrator's worker thread
+        self.orchestrator = ConnectionOrchestrator(self.vpn_manager, self)
+        self.orchestrator.phase_changed.connect(self.on_connection_phase)
+        self.orchestrator.connect_finished.connect(self.on_connect_finished)
+        self.orchestrator.disconnect_finished.connect(self.on_disconnect_finished)
+        self.orchestrator.install_finished.connect(self.on_install_finished)
+        self.orchestrator.start()
+        
+        with _timeline.phase("load servers"):
+            self.load_server_data()
+        
+        # Live ping/load for the Load and Ping columns
+        self.metrics_feed = MetricsFeed(self.vpn_manager.servers, self.server_widget, parent=self)
+        self.metrics_feed.start()
+        self.map_widget.set_metrics_provider(self.metrics_feed.cache.get)
+        
+        _timeline.finish()
+        
     def update_theme_assets(self, theme):
         """Update asset paths based on the selected theme"""
         base_dir = os.path.dirname(__file__)
@@ -771,14 +875,6 @@ class MainWindow(QMainWindow):
                 "logo": os.path.join(base_dir, "..", "assets", "logo.png")
             }
         
-        # Start status monitoring thread
-        self.status_thread = VPNStatusThread(self.vpn_manager)
-        self.status_thread.status_updated.connect(self.update_status)
-        self.status_thread.start()
-        
-        # Try to load server data
-        self.load_server_data()
-        
     def initUI(self):
         """Initialize the user interface"""
         self.setWindowTitle("AniData VPN")
@@ -820,7 +916,7 @@ class MainWindow(QMainWindow):
         splitter = QSplitter(Qt.Horizontal)
         
         # Left side - Server list
-        self.server_widget = ServerListWidget(self.vpn_manager.servers, self)
+        self.server_widget = ServerListWidget([], self)
         self.server_widget.server_selected.connect(self.on_server_selected)
         splitter.addWidget(self.server_widget)
         
@@ -835,6 +931,7 @@ class MainWindow(QMainWindow):
         
         # Map tab
         self.map_widget = MapWidget(self)
+        self.map_widget.server_selected.connect(self.on_server_selected)
         tabs.addTab(self.map_widget, "World Map")
         
         # Statistics tab
@@ -1049,6 +1146,8 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'server_widget'):
             self.server_widget.servers = self.vpn_manager.servers
             self.server_widget.populate_servers()
+        if hasattr(self, 'map_widget'):
+            self.map_widget.set_servers(self.vpn_manager.servers)
     
     def on_server_selected(self, server):
         """Handle server selection"""
@@ -1057,10 +1156,11 @@ class MainWindow(QMainWindow):
     
     def on_connect(self, options):
         """Handle connect button click"""
-        server = options.get("server", {})
-        protocol = options.get("protocol", "wireguard")
+        if self.orchestrator is None:
+            self.statusBar().showMessage("Still starting, please try again in a moment")
+            return
         
-        self.statusBar().showMessage(f"Connecting to {server.get('country')}, {server.get('city')} using {protocol}...")
+        server = options.get("server", {})
         
         # Save selected options to settings
         self.app_settings["kill_switch"] = options.get("kill_switch", True)
@@ -1069,54 +1169,57 @@ class MainWindow(QMainWindow):
         self.app_settings["default_server"] = server.get("id")
         self.save_settings()
         
-        # Check if WireGuard tools are installed and sudo script is available
-        if protocol.lower() == "wireguard":
-            try:
-                # Check for WireGuard tools
-                result = subprocess.run(["which", "wg"], capture_output=True, text=True)
-                if result.returncode != 0:
-                    error = "WireGuard tools are not installed. Please install 'wireguard-tools' package."
-                    self.statusBar().showMessage(f"Connection failed: {error}")
-                    QMessageBox.warning(self, "Connection Failed", f"Failed to connect to VPN: {error}")
-                    
-                    # Offer to install WireGuard
-                    reply = QMessageBox.question(self, "Install WireGuard?", 
-                                               "Would you like to install WireGuard tools now?",
-                                               QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
-                    if reply == QMessageBox.Yes:
-                        try:
-                            self.statusBar().showMessage("Installing WireGuard tools...")
-                            install_cmd = "pkexec apt-get install -y wireguard-tools"
-                            subprocess.run(install_cmd, shell=True, check=True)
-                            self.statusBar().showMessage("WireGuard tools installed. Trying to connect...")
-                            # Continue with connection attempt
-                        except Exception as e:
-                            self.statusBar().showMessage(f"Failed to install WireGuard tools: {str(e)}")
-                            return
-                    else:
-                        return
-                
-                # Check for sudo script
-                sudo_script = os.path.expanduser("~/.anidata/vpn_sudo.sh")
-                if not os.path.exists(sudo_script) or not os.access(sudo_script, os.X_OK):
-                    # Try to set up the script
-                    try:
-                        if hasattr(self.vpn_manager, '_setup_sudo_script'):
-                            self.vpn_manager._setup_sudo_script()
-                        else:
-                            error = "Les scripts d'élévation de privilèges ne sont pas configurés correctement."
-                            self.statusBar().showMessage(f"Connection failed: {error}")
-                            QMessageBox.warning(self, "Connection Failed", error)
-                            return
-                    except Exception as e:
-                        self.statusBar().showMessage(f"Failed to setup sudo script: {str(e)}")
-                        return
-                        
-            except Exception:
-                pass
+        # Tool checks and the connection itself run on the worker;
+        # the disconnect button cancels while connecting
+        self._pending_connect = options
+        self.connection_widget.set_connecting(True)
+        self.orchestrator.request_connect(options)
+    
+    def on_connection_phase(self, phase, message):
+        """Progress reported by the orchestrator"""
+        self.statusBar().showMessage(message)
+    
+    def on_connect_finished(self, result):
+        """Result of a connect request (GUI thread)"""
+        server = result.get("server", {})
+        protocol = result.get("protocol", "wireguard")
         
-        # Connect to VPN
-        result = self.vpn_manager.connect(server_id=server.get("id"))
+        if not self.orchestrator.is_busy():
+            self.connection_widget.set_connecting(False)
+        
+        if result.get("cancelled", False):
+            self.statusBar().showMessage("Connection cancelled")
+            return
+        
+        if result.get("missing_tools", False):
+            error = result.get("error", "")
+            self.statusBar().showMessage(f"Connection failed: {error}")
+            QMessageBox.warning(self, "Connection Failed", f"Failed to connect to VPN: {error}")
+            
+            # Offer to install WireGuard, then retry once installed
+            reply = QMessageBox.question(self, "Install WireGuard?", 
+                                       "Would you like to install WireGuard tools now?",
+                                       QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            if reply == QMessageBox.Yes:
+                self.orchestrator.request_install()
+            return
+        
+        if result.get("needs_privileges", False):
+            # First run only: the setup asks the user, so it stays on the GUI thread
+            if hasattr(self.vpn_manager, '_setup_sudo_script'):
+                try:
+                    self.vpn_manager._setup_sudo_script()
+                except Exception as e:
+                    self.statusBar().showMessage(f"Failed to setup sudo script: {str(e)}")
+                    return
+                if os.access(os.path.expanduser("~/.anidata/vpn_sudo.sh"), os.X_OK):
+                    self.connection_widget.set_connecting(True)
+                    self.orchestrator.request_connect(self._pending_connect)
+                    return
+            error = result.get("error", "")
+            self.statusBar().showMessage(f"Connection failed: {error}")
+            QMessageBox.warning(self, "Connection Failed", error)
+            return
         
         # Check for permission error and suggest running as admin
         if not result.get("success", False) and "Permission" in str(result.get("error", "")):
@@ -1153,12 +1256,29 @@ class MainWindow(QMainWindow):
             self.statusBar().showMessage(f"Connection failed: {error}")
             QMessageBox.warning(self, "Connection Failed", f"Failed to connect to VPN: {error}")
     
+    def on_install_finished(self, result):
+        """WireGuard tools installation done: retry the connect that needed them"""
+        if not result.get("success", False):
+            self.statusBar().showMessage(f"Failed to install WireGuard tools: {result.get('error', '')}")
+            return
+        
+        self.statusBar().showMessage("WireGuard tools installed. Trying to connect...")
+        options = getattr(self, "_pending_connect", None)
+        if options:
+            self.connection_widget.set_connecting(True)
+            self.orchestrator.request_connect(options)
+    
     def on_disconnect(self):
-        """Handle disconnect button click"""
+        """Handle disconnect button click (also cancels a connect in progress)"""
+        if self.orchestrator is None:
+            return
         self.statusBar().showMessage("Disconnecting...")
-        
-        # Disconnect from VPN
-        result = self.vpn_manager.disconnect()
+        self.orchestrator.request_disconnect()
+    
+    def on_disconnect_finished(self, result):
+        """Result of a disconnect request (GUI thread)"""
+        if not self.orchestrator.is_busy():
+            self.connection_widget.set_connecting(False)
         
         # For UI-only mode, update connection state
         if hasattr(self.vpn_manager, '_connected'):
@@ -1166,23 +1286,16 @@ class MainWindow(QMainWindow):
             self.vpn_manager._connected_server = None
             self.vpn_manager._connected_protocol = None
         
-        if result.get("success", False):
-            self.statusBar().showMessage("Disconnected")
-            
-            # Update status in all widgets
-            status = {"connected": False}
-            self.update_status(status)
-        else:
-            # In UI-only mode, we'll still show as disconnected
-            self.statusBar().showMessage("Disconnected")
-            status = {"connected": False}
-            self.update_status(status)
-            
-            # Only show error if not in UI-only mode
-            if "UI-only mode" not in result.get("error", ""):
-                error = result.get("error", "Unknown error")
-                self.statusBar().showMessage(f"Disconnection failed: {error}")
-                QMessageBox.warning(self, "Disconnection Failed", f"Failed to disconnect from VPN: {error}")
+        # In UI-only mode, we'll still show as disconnected
+        self.statusBar().showMessage("Disconnected")
+        status = {"connected": False}
+        self.update_status(status)
+        
+        # Only show error if not in UI-only mode
+        if not result.get("success", False) and "UI-only mode" not in result.get("error", ""):
+            error = result.get("error", "Unknown error")
+            self.statusBar().showMessage(f"Disconnection failed: {error}")
+            QMessageBox.warning(self, "Disconnection Failed", f"Failed to disconnect from VPN: {error}")
     
     def tray_connect(self):
         """Connect to the last used server from the system tray"""
@@ -1271,8 +1384,13 @@ class MainWindow(QMainWindow):
     
     def update_status(self, status):
         """Update status in all widgets"""
+        # Polled "disconnected" states would hide a connect still in progress
+        if self.orchestrator is not None and self.orchestrator.is_busy() and not status.get("connected", False):
+            return
         self.connection_widget.update_status(status)
         self.statistics_widget.update_statistics(status)
+        connected = status.get("connected", False)
+        self.map_widget.set_connected((status.get("server") or {}).get("id") if connected else None)
     
     def closeEvent(self, event):
         """Handle window close event"""
@@ -1293,13 +1411,21 @@ class MainWindow(QMainWindow):
     def close_application(self):
         """Close the application"""
         # Stop status thread
-        if hasattr(self, 'status_thread'):
+        if self.status_thread:
             self.status_thread.stop()
         
+        # Let the connect/disconnect in progress finish before tearing down
+        if self.orchestrator is not None:
+            self.orchestrator.stop()
+        
+        if self.metrics_feed is not None:
+            self.metrics_feed.stop()
+        
         # Disconnect from VPN if connected
-        status = self.vpn_manager.get_status()
-        if status.get("connected", False):
-            self.vpn_manager.disconnect()
+        if self.vpn_manager is not None:
+            status = self.vpn_manager.get_status()
+            if status.get("connected", False):
+                self.vpn_manager.disconnect()
         
         # Save settings
         self.save_settings()
@@ -1441,6 +1567,11 @@ def main():
     # Create and show main window
     window = MainWindow()
     window.show()
+    _timeline.mark("window shown")
+    
+    # Paint the window before initializing the backend
+    app.processEvents()
+    QTimer.singleShot(0, window.init_backend)
     
     sys.exit(app.exec_())
 
@@ -1,9 +1,13 @@
 import os
 import sys
 import json
-from PySide6.QtCore import QObject, Signal
+from PySide6.QtCore import QObject, Signal, QTimer
+from core.timeline import get_timeline
 from . import main
 from .modern_ui import ModernMainWindow, COLORS
+from .orchestrator import ConnectionOrchestrator
+
+_timeline = get_timeline("modern")
 
 # Ensure the project root is in Python path
 current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -16,6 +20,21 @@ class VPNBridge(QObject):
     
     def __init__(self):
         super().__init__()
+        # Created in setup_modern_ui(), once the window is on screen
+        self.vpn_manager = None
+        self.status_thread = None
+        self.orchestrator = None
+        self.metrics_feed = None
+        self.telemetry = None
+        self.telemetry_timer = None
+        self.telemetry_index = -1
+        self.current_server = None
+        self.servers = []
+        self.settings = {}
+        self.protocol = "wireguard"  # Default protocol
+        
+    def _init_local_manager(self):
+        """Drive the tunnel in-process when no daemon is running"""
         try:
             from core.protocols.wireguard.wireguard import WireGuardManager
             home_dir = os.path.expanduser("~/.anidata")
@@ -25,17 +44,17 @@ class VPNBridge(QObject):
         except ImportError:
             self.vpn_manager = main.WireGuardManager()
         
-        self.status_thread = None
-        self.current_server = None
-        self.servers = []
-        self.settings = {}
-        self.protocol = "wireguard"  # Default protocol
-        
     def setup_modern_ui(self, window: ModernMainWindow):
         self.window = window
         
+        with _timeline.phase("init manager"):
+            self.vpn_manager = main.connect_daemon_manager()
+            if self.vpn_manager is None:
+                self._init_local_manager()
+        
         # Connect signals from UI to logic
         self.window.server_list.server_selected.connect(self.on_server_selected)
+        self.window.map_widget.server_selected.connect(self.on_server_selected)
         self.window.connection_widget.connect_clicked.connect(self.connect_vpn)
         self.window.connection_widget.disconnect_clicked.connect(self.disconnect_vpn)
         self.window.settings_widget.settings_changed.connect(self.save_settings)
@@ -45,13 +64,37 @@ class VPNBridge(QObject):
         self.statistics_updated.connect(self.window.stats_widget.update_statistics)
         
         # Initialize status monitoring
-        self.status_thread = main.VPNStatusThread(self.vpn_manager)
+        self.status_thread = main.create_status_monitor(self.vpn_manager)
         self.status_thread.status_updated.connect(self.update_status)
         self.status_thread.start()
         
+        # Connect/disconnect run off the GUI thread
+        self.orchestrator = ConnectionOrchestrator(self.vpn_manager)
+        self.orchestrator.connect_finished.connect(self.on_connect_finished)
+        self.orchestrator.disconnect_finished.connect(self.on_disconnect_finished)
+        self.orchestrator.start()
+        
+        # High-rate samples for the graph come from the daemon's shared memory
+        if hasattr(self.vpn_manager, 'open_telemetry'):
+            self.telemetry = self.vpn_manager.open_telemetry()
+        if self.telemetry and hasattr(self.window, 'bandwidth_graph'):
+            self.telemetry_index = self.telemetry.head - 1
+            self.window.bandwidth_graph.set_refresh_interval(100)
+            self.telemetry_timer = QTimer(self)
+            self.telemetry_timer.timeout.connect(self.poll_telemetry)
+            self.telemetry_timer.start(100)
+        
         # Load initial data
-        self.load_servers()
+        with _timeline.phase("load servers"):
+            self.load_servers()
+        
+        # Live ping/load in the server list
+        self.metrics_feed = main.MetricsFeed(getattr(self.window.server_list, 'servers', self.servers),
+                                             self.window.server_list, parent=self)
+        self.metrics_feed.start()
+        self.window.map_widget.set_metrics_provider(self.metrics_feed.cache.get)
         self.load_settings()
+        _timeline.finish()
         
     def load_servers(self):
         """Load server data from configuration file"""
@@ -61,23 +104,9 @@ class VPNBridge(QObject):
                 self.load_fallback_servers()
                 return
                 
-            # Convert server format if needed
-            formatted_servers = []
-            for server in self.servers:
-                formatted_server = {
-                    'id': server.get('id', ''),
-                    'country': server.get('country', 'Unknown'),
-                    'city': server.get('city', ''),
-                    'protocols': server.get('protocols', ['wireguard']),
-                    'bandwidth': server.get('bandwidth', 0),
-                    'status': server.get('status', 'active'),
-                    'coordinates': server.get('coordinates', {'latitude': 0, 'longitude': 0}),
-                    'capabilities': server.get('capabilities', {})
-                }
-                formatted_servers.append(formatted_server)
-            
-            self.servers = formatted_servers
+            # The model reads fields with defaults: pass the catalog as-is, no copy
             self.window.server_list.populate_servers(self.servers)
+            self.window.map_widget.set_servers(self.servers)
             
         except Exception as e:
             print(f"Error loading server data: {str(e)}")
@@ -156,54 +185,51 @@ class VPNBridge(QObject):
         
     def on_server_selected(self, server):
         self.current_server = server
-        self.window.connection_widget.server_info.setText(f"Selected: {server['country']} - {server['city']}")
+        self.window.connection_widget.server_info.setText(f"Selected: {server.get('country', 'Unknown')} - {server.get('city', '')}")
         self.window.connection_widget.connect_btn.setEnabled(True)
         
     def connect_vpn(self):
-        if not self.current_server:
+        if not self.current_server or self.orchestrator is None:
             return
-            
-        try:
-            # Configure connection based on selected protocol
-            connection_config = {
-                'server': self.current_server,
-                'protocol': self.protocol,
-                'port': 51820 if self.protocol == 'wireguard' else 1194,
-            }
-            
-            self.vpn_manager.connect(connection_config)
-            self.status_updated.emit(True, self.current_server, "00:00:00")
-            
-            # Start bandwidth monitoring
-            if hasattr(self.window, 'bandwidth_graph'):
-                self.window.bandwidth_graph.reset()
-                self.window.bandwidth_graph.start_monitoring()
-                
-        except Exception as e:
-            print(f"Failed to connect: {e}")
+        self.orchestrator.request_connect({"server": self.current_server, "protocol": self.protocol})
+        
+    def on_connect_finished(self, result):
+        if not result.get('success'):
+            if not result.get('cancelled'):
+                print(f"Failed to connect: {result.get('error', 'unknown error')}")
             self.status_updated.emit(False, None, None)
+            return
+            
+        self.status_updated.emit(True, result.get('server'), "00:00:00")
+        
+        # Start bandwidth monitoring
+        if hasattr(self.window, 'bandwidth_graph'):
+            self.window.bandwidth_graph.reset()
+            self.window.bandwidth_graph.start_monitoring()
             
     def disconnect_vpn(self):
-        try:
-            self.vpn_manager.disconnect()
-            # Use dummy server object when disconnected
-            self.status_updated.emit(False, {
-                'country': 'Not Connected',
-                'city': '',
-                'id': '',
-                'protocols': [],
-                'capabilities': {}
-            }, "00:00:00")
-        except Exception as e:
-            print(f"Failed to disconnect: {e}")
+        if self.orchestrator is not None:
+            self.orchestrator.request_disconnect()
+            
+    def on_disconnect_finished(self, result):
+        if not result.get('success', False):
+            print(f"Failed to disconnect: {result.get('error', 'unknown error')}")
+        # Use dummy server object when disconnected
+        self.status_updated.emit(False, {
+            'country': 'Not Connected',
+            'city': '',
+            'id': '',
+            'protocols': [],
+            'capabilities': {}
+        }, "00:00:00")
             
     def update_status(self, status):
         is_connected = status.get('connected', False)
         uptime = status.get('uptime', "00:00:00")
         stats = status.get('statistics', {})
         
-        # Update bandwidth graph if available
-        if hasattr(self.window, 'bandwidth_graph') and is_connected:
+        # Update bandwidth graph if available (telemetry feeds it otherwise)
+        if hasattr(self.window, 'bandwidth_graph') and is_connected and not self.telemetry_timer:
             download_speed = stats.get('download_speed', 0)
             upload_speed = stats.get('upload_speed', 0)
             self.window.bandwidth_graph.update_bandwidth(download_speed, upload_speed)
@@ -218,6 +244,7 @@ class VPNBridge(QObject):
         }
         
         self.status_updated.emit(is_connected, current_server, uptime)
+        self.window.map_widget.set_connected(current_server.get('id') or None)
         
         # Update statistics
         download_speed = f"{stats.get('download_speed', 0):.2f} MB/s"
@@ -232,21 +259,46 @@ class VPNBridge(QObject):
             total_uploaded
         )
         
+    def poll_telemetry(self):
+        """Copy new shared-memory samples into the graph (no IPC round trip)"""
+        samples = self.telemetry.since(self.telemetry_index)
+        if not samples:
+            return
+        self.telemetry_index = samples[-1].index
+        self.window.bandwidth_graph.update_bandwidth_batch([
+            (sample.timestamp, sample.rx_rate / 1024 / 1024, sample.tx_rate / 1024 / 1024)
+            for sample in samples if sample.connected
+        ])
+        
     def cleanup(self):
+        if self.telemetry_timer:
+            self.telemetry_timer.stop()
+        if self.telemetry:
+            self.telemetry.close()
+            self.telemetry = None
         if self.status_thread:
             self.status_thread.stop()
             self.status_thread.wait()
+        if self.orchestrator:
+            self.orchestrator.stop()
+        if self.metrics_feed:
+            self.metrics_feed.stop()
 
 def run_modern_ui():
     from PySide6.QtWidgets import QApplication
     
     app = QApplication(sys.argv)
-    window = ModernMainWindow()
+    with _timeline.phase("build window"):
+        window = ModernMainWindow()
     
     bridge = VPNBridge()
-    bridge.setup_modern_ui(window)
     
     window.show()
+    _timeline.mark("window shown")
+    
+    # Paint the window before creating the manager and loading servers
+    app.processEvents()
+    QTimer.singleShot(0, lambda: bridge.setup_modern_ui(window))
     result = app.exec_()
     
     bridge.cleanup()
@@ -6,9 +6,11 @@ from datetime import datetime, timedelta
 from PySide6.QtWidgets import *
 from PySide6.QtCore import *
 from PySide6.QtGui import *
-from PySide6.QtWebEngineWidgets import QWebEngineView
-from .bandwidth_graph import BandwidthGraph
-import pyqtgraph as pg
+
+from .server_model import ServerTableModel, ServerFilterProxyModel, COLUMN_LOCATION, visible_server_ids
+from .native_map import NativeMapWidget
+
+# The graph (pyqtgraph + numpy) is imported when first shown
 
 # Lovable.ai inspired color scheme
 COLORS = {
@@ -61,6 +63,8 @@ class ModernCard(QFrame):
         """)
 
 class ModernMapWidget(QWidget):
+    server_selected = Signal(dict)
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         layout = QVBoxLayout(self)
@@ -77,13 +81,82 @@ class ModernMapWidget(QWidget):
         """)
         self.map_layout = QVBoxLayout(self.map_card)
         
-        self.web_view = QWebEngineView()
-        self.map_layout.addWidget(self.web_view)
+        self.map_view = NativeMapWidget()
+        self.map_view.server_selected.connect(self.server_selected)
+        self.map_layout.addWidget(self.map_view)
         
         layout.addWidget(self.map_card)
 
-    def load_map(self, html_path):
-        self.web_view.load(QUrl.fromLocalFile(html_path))
+    def set_servers(self, servers):
+        self.map_view.set_servers(servers)
+
+    def set_metrics_provider(self, provider):
+        self.map_view.set_metrics_provider(provider)
+
+    def set_connected(self, server_id):
+        self.map_view.set_connected(server_id)
+
+class DeferredBandwidthGraph(QWidget):
+    """Placeholder that builds the pyqtgraph graph on first display"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.graph = None
+        # Requests made before the graph exists, applied when it is built
+        self.refresh_interval = None
+        self.monitoring = False
+        self.reset_pending = False
+        self.graph_layout = QVBoxLayout(self)
+        self.graph_layout.setContentsMargins(0, 0, 0, 0)
+        
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.graph is None:
+            QTimer.singleShot(0, self._create_graph)
+            
+    def _create_graph(self):
+        if self.graph is not None:
+            return
+        from .bandwidth_graph import BandwidthGraph
+        self.graph = BandwidthGraph(self)
+        if self.refresh_interval:
+            self.graph.set_refresh_interval(self.refresh_interval)
+        if self.reset_pending:
+            self.graph.reset()
+            self.reset_pending = False
+        if self.monitoring:
+            self.graph.start_monitoring()
+        self.graph_layout.addWidget(self.graph)
+        
+    # Samples arriving before the graph exists have nothing to be drawn on
+    def update_bandwidth(self, download_speed, upload_speed):
+        if self.graph:
+            self.graph.update_bandwidth(download_speed, upload_speed)
+            
+    def update_bandwidth_batch(self, samples):
+        if self.graph:
+            self.graph.update_bandwidth_batch(samples)
+            
+    def set_refresh_interval(self, interval_ms):
+        self.refresh_interval = interval_ms
+        if self.graph:
+            self.graph.set_refresh_interval(interval_ms)
+            
+    def reset(self):
+        if self.graph:
+            self.graph.reset()
+        else:
+            self.reset_pending = True
+            
+    def start_monitoring(self):
+        self.monitoring = True
+        if self.graph:
+            self.graph.start_monitoring()
+            
+    def stop_monitoring(self):
+        self.monitoring = False
+        if self.graph:
+            self.graph.stop_monitoring()
 
 class ProtocolSelector(QWidget):
     protocol_changed = Signal(str)
@@ -130,25 +203,34 @@ class ServerListWidget(QWidget):
             }
         """)
         
-        self.server_list = QListWidget()
+        # Model/view list: items are not materialized, filtering runs in the proxy
+        self.model = ServerTableModel(show_protocols=True, parent=self)
+        self.proxy = ServerFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.sort(COLUMN_LOCATION, Qt.AscendingOrder)
+        
+        self.server_list = QListView()
+        self.server_list.setModel(self.proxy)
+        self.server_list.setModelColumn(COLUMN_LOCATION)
+        self.server_list.setUniformItemSizes(True)
         self.server_list.setStyleSheet("""
-            QListWidget {
+            QListView {
                 border: 1px solid #E5E7EB;
                 border-radius: 8px;
                 background: white;
                 padding: 4px;
                 margin-top: 8px;
             }
-            QListWidget::item {
+            QListView::item {
                 padding: 8px;
                 border-radius: 4px;
                 margin: 2px;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background: #EEF2FF;
                 color: #6366F1;
             }
-            QListWidget::item:hover {
+            QListView::item:hover {
                 background: #F3F4F6;
             }
         """)
@@ -157,29 +239,25 @@ class ServerListWidget(QWidget):
         layout.addWidget(self.server_list)
         
         self.search_box.textChanged.connect(self.filter_servers)
-        self.server_list.itemClicked.connect(self.on_server_selected)
+        self.server_list.clicked.connect(self.on_server_selected)
         
     def populate_servers(self, servers):
         self.servers = servers
-        self.server_list.clear()
-        for server in servers:
-            protocols = ", ".join(p.upper() for p in server.get('protocols', []))
-            item = QListWidgetItem(f"{server['country']} - {server['city']} ({protocols})")
-            item.setData(Qt.UserRole, server)
-            self.server_list.addItem(item)
+        self.model.set_servers(servers)
             
     def filter_servers(self, text):
-        for i in range(self.server_list.count()):
-            item = self.server_list.item(i)
-            server = item.data(Qt.UserRole)
-            if text.lower() in server['country'].lower() or text.lower() in server['city'].lower():
-                item.setHidden(False)
-            else:
-                item.setHidden(True)
+        self.proxy.set_search(text)
+        
+    def update_metrics(self, updates):
+        self.model.update_metrics(updates)
+        
+    def visible_server_ids(self):
+        return visible_server_ids(self.server_list, self.proxy)
                 
-    def on_server_selected(self, item):
-        server = item.data(Qt.UserRole)
-        self.server_selected.emit(server)
+    def on_server_selected(self, index):
+        server = self.proxy.server_for(index)
+        if server:
+            self.server_selected.emit(server)
 
 class ModernConnectionWidget(QWidget):
     connect_clicked = Signal()
@@ -427,11 +505,11 @@ class ModernMainWindow(QMainWindow):
         
         # Create widgets
         self.map_widget = ModernMapWidget()
-        self.server_list = ModernServerListWidget()
+        self.server_list = ServerListWidget()
         self.protocol_selector = ProtocolSelector()
         self.connection_widget = ModernConnectionWidget()
         self.stats_widget = ModernStatisticsWidget()
-        self.bandwidth_graph = BandwidthGraph()
+        self.bandwidth_graph = DeferredBandwidthGraph()
         self.settings_widget = ModernSettingsWidget()
         
         # Add widgets to layouts
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Native Server Map
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+World map drawn with QGraphicsScene, no web engine.
+
+The basemap is a GeoJSON file of land polygons, ``ui/maps/basemap.geojson``.
+The one shipped is a coarse hand-simplified outline of the continents and
+main islands (about 10 KB); Natural Earth ``ne_110m_land.geojson`` saved
+under that name gives real coastlines. It is projected (equirectangular)
+and simplified once, then cached as a pickle under ``~/.anidata/cache``
+keyed by the file's mtime and size. The whole basemap is a single path
+item. Without a basemap file, only a graticule is drawn.
+
+Servers are placed from their ``coordinates`` and grouped on a spatial
+grid whose cell size follows the zoom level, so thousands of servers
+become a few dozen items. Markers ignore the view transform (constant size
+on screen). Tooltips are built when shown, so the latency in them comes
+straight from the metrics provider.
+"""
+
+import os
+import json
+import math
+import pickle
+import logging
+from typing import Callable, Dict, List, Optional
+
+from PySide6.QtCore import Qt, QRectF, QPointF, QEvent, Signal
+from PySide6.QtGui import QColor, QPainter, QPainterPath, QPen, QBrush, QFont
+from PySide6.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsItem, QGraphicsPathItem, QToolTip
+
+logger = logging.getLogger('anidata_map')
+
+BASEMAP_FILE = os.path.join(os.path.dirname(__file__), "..", "maps", "basemap.geojson")
+CACHE_DIR = os.path.join(os.path.expanduser("~/.anidata"), "cache")
+CACHE_VERSION = 1
+
+# Scene units: one degree = 10 units
+SCENE_WIDTH = 3600.0
+SCENE_HEIGHT = 1800.0
+
+MARKER_RADIUS = 6          # pixels, single server
+CLUSTER_RADIUS = 11        # pixels, group of servers
+CLUSTER_CELL = 36          # pixels between cluster centres
+MAX_ZOOM = 64.0
+SIMPLIFY_TOLERANCE = 0.5   # scene units dropped between consecutive points
+
+COLORS = {
+    "ocean": QColor("#1f2d3a"),
+    "land": QColor("#34495e"),
+    "coast": QColor("#4b6584"),
+    "graticule": QColor(255, 255, 255, 25),
+    "marker": QColor("#3498db"),
+    "cluster": QColor("#2980b9"),
+    "connected": QColor("#2ecc71"),
+    "text": QColor("#ffffff"),
+}
+
+
+def project(longitude: float, latitude: float) -> QPointF:
+    """Equirectangular projection to scene coordinates"""
+    return QPointF((longitude + 180.0) * SCENE_WIDTH / 360.0, (90.0 - latitude) * SCENE_HEIGHT / 180.0)
+
+
+# ----------------------------------------------------------------------
+# Basemap
+# ----------------------------------------------------------------------
+
+def _project_ring(ring) -> List[float]:
+    """Project and simplify one ring into a flat [x0, y0, x1, y1, ...] list"""
+    points = []
+    last_x = last_y = None
+    for position in ring:
+        x = (position[0] + 180.0) * SCENE_WIDTH / 360.0
+        y = (90.0 - position[1]) * SCENE_HEIGHT / 180.0
+        if last_x is not None and abs(x - last_x) < SIMPLIFY_TOLERANCE and abs(y - last_y) < SIMPLIFY_TOLERANCE:
+            continue
+        points.extend((x, y))
+        last_x, last_y = x, y
+    return points
+
+
+def _read_geojson(path: str) -> List[List[float]]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    features = data.get("features", [data]) if isinstance(data, dict) else []
+    rings = []
+    for feature in features:
+        geometry = feature.get("geometry", feature)
+        if not geometry:
+            continue
+        if geometry.get("type") == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry.get("type") == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            continue
+        for polygon in polygons:
+            for ring in polygon:
+                points = _project_ring(ring)
+                if len(points) >= 6:
+                    rings.append(points)
+    return rings
+
+
+def load_basemap(path: str = BASEMAP_FILE, use_cache: bool = True) -> List[List[float]]:
+    """
+    Projected basemap rings, from the pickle cache when the file is unchanged
+
+    Returns:
+        List of flat coordinate lists (empty if there is no basemap file)
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return []
+
+    key = (CACHE_VERSION, os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    cache_file = os.path.join(CACHE_DIR, "basemap.pickle")
+    if use_cache:
+        try:
+            with open(cache_file, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("key") == key:
+                return cached["rings"]
+        except (OSError, pickle.PickleError, EOFError, AttributeError, ValueError):
+            pass
+
+    try:
+        rings = _read_geojson(path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Could not read basemap {path}: {str(e)}")
+        return []
+
+    if use_cache:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                pickle.dump({"key": key, "rings": rings}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logger.debug(f"Could not write basemap cache: {str(e)}")
+    return rings
+
+
+def _basemap_path(rings: List[List[float]]) -> QPainterPath:
+    path = QPainterPath()
+    path.setFillRule(Qt.WindingFill)
+    for points in rings:
+        path.moveTo(points[0], points[1])
+        for i in range(2, len(points), 2):
+            path.lineTo(points[i], points[i + 1])
+        path.closeSubpath()
+    return path
+
+
+def _graticule_path(step: int = 30) -> QPainterPath:
+    path = QPainterPath()
+    for longitude in range(-180, 181, step):
+        path.moveTo(project(longitude, 90))
+        path.lineTo(project(longitude, -90))
+    for latitude in range(-90, 91, step):
+        path.moveTo(project(-180, latitude))
+        path.lineTo(project(180, latitude))
+    return path
+
+
+# ----------------------------------------------------------------------
+# Markers
+# ----------------------------------------------------------------------
+
+def cluster_servers(servers: List[Dict], cell: float) -> List[List[Dict]]:
+    """
+    Group servers falling in the same grid cell
+
+    Args:
+        servers: Servers with ``coordinates``
+        cell: Cell size in scene units
+    """
+    grid: Dict[tuple, List[Dict]] = {}
+    for server in servers:
+        coordinates = server.get("coordinates") or {}
+        latitude = coordinates.get("latitude")
+        longitude = coordinates.get("longitude")
+        if latitude is None or longitude is None:
+            continue
+        point = project(longitude, latitude)
+        grid.setdefault((int(point.x() // cell), int(point.y() // cell)), []).append(server)
+    return list(grid.values())
+
+
+class ClusterItem(QGraphicsItem):
+    """One server, or a group of nearby servers, drawn at a fixed pixel size"""
+
+    def __init__(self, servers: List[Dict]):
+        super().__init__()
+        self.servers = servers
+        self.connected = False
+        self.radius = MARKER_RADIUS if len(servers) == 1 else CLUSTER_RADIUS
+        self.setFlag(QGraphicsItem.ItemIgnoresTransformations)
+        self.setAcceptHoverEvents(True)
+        self.setZValue(10)
+
+        x = y = 0.0
+        for server in servers:
+            point = project(server["coordinates"]["longitude"], server["coordinates"]["latitude"])
+            x += point.x()
+            y += point.y()
+        self.setPos(x / len(servers), y / len(servers))
+
+    def boundingRect(self) -> QRectF:
+        r = self.radius + 2
+        return QRectF(-r, -r, 2 * r, 2 * r)
+
+    def paint(self, painter, option, widget=None):
+        r = self.radius
+        color = COLORS["connected"] if self.connected else (
+            COLORS["marker"] if len(self.servers) == 1 else COLORS["cluster"])
+        painter.setPen(QPen(COLORS["text"], 1.5))
+        painter.setBrush(QBrush(color))
+        painter.drawEllipse(QPointF(0, 0), r, r)
+        if len(self.servers) > 1:
+            painter.setPen(COLORS["text"])
+            font = QFont()
+            font.setPixelSize(10)
+            font.setBold(True)
+            painter.setFont(font)
+            painter.drawText(QRectF(-r, -r, 2 * r, 2 * r), Qt.AlignCenter, str(len(self.servers)))
+
+
+class NativeMapWidget(QGraphicsView):
+    """Pannable, zoomable server map"""
+
+    server_selected = Signal(dict)
+
+    def __init__(self, parent=None, basemap_file: str = BASEMAP_FILE):
+        super().__init__(parent)
+        self.servers: List[Dict] = []
+        self.metrics_provider: Optional[Callable[[str], Dict]] = None
+        self.connected_id: Optional[str] = None
+        self._clusters: List[ClusterItem] = []
+        self._cluster_level = None
+        self._user_zoomed = False
+        self._press_pos = None
+
+        self.scene = QGraphicsScene(0, 0, SCENE_WIDTH, SCENE_HEIGHT, self)
+        self.scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+        self.setScene(self.scene)
+        self.setBackgroundBrush(COLORS["ocean"])
+
+        graticule = QGraphicsPathItem(_graticule_path())
+        pen = QPen(COLORS["graticule"], 0)  # cosmetic: 1 px whatever the zoom
+        graticule.setPen(pen)
+        self.scene.addItem(graticule)
+
+        rings = load_basemap(basemap_file)
+        if rings:
+            land = QGraphicsPathItem(_basemap_path(rings))
+            land.setPen(QPen(COLORS["coast"], 0))
+            land.setBrush(COLORS["land"])
+            self.scene.addItem(land)
+
+        self.setRenderHint(QPainter.Antialiasing)
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        self.setOptimizationFlag(QGraphicsView.DontSavePainterState)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+
+    # ------------------------------------------------------------------
+    # Data
+    # ------------------------------------------------------------------
+
+    def set_servers(self, servers: List[Dict]) -> None:
+        self.servers = servers
+        self._cluster_level = None
+        self._update_clusters()
+
+    def set_metrics_provider(self, provider: Callable[[str], Dict]) -> None:
+        """``provider(server_id)`` returns {"ping_ms": ..., "load": ...}"""
+        self.metrics_provider = provider
+
+    def set_connected(self, server_id: Optional[str]) -> None:
+        if server_id == self.connected_id:
+            return
+        self.connected_id = server_id
+        for item in self._clusters:
+            connected = any(s.get("id") == server_id for s in item.servers)
+            if connected != item.connected:
+                item.connected = connected
+                item.update()
+
+    # ------------------------------------------------------------------
+    # Clustering
+    # ------------------------------------------------------------------
+
+    def _scale(self) -> float:
+        return self.transform().m11() or 1.0
+
+    def _update_clusters(self) -> None:
+        # Re-cluster per half zoom step only, not on every wheel tick
+        level = round(math.log2(self._scale()) * 2)
+        if level == self._cluster_level:
+            return
+        self._cluster_level = level
+
+        for item in self._clusters:
+            self.scene.removeItem(item)
+        self._clusters = []
+
+        cell = CLUSTER_CELL / (2 ** (level / 2))
+        for group in cluster_servers(self.servers, cell):
+            item = ClusterItem(group)
+            item.connected = any(s.get("id") == self.connected_id for s in group)
+            self.scene.addItem(item)
+            self._clusters.append(item)
+
+    # ------------------------------------------------------------------
+    # View behaviour
+    # ------------------------------------------------------------------
+
+    def _fit(self) -> None:
+        self.fitInView(self.scene.sceneRect(), Qt.KeepAspectRatio)
+        self._update_clusters()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._user_zoomed:
+            self._fit()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if not self._user_zoomed:
+            self._fit()
+
+    def _min_scale(self) -> float:
+        viewport = self.viewport().rect()
+        return min(viewport.width() / SCENE_WIDTH, viewport.height() / SCENE_HEIGHT) or 0.01
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120.0
+        if not steps:
+            return
+        current = self._scale()
+        target = max(self._min_scale(), min(MAX_ZOOM, current * (1.25 ** steps)))
+        if target != current:
+            self.scale(target / current, target / current)
+            self._user_zoomed = target > self._min_scale()
+            self._update_clusters()
+
+    def mousePressEvent(self, event):
+        self._press_pos = event.position().toPoint()
+        super().mousePressEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        super().mouseReleaseEvent(event)
+        if self._press_pos is None:
+            return
+        moved = (event.position().toPoint() - self._press_pos).manhattanLength()
+        self._press_pos = None
+        if moved > 4:
+            return  # a drag, not a click
+
+        item = self.itemAt(event.position().toPoint())
+        if not isinstance(item, ClusterItem):
+            return
+        if len(item.servers) == 1:
+            self.server_selected.emit(item.servers[0])
+        else:
+            # Zoom into the group until it splits
+            bounds = QRectF()
+            for server in item.servers:
+                point = project(server["coordinates"]["longitude"], server["coordinates"]["latitude"])
+                bounds = bounds.united(QRectF(point, point).adjusted(-5, -5, 5, 5))
+            self.fitInView(bounds, Qt.KeepAspectRatio)
+            if self._scale() > MAX_ZOOM:
+                factor = MAX_ZOOM / self._scale()
+                self.scale(factor, factor)
+            self._user_zoomed = True
+            self._update_clusters()
+
+    def viewportEvent(self, event):
+        if event.type() == QEvent.ToolTip:
+            item = self.itemAt(event.pos())
+            if isinstance(item, ClusterItem):
+                QToolTip.showText(event.globalPos(), self._tooltip(item), self.viewport())
+            else:
+                QToolTip.hideText()
+            return True
+        return super().viewportEvent(event)
+
+    def _describe(self, server: Dict) -> str:
+        text = f"{server.get('country', 'Unknown')}, {server.get('city', '')}"
+        metrics = self.metrics_provider(server.get("id")) if self.metrics_provider else {}
+        ping = metrics.get("ping_ms")
+        if ping is not None:
+            text += f" — {ping:.0f} ms"
+        elif metrics.get("ping_age") is not None:
+            text += " — unreachable"
+        if metrics.get("load") is not None:
+            text += f", load {metrics['load']:.0f}%"
+        return text
+
+    def _tooltip(self, item: ClusterItem) -> str:
+        lines = [self._describe(server) for server in item.servers[:8]]
+        if len(item.servers) > 8:
+            lines.append(f"… and {len(item.servers) - 8} more (click to zoom)")
+        return "\n".join(lines)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Connection Orchestrator
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Runs connect/disconnect off the GUI thread.
+
+Every blocking step (tool and privilege checks, tunnel bring-up through
+the manager or the daemon) runs on a single worker thread, so requests are
+naturally serialized. Queued requests are coalesced: a new connect replaces
+a connect that has not started yet, and a disconnect drops pending connects
+and cancels the one in progress. Cancellation is checked between phases; a
+tunnel that came up after cancellation is torn down again.
+
+Progress and results are reported through signals, which Qt delivers on the
+GUI thread.
+"""
+
+import os
+import queue
+import shutil
+import threading
+import subprocess
+from typing import Dict, Optional
+
+from PySide6.QtCore import QThread, Signal
+
+SUDO_SCRIPT = os.path.expanduser("~/.anidata/vpn_sudo.sh")
+INSTALL_COMMAND = ["pkexec", "apt-get", "install", "-y", "wireguard-tools"]
+
+# Phases reported through phase_changed
+PHASE_PREFLIGHT = "preflight"
+PHASE_PRIVILEGES = "privileges"
+PHASE_TUNNEL = "tunnel"
+PHASE_TEARDOWN = "teardown"
+PHASE_INSTALL = "install"
+
+
+class ConnectionCancelled(Exception):
+    """Raised between phases when the current request was cancelled"""
+
+
+class _Request:
+    def __init__(self, action: str, options: Optional[Dict] = None):
+        self.action = action
+        self.options = options or {}
+        self.cancelled = False
+
+
+class ConnectionOrchestrator(QThread):
+    """Worker thread serializing connection requests for a manager"""
+    phase_changed = Signal(str, str)       # phase, message
+    connect_finished = Signal(dict)        # manager result + "server"/"protocol"
+    disconnect_finished = Signal(dict)
+    install_finished = Signal(dict)
+    busy_changed = Signal(bool)
+
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self._queue = queue.Queue()
+        self._pending = []          # requests not started yet, in order
+        self._lock = threading.Lock()
+        self._current: Optional[_Request] = None
+        self.running = True
+
+    # ------------------------------------------------------------------
+    # GUI thread API
+    # ------------------------------------------------------------------
+
+    def request_connect(self, options: Dict) -> None:
+        """Queue a connect (``options`` as emitted by ConnectionWidget)"""
+        self._submit(_Request("connect", options), supersedes=("connect",))
+
+    def request_disconnect(self) -> None:
+        """Queue a disconnect, cancelling pending and in-progress connects"""
+        current = self._current
+        if current is not None and current.action == "connect":
+            current.cancelled = True
+        self._submit(_Request("disconnect"), supersedes=("connect", "disconnect"))
+
+    def request_install(self) -> None:
+        """Install the WireGuard tools (pkexec prompts on its own)"""
+        self._submit(_Request("install"))
+
+    def cancel(self) -> None:
+        """Cancel the request in progress, if any"""
+        current = self._current
+        if current is not None:
+            current.cancelled = True
+
+    def is_busy(self) -> bool:
+        with self._lock:
+            return self._current is not None or bool(self._pending)
+
+    def stop(self):
+        self.running = False
+        self.cancel()
+        self._queue.put(None)
+        self.wait()
+
+    def _submit(self, request: _Request, supersedes=()) -> None:
+        with self._lock:
+            for pending in self._pending:
+                if pending.action in supersedes:
+                    pending.cancelled = True
+            self._pending = [r for r in self._pending if not r.cancelled]
+            self._pending.append(request)
+        self._queue.put(request)
+
+    # ------------------------------------------------------------------
+    # Worker thread
+    # ------------------------------------------------------------------
+
+    def run(self):
+        while self.running:
+            request = self._queue.get()
+            if request is None:
+                break
+            with self._lock:
+                if request in self._pending:
+                    self._pending.remove(request)
+                if request.cancelled:
+                    continue
+                self._current = request
+            self.busy_changed.emit(True)
+            try:
+                if request.action == "connect":
+                    self.connect_finished.emit(self._run_connect(request))
+                elif request.action == "disconnect":
+                    self.disconnect_finished.emit(self._run_disconnect())
+                elif request.action == "install":
+                    self.install_finished.emit(self._run_install())
+            finally:
+                with self._lock:
+                    self._current = None
+                self.busy_changed.emit(self.is_busy())
+
+    def _phase(self, request: _Request, phase: str, message: str) -> None:
+        if request.cancelled:
+            raise ConnectionCancelled()
+        self.phase_changed.emit(phase, message)
+
+    def _run_connect(self, request: _Request) -> Dict:
+        server = request.options.get("server", {})
+        protocol = request.options.get("protocol", "wireguard")
+        base = {"server": server, "protocol": protocol}
+
+        try:
+            # Tool checks and privilege setup only matter for a local manager;
+            # the daemon already runs with the rights it needs
+            local = not hasattr(self.manager, "add_status_listener")
+            if local and protocol.lower() == "wireguard":
+                self._phase(request, PHASE_PREFLIGHT, "Checking WireGuard tools...")
+                if shutil.which("wg") is None:
+                    return dict(base, success=False, missing_tools=True,
+                                error="WireGuard tools are not installed. Please install 'wireguard-tools' package.")
+
+                self._phase(request, PHASE_PRIVILEGES, "Checking privileges...")
+                if not os.path.exists(SUDO_SCRIPT) or not os.access(SUDO_SCRIPT, os.X_OK):
+                    # Setting the script up shows dialogs: handed back to the GUI thread
+                    return dict(base, success=False, needs_privileges=True,
+                                error="Les scripts d'élévation de privilèges ne sont pas configurés correctement.")
+
+            self._phase(request, PHASE_TUNNEL,
+                        f"Connecting to {server.get('country')}, {server.get('city')} using {protocol}...")
+            result = self.manager.connect(server_id=server.get("id"))
+        except ConnectionCancelled:
+            return dict(base, success=False, cancelled=True, error="Connection cancelled")
+        except Exception as e:
+            return dict(base, success=False, error=str(e))
+
+        if request.cancelled and result.get("success", False):
+            # The tunnel came up after the user gave up: take it down again
+            self.phase_changed.emit(PHASE_TEARDOWN, "Connection cancelled, disconnecting...")
+            try:
+                self.manager.disconnect()
+            except Exception:
+                pass
+            return dict(base, success=False, cancelled=True, error="Connection cancelled")
+
+        return dict(base, **result)
+
+    def _run_disconnect(self) -> Dict:
+        self.phase_changed.emit(PHASE_TEARDOWN, "Disconnecting...")
+        try:
+            return self.manager.disconnect()
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def _run_install(self) -> Dict:
+        self.phase_changed.emit(PHASE_INSTALL, "Installing WireGuard tools...")
+        try:
+            subprocess.run(INSTALL_COMMAND, check=True)
+            return {"success": True}
+        except (OSError, subprocess.CalledProcessError) as e:
+            return {"success": False, "error": str(e)}
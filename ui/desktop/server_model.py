@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Server List Model
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Model/view server list shared by both Qt frontends.
+
+``ServerTableModel`` wraps the catalog list as-is: no per-row item objects,
+cell text is computed when a view asks for it, so only visible rows cost
+anything. Live metrics (ping, load) are kept in a side table keyed by
+server ID and announced with ``dataChanged`` over the affected row ranges
+only. ``ServerFilterProxyModel`` does search and sorting on top of it.
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PySide6.QtGui import QColor
+
+# Custom roles
+ServerRole = Qt.UserRole          # the server dict
+SortRole = Qt.UserRole + 1        # numeric key for metric columns
+SearchRole = Qt.UserRole + 2      # lowercase "country city id region"
+
+COLUMN_LOCATION = 0
+COLUMN_LOAD = 1
+COLUMN_PING = 2
+COLUMN_FEATURES = 3
+
+HEADERS = ["Location", "Load", "Ping", "Features"]
+
+# Values past their TTL (see core.vpn.metrics) are kept but greyed out
+STALE_COLOR = QColor(150, 150, 150)
+
+FEATURE_LABELS = (
+    ("multi_hop", "Multi-hop"),
+    ("obfuscation", "Obfuscation"),
+    ("streaming", "Streaming"),
+    ("p2p", "P2P"),
+)
+
+
+def server_features(server: Dict) -> str:
+    capabilities = server.get("capabilities", {})
+    features = [label for key, label in FEATURE_LABELS if capabilities.get(key, False)]
+    return ", ".join(features) if features else "Standard"
+
+
+class ServerTableModel(QAbstractTableModel):
+    """Table model over the server catalog"""
+
+    def __init__(self, servers: Optional[List[Dict]] = None, show_protocols: bool = False, parent=None):
+        """
+        Args:
+            servers: Catalog entries (kept by reference, not copied)
+            show_protocols: Append protocols to the location text (list views)
+            parent: Parent QObject
+        """
+        super().__init__(parent)
+        self.show_protocols = show_protocols
+        self._servers: List[Dict] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._metrics: Dict[str, Dict] = {}
+        self._search_keys: Optional[List[str]] = None
+        if servers:
+            self.set_servers(servers)
+
+    # ------------------------------------------------------------------
+    # Data management
+    # ------------------------------------------------------------------
+
+    def set_servers(self, servers: List[Dict]) -> None:
+        """Replace the catalog (one reset, no per-row work besides the ID index)"""
+        self.beginResetModel()
+        self._servers = servers
+        self._row_by_id = {server.get("id"): row for row, server in enumerate(servers)}
+        self._search_keys = None
+        self.endResetModel()
+
+    @property
+    def servers(self) -> List[Dict]:
+        return self._servers
+
+    def server_at(self, row: int) -> Optional[Dict]:
+        if 0 <= row < len(self._servers):
+            return self._servers[row]
+        return None
+
+    def row_of(self, server_id: str) -> Optional[int]:
+        return self._row_by_id.get(server_id)
+
+    def metrics(self, server_id: str) -> Dict:
+        return self._metrics.get(server_id, {})
+
+    def update_metrics(self, updates: Dict[str, Dict]) -> None:
+        """
+        Merge live metrics and notify views
+
+        Args:
+            updates: Mapping of server ID to {"ping_ms": float|None, "load": float|None},
+                optionally with "ping_stale"/"load_stale" flags and "ping_age" (seconds)
+        """
+        rows = []
+        for server_id, values in updates.items():
+            row = self._row_by_id.get(server_id)
+            if row is None:
+                continue
+            current = self._metrics.setdefault(server_id, {})
+            if any(current.get(key) != value for key, value in values.items()):
+                current.update(values)
+                rows.append(row)
+
+        # One dataChanged per contiguous run of rows, over the metric columns only
+        roles = [Qt.DisplayRole, SortRole, Qt.ForegroundRole, Qt.ToolTipRole]
+        for first, last in self._row_ranges(rows):
+            self.dataChanged.emit(self.index(first, COLUMN_LOAD), self.index(last, COLUMN_PING), roles)
+
+    @staticmethod
+    def _row_ranges(rows: Iterable[int]):
+        ranges = []
+        for row in sorted(rows):
+            if ranges and row == ranges[-1][1] + 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+        return ranges
+
+    def _search_key(self, row: int) -> str:
+        # Built on first search only, then reused for every keystroke
+        if self._search_keys is None:
+            self._search_keys = [
+                f"{s.get('country', '')} {s.get('city', '')} {s.get('id', '')} {s.get('region', '')}".lower()
+                for s in self._servers
+            ]
+        return self._search_keys[row]
+
+    # ------------------------------------------------------------------
+    # QAbstractTableModel interface
+    # ------------------------------------------------------------------
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._servers)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal and 0 <= section < len(HEADERS):
+            return HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        server = self._servers[index.row()]
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            if column == COLUMN_LOCATION:
+                location = f"{server.get('country', 'Unknown')}, {server.get('city', 'Unknown')}"
+                if self.show_protocols:
+                    protocols = ", ".join(p.upper() for p in server.get("protocols", []))
+                    location = f"{server.get('country', 'Unknown')} - {server.get('city', '')} ({protocols})"
+                return location
+            if column == COLUMN_LOAD:
+                load = self.metrics(server.get("id")).get("load")
+                return f"{load:.0f}%" if load is not None else "–"
+            if column == COLUMN_PING:
+                ping = self.metrics(server.get("id")).get("ping_ms")
+                return f"{ping:.0f} ms" if ping is not None else "–"
+            if column == COLUMN_FEATURES:
+                return server_features(server)
+        elif role == SortRole:
+            if column == COLUMN_LOAD:
+                load = self.metrics(server.get("id")).get("load")
+                return load if load is not None else math.inf
+            if column == COLUMN_PING:
+                ping = self.metrics(server.get("id")).get("ping_ms")
+                return ping if ping is not None else math.inf
+            if column == COLUMN_LOCATION:
+                return f"{server.get('country', '')} {server.get('city', '')}"
+            return server_features(server)
+        elif role == SearchRole:
+            return self._search_key(index.row())
+        elif role == ServerRole:
+            return server
+        elif role == Qt.ForegroundRole:
+            metrics = self.metrics(server.get("id"))
+            if (column == COLUMN_PING and metrics.get("ping_stale")) or \
+                    (column == COLUMN_LOAD and metrics.get("load_stale")):
+                return STALE_COLOR
+        elif role == Qt.ToolTipRole:
+            if column == COLUMN_LOCATION:
+                return f"{server.get('id', '')} · {server.get('region', '')}"
+            if column == COLUMN_PING:
+                age = self.metrics(server.get("id")).get("ping_age")
+                if age is not None:
+                    return f"Measured {age:.0f} s ago"
+        return None
+
+
+class ServerFilterProxyModel(QSortFilterProxyModel):
+    """Search and sort on top of ServerTableModel"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFilterRole(SearchRole)
+        self.setFilterKeyColumn(COLUMN_LOCATION)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.setSortRole(SortRole)
+        # Re-sort when ping/load change
+        self.setDynamicSortFilter(True)
+
+    def set_search(self, text: str) -> None:
+        self.setFilterFixedString(text.strip().lower())
+
+    def server_for(self, proxy_index) -> Optional[Dict]:
+        if not proxy_index.isValid():
+            return None
+        return self.sourceModel().server_at(self.mapToSource(proxy_index).row())
+
+
+def visible_server_ids(view, proxy: ServerFilterProxyModel) -> List[str]:
+    """IDs of the rows currently on screen in a view over the proxy"""
+    rect = view.viewport().rect()
+    first = view.indexAt(rect.topLeft())
+    if not first.isValid():
+        return []
+    last = view.indexAt(rect.bottomLeft())
+    last_row = last.row() if last.isValid() else proxy.rowCount() - 1
+
+    ids = []
+    for row in range(first.row(), last_row + 1):
+        server = proxy.server_for(proxy.index(row, COLUMN_LOCATION))
+        if server:
+            ids.append(server.get("id"))
+    return ids
@@ -0,0 +1,7 @@
+# This file marks the directory as a Python package
+# Tk widgets shared by the Tkinter frontends (tkinter_ui, vpn_tk, simple_vpn)
+
+from .server_list import IndexedServerTree
+from .dispatcher import TkDispatcher
+
+__all__ = ['IndexedServerTree', 'TkDispatcher']
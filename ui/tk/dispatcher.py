@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Tk Dispatcher
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Main-thread dispatcher for Tk.
+
+Tk widgets may only be touched from the thread running ``mainloop``.
+Background producers (status threads, daemon listeners) call ``post()``,
+which only appends to a queue; a single ``after()`` pump on the Tk thread
+drains it once per frame. Updates posted under the same key replace each
+other, so a burst of status samples costs one redraw with the latest
+state, and everything drained in one pass is applied as one batch.
+
+When nothing is posted, the pump slows down to ``idle_ms`` to avoid
+waking the event loop for nothing.
+"""
+
+import queue
+import logging
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+logger = logging.getLogger('anidata_tk')
+
+
+class TkDispatcher:
+    """
+    Queue of UI updates applied on the Tk thread
+    """
+
+    def __init__(self, widget, frame_ms: int = 16, idle_ms: int = 100):
+        """
+        Args:
+            widget: Any widget of the application (used for ``after``)
+            frame_ms: Pump period while updates are flowing
+            idle_ms: Pump period once the queue has been empty for a frame
+        """
+        self.widget = widget
+        self.frame_ms = frame_ms
+        self.idle_ms = idle_ms
+        self._queue = queue.SimpleQueue()
+        self._job = None
+        self._running = False
+
+    def post(self, key: Hashable, callback: Callable, *args) -> None:
+        """
+        Schedule ``callback(*args)`` on the Tk thread; safe from any thread
+
+        Args:
+            key: Target of the update (e.g. ``"status"``); only the latest
+                update per key and frame is applied. ``None`` never coalesces.
+            callback: Function updating the widgets
+        """
+        self._queue.put((key, callback, args))
+
+    def start(self) -> None:
+        """Start the pump; must be called from the Tk thread"""
+        if not self._running:
+            self._running = True
+            self._job = self.widget.after(self.frame_ms, self._pump)
+
+    def stop(self) -> None:
+        """Stop the pump; pending updates are dropped"""
+        self._running = False
+        if self._job is not None:
+            try:
+                self.widget.after_cancel(self._job)
+            except Exception:
+                pass
+            self._job = None
+
+    def _drain(self) -> "OrderedDict":
+        batch = OrderedDict()
+        anonymous = 0
+        while True:
+            try:
+                key, callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                return batch
+            if key is None:
+                key = ("anonymous", anonymous)
+                anonymous += 1
+            else:
+                # Keep the position of the latest update
+                batch.pop(key, None)
+            batch[key] = (callback, args)
+
+    def _pump(self) -> None:
+        self._job = None
+        if not self._running:
+            return
+
+        batch = self._drain()
+        for callback, args in batch.values():
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.error(f"UI update failed: {str(e)}")
+
+        self._job = self.widget.after(self.frame_ms if batch else self.idle_ms, self._pump)
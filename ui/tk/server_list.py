@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# AniData VPN - Tk Server List
+# © 2023-2024 AniData - All Rights Reserved
+
+"""
+Indexed, incrementally materialized server list for ``ttk.Treeview``.
+
+Rows use the catalog index as iid, so selecting a row is a list lookup
+(no JSON in tags, no value parsing). Filtering never deletes rows: rows
+that stop matching are detached in a single call and matching rows are
+re-attached (or inserted the first time they are needed) one page at a
+time. Further pages are materialized when the user scrolls near the end,
+so a 10k-entry catalog only creates the rows actually looked at. Typing
+is debounced so a burst of keystrokes triggers one filter pass.
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence
+
+
+def default_search_key(server: Dict) -> str:
+    return f"{server.get('country', '')} {server.get('city', '')}".lower()
+
+
+class IndexedServerTree:
+    """
+    Controller attached to an existing Treeview (columns and styling stay
+    with the caller)
+    """
+
+    def __init__(self, tree,
+                 row_values: Callable[[Dict], Sequence],
+                 row_tags: Optional[Callable[[Dict], Sequence[str]]] = None,
+                 search_key: Callable[[Dict], str] = default_search_key,
+                 scrollbar=None,
+                 page_size: int = 200,
+                 debounce_ms: int = 150):
+        """
+        Args:
+            tree: ttk.Treeview to drive
+            row_values: Server -> column values
+            row_tags: Server -> row tags (e.g. region colors)
+            search_key: Server -> lowercase text matched by search
+            scrollbar: Vertical scrollbar fed by the tree, if any
+            page_size: Rows attached per page
+            debounce_ms: Delay between the last keystroke and filtering
+        """
+        self.tree = tree
+        self.row_values = row_values
+        self.row_tags = row_tags
+        self.search_key = search_key
+        self.scrollbar = scrollbar
+        self.page_size = page_size
+        self.debounce_ms = debounce_ms
+
+        self.servers: List[Dict] = []
+        self._keys: List[str] = []
+        self._matches: List[int] = []
+        self._attached = 0          # prefix of _matches currently attached
+        self._materialized = set()  # indices with an existing tree item
+        self._query = ""
+        self._filter_job = None
+        self._page_job = None
+
+        self.tree.configure(yscrollcommand=self._on_scroll)
+
+    # ------------------------------------------------------------------
+    # Data
+    # ------------------------------------------------------------------
+
+    def set_servers(self, servers: List[Dict]) -> None:
+        """Replace the catalog; only the first page is materialized"""
+        # Attached and detached rows go in a single call
+        items = set(self.tree.get_children()) | {str(i) for i in self._materialized}
+        if items:
+            self.tree.delete(*items)
+
+        self.servers = servers
+        self._keys = [self.search_key(server) for server in servers]
+        self._materialized = set()
+        self._attached = 0
+        self._apply_matches(self._compute_matches(self._query))
+
+    def server_for(self, iid: str) -> Optional[Dict]:
+        try:
+            return self.servers[int(iid)]
+        except (ValueError, IndexError):
+            return None
+
+    def selected_server(self) -> Optional[Dict]:
+        selection = self.tree.selection()
+        return self.server_for(selection[0]) if selection else None
+
+    @property
+    def match_count(self) -> int:
+        return len(self._matches)
+
+    # ------------------------------------------------------------------
+    # Filtering
+    # ------------------------------------------------------------------
+
+    def schedule_filter(self, query: str) -> None:
+        """Debounced filter, meant for <KeyRelease> handlers"""
+        if self._filter_job is not None:
+            self.tree.after_cancel(self._filter_job)
+        self._filter_job = self.tree.after(self.debounce_ms, self.filter, query)
+
+    def filter(self, query: str) -> None:
+        self._filter_job = None
+        query = query.strip().lower()
+        if query == self._query and self._attached:
+            return
+        self._query = query
+        self._apply_matches(self._compute_matches(query))
+
+    def _compute_matches(self, query: str) -> List[int]:
+        if not query:
+            return list(range(len(self.servers)))
+        return [i for i, key in enumerate(self._keys) if query in key]
+
+    def _apply_matches(self, matches: List[int]) -> None:
+        # One Tcl call detaches everything currently shown
+        attached = self.tree.get_children()
+        if attached:
+            self.tree.detach(*attached)
+        self._matches = matches
+        self._attached = 0
+        self._attach_next_page()
+        self.tree.yview_moveto(0)
+
+    def _attach_next_page(self) -> None:
+        self._page_job = None
+        end = min(self._attached + self.page_size, len(self._matches))
+        for position in range(self._attached, end):
+            index = self._matches[position]
+            iid = str(index)
+            if index in self._materialized:
+                self.tree.move(iid, "", position)
+            else:
+                server = self.servers[index]
+                tags = tuple(self.row_tags(server)) if self.row_tags else ()
+                self.tree.insert("", position, iid=iid, values=tuple(self.row_values(server)), tags=tags)
+                self._materialized.add(index)
+        self._attached = end
+
+    def _on_scroll(self, first, last) -> None:
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        # Near the end of what is attached: bring in the next page
+        if float(last) > 0.9 and self._attached < len(self._matches) and self._page_job is None:
+            self._page_job = self.tree.after_idle(self._attach_next_page)
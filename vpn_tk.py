@@ -21,13 +21,16 @@ try:
 except ImportError:
     MATPLOTLIB_AVAILABLE = False
 
-# Classe de gestionnaire VPN simplifiée
+from ui.tk import IndexedServerTree, TkDispatcher
+
+# Classe de gestionnaire VPN simplifiée (simulation, sans démon)
 class VPNManager:
     def __init__(self):
         self.servers = []
         self.connected = False
     
-    def connect(self, server):
+    def connect(self, connection_config):
+        server = connection_config['server']
         print(f"Connexion à {server['country']} - {server['city']}...")
         self.connected = True
         return True
@@ -49,8 +52,19 @@ class VPNManager:
             }
         }
 
+# Client du démon de contrôle
+def connect_daemon_manager():
+    """Retourne un gestionnaire relié au démon AniData VPN, ou None s'il n'est pas lancé"""
+    try:
+        from core.daemon import connect_daemon, DaemonRealVPNManager
+    except ImportError:
+        return None
+    client = connect_daemon()
+    return DaemonRealVPNManager(client) if client else None
+
 # Thread de surveillance
 class StatusThread(threading.Thread):
+    # Le callback s'exécute sur ce thread : passer par un TkDispatcher
     def __init__(self, manager, callback):
         super().__init__()
         self.manager = manager
@@ -75,8 +89,10 @@ class VPNApp:
         self.root.geometry("1000x600")
         self.root.minsize(800, 500)
         
-        # Manager VPN
-        self.manager = VPNManager()
+        # Manager VPN : le démon s'il tourne (il possède le tunnel), sinon la simulation
+        daemon_manager = connect_daemon_manager()
+        self.uses_daemon = daemon_manager is not None
+        self.manager = daemon_manager or VPNManager()
         self.current_server = None
         self.servers = []
         
@@ -86,8 +102,13 @@ class VPNApp:
         # Charger les données
         self.load_servers()
         
-        # Démarrer la surveillance
-        self.status_thread = StatusThread(self.manager, self.update_status)
+        # Démarrer la surveillance (les mises à jour passent par le thread Tk)
+        self.dispatcher = TkDispatcher(self.root)
+        self.dispatcher.start()
+        self.status_thread = StatusThread(
+            self.manager,
+            lambda status: self.dispatcher.post("status", self.update_status, status)
+        )
         self.status_thread.start()
     
     def create_ui(self):
@@ -171,7 +192,17 @@ class VPNApp:
         # Barre de défilement
         scrollbar = ttk.Scrollbar(servers_frame, orient=tk.VERTICAL, command=self.servers_tree.yview)
         scrollbar.place(relx=1, rely=0, relheight=1, anchor=tk.NE)
-        self.servers_tree.configure(yscrollcommand=scrollbar.set)
+        
+        # Index iid -> serveur, filtrage par detach/reattach et lignes créées à la demande
+        self.servers_index = IndexedServerTree(
+            self.servers_tree,
+            lambda server: (
+                server.get("country", "Inconnu"),
+                server.get("city", ""),
+                ", ".join(server.get("protocols", []))
+            ),
+            scrollbar=scrollbar
+        )
         
         # Sélection de serveur
         self.servers_tree.bind("<<TreeviewSelect>>", self.on_server_selected)
@@ -292,6 +323,16 @@ class VPNApp:
             ).pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
     
     def load_servers(self):
+        if self.uses_daemon:
+            # Seuls les serveurs du catalogue du démon sont joignables
+            try:
+                self.servers = self.manager.servers
+                if self.servers:
+                    self.populate_servers()
+                    return
+            except Exception as e:
+                print(f"Erreur lors du chargement des serveurs du démon: {e}")
+
         # Essayer de charger depuis un fichier JSON
         try:
             data_path = os.path.join(os.path.dirname(__file__), "data", "countries.json")
@@ -365,56 +406,21 @@ class VPNApp:
             })
     
     def populate_servers(self):
-        # Effacer la liste actuelle
-        for item in self.servers_tree.get_children():
-            self.servers_tree.delete(item)
-        
-        # Ajouter les serveurs
-        for i, server in enumerate(self.servers):
-            protocols = ", ".join(server.get("protocols", []))
-            self.servers_tree.insert(
-                "", tk.END, 
-                iid=str(i),
-                values=(
-                    server.get("country", "Inconnu"),
-                    server.get("city", ""),
-                    protocols
-                )
-            )
+        self.servers_index.set_servers(self.servers)
     
     def filter_servers(self, event=None):
-        query = self.search_entry.get().lower()
-        
-        # Effacer la liste actuelle
-        for item in self.servers_tree.get_children():
-            self.servers_tree.delete(item)
-        
-        # Ajouter les serveurs filtrés
-        for i, server in enumerate(self.servers):
-            if (query in server.get("country", "").lower() or 
-                query in server.get("city", "").lower()):
-                protocols = ", ".join(server.get("protocols", []))
-                self.servers_tree.insert(
-                    "", tk.END, 
-                    iid=str(i),
-                    values=(
-                        server.get("country", "Inconnu"),
-                        server.get("city", ""),
-                        protocols
-                    )
-                )
+        self.servers_index.schedule_filter(self.search_entry.get())
     
     def on_server_selected(self, event):
-        selection = self.servers_tree.selection()
-        if selection:
-            index = int(selection[0])
-            self.current_server = self.servers[index]
+        server = self.servers_index.selected_server()
+        if server:
+            self.current_server = server
             self.server_label.config(text=f"{self.current_server['country']} - {self.current_server['city']}")
             self.connect_btn.state(['!disabled'])
     
     def connect(self):
         if self.current_server:
-            if self.manager.connect(self.current_server):
+            if self.manager.connect({'server': self.current_server}):
                 self.status_label.config(text="Connecté")
                 self.connect_btn.state(['disabled'])
                 self.disconnect_btn.state(['!disabled'])
@@ -490,11 +496,16 @@ class VPNApp:
                 if max_speed > 0:
                     self.ax.set_ylim(0, max_speed * 1.1)
             
-            self.canvas.draw()
+            self.canvas.draw_idle()
     
     def on_close(self):
         if hasattr(self, 'status_thread'):
             self.status_thread.stop()
+        if hasattr(self, 'dispatcher'):
+            self.dispatcher.stop()
+        if self.uses_daemon:
+            # Le tunnel reste au démon : seule la connexion de contrôle est fermée
+            self.manager.close()
         self.root.destroy()
 
 # Lancer l'application